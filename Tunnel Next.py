@@ -30,6 +30,11 @@ import importlib.util
 import datetime
 import copy
 import threading
+import contextlib
+import json
+# 节点图求值引擎和脚本头部解析与命令行共用
+from TunnelNX_scripts.TNXEngine import TNXEngine, TNXEngineError, parse_script_header
+
 # 动态导入TNXVC模块
 try:
     from TunnelNX_scripts.TNXVC import TNXVC
@@ -37,167 +42,6 @@ except ImportError:
     print("TNXVC模块未找到，版本控制功能可能不可用")
 
 
-class MetadataManager:
-    """元数据管理器 - 负责处理节点图中的元数据流"""
-
-    def __init__(self):
-        self._lock = threading.Lock()
-
-    def create_metadata(self, **kwargs):
-        """创建新的元数据字典"""
-        with self._lock:
-            metadata = {
-                'created_at': datetime.datetime.now().isoformat(),
-                'node_path': [],  # 记录经过的节点路径
-                'processing_history': [],  # 记录处理历史
-                **kwargs
-            }
-            return metadata
-
-    def merge_metadata(self, *metadata_dicts):
-        """合并多个元数据字典，后面的会覆盖前面的同名键"""
-        with self._lock:
-            merged = {}
-            for metadata in metadata_dicts:
-                if isinstance(metadata, dict):
-                    merged.update(metadata)
-            return merged
-
-    def copy_metadata(self, metadata):
-        """深拷贝元数据"""
-        if not isinstance(metadata, dict):
-            return {}
-        return copy.deepcopy(metadata)
-
-    def add_node_to_path(self, metadata, node_id, node_title):
-        """向元数据的节点路径中添加节点（优化版本）
-
-        优化点：
-        1. 只保存节点ID和标题，不保存处理时间
-        2. 避免重复添加相同的节点
-        3. 限制路径长度，防止无限增长
-        """
-        if not isinstance(metadata, dict):
-            metadata = {}
-
-        if 'node_path' not in metadata:
-            metadata['node_path'] = []
-
-        # 检查节点是否已经在路径中（避免重复）
-        for existing_node in metadata['node_path']:
-            if (isinstance(existing_node, dict) and
-                existing_node.get('node_id') == node_id):
-                # 节点已存在，不重复添加
-                return metadata
-            elif existing_node == node_id:
-                # 兼容旧格式（直接存储node_id）
-                return metadata
-
-        # 添加新节点（只保存ID和标题）
-        node_info = {
-            'node_id': node_id,
-            'node_title': node_title
-        }
-
-        metadata['node_path'].append(node_info)
-
-        # 限制路径长度，防止无限增长（保留最近的50个节点）
-        max_path_length = 50
-        if len(metadata['node_path']) > max_path_length:
-            metadata['node_path'] = metadata['node_path'][-max_path_length:]
-
-        return metadata
-
-    def add_processing_record(self, metadata, operation, details=None):
-        """向元数据中添加处理记录（优化版本）
-
-        优化点：
-        1. 不保存时间戳，减少元数据大小
-        2. 限制历史记录数量，防止无限增长
-        3. 简化记录格式
-        """
-        if not isinstance(metadata, dict):
-            metadata = {}
-
-        if 'processing_history' not in metadata:
-            metadata['processing_history'] = []
-
-        # 简化的记录格式（不包含时间戳）
-        record = {
-            'operation': operation
-        }
-
-        # 只保存重要的详情信息
-        if details and isinstance(details, dict):
-            # 只保存脚本类型和输出类型，忽略脚本路径等冗余信息
-            simplified_details = {}
-            if 'script_type' in details:
-                simplified_details['script_type'] = details['script_type']
-            if 'output_types' in details and details['output_types']:
-                simplified_details['output_types'] = details['output_types']
-
-            if simplified_details:
-                record['details'] = simplified_details
-
-        metadata['processing_history'].append(record)
-
-        # 限制历史记录数量，防止无限增长（保留最近的20条记录）
-        max_history_length = 20
-        if len(metadata['processing_history']) > max_history_length:
-            metadata['processing_history'] = metadata['processing_history'][-max_history_length:]
-
-        return metadata
-
-    def get_metadata_value(self, metadata, key, default=None):
-        """安全地获取元数据值"""
-        if not isinstance(metadata, dict):
-            return default
-        return metadata.get(key, default)
-
-    def set_metadata_value(self, metadata, key, value):
-        """设置元数据值"""
-        if not isinstance(metadata, dict):
-            metadata = {}
-        metadata[key] = value
-        return metadata
-
-    def delete_metadata_key(self, metadata, key):
-        """删除元数据键"""
-        if isinstance(metadata, dict) and key in metadata:
-            del metadata[key]
-        return metadata
-
-    def validate_metadata(self, metadata):
-        """验证元数据格式"""
-        if not isinstance(metadata, dict):
-            return False
-
-        # 检查必要的字段
-        required_fields = ['created_at', 'node_path', 'processing_history']
-        for field in required_fields:
-            if field not in metadata:
-                return False
-
-        return True
-
-    def serialize_metadata(self, metadata):
-        """序列化元数据为JSON字符串"""
-        try:
-            import json
-            return json.dumps(metadata, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"元数据序列化失败: {e}")
-            return "{}"
-
-    def deserialize_metadata(self, metadata_str):
-        """从JSON字符串反序列化元数据"""
-        try:
-            import json
-            return json.loads(metadata_str)
-        except Exception as e:
-            print(f"元数据反序列化失败: {e}")
-            return {}
-
 def scale_tile_worker(tile_byte_array, target_width, target_height, transformation_mode_value, aspect_ratio_mode_value):
     """
     工作进程函数：加载图像块字节，缩放，并返回缩放后的字节。
@@ -255,18 +99,99 @@ def scale_tile_worker(tile_byte_array, target_width, target_height, transformati
         import traceback
         traceback.print_exc()
         return None # 返回 None 表示失败
+class UICallbackBridge(QObject):
+    """
+    将工作线程中产生的UI回调转发到GUI线程执行
+
+    QTimer.singleShot 只能在带有Qt事件循环的线程中使用，
+    线程池中的工作线程通过发射信号（跨线程时自动为队列连接）把回调交给GUI线程。
+    """
+    callback_requested = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.callback_requested.connect(self._run_callback)
+
+    def _run_callback(self, callback):
+        try:
+            callback()
+        except Exception as e:
+            print(f"执行UI回调时出错: {e}")
+            import traceback
+            traceback.print_exc()
+
+class TunnelNXEngine(TNXEngine):
+    """
+    主程序使用的求值引擎：在无界面引擎的基础上接入主窗口的状态
+
+    脚本上下文中的视图状态和文件夹来自主窗口，打开了独立预览窗口的节点同样是汇节点且输出不会被释放，
+    节点重新计算后在GUI线程中更新自定义预览和独立预览窗口。
+    """
+
+    def __init__(self, app, **kwargs):
+        super().__init__(app=app, **kwargs)
+
+    def get_view_state(self):
+        # 界面相关的状态只能在GUI线程中读取，后台渲染时使用提交渲染请求时记录的快照
+        if threading.current_thread() is threading.main_thread() or not self.app._view_state_snapshot:
+            return self.app._capture_view_state()
+        return self.app._view_state_snapshot
+
+    def get_application_context(self, node=None):
+        context = super().get_application_context(node)
+        context.update({
+            'work_folder': self.app.work_folder,
+            'temp_folder': self.app.temp_folder,
+            'scripts_folder': self.app.scripts_folder,
+            'current_image_path': self.app.current_image_path,
+        })
+        return context
+
+    def get_default_sink_ids(self):
+        sink_ids = super().get_default_sink_ids()
+        sink_ids.update(self.app.node_preview_windows.keys())
+        return sink_ids
+
+    def is_output_pinned(self, node):
+        return super().is_output_pinned(node) or node.get('id') in self.app.node_preview_windows
+
+    def on_node_processed(self, node, context):
+        app = self.app
+        node_id = node.get('id')
+        if node_id is None:
+            return
+        # --- 检查是否有自定义预览更新函数 ---
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        custom_update_func_name = supported_features.get('PreviewUpdateFunction')
+
+        if custom_update_func_name and node.get('module') and hasattr(node['module'], custom_update_func_name):
+            # 调用节点的自定义预览更新函数
+            try:
+                custom_update_func = getattr(node['module'], custom_update_func_name)
+                # 注意：传递 node 本身，脚本函数可以从中获取 outputs
+                # 在GUI线程中异步调用可能更新UI的脚本代码（节点可能在工作线程中处理）
+                app._run_on_ui_thread(lambda n=node, ctx=context: custom_update_func(n, ctx))
+            except Exception as e:
+                print(
+                    f"Error calling custom preview update function '{custom_update_func_name}' for node {node_id}: {e}")
+        elif node_id in app.node_preview_windows:
+            # --- 更新标准预览窗口 ---
+            dialog = app.node_preview_windows[node_id]
+            if dialog and dialog.isVisible():
+                updated_img = None
+                if 'processed_outputs' in node and node['processed_outputs']:
+                    updated_img = next(iter(node['processed_outputs'].values()), None)
+
+                # 在GUI线程中安全更新，需要捕获 dialog 和 updated_img 的当前值
+                app._run_on_ui_thread(lambda d=dialog, img=updated_img: d.update_image(img))
+
 class TunnelNX(QMainWindow):
     def __init__(self):
         super().__init__()
         self.version = "Alpha 2"
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.node_cache = LRUCache(max_size=200)
-
-        # 启用缓存调试统计（可以通过配置文件控制）
-        self._debug_cache_stats = True  # 设置为True以查看缓存统计信息
-
-        # 初始化元数据管理器
-        self.metadata_manager = MetadataManager()
+        # 节点画布上是否显示求值耗时热图
+        self.profile_heatmap_enabled = False
 
         # 首先，确保 self.script_dir 已定义
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -315,14 +240,14 @@ class TunnelNX(QMainWindow):
 
         self.performance_mode_enabled = False
 
-        # 加载伪类型定义
-        self.pseudo_types = {}
-        if 'Pseudo Type' in self.config:
-            for real_type, aliases in self.config['Pseudo Type'].items():
-                alias_list = [alias.strip() for alias in aliases.split(',')]
-                for alias in alias_list:
-                    self.pseudo_types[alias] = real_type
-            print(f"已加载伪类型定义: {self.pseudo_types}")
+        # 节点图求值引擎（节点图、节点缓存、调度器，不依赖Qt），按配置读取性能、缓存和伪类型设置
+        self.engine = TunnelNXEngine(self, config=self.config)
+
+        # 加载界面相关的性能配置（后台渲染、可见区域求值、代理分辨率）
+        self._load_performance_settings()
+
+        # 工作线程中的UI回调统一转发到GUI线程
+        self._ui_callback_bridge = UICallbackBridge(self)
 
         # 设置窗口标题和图标
         self.setWindowTitle("TunnelNX Preview")
@@ -330,8 +255,7 @@ class TunnelNX(QMainWindow):
         self.setMinimumSize(1024, 576)
 
         # 初始化节点管理
-        self.nodes = []  # 节点列表
-        self.connections = []  # 节点连接列表
+        # 节点列表、连接列表和邻接索引（self.graph_index）保存在引擎中，见 nodes/connections 属性
         self.next_node_id = 0  # 下一个节点ID
         self.selected_node = None  # 当前选择的节点
         self.dragging = False  # 是否正在拖拽
@@ -375,6 +299,10 @@ class TunnelNX(QMainWindow):
         self.temp_folder = os.path.join(self.nodegraphs_folder, "temp")
         os.makedirs(self.temp_folder, exist_ok=True)
 
+        # 内存缓存淘汰的输出写入临时文件夹下的磁盘二级缓存，保存节点图时的输出写入持久化缓存
+        self.engine.init_disk_cache(os.path.join(self.temp_folder, "node_cache"),
+                                    os.path.join(self.nodegraphs_folder, "cache"))
+
         # 初始化版本控制系统
         try:
             self.tnxvc = TNXVC(self.work_folder)
@@ -418,21 +346,56 @@ class TunnelNX(QMainWindow):
         self.node_preview_windows = {} # 存储 node_id: QDialog 实例
         self.last_context_menu_time = 0
 
+    # --- 节点图保存在求值引擎中，脚本通过 context['app'] 访问的接口转发给引擎 ---
+    @property
+    def nodes(self):
+        """节点列表"""
+        return self.engine.nodes
+
+    @nodes.setter
+    def nodes(self, value):
+        self.engine.nodes = value
+
+    @property
+    def connections(self):
+        """节点连接列表"""
+        return self.engine.connections
+
+    @connections.setter
+    def connections(self, value):
+        self.engine.connections = value
+
+    @property
+    def graph_index(self):
+        """按节点ID维护的邻接索引，与 nodes/connections 同步更新"""
+        return self.engine.graph_index
+
+    def process_node(self, node):
+        """处理单个节点并返回输出（见 TNXEngine.process_node），出错时打印错误并返回空字典"""
+        try:
+            return self.engine.process_node(node)
+        except TNXEngineError as e:
+            print(e)
+            import traceback
+            traceback.print_exc()
+            return {}
 
+    def get_node_inputs(self, node, consumed=None, upstream_outputs=None):
+        """获取节点的输入数据（见 TNXEngine.get_node_inputs）"""
+        return self.engine.get_node_inputs(node, consumed, upstream_outputs)
 
     def get_application_context(self, node=None):
         """Gathers relevant application state information for scripts."""
+        return self.engine.get_application_context(node)
+
+    def _capture_view_state(self):
+        """读取预览区域等界面状态（必须在GUI线程中调用）"""
         # --- 直接使用 preview_display_widget ---
         preview_widget_size = QSize(0, 0)
         if hasattr(self, 'preview_display_widget') and self.preview_display_widget:
              preview_widget_size = self.preview_display_widget.size()
 
-        context = {
-            'app': self,
-            'work_folder': self.work_folder,
-            'temp_folder': self.temp_folder,
-            'scripts_folder': self.scripts_folder,
-            'current_image_path': self.current_image_path if hasattr(self, 'current_image_path') else None,
+        return {
             'zoom_level': self.zoom_level,
             # 添加预览视口尺寸
             'preview_viewport_size': self.preview_scroll.viewport().size() if hasattr(self, 'preview_scroll') else QSize(0, 0),
@@ -445,12 +408,6 @@ class TunnelNX(QMainWindow):
             # 添加主窗口尺寸
             'window_size': self.size(),
         }
-        if node:
-            context.update({
-                'node_id': node['id'],
-                'node_title': node['title']
-            })
-        return context
     def setup_aero_style(self, theme_name="default.TNXtheme"):
         """设置Aero风格样式，移除多余边框，统一界面风格"""
         theme_path = os.path.join(self.script_dir, "resources", theme_name)
@@ -841,19 +798,129 @@ class TunnelNX(QMainWindow):
 
         self.performance_mode_action = QAction(QIcon(os.path.join(resources_dir, "performance.png")), "性能模式", self)
         self.performance_mode_action.setCheckable(True)  # 使按钮可切换
-        self.performance_mode_action.setToolTip("启用性能模式，对PerfSensitive节点优化处理")
+        self.performance_mode_action.setToolTip("启用性能模式，预览缩小时在降低的代理分辨率上计算整个节点图，导出时使用完整分辨率")
         self.performance_mode_action.triggered.connect(self.toggle_performance_mode)
         self.performance_toolbar.addAction(self.performance_mode_action)
 
+        self.profile_heatmap_action = QAction(QIcon(os.path.join(resources_dir, "performance.png")), "性能热图", self)
+        self.profile_heatmap_action.setCheckable(True)
+        self.profile_heatmap_action.setToolTip("按最近一次求值中各节点的耗时给节点着色，并用红色标出关键路径")
+        self.profile_heatmap_action.toggled.connect(self.toggle_profile_heatmap)
+        self.performance_toolbar.addAction(self.profile_heatmap_action)
+
+        export_trace_action = QAction(QIcon(os.path.join(resources_dir, "export.png")), "导出跟踪", self)
+        export_trace_action.setToolTip("把最近的求值记录导出为Chrome trace_event JSON，可在chrome://tracing或Perfetto中查看")
+        export_trace_action.triggered.connect(self.export_profile_trace)
+        self.performance_toolbar.addAction(export_trace_action)
+
         # 更新后调用样式设置
         self.update_performance_button_style()
 
+        # --- 缓存组 ---
+        cache_toolbar = QToolBar("缓存")
+        cache_toolbar.setToolButtonStyle(Qt.ToolButtonTextUnderIcon)
+        cache_toolbar.setIconSize(QSize(48, 48))
+
+        purge_cache_action = QAction(QIcon(os.path.join(resources_dir, "delete_node.png")), "清除缓存", self)
+        purge_cache_action.setToolTip("清除内存、磁盘临时缓存和持久化缓存中的所有节点输出")
+        purge_cache_action.triggered.connect(self.purge_node_caches)
+        cache_toolbar.addAction(purge_cache_action)
+
         view_layout.addWidget(zoom_toolbar)
         view_layout.addWidget(self.performance_toolbar)
+        view_layout.addWidget(cache_toolbar)
         view_layout.addStretch(1)
 
         self.ribbon_widget.addTab(view_tab, "视图")
 
+    def _load_performance_settings(self):
+        """
+        从config.ini的[Performance]节读取界面相关的性能配置，缺省时使用默认值
+
+        并行执行、按需求值、提前截止、原地执行、缓冲区池、中间结果释放、分块处理和性能记录
+        由求值引擎读取（见 TNXEngine._load_performance_settings）。
+
+        支持的配置项:
+            background_rendering: 参数调整时是否在后台线程中渲染 (默认 true)
+            roi_evaluation: 预览放大时参数调整是否只计算可见区域 (默认 true)
+            roi_max_fraction: 可见区域占整幅图像的比例不超过该值时才只计算可见区域 (默认 0.5)
+            roi_refine_delay_ms: 只计算可见区域后，停止编辑多久再补算整幅图像，单位毫秒 (默认 300)
+            proxy_max_level: 性能模式下代理分辨率的最大金字塔层级，边长最小缩小到 1/2**level (默认 3)
+            progressive_refinement: 性能模式下参数调整是否先在更低的分辨率上快速预览，再逐级细化 (默认 true)
+            progressive_frame_budget_ms: 渐进细化第一次预览的目标耗时，单位毫秒 (默认 50)
+            param_coalesce_ms: 合并连续参数修改的时间窗口，单位毫秒 (默认 16)
+        """
+        section = self.config['Performance'] if 'Performance' in self.config else {}
+
+        # 后台渲染：单独的渲染线程负责求值，代数(generation)用于取消过期的渲染
+        self.background_rendering_enabled = True
+        try:
+            if 'background_rendering' in section:
+                self.background_rendering_enabled = self.config.getboolean('Performance', 'background_rendering')
+        except ValueError as e:
+            print(f"读取后台渲染配置失败，使用默认值: {e}")
+        self.roi_evaluation_enabled = True
+        self.roi_max_fraction = 0.5
+        roi_refine_delay_ms = 300
+        try:
+            if 'roi_evaluation' in section:
+                self.roi_evaluation_enabled = self.config.getboolean('Performance', 'roi_evaluation')
+            if 'roi_max_fraction' in section:
+                self.roi_max_fraction = min(1.0, max(0.0, self.config.getfloat('Performance', 'roi_max_fraction')))
+            if 'roi_refine_delay_ms' in section:
+                roi_refine_delay_ms = max(0, self.config.getint('Performance', 'roi_refine_delay_ms'))
+        except ValueError as e:
+            print(f"读取可见区域求值配置失败，使用默认值: {e}")
+        # 只计算了可见区域后，停止编辑一段时间再补算整幅图像
+        self._roi_refine_timer = QTimer(self)
+        self._roi_refine_timer.setSingleShot(True)
+        self._roi_refine_timer.setInterval(roi_refine_delay_ms)
+        self._roi_refine_timer.timeout.connect(self._refine_after_roi_render)
+        self.proxy_max_level = 3
+        try:
+            if 'proxy_max_level' in section:
+                self.proxy_max_level = max(0, self.config.getint('Performance', 'proxy_max_level'))
+        except ValueError as e:
+            print(f"读取代理分辨率配置失败，使用默认值: {e}")
+        self.progressive_refinement_enabled = True
+        self.progressive_frame_budget = 0.05
+        try:
+            if 'progressive_refinement' in section:
+                self.progressive_refinement_enabled = self.config.getboolean('Performance', 'progressive_refinement')
+            if 'progressive_frame_budget_ms' in section:
+                self.progressive_frame_budget = max(0, self.config.getint('Performance', 'progressive_frame_budget_ms')) / 1000.0
+        except ValueError as e:
+            print(f"读取渐进细化配置失败，使用默认值: {e}")
+        # 各代理层级最近一次完整求值的耗时（秒），用于估计渐进细化第一次预览的层级
+        self._render_level_times = {}
+        # 最近一次渲染请求使用的代理层级（渲染线程切换层级之前，引擎中的层级可能还是旧的）
+        self._requested_proxy_level = self.engine.proxy_level
+        self._render_executor = None
+        self._render_generation = 0
+        self._render_state_lock = threading.Lock()
+        # 求值期间持有引擎的求值锁（同一把可重入锁）
+        self._render_lock = self.engine.evaluation_lock
+        self._view_state_snapshot = None
+        self._background_renders_in_flight = 0
+        # 加载图像或节点图后，等渲染结果发布到预览再适应窗口
+        self._zoom_fit_pending = False
+
+        # 参数变更调度器：在短时间窗口内合并多次参数修改
+        coalesce_ms = 16
+        try:
+            if 'param_coalesce_ms' in section:
+                coalesce_ms = max(0, self.config.getint('Performance', 'param_coalesce_ms'))
+        except ValueError as e:
+            print(f"读取参数合并窗口配置失败，使用默认值: {e}")
+        self._dirty_nodes = {}
+        self._param_change_timer = QTimer(self)
+        self._param_change_timer.setSingleShot(True)
+        self._param_change_timer.setInterval(coalesce_ms)
+        self._param_change_timer.timeout.connect(self._flush_dirty_nodes)
+
+        print(f"性能配置: 并行执行={'开启' if self.engine.parallel_execution_enabled else '关闭'}, 最大线程数={self.engine.max_worker_threads}, "
+              f"后台渲染={'开启' if self.background_rendering_enabled else '关闭'}")
+
     def toggle_performance_mode(self):
         """切换性能模式开关状态"""
         self.performance_mode_enabled = not self.performance_mode_enabled
@@ -864,11 +931,57 @@ class TunnelNX(QMainWindow):
         if hasattr(self, 'task_label'):
             self.task_label.setText(status_msg)
 
-        # 重新处理节点图以应用更改
-        self.process_node_graph()
+        # 按当前预览缩放比例切换代理分辨率，并重新处理节点图以应用更改
+        self.request_graph_render(allow_roi=False, progressive=False, proxy_level=self._select_proxy_level())
 
         print(f"性能模式: {'开启' if self.performance_mode_enabled else '关闭'}")
 
+    def toggle_profile_heatmap(self, enabled):
+        """切换节点画布上的性能热图"""
+        self.profile_heatmap_enabled = enabled
+        self._update_profile_heatmap()
+        if hasattr(self, 'node_canvas_widget'):
+            self.node_canvas_widget.update()
+
+    def _update_profile_heatmap(self):
+        """求值完成后刷新热图，并在状态栏显示关键路径"""
+        if not self.profile_heatmap_enabled:
+            return
+        if hasattr(self, 'node_canvas_widget'):
+            self.node_canvas_widget.update()
+        run = self.engine.profiler.last_run()
+        if run is None or not hasattr(self, 'task_label'):
+            return
+        edges = [(conn['output_node']['id'], conn['input_node']['id']) for conn in self.connections]
+        path, total = self.engine.profiler.critical_path(run, edges)
+        titles = [run['records'][node_id]['title'] for node_id in path if node_id in run['records']]
+        if titles:
+            self.task_label.setText(f"关键路径 ({total * 1000:.1f} ms): {' → '.join(titles)}")
+
+    def export_profile_trace(self):
+        """把保留的求值记录导出为Chrome trace_event格式的JSON文件"""
+        if not self.engine.profiler.runs:
+            QMessageBox.information(self, "提示", "还没有求值记录可导出")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "导出性能跟踪",
+            os.path.join(self.work_folder, "tunnelnx_trace.json"),
+            "Chrome跟踪文件 (*.json);;所有文件 (*.*)"
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(self.engine.profiler.to_chrome_trace(), f, ensure_ascii=False)
+            print(f"性能跟踪已导出: {file_path}")
+            if hasattr(self, 'task_label'):
+                self.task_label.setText(f"性能跟踪已导出: {file_path}")
+        except Exception as e:
+            QMessageBox.critical(self, "导出失败", f"导出性能跟踪时出错: {str(e)}")
+            import traceback
+            traceback.print_exc()
+
     def create_node_tab(self):
         """创建 '节点' Ribbon 标签页"""
         node_tab = QWidget()
@@ -1808,8 +1921,8 @@ class TunnelNX(QMainWindow):
         # 更新连接线
         self.update_connections()
 
-        # 处理节点图
-        self.process_node_graph()
+        # 在后台处理节点图
+        self.request_graph_render(allow_roi=False, progressive=False)
 
         # 注: 此处原自动保存代码已移除
 
@@ -1818,7 +1931,6 @@ class TunnelNX(QMainWindow):
         try:
             # 显示加载指示器
             self.task_label.setText("正在加载图像...")
-            QApplication.processEvents()  # 强制更新UI
 
             # 0. 检查文件是否存在
             if not os.path.exists(file_path):
@@ -1889,8 +2001,9 @@ class TunnelNX(QMainWindow):
             # 5. 创建默认节点图
             print(f"创建新节点图: {new_graph_path}")
             self.task_label.setText("创建新节点图...")
-            QApplication.processEvents()
 
+            # 加载新图后适应窗口（渲染在后台进行，结果发布到预览后再适应）
+            self._fit_after_next_render()
             # 创建默认图时不抑制自动保存，让其成为可撤销的第一步
             self.create_default_node_graph() # 内部应调用 process_node_graph
 
@@ -1899,7 +2012,7 @@ class TunnelNX(QMainWindow):
             if image_node and 'params' in image_node and 'image_path' in image_node['params']:
                 self.update_node_param(image_node, 'image_path', self.current_image_path)
                 # 可能需要重新处理一下，确保图像正确加载
-                self.process_node_graph()
+                self.request_graph_render(allow_roi=False, progressive=False)
             else:
                 print("警告：创建默认图后未找到图像节点或参数，预览可能不正确。")
 
@@ -1914,7 +2027,6 @@ class TunnelNX(QMainWindow):
             if self.film_preview_list.parentWidget():
                 print(f"  Parent is: {self.film_preview_list.parentWidget().objectName()} of type {type(self.film_preview_list.parentWidget())}")
             self.update_film_preview() # 更新胶片预览缩略图
-            self.zoom_fit() # 加载新图后适应窗口
 
             # 切换到视图标签页
             view_tab_index = -1
@@ -2218,10 +2330,9 @@ class TunnelNX(QMainWindow):
             if self.load_node_graph_from_file(target_path):
                 # 注意：不需要再次设置状态，load_node_graph_from_file 已经正确设置
 
-                # 处理节点图并更新预览，禁用自动保存
-                self.process_node_graph(suppress_auto_save=True)
-                # 更新缩放以适应显示
-                self.zoom_fit()
+                # 在后台处理节点图，渲染完成后更新预览并适应显示
+                self._fit_after_next_render()
+                self.request_graph_render(allow_roi=False, progressive=False)
                 # 更新状态栏
                 if is_in_workfolder:
                     self.task_label.setText(f"已打开节点图: {os.path.basename(target_path)}")
@@ -2248,16 +2359,21 @@ class TunnelNX(QMainWindow):
             QMessageBox.information(self, "提示", "没有预览节点可导出")
             return
 
-        # 确保预览节点和其所有上游节点都已处理
-        self._ensure_preview_dependencies_processed(preview_node)
+        # 导出使用完整分辨率：性能模式下预览是代理分辨率，临时切换到层级0重新计算
+        previous_proxy_level = self._enter_full_resolution()
+        try:
+            # 确保预览节点和其所有上游节点都已处理
+            self._ensure_preview_dependencies_processed(preview_node)
 
-        # 获取输出图像
-        img = None
-        if 'processed_outputs' in preview_node:
-            if 'f32bmp' in preview_node['processed_outputs']:
-                img = preview_node['processed_outputs']['f32bmp']
-            elif 'tif16' in preview_node['processed_outputs']:
-                img = preview_node['processed_outputs']['tif16']
+            # 获取输出图像
+            img = None
+            if 'processed_outputs' in preview_node:
+                if 'f32bmp' in preview_node['processed_outputs']:
+                    img = preview_node['processed_outputs']['f32bmp']
+                elif 'tif16' in preview_node['processed_outputs']:
+                    img = preview_node['processed_outputs']['tif16']
+        finally:
+            self._leave_full_resolution(previous_proxy_level)
 
         if img is None:
             QMessageBox.information(self, "提示", "没有可导出的图像")
@@ -2752,10 +2868,11 @@ class TunnelNX(QMainWindow):
             # 更新图像尺寸标签
             self.image_size_label.setText(f"尺寸: {img_width} x {img_height}")
 
-            # 计算相对于图像的坐标（考虑缩放）
+            # 计算相对于图像的坐标（考虑缩放，代理分辨率的图像还要考虑缩小倍数）
             if hasattr(self, 'zoom_level'):
-                rel_x = int(rel_x / self.zoom_level)
-                rel_y = int(rel_y / self.zoom_level)
+                source_scale = self.preview_display_widget.source_scale if hasattr(self, 'preview_display_widget') else 1.0
+                rel_x = int(rel_x / (self.zoom_level * source_scale))
+                rel_y = int(rel_y / (self.zoom_level * source_scale))
 
             # 检查坐标是否在图像范围内
             if 0 <= rel_x < img_width and 0 <= rel_y < img_height:
@@ -3058,7 +3175,7 @@ class TunnelNX(QMainWindow):
                 'outputs': len(script_info.get('outputs', []))
             },
             # 新增：元数据支持
-            'metadata': self.metadata_manager.create_metadata(
+            'metadata': self.engine.metadata_manager.create_metadata(
                 node_id=self.next_node_id,
                 node_title=os.path.splitext(os.path.basename(script_path))[0],
                 script_path=script_path
@@ -3099,8 +3216,11 @@ class TunnelNX(QMainWindow):
         except Exception as e:
             print(f"加载模块出错: {str(e)}")
 
-        # 添加到节点列表
-        self.nodes.append(node)
+        # 添加到节点列表和邻接索引
+        render_interrupted = self._background_renders_in_flight > 0
+        with self._graph_mutation():
+            self.nodes.append(node)
+            self.graph_index.add_node(node)
         self.next_node_id += 1
 
         # 设置节点图为已修改状态
@@ -3118,6 +3238,8 @@ class TunnelNX(QMainWindow):
         # 这避免了不必要的预览刷新，提高性能
         # 只有当节点有连接时才会在后续的连接创建过程中被处理
         print(f"已添加节点 '{node['title']}'，等待连接后再处理")
+        if render_interrupted:
+            self._resume_interrupted_render()
         # 注: 此处原自动保存代码已移除
 
         return node
@@ -3866,6 +3988,12 @@ class TunnelNX(QMainWindow):
         metadata_action = menu.addAction("元数据查看")
         metadata_action.triggered.connect(lambda: self.show_node_metadata_dialog(node))
 
+        # --- 保留输出：求值后不释放该节点的中间结果 ---
+        keep_action = menu.addAction("保留输出")
+        keep_action.setCheckable(True)
+        keep_action.setChecked(bool(node.get('keep_outputs', False)))
+        keep_action.toggled.connect(lambda checked: self.set_node_keep_outputs(node, checked))
+
         # --- （菜单显示逻辑不变） ---
         # 在节点 widget 全局坐标处显示菜单
         menu.exec_(node['widget'].mapToGlobal(pos))
@@ -4078,7 +4206,7 @@ class TunnelNX(QMainWindow):
             output_metadata = node['processed_outputs']['_metadata']
 
         # 合并元数据（输出元数据优先）
-        combined_metadata = self.metadata_manager.merge_metadata(node_metadata, output_metadata)
+        combined_metadata = self.engine.metadata_manager.merge_metadata(node_metadata, output_metadata)
 
         # 创建分割器
         splitter = QSplitter(Qt.Horizontal)
@@ -4679,13 +4807,13 @@ class TunnelNX(QMainWindow):
 
                                  # 检查是否为伪类型
                                  real_output_type = output_type
-                                 if output_type in self.pseudo_types:
-                                     real_output_type = self.pseudo_types[output_type]
+                                 if output_type in self.engine.pseudo_types:
+                                     real_output_type = self.engine.pseudo_types[output_type]
                                      print(f"DEBUG: eventFilter - Output port is pseudo-type: {output_type} -> {real_output_type}")
 
                                  real_input_type = input_type
-                                 if input_type in self.pseudo_types:
-                                     real_input_type = self.pseudo_types[input_type]
+                                 if input_type in self.engine.pseudo_types:
+                                     real_input_type = self.engine.pseudo_types[input_type]
                                      print(f"DEBUG: eventFilter - Input port is pseudo-type: {input_type} -> {real_input_type}")
 
                                  print(f"DEBUG: eventFilter - Checking type compatibility: Output '{output_type}' -> Input '{input_type}'")
@@ -4766,9 +4894,10 @@ class TunnelNX(QMainWindow):
     def create_connection(self, output_node, output_port, input_node, input_port):
         """创建节点之间的连接 (实现替换逻辑)"""
         # 检查连接是否已存在 (完全相同的连接)
-        for conn in self.connections:
+        existing_input_connections = self.graph_index.get_input_connections(input_node['id'])
+        for conn in existing_input_connections:
             if (conn['output_node'] == output_node and conn['output_port'] == output_port and
-                conn['input_node'] == input_node and conn['input_port'] == input_port):
+                conn['input_port'] == input_port):
                 return False # 完全相同的连接，无需操作
 
         # 检查是否会形成环路 (必须在替换之前检查，否则可能错误地允许环路)
@@ -4778,16 +4907,11 @@ class TunnelNX(QMainWindow):
 
         # --- 新增：查找并移除指向目标输入端口的旧连接 ---
         connection_to_remove = None
-        for existing_conn in self.connections:
-            if existing_conn['input_node'] == input_node and existing_conn['input_port'] == input_port:
+        for existing_conn in existing_input_connections:
+            if existing_conn['input_port'] == input_port:
                 connection_to_remove = existing_conn
                 break # 一个输入端口只有一个连接
 
-        if connection_to_remove:
-            print(f"自动断开旧连接: {connection_to_remove['output_node']['title']}:{connection_to_remove['output_port']} -> {connection_to_remove['input_node']['title']}:{connection_to_remove['input_port']}")
-            self.connections.remove(connection_to_remove)
-        # --- 结束移除旧连接逻辑 ---
-
         # 创建新连接
         connection = {
             'output_node': output_node,
@@ -4796,31 +4920,34 @@ class TunnelNX(QMainWindow):
             'input_port': input_port
         }
 
-        self.connections.append(connection)
+        with self._graph_mutation():
+            if connection_to_remove:
+                print(f"自动断开旧连接: {connection_to_remove['output_node']['title']}:{connection_to_remove['output_port']} -> {connection_to_remove['input_node']['title']}:{connection_to_remove['input_port']}")
+                self.connections.remove(connection_to_remove)
+                self.graph_index.remove_connection(connection_to_remove)
+            # --- 结束移除旧连接逻辑 ---
 
-        # 设置节点图为已修改状态
-        self.set_nodegraph_state(modified=True)
+            self.connections.append(connection)
+            self.graph_index.add_connection(connection)
 
-        # 使输入节点及其下游节点的缓存失效（因为输入发生了变化）
-        input_node_id = input_node.get('id')
-        if input_node_id is not None:
-            self.invalidate_downstream_cache(input_node_id, "新建连接")
+            # --- 新增：处理灵活端口 ---
+            # 检查并处理输出节点的灵活端口
+            self._handle_flexible_port(output_node, output_port, 'outputs')
 
-        # --- 新增：处理灵活端口 ---
-        # 检查并处理输出节点的灵活端口
-        self._handle_flexible_port(output_node, output_port, 'outputs')
+            # 检查并处理输入节点的灵活端口
+            self._handle_flexible_port(input_node, input_port, 'inputs')
+            # --- 结束灵活端口处理 ---
 
-        # 检查并处理输入节点的灵活端口
-        self._handle_flexible_port(input_node, input_port, 'inputs')
-        # --- 结束灵活端口处理 ---
+        # 设置节点图为已修改状态
+        self.set_nodegraph_state(modified=True)
 
         # 连接创建只会影响输入节点和其下游节点
         # 输出节点的逻辑和结果不会受到影响，所以无需重新处理
         # 在这里精确控制重新计算的范围，避免不必要的处理
         print(f"创建连接：只处理输入节点 {input_node['title']} 及其下游节点")
-        self.process_node_graph(changed_nodes=[input_node])
+        self.request_graph_render(changed_nodes=[input_node], allow_roi=False, progressive=False)
 
-        # 不直接调用 self.process_node_graph() 以避免处理全部节点
+        # 不重新处理全部节点
 
         return True
 
@@ -4935,28 +5062,8 @@ class TunnelNX(QMainWindow):
         self.node_canvas_widget.update()
 
     def would_form_cycle(self, output_node, input_node):
-        """检查添加连接是否会形成循环"""
-        # 实现简单的循环检测
-        visited = set()
-
-        def dfs(node):
-            if node['id'] in visited:
-                return False
-
-            if node == output_node:
-                return True
-
-            visited.add(node['id'])
-
-            # 检查当前节点的所有输出连接
-            for conn in self.connections:
-                if conn['output_node'] == node:
-                    if dfs(conn['input_node']):
-                        return True
-
-            return False
-
-        return dfs(input_node)
+        """检查添加连接是否会形成循环（输出节点是否为输入节点自身或其下游）"""
+        return self.graph_index.would_form_cycle(output_node['id'], input_node['id'])
 
     def paintEvent(self, event):
         """重写绘制事件处理连接线的绘制"""
@@ -5306,35 +5413,33 @@ class TunnelNX(QMainWindow):
             # 清除节点的已处理输出缓存以强制重新计算
             if 'processed_outputs' in node:
                 del node['processed_outputs']
+            node.pop('outputs_released', None)
 
-            # 使该节点及其下游节点的缓存失效
-            node_id = node.get('id')
-            if node_id is not None:
-                self.invalidate_downstream_cache(node_id, f"参数 '{param_name}' 更新")
+            # 不移除缓存项：缓存按内容指纹寻址，新参数对应新的缓存键，
+            # 旧参数的结果保留在缓存中（参数改回原值时直接命中），由缓存按预算淘汰
 
-            # 检查此节点是否是预览节点的上游节点
-            is_preview_relevant = False
-            preview_node = None
-            for n in self.nodes:
-                if n['title'] == '预览节点':
-                    preview_node = n
-                    break
+            # 交给参数变更调度器：短时间内的连续修改会合并为一次增量渲染，
+            # 只处理变化节点及其下游节点，渲染完成后自动更新预览
+            self.schedule_node_update(node)
 
-            if preview_node and (node == preview_node or self.is_upstream_of_preview(node)):
-                is_preview_relevant = True
-
-            # 选择性处理节点图 - 只处理当前节点和下游节点
-            # 将suppress_auto_save设为True，抑制即时自动保存
-            self.process_node_graph(suppress_auto_save=True, changed_nodes=[node])
+            # 注: 原来的延迟保存计时器代码已移除
 
-            # 更新预览（确保在参数更新后更新预览）
-            # 如果是预览节点的上游，确保所有依赖都被处理
-            if is_preview_relevant:
-                self.update_preview(force_refresh=True)
-            else:
-                self.update_preview()
+    def set_node_keep_outputs(self, node, keep):
+        """
+        设置节点的"保留输出"标记，标记后求值结束时不会释放该节点的中间结果
 
-            # 注: 原来的延迟保存计时器代码已移除
+        参数:
+            node: 节点
+            keep (bool): 是否保留
+        """
+        if bool(node.get('keep_outputs', False)) == bool(keep):
+            return
+        if keep:
+            node['keep_outputs'] = True
+        else:
+            node.pop('keep_outputs', None)
+        self.set_nodegraph_state(modified=True)
+        print(f"节点 '{node.get('title', '未知')}' {'保留' if keep else '不再保留'}输出")
 
     def delete_selected_node(self, node=None):
         """删除选中的节点或指定节点"""
@@ -5344,36 +5449,29 @@ class TunnelNX(QMainWindow):
         if not target_node:
             return
 
-        # 删除相关的连接
-        conn_to_remove = []
-        for conn in self.connections:
-            if conn['input_node'] == target_node or conn['output_node'] == target_node:
-                conn_to_remove.append(conn)
+        render_interrupted = self._background_renders_in_flight > 0
+        with self._graph_mutation():
+            # 删除相关的连接
+            conn_to_remove = (self.graph_index.get_input_connections(target_node['id']) +
+                              self.graph_index.get_output_connections(target_node['id']))
 
-        # 使受影响的节点缓存失效
-        target_node_id = target_node.get('id')
-        if target_node_id is not None:
-            # 使被删除节点的缓存失效
-            self.invalidate_node_cache(target_node_id, "节点被删除")
+            # 使被删除节点的缓存失效，并清除它的来源记录和缓冲区池；
+            # 下游节点的缓存键包含上游指纹，删除后自然不再命中，不需要移除
+            target_node_id = target_node.get('id')
+            if target_node_id is not None:
+                self.engine.forget_node(target_node_id)
 
-            # 使所有连接到被删除节点的下游节点缓存失效
             for conn in conn_to_remove:
-                if conn['output_node'] == target_node:
-                    # 被删除节点是输出节点，使输入节点及其下游失效
-                    input_node_id = conn['input_node'].get('id')
-                    if input_node_id is not None:
-                        self.invalidate_downstream_cache(input_node_id, "上游节点被删除")
+                self.connections.remove(conn)
 
-        for conn in conn_to_remove:
-            self.connections.remove(conn)
+            # 从节点列表和邻接索引中移除
+            self.nodes.remove(target_node)
+            self.graph_index.remove_node(target_node)
 
         # 删除节点部件
         if 'widget' in target_node and target_node['widget']:
             target_node['widget'].setParent(None)
 
-        # 从节点列表中移除
-        self.nodes.remove(target_node)
-
         # 设置节点图为已修改状态
         self.set_nodegraph_state(modified=True)
 
@@ -5407,9 +5505,11 @@ class TunnelNX(QMainWindow):
 
         if affected_nodes:
             print(f"删除节点 '{target_node['title']}' 影响了 {len(affected_nodes)} 个节点，只处理这些节点")
-            self.process_node_graph(changed_nodes=affected_nodes)
+            self.request_graph_render(changed_nodes=affected_nodes, allow_roi=False, progressive=False)
         else:
             print(f"删除节点 '{target_node['title']}' 是孤立节点，无需重新处理或刷新预览")
+            if render_interrupted:
+                self._resume_interrupted_render()
 
         # 更新画布
         self.node_canvas_widget.update()
@@ -5458,8 +5558,24 @@ class TunnelNX(QMainWindow):
         注意:
             当添加新节点时，应该只处理新添加的节点，即使用changed_nodes=[node]
             仅在完全清空节点图或者加载新节点图时才清空缓存
+            此方法同步执行：调用时会使正在进行的后台渲染过期（在节点之间取消），
+            然后在当前线程中完成处理并更新界面。界面代码应调用 request_graph_render，
+            它在后台渲染线程中求值，只在未启用后台渲染时退化为调用本方法
+        """
+        self._next_render_generation()
+        with self._render_lock:
+            result = self.engine.evaluate_graph(changed_nodes)
+        self._finish_node_graph_processing(result)
+
+    def _finish_node_graph_processing(self, result):
+        """
+        根据一次求值的结果更新预览和节点界面（必须在GUI线程中调用）
+
+        参数:
+            result (dict): _evaluate_node_graph 的返回值
         """
-        processed_node_ids = set() # 记录在此次运行中处理的节点
+        processed_node_ids = result['processed_node_ids']
+        processed_count = result['processed_count']
 
         if not self.nodes:
             # 如果没有节点，确保清除上次处理记录并返回
@@ -5468,148 +5584,6 @@ class TunnelNX(QMainWindow):
                 self.preview_display_widget.update() # 更新一次以清除可能残留的叠加层
             return
 
-        # --- 1. 初始化处理状态 ---
-        # processing_state: node_id -> {'node': node_obj, 'inputs_needed': set(indices), 'inputs_received': set(indices), 'status': 'pending/ready/processing/done/error'}
-        processing_state = {}
-        # input_connections: input_node_id -> list of {output_node_id, output_port_idx, input_port_idx}
-        input_connections = {node['id']: [] for node in self.nodes}
-        # output_connections: output_node_id -> list of {input_node_id, input_port_idx, output_port_idx}
-        output_connections = {node['id']: [] for node in self.nodes}
-
-        for conn in self.connections:
-            in_node_id = conn['input_node']['id']
-            out_node_id = conn['output_node']['id']
-            input_connections[in_node_id].append({
-                'output_node_id': out_node_id,
-                'output_port_idx': conn['output_port'],
-                'input_port_idx': conn['input_port']
-            })
-            output_connections[out_node_id].append({
-                'input_node_id': in_node_id,
-                'input_port_idx': conn['input_port'],
-                'output_port_idx': conn['output_port']
-            })
-
-        for node in self.nodes:
-            node_id = node['id']
-            num_expected_inputs = len(node['script_info'].get('inputs', []))
-            inputs_needed = set(idx for idx in range(num_expected_inputs)
-                                if any(conn_info['input_port_idx'] == idx for conn_info in input_connections[node_id]))
-            processing_state[node_id] = {
-                'node': node,
-                'inputs_needed': inputs_needed,
-                'inputs_received': set(),
-                'status': 'pending'
-            }
-            # 只有当节点需要重新处理时才清除旧输出
-            if changed_nodes is None or node['id'] in set(n['id'] for n in changed_nodes if isinstance(n, dict) and 'id' in n):
-                if 'processed_outputs' in node:
-                    del node['processed_outputs']
-
-        # --- 2. 确定处理范围和起始节点 ---
-        nodes_to_process_ids = set()
-        if changed_nodes is None:
-            # 完全重新计算
-            nodes_to_process_ids = set(processing_state.keys())
-        else:
-            # 选择性重新计算
-            nodes_to_process_ids = set(n['id'] for n in changed_nodes)
-            queue = list(nodes_to_process_ids)
-            while queue:
-                current_id = queue.pop(0)
-                for conn_info in output_connections.get(current_id, []):
-                    downstream_id = conn_info['input_node_id']
-                    if downstream_id not in nodes_to_process_ids:
-                        nodes_to_process_ids.add(downstream_id)
-                        queue.append(downstream_id)
-            # 对于受影响的节点，重置其状态
-            for node_id in nodes_to_process_ids:
-                processing_state[node_id]['status'] = 'pending'
-                processing_state[node_id]['inputs_received'] = set()
-            # 对于未受影响的节点，标记为完成 (假设它们有缓存的结果)
-            for node_id in processing_state:
-                 if node_id not in nodes_to_process_ids:
-                      processing_state[node_id]['status'] = 'done' # 标记为完成
-                      # 不需要添加到 processed_node_ids，因为我们只关心本次运行处理的
-
-        # 查找处理范围内的起始节点 (没有需要的输入，或者所有需要的输入都来自已完成/范围外的节点)
-        processing_queue = []
-        for node_id in nodes_to_process_ids:
-            state = processing_state[node_id]
-            if not state['inputs_needed']: # 没有输入端口
-                state['status'] = 'ready'
-                processing_queue.append(node_id)
-            else:
-                # 检查输入是否来自已完成的节点
-                received_from_done = set()
-                all_inputs_accounted_for = True
-                for conn_info in input_connections[node_id]:
-                    upstream_id = conn_info['output_node_id']
-                    input_port_idx = conn_info['input_port_idx']
-                    if input_port_idx in state['inputs_needed']:
-                         if upstream_id not in processing_state or processing_state[upstream_id]['status'] == 'done':
-                              received_from_done.add(input_port_idx)
-                         elif upstream_id not in nodes_to_process_ids: # 输入来自范围外
-                              received_from_done.add(input_port_idx)
-                         # else: 输入来自处理范围内的未完成节点，等待
-
-                state['inputs_received'] = received_from_done
-                if state['inputs_received'] == state['inputs_needed']:
-                     state['status'] = 'ready'
-                     processing_queue.append(node_id)
-
-        # --- 3. 执行处理 ---
-        start_time = time.time()
-        processed_count = 0
-        error_occurred = False
-
-        # 记录每个节点的处理时间
-        node_times = {}
-
-        while processing_queue:
-            current_id = processing_queue.pop(0)
-            state = processing_state[current_id]
-
-            if state['status'] != 'ready': # 可能已被其他路径处理
-                continue
-
-            current_node = state['node']
-            state['status'] = 'processing'
-            # 记录节点处理开始时间
-            node_start_time = time.time()
-            try:
-                # 调用 process_node 来实际执行节点逻辑
-                # process_node 内部会调用 get_node_inputs，后者依赖上游节点的 processed_outputs
-                self.process_node(current_node)
-                state['status'] = 'done'
-                processed_node_ids.add(current_id)
-                processed_count += 1
-                # 记录节点处理结束时间并计算用时
-                node_end_time = time.time()
-                node_processing_time = node_end_time - node_start_time
-                node_times[current_node['title']] = node_processing_time
-                # 通知下游节点输入已就绪
-                for conn_info in output_connections.get(current_id, []):
-                    downstream_id = conn_info['input_node_id']
-                    input_port_idx = conn_info['input_port_idx']
-                    if downstream_id in processing_state and processing_state[downstream_id]['status'] == 'pending':
-                        ds_state = processing_state[downstream_id]
-                        ds_state['inputs_received'].add(input_port_idx)
-                        if ds_state['inputs_received'] == ds_state['inputs_needed']:
-                            ds_state['status'] = 'ready'
-                            if downstream_id not in processing_queue: # 避免重复添加
-                                processing_queue.append(downstream_id)
-
-            except Exception as e:
-                print(f"Error processing node {current_node['title']}: {e}")
-                import traceback
-                traceback.print_exc()
-                state['status'] = 'error'
-                error_occurred = True
-                # 错误传播？当前不处理，下游节点将无法获得输入
-
-        end_time = time.time()
-        processing_time = end_time - start_time
         # --- 4. 更新UI和状态 ---
         # 将本次运行处理的节点ID集合传递给预览部件
         if hasattr(self, 'preview_display_widget'):
@@ -5620,6 +5594,10 @@ class TunnelNX(QMainWindow):
         # 更新预览图像 (记录预览更新时间)
         preview_start_time = time.time()
         self.update_preview()
+        self._update_profile_heatmap()
+        if self._zoom_fit_pending:
+            self._zoom_fit_pending = False
+            self.zoom_fit()
 
         # 强制刷新预览显示 - 确保即使在初次加载时也能显示
         if processed_count > 0:
@@ -5678,58 +5656,593 @@ class TunnelNX(QMainWindow):
         self.update_colorspace_gamma_indicators()
 
         # 显示缓存统计信息（如果启用了调试且有节点被处理）
-        if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats and processed_count > 0:
-            self.print_cache_stats()
+        if self.engine.verbose and processed_count > 0:
+            self.engine.print_cache_stats()
 
         # 注: 此处原来的自动保存代码已移除
 
+    def _run_on_ui_thread(self, callback):
+        """在GUI线程中异步执行回调，可以从任意线程调用"""
+        if threading.current_thread() is threading.main_thread():
+            QTimer.singleShot(0, callback)
+        else:
+            self._ui_callback_bridge.callback_requested.emit(callback)
 
+    def _fit_after_next_render(self):
+        """下一次渲染结果发布到预览后适应窗口（渲染在后台进行，预览图像此时还没有更新）"""
+        self._zoom_fit_pending = True
 
-    def _rebuild_preview_node_widget(self, node):
+    def _next_render_generation(self):
+        """生成新的渲染代数，之前所有代数的渲染都随之过期"""
+        with self._render_state_lock:
+            self._render_generation += 1
+            return self._render_generation
+
+    def _is_render_stale(self, generation):
+        """判断指定代数的渲染是否已被更新的请求取代"""
+        return generation != self._render_generation
+
+    @contextlib.contextmanager
+    def _graph_mutation(self):
         """
-        完全重建支持PreviewOnNode的节点widget
+        修改节点图结构（节点、连接、端口）时使用，在GUI线程中调用
+
+        先生成新的渲染代数，使正在进行的后台渲染在节点之间取消，再持有求值锁完成修改，
+        渲染线程不会看到修改了一半的节点列表、连接列表和邻接索引。
+        """
+        self._next_render_generation()
+        with self._render_lock:
+            yield
+
+    def _resume_interrupted_render(self):
+        """修改节点图取消了后台渲染、之后又不需要重新处理任何节点时调用，由新的渲染继续处理被取消的节点"""
+        self.request_graph_render(changed_nodes=[], allow_roi=False, progressive=False)
+
+    def _get_render_executor(self):
+        """按需创建后台渲染线程（单线程，保证同一时间只有一次求值）"""
+        if self._render_executor is None:
+            self._render_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="TNXRenderWorker"
+            )
+        return self._render_executor
+
+    def schedule_node_update(self, node):
+        """
+        记录参数发生变化的节点，在一个短时间窗口后合并为一次增量渲染
+
+        窗口内以及当前后台渲染尚未完成期间的所有修改都会被合并，
+        因此一次连续编辑中每个受影响的节点只会在每次渲染中处理一次，
+        而不会像以前那样先增量处理、再整体强制刷新一遍。
 
         参数:
-            node: 需要重建的节点
+            node: 参数发生变化的节点
         """
-        # 保存位置和大小信息
-        old_x, old_y = node['x'], node['y']
-        old_width, old_height = node['width'], node['height']
+        self._dirty_nodes[node['id']] = node
+        if not self._param_change_timer.isActive():
+            self._param_change_timer.start()
 
-        # 如果有旧widget，先移除
-        old_widget = node.get('widget')
-        if old_widget:
-            old_widget.setParent(None)
-            old_widget.deleteLater()
+    def _flush_dirty_nodes(self):
+        """把收集到的脏节点合并为一次渲染请求（在GUI线程中调用）"""
+        if not self._dirty_nodes:
+            return
+        if self._background_renders_in_flight > 0:
+            # 等当前渲染完成后再合并处理，渲染结束时会再次调用本方法
+            return
 
-        # 重新绘制节点
-        self.draw_node(node)
+        dirty_nodes = [n for n in self.nodes if self._dirty_nodes.get(n['id']) is n]
+        self._dirty_nodes = {}
+        if dirty_nodes:
+            self.request_graph_render(changed_nodes=dirty_nodes)
 
-        # 恢复位置和大小
-        node['x'], node['y'] = old_x, old_y
-        node['width'], node['height'] = old_width, old_height
-        if 'widget' in node and node['widget']:
-            node['widget'].move(old_x, old_y)
+    def _on_background_render_done(self):
+        """后台渲染结束（完成或取消）后在GUI线程中调用，继续处理期间积累的修改"""
+        self._background_renders_in_flight = max(0, self._background_renders_in_flight - 1)
+        if self._background_renders_in_flight == 0 and self._dirty_nodes:
+            self._flush_dirty_nodes()
 
-    def _update_node_preview_image(self, node):
+    def request_graph_render(self, changed_nodes=None, allow_roi=True, progressive=True, proxy_level=None):
         """
-        只更新节点的预览图像部分，不重建整个widget
+        请求在后台渲染线程中处理节点图（不阻塞界面）
+
+        每次请求都会生成新的渲染代数，被取代的渲染会在节点之间取消，
+        其结果永远不会发布到预览界面。未启用后台渲染时退化为同步处理。
+        预览放大到只显示一部分图像时，参数修改只计算可见区域，停止编辑后再补算整幅图像；
+        性能模式下的参数修改先在更低的代理分辨率上快速预览，之后逐级细化到当前缩放对应的分辨率。
+        代理层级在渲染线程中持有求值锁后切换，GUI线程不等待正在进行的渲染。
 
         参数:
-            node: 需要更新预览的节点
+            changed_nodes (list): 需要重新处理的节点列表，None表示全部重新处理
+            allow_roi (bool): 是否允许只计算预览的可见区域
+            progressive (bool): 是否允许先在更低的分辨率上预览再逐级细化
+            proxy_level (int): 本次渲染使用的代理层级，None表示沿用最近一次请求的层级
         """
-        if not node.get('widget') or not node.get('processed_outputs'):
+        if not getattr(self, 'background_rendering_enabled', False):
+            if proxy_level is not None:
+                self._set_proxy_level(proxy_level)
+            self.process_node_graph(suppress_auto_save=True, changed_nodes=changed_nodes)
             return
 
-        # 查找现有的预览标签
-        preview_label = None
-        widget = node['widget']
+        if changed_nodes is not None:
+            changed_nodes = list(changed_nodes)
+        roi = self._get_preview_roi() if allow_roi and changed_nodes is not None else None
+        if roi is None and progressive and changed_nodes is not None:
+            proxy_level = self._select_coarse_proxy_level()
+        # 被取代的请求可能还没来得及切换层级，之后的请求继续使用它的层级
+        if proxy_level is None:
+            proxy_level = self._requested_proxy_level
+        self._requested_proxy_level = proxy_level
+
+        generation = self._next_render_generation()
+        # 在GUI线程中记录视图状态，供后台线程构建脚本上下文使用
+        self._view_state_snapshot = self._capture_view_state()
+        # 新的渲染会包含被推迟的节点，不再需要单独补算
+        self._roi_refine_timer.stop()
+        self._background_renders_in_flight += 1
+        self._get_render_executor().submit(self._background_render_job, generation, changed_nodes, roi, proxy_level)
+
+    def _background_render_job(self, generation, changed_nodes, roi=None, proxy_level=None):
+        """
+        后台渲染线程中执行的求值任务，roi不为None时先尝试只计算预览的可见区域
 
-        # 遍历子控件寻找预览标签
-        for child in widget.findChildren(QLabel):
-            if child.objectName() == "previewLabel":
-                preview_label = child
-                break
+        proxy_level不为None时先切换到该代理层级：切换会清除所有节点的输出，
+        改为完整求值，未变化的节点按内容指纹从该层级的缓存取回。
+        """
+        try:
+            if self._is_render_stale(generation):
+                # 尚未开始就已被取代，交给下一次渲染处理
+                self.engine.record_interrupted_nodes(
+                    None if changed_nodes is None else set(n['id'] for n in changed_nodes))
+                return
+
+            is_cancelled = lambda: self._is_render_stale(generation)
+            with self._render_lock:
+                if proxy_level is not None and self.engine.set_proxy_level(proxy_level):
+                    print(f"代理分辨率: 层级 {proxy_level} (1/{2 ** proxy_level})")
+                    changed_nodes = None
+                    roi = None
+                render_level = self.engine.proxy_level
+                roi_result = None
+                if roi is not None:
+                    roi_result = self._evaluate_preview_roi(changed_nodes, roi, is_cancelled=is_cancelled)
+                if roi_result is not None and (roi_result['cancelled'] or roi_result['patch'] is not None):
+                    result = None
+                else:
+                    # 节点图不适合只计算可见区域，被推迟的节点会合并进完整求值
+                    render_start = time.perf_counter()
+                    result = self.engine.evaluate_graph(changed_nodes, is_cancelled=is_cancelled)
+                    if not result['cancelled']:
+                        self._render_level_times[render_level] = time.perf_counter() - render_start
+
+            if result is None:
+                if roi_result['cancelled']:
+                    print(f"渲染 #{generation} 已被更新的编辑取代，已取消")
+                    return
+                patch = roi_result['patch']
+                self._run_on_ui_thread(lambda: self._publish_roi_result(generation, roi, patch))
+                return
+
+            if result['cancelled']:
+                print(f"渲染 #{generation} 已被更新的编辑取代，已取消")
+                return
+
+            self._run_on_ui_thread(lambda: self._publish_render_result(generation, result, render_level))
+        except Exception as e:
+            print(f"后台渲染 #{generation} 出错: {e}")
+            import traceback
+            traceback.print_exc()
+        finally:
+            self._run_on_ui_thread(self._on_background_render_done)
+
+    def _publish_render_result(self, generation, result, render_level):
+        """在GUI线程中发布渲染结果，过期的结果直接丢弃"""
+        if self._is_render_stale(generation):
+            return
+        self._finish_node_graph_processing(result)
+        if render_level > self._select_proxy_level():
+            # 渐进细化：本次是低分辨率的快速预览，等渲染线程空闲后计算下一级分辨率
+            QTimer.singleShot(0, lambda: self._refine_progressive_level(render_level))
+
+    def _select_coarse_proxy_level(self):
+        """
+        选择参数修改后第一次预览使用的代理层级
+
+        按各层级最近的求值耗时估计（每降低一级像素数减少为1/4），选择耗时不超过
+        progressive_frame_budget 的最高分辨率层级；没有耗时记录时直接使用目标层级。
+
+        返回:
+            int: 代理层级，不低于当前缩放对应的目标层级
+        """
+        target_level = self._select_proxy_level()
+        if not self.performance_mode_enabled or not self.progressive_refinement_enabled or not self._render_level_times:
+            return target_level
+        max_level = max(target_level, self.proxy_max_level)
+        for level in range(target_level, max_level + 1):
+            # 用最接近的已知层级的耗时估计
+            known_level = min(self._render_level_times, key=lambda known: abs(known - level))
+            estimate = self._render_level_times[known_level] * (4.0 ** (known_level - level))
+            if estimate <= self.progressive_frame_budget:
+                return level
+        return max_level
+
+    def _refine_progressive_level(self, render_level):
+        """
+        渐进细化：在低一级代理层级（更高分辨率）上重新求值，直到达到当前缩放对应的层级
+
+        参数:
+            render_level: 刚发布的渲染使用的代理层级
+        """
+        if self._dirty_nodes or self._background_renders_in_flight > 0:
+            # 仍在编辑或渲染，之后的渲染会重新开始渐进细化
+            return
+        target_level = self._select_proxy_level()
+        if render_level <= target_level:
+            return
+        self.request_graph_render(allow_roi=False, progressive=False, proxy_level=render_level - 1)
+
+    def _get_preview_roi(self):
+        """
+        计算预览区域当前可见的图像矩形（必须在GUI线程中调用）
+
+        返回:
+            dict或None: {'rect': (x0, y0, x1, y1), 'image_size': (宽, 高)}，图像坐标；
+                        可见部分超过 roi_max_fraction 或不满足条件时返回None
+        """
+        if not getattr(self, 'roi_evaluation_enabled', False) or not self.engine.demand_driven_evaluation:
+            return None
+        widget = getattr(self, 'preview_display_widget', None)
+        if widget is None or not hasattr(self, 'preview_scroll'):
+            return None
+        pixmap = widget.get_original_image()
+        # 原始图像可能是代理分辨率，换算为相对原始图像像素的缩放比例
+        zoom = widget.zoom_level * widget.source_scale
+        if pixmap.isNull() or zoom <= 0:
+            return None
+
+        width, height = pixmap.width(), pixmap.height()
+        viewport = self.preview_scroll.viewport().size()
+        scroll_x = self.preview_scroll.horizontalScrollBar().value()
+        scroll_y = self.preview_scroll.verticalScrollBar().value()
+        # 多取一个像素，覆盖视口边缘只显示了一部分的像素
+        x0 = max(0, int(math.floor(scroll_x / zoom)))
+        y0 = max(0, int(math.floor(scroll_y / zoom)))
+        x1 = min(width, int(math.ceil((scroll_x + viewport.width()) / zoom)) + 1)
+        y1 = min(height, int(math.ceil((scroll_y + viewport.height()) / zoom)) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        if (x1 - x0) * (y1 - y0) > self.roi_max_fraction * width * height:
+            return None
+        return {'rect': (x0, y0, x1, y1), 'image_size': (width, height)}
+
+    def _collect_roi_node_ids(self, preview_node, excluded_ids=()):
+        """
+        从预览节点向上游收集可以只计算部分区域的节点（预览节点本身，以及声明了Tileable且经由此类节点连到预览节点的节点）
+
+        参数:
+            excluded_ids: 当前参数下只能整幅计算的节点ID
+        """
+        roi_ids = set()
+        stack = [preview_node]
+        while stack:
+            node = stack.pop()
+            if node['id'] in roi_ids or node['id'] in excluded_ids:
+                continue
+            supported_features = node.get('script_info', {}).get('supported_features', {})
+            if not node.get('module'):
+                continue
+            # 预览节点原样传递输入，不声明Tileable也可以只计算可见区域
+            if node is not preview_node and not supported_features.get('Tileable', False):
+                continue
+            roi_ids.add(node['id'])
+            for conn in self.graph_index.get_input_connections(node['id']):
+                stack.append(conn['output_node'])
+        return roi_ids
+
+    def _crop_region_outputs(self, outputs, src_rect, dst_rect):
+        """
+        把覆盖src_rect的输出裁切到dst_rect（两者都是整幅图像坐标，dst_rect位于src_rect内）
+
+        尺寸与src_rect相同的图像数组裁切为只读视图，其余输出原样保留。
+        """
+        sx0, sy0, sx1, sy1 = src_rect
+        dx0, dy0, dx1, dy1 = dst_rect
+        cropped = {}
+        for key, value in (outputs or {}).items():
+            if isinstance(value, np.ndarray) and value.ndim >= 2 and value.shape[:2] == (sy1 - sy0, sx1 - sx0):
+                value = value[dy0 - sy0:dy1 - sy0, dx0 - sx0:dx1 - sx0]
+                value.flags.writeable = False
+            cropped[key] = value
+        return cropped
+
+    def _evaluate_preview_roi(self, changed_nodes, roi, is_cancelled=None):
+        """
+        只计算预览节点可见区域的求值，不涉及界面操作，可以在后台渲染线程中运行
+
+        从预览节点向上游收集声明了Tileable的节点，可见区域按每个节点的图块边缘宽度逐级扩大后传给上游；
+        链外的上游节点（整幅节点）照常完整计算。链上的节点只计算所需区域，结果不写入节点输出和缓存，
+        这些节点记录为未完成，由之后的完整渲染补算。
+
+        参数:
+            changed_nodes (list): 需要重新处理的节点列表
+            roi (dict): _get_preview_roi 的返回值
+            is_cancelled (callable): 返回True时在节点之间停止处理
+
+        返回:
+            dict或None: {'cancelled': 是否被取消, 'patch': 可见区域的预览图像或None}；
+                        节点图不适合只计算可见区域时返回None，此时没有做任何处理
+        """
+        preview_node = self.graph_index.find_preview_node()
+        if preview_node is None:
+            return None
+        roi_ids = self._collect_roi_node_ids(preview_node)
+        if preview_node['id'] not in roi_ids:
+            return None
+
+        changed_nodes = self.engine.merge_interrupted_nodes(changed_nodes)
+        nodes_by_id = {node['id']: node for node in self.nodes}
+
+        def defer_missing_nodes():
+            # 没有有效输出的节点交给下一次完整渲染
+            self.engine.record_interrupted_nodes(set(
+                node['id'] for node in self.nodes
+                if not node.get('processed_outputs') and not node.get('outputs_released')))
+
+        result = None
+        refused_ids = set()
+        while True:
+            # 先完整计算链外的上游节点（以及独立预览窗口需要的节点）
+            frontier = {}
+            for node_id in roi_ids:
+                for conn in self.graph_index.get_input_connections(node_id):
+                    if conn['output_node']['id'] not in roi_ids:
+                        frontier[conn['output_node']['id']] = conn['output_node']
+            sinks = list(frontier.values())
+            sinks.extend(nodes_by_id[node_id] for node_id in getattr(self, 'node_preview_windows', {})
+                         if node_id in nodes_by_id and node_id not in frontier)
+            if not sinks:
+                # 链上的节点没有任何外部输入，交给完整渲染
+                if result is None:
+                    self.engine.record_interrupted_nodes(
+                        None if changed_nodes is None else set(n['id'] for n in changed_nodes))
+                else:
+                    defer_missing_nodes()
+                return {'cancelled': False, 'patch': None}
+            if result is None:
+                evaluate_nodes = changed_nodes
+            else:
+                evaluate_nodes = [node for node in self.nodes
+                                  if not node.get('processed_outputs') and not node.get('outputs_released')]
+            result = self.engine.evaluate_graph(evaluate_nodes, is_cancelled=is_cancelled, sinks=sinks)
+            if result['cancelled']:
+                defer_missing_nodes()
+                return {'cancelled': True, 'patch': None}
+
+            # 用与整幅输出同形状的占位数组询问每个节点的图块边缘宽度
+            order = [nodes_by_id[node_id] for node_id in self.graph_index.topological_order() if node_id in roi_ids]
+            shapes = {}
+            halos = {}
+            placeholder_outputs = {}
+            refused_id = None
+            for node in order:
+                upstream = {conn['output_node']['id']: placeholder_outputs[conn['output_node']['id']]
+                            for conn in self.graph_index.get_input_connections(node['id'])
+                            if conn['output_node']['id'] in roi_ids}
+                inputs = self.get_node_inputs(node, upstream_outputs=upstream)
+                inputs.pop('_metadata', None)
+                shape = None
+                for value in inputs.values():
+                    if isinstance(value, np.ndarray) and value.ndim >= 2:
+                        if shape is None or value.shape[0] * value.shape[1] > shape[0] * shape[1]:
+                            shape = value.shape
+                if shape is None:
+                    halo = None
+                elif node is preview_node:
+                    halo = 0
+                else:
+                    halo = self.engine.get_node_tile_halo(node, inputs, self.engine.get_node_process_params(node, inputs))
+                if halo is None:
+                    refused_id = node['id']
+                    break
+                shapes[node['id']] = shape
+                halos[node['id']] = halo
+                placeholder = np.broadcast_to(np.zeros((), dtype=np.float32), shape)
+                placeholder_outputs[node['id']] = {output_type: placeholder
+                                                   for output_type in node['script_info'].get('outputs', [])}
+            if refused_id is None:
+                break
+            # 该节点在当前参数下只能整幅计算，从链上移除后重新划分
+            refused_ids.add(refused_id)
+            roi_ids = self._collect_roi_node_ids(preview_node, refused_ids)
+            if preview_node['id'] not in roi_ids:
+                defer_missing_nodes()
+                return {'cancelled': False, 'patch': None}
+
+        # 从预览节点开始逐级向上游计算每个节点需要输出的区域和需要读取的区域
+        image_width, image_height = roi['image_size']
+        if shapes[preview_node['id']][:2] != (image_height, image_width):
+            # 预览图像尺寸已变化（例如换了图片），可见区域失效
+            defer_missing_nodes()
+            return {'cancelled': False, 'patch': None}
+        out_rects = {preview_node['id']: roi['rect']}
+        in_rects = {}
+        for node in reversed(order):
+            node_id = node['id']
+            if node_id not in out_rects:
+                continue
+            height, width = shapes[node_id][:2]
+            halo = halos[node_id]
+            x0, y0, x1, y1 = out_rects[node_id]
+            in_rect = (max(0, x0 - halo), max(0, y0 - halo), min(width, x1 + halo), min(height, y1 + halo))
+            in_rects[node_id] = in_rect
+            for conn in self.graph_index.get_input_connections(node_id):
+                upstream_id = conn['output_node']['id']
+                if upstream_id not in roi_ids:
+                    continue
+                if shapes[upstream_id][:2] == (height, width):
+                    need = in_rect
+                else:
+                    # 尺寸不同的输入整体传入
+                    need = (0, 0, shapes[upstream_id][1], shapes[upstream_id][0])
+                if upstream_id in out_rects:
+                    ox0, oy0, ox1, oy1 = out_rects[upstream_id]
+                    need = (min(ox0, need[0]), min(oy0, need[1]), max(ox1, need[2]), max(oy1, need[3]))
+                out_rects[upstream_id] = need
+
+        # 按拓扑顺序只计算所需区域
+        import inspect
+        region_outputs = {}
+        for node in order:
+            node_id = node['id']
+            if node_id not in in_rects:
+                continue
+            if is_cancelled and is_cancelled():
+                defer_missing_nodes()
+                return {'cancelled': True, 'patch': None}
+            height, width = shapes[node_id][:2]
+            full_rect = (0, 0, width, height)
+            if node.get('processed_outputs') or node.get('outputs_released'):
+                # 整幅输出仍然有效（未受本次修改影响），直接裁切
+                region_outputs[node_id] = self._crop_region_outputs(self.process_node(node), full_rect, out_rects[node_id])
+                continue
+
+            in_rect = in_rects[node_id]
+            upstream = {}
+            for conn in self.graph_index.get_input_connections(node_id):
+                upstream_node = conn['output_node']
+                upstream_id = upstream_node['id']
+                if upstream_id in upstream:
+                    continue
+                if upstream_id in region_outputs:
+                    if shapes[upstream_id][:2] == (height, width):
+                        upstream[upstream_id] = self._crop_region_outputs(
+                            region_outputs[upstream_id], out_rects[upstream_id], in_rect)
+                    else:
+                        upstream[upstream_id] = region_outputs[upstream_id]
+                else:
+                    upstream[upstream_id] = self._crop_region_outputs(self.process_node(upstream_node), full_rect, in_rect)
+            inputs = self.get_node_inputs(node, upstream_outputs=upstream)
+            inputs.pop('_metadata', None)
+
+            context = self.get_application_context(node)
+            context['alloc'] = np.empty
+            context['tile_rect'] = (in_rect[0], in_rect[1], in_rect[2] - in_rect[0], in_rect[3] - in_rect[1])
+            context['image_size'] = (width, height)
+            process_func = node['module'].process
+            try:
+                try:
+                    accepts_context = len(inspect.signature(process_func).parameters) == 3
+                except (TypeError, ValueError):
+                    accepts_context = False
+                outputs = self.engine.run_node_process(node, process_func, inputs, self.engine.get_node_process_params(node, inputs),
+                                                 context if accepts_context else None)
+            except Exception as e:
+                print(f"可见区域求值时节点 '{node.get('title', '未知')}' 出错，改为完整渲染: {e}")
+                import traceback
+                traceback.print_exc()
+                defer_missing_nodes()
+                return {'cancelled': False, 'patch': None}
+            region_outputs[node_id] = self._crop_region_outputs(outputs, in_rect, out_rects[node_id])
+
+        defer_missing_nodes()
+        preview_outputs = region_outputs.get(preview_node['id'], {})
+        patch = preview_outputs.get('f32bmp')
+        if patch is None:
+            patch = preview_outputs.get('tif16')
+        print(f"可见区域求值: 区域 {roi['rect']}，链上 {len(in_rects)} 个节点只计算所需区域")
+        return {'cancelled': False, 'patch': patch}
+
+    def _refine_after_roi_render(self):
+        """只计算了可见区域的渲染完成并停止编辑后，补算被推迟的整幅图像"""
+        if self._dirty_nodes or self._background_renders_in_flight > 0:
+            # 仍在编辑或渲染，下一次可见区域渲染完成后会重新计时
+            return
+        self.request_graph_render(changed_nodes=[], allow_roi=False, progressive=False)
+
+    def _publish_roi_result(self, generation, roi, patch):
+        """在GUI线程中把可见区域的计算结果绘制到预览图像上，过期的结果直接丢弃"""
+        if self._is_render_stale(generation):
+            return
+        if hasattr(self, 'preview_display_widget'):
+            pixmap = self._array_to_preview_pixmap(patch)
+            if pixmap is not None:
+                x0, y0 = roi['rect'][:2]
+                self.preview_display_widget.update_region(pixmap, x0, y0)
+        self._roi_refine_timer.start()
+
+    def _array_to_preview_pixmap(self, img):
+        """把图像数组转换为预览显示用的QPixmap（与update_preview_from_node的转换一致）"""
+        if not isinstance(img, np.ndarray) or img.ndim < 2:
+            return None
+        if img.dtype == np.float32:
+            img_display = (img * 255).clip(0, 255).astype(np.uint8)
+        elif img.dtype == np.uint16:
+            img_display = (img / 256).astype(np.uint8)
+        else:
+            img_display = img
+        if len(img_display.shape) == 3:
+            if img_display.shape[2] == 3:
+                img_display = cv2.cvtColor(img_display, cv2.COLOR_RGB2BGR)
+            elif img_display.shape[2] == 4:
+                img_display = cv2.cvtColor(img_display, cv2.COLOR_RGBA2BGRA)
+        img_display = self._qimage_source_array(img_display)
+
+        height, width = img_display.shape[:2]
+        if len(img_display.shape) == 3:
+            if img_display.shape[2] == 4:
+                qimage = QImage(img_display.data, width, height, 4 * width, QImage.Format_ARGB32)
+            else:
+                qimage = QImage(img_display.data, width, height, 3 * width, QImage.Format_BGR888)
+        else:
+            qimage = QImage(img_display.data, width, height, width, QImage.Format_Grayscale8)
+        # fromImage会复制像素数据，之后img_display可以被释放
+        pixmap = QPixmap.fromImage(qimage)
+        return None if pixmap.isNull() else pixmap
+
+    def _rebuild_preview_node_widget(self, node):
+        """
+        完全重建支持PreviewOnNode的节点widget
+
+        参数:
+            node: 需要重建的节点
+        """
+        # 保存位置和大小信息
+        old_x, old_y = node['x'], node['y']
+        old_width, old_height = node['width'], node['height']
+
+        # 如果有旧widget，先移除
+        old_widget = node.get('widget')
+        if old_widget:
+            old_widget.setParent(None)
+            old_widget.deleteLater()
+
+        # 重新绘制节点
+        self.draw_node(node)
+
+        # 恢复位置和大小
+        node['x'], node['y'] = old_x, old_y
+        node['width'], node['height'] = old_width, old_height
+        if 'widget' in node and node['widget']:
+            node['widget'].move(old_x, old_y)
+
+    def _update_node_preview_image(self, node):
+        """
+        只更新节点的预览图像部分，不重建整个widget
+
+        参数:
+            node: 需要更新预览的节点
+        """
+        if not node.get('widget') or not node.get('processed_outputs'):
+            return
+
+        # 查找现有的预览标签
+        preview_label = None
+        widget = node['widget']
+
+        # 遍历子控件寻找预览标签
+        for child in widget.findChildren(QLabel):
+            if child.objectName() == "previewLabel":
+                preview_label = child
+                break
 
         if not preview_label:
             # 如果没有找到预览标签，可能需要重建整个widget
@@ -5823,676 +6336,75 @@ class TunnelNX(QMainWindow):
 
         return None
 
-    def _get_node_cache_key(self, node):
+    def _select_proxy_level(self):
         """
-        为节点生成唯一的缓存键，考虑节点ID、输入数据哈希、参数值
-
-        参数:
-            node: 要处理的节点
+        根据预览缩放比例选择代理金字塔层级
 
-        返回:
-            唯一标识节点及其处理状态的缓存键
+        缩放比例不超过 1/2**level 时，缩小 2**level 倍的图像仍然不少于屏幕像素；
+        1:1 及以上的缩放使用完整分辨率，未启用性能模式时始终为0。
         """
-        # 基本键：节点ID和脚本路径
-        key_parts = [
-            f"id:{node.get('id', 'unknown')}",
-            f"script:{node.get('script_path', 'unknown')}"
-        ]
-
-        # 添加参数信息 - 仅包含可能影响输出的参数
-        if 'params' in node and isinstance(node['params'], dict):
-            params_str = "|".join(f"{param}={info.get('value')}"
-                                for param, info in sorted(node['params'].items())
-                                if isinstance(info, dict))
-            key_parts.append(f"params:{params_str}")
-
-        # 添加输入连接信息 - 使用连接信息而不是实际数据哈希以避免递归
-        input_connections = []
-        for conn in self.connections:
-            if conn['input_node'] == node:
-                output_node = conn['output_node']
-                output_port = conn['output_port']
-                input_port = conn['input_port']
-
-                # 包含上游节点的缓存键信息，但不递归计算
-                upstream_key_part = f"{output_node.get('id', 'unknown')}:{output_node.get('script_path', 'unknown')}"
-
-                # 如果上游节点有参数，也包含参数信息
-                if 'params' in output_node and isinstance(output_node['params'], dict):
-                    upstream_params = "|".join(f"{param}={info.get('value')}"
-                                            for param, info in sorted(output_node['params'].items())
-                                            if isinstance(info, dict))
-                    upstream_key_part += f":{upstream_params}"
-
-                conn_repr = f"{upstream_key_part}:{output_port}->{input_port}"
-                input_connections.append(conn_repr)
-
-        if input_connections:
-            key_parts.append(f"inputs:{','.join(sorted(input_connections))}")
-
-        # 合并所有部分生成最终缓存键
-        cache_key = "|".join(key_parts)
-        return cache_key
-    def process_node(self, node):
-        """处理单个节点并返回输出，正确处理Neo和Legacy脚本，支持性能模式自动缩放"""
-        # 检查node是否有效
-        if not isinstance(node, dict):
-            print(f"警告: process_node接收到的'node'不是字典: {type(node)}")
-            return {}
-
-        # 如果节点已处理，直接返回结果（但要确保结果不为空）
-        if 'processed_outputs' in node:
-            # 确保返回的是一个字典，即使之前存储的是None或其他类型
-            outputs = node['processed_outputs']
-            if isinstance(outputs, dict) and outputs:  # 确保输出不为空
-                return outputs
-            else:
-                # 如果输出为空或无效，清除processed_outputs以重新处理
-                if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-                    print(f"节点 '{node.get('title', '未知')}' 的processed_outputs为空，重新处理")
-                del node['processed_outputs']
-
-        # 计算缓存键
-        cache_key = self._get_node_cache_key(node)
-        node_title = node.get('title', '未知')
-        node_id = node.get('id', '未知ID')
-
-        # 调试：打印缓存键信息
-        if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-            print(f"节点 '{node_title}' ({node_id}) 缓存键: {cache_key[:100]}...")
-
-        # 尝试从缓存中获取结果
-        cached_result = self.node_cache.get(cache_key)
-        if cached_result is not None:
-            # 有缓存结果，记录缓存命中并直接使用
-            node_type = node.get('script_info', {}).get('node_type', '未知类型')
-
-            # 为了调试目的，只打印某些类型节点的缓存命中日志
-            is_debug_node = node_type in ['decode', 'input', 'filter', 'transform']
-            if is_debug_node or (hasattr(self, '_debug_cache_stats') and self._debug_cache_stats):
-                print(f"缓存命中：节点 '{node_title}' ({node_id}) - 类型: {node_type}")
-
-            # 深拷贝缓存结果以避免修改原始缓存数据
-            import copy
-            cached_result_copy = copy.deepcopy(cached_result)
-
-            # 保存到节点缓存，避免再次计算
-            node['processed_outputs'] = cached_result_copy
-            return cached_result_copy
-        else:
-            # 调试：打印缓存未命中信息
-            if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-                print(f"缓存未命中：节点 '{node_title}' ({node_id})")
-
-        # 初始化输出
-        outputs = {}
-        try:
-            # 获取节点输入（包含元数据）
-            inputs = self.get_node_inputs(node)
-
-            # 提取元数据
-            input_metadata = inputs.pop('_metadata', {})
-
-            # 获取节点参数
-            params = {}
-            if 'params' in node and isinstance(node['params'], dict):
-                params = {name: param_info.get('value') for name, param_info in node['params'].items() if isinstance(param_info, dict)}
-
-            # 获取应用上下文(对NeoScript有用)
-            context = self.get_application_context(node)
-
-            # --- 性能模式预处理 ---
-            # 检查是否启用了性能模式且节点支持性能模式
-            is_perf_sensitive = False
-            original_sizes = {}  # 存储原始尺寸信息
-
-            # --- 性能模式预处理 ---
-            # 检查是否启用了性能模式且节点支持性能模式
-            is_perf_sensitive = False
-            original_sizes = {}  # 存储原始尺寸信息
-
-            if hasattr(self, 'performance_mode_enabled') and self.performance_mode_enabled and 'script_info' in node:
-                print(f"节点 '{node.get('title', '未知')}' 支持性能模式: {node['script_info'].get('supported_features', {})}")
-                supported_features = node['script_info'].get('supported_features', {})
-                # 使用新的SupportedFeatures格式
-                is_perf_sensitive = supported_features.get('PerfSensitive', False)
-
-                if is_perf_sensitive:
-                    print(f"性能模式: 对节点 '{node.get('title', '未知')}' 应用自动缩放优化")
-                    # 获取预览区域尺寸作为目标缩放尺寸
-                    target_size = None
-                    if hasattr(self, 'preview_display_widget'):
-                        preview_widget = self.preview_display_widget
-                        preview_size = preview_widget.size()
-                        target_size = (preview_size.width(), preview_size.height())
-
-                    # 如果有合适的目标尺寸，对输入图像进行缩放
-                    if target_size and all(size > 50 for size in target_size):  # 确保目标尺寸合理
-                        import cv2
-                        import numpy as np
-
-                        # 第一步：查找所有图像输入和最大的图像尺寸
-                        valid_inputs = {}  # 存储所有有效的图像输入
-                        max_width = 0
-                        max_height = 0
-
-                        for input_key, input_data in inputs.items():
-                            # 只处理numpy数组类型的图像输入
-                            if isinstance(input_data, np.ndarray) and len(input_data.shape) >= 2:
-                                # 保存原始尺寸和数据类型
-                                original_sizes[input_key] = {
-                                    'shape': input_data.shape,
-                                    'dtype': input_data.dtype
-                                }
-
-                                # 记录有效的图像输入
-                                valid_inputs[input_key] = input_data
-
-                                # 更新最大尺寸
-                                max_width = max(max_width, input_data.shape[1])
-                                max_height = max(max_height, input_data.shape[0])
-
-                                                    # 第二步：只有当开启性能模式且最大图像尺寸明显大于预览窗口时才应用缩放
-                            # 添加检查避免低分辨率问题
-                            is_preview_node = node['title'] == '预览节点'
-                            is_independent_preview = node_id in getattr(self, 'node_preview_windows', {})
-                            should_scale = False
-
-                            # 是否应该进行缩放的条件
-                            if not is_preview_node and not is_independent_preview:
-                                # 普通节点在性能模式下可以缩放
-                                should_scale = (max_width > target_size[0] * 1.2 or max_height > target_size[1] * 1.2)
-                            else:
-                                # 预览节点或独立预览窗口节点使用高分辨率
-                                should_scale = False
-                                print(f"跳过缩放以保持高分辨率: {'预览节点' if is_preview_node else '独立预览窗口节点'}")
-
-                            if should_scale:
-                                # 计算全局缩放比例（基于最大的那个图像）
-                                global_scale_factor = min(
-                                    target_size[0] / max_width,
-                                    target_size[1] / max_height
-                                )
-
-                                # 设置最小缩放因子，确保不会过度缩小图像
-                                min_scale_factor = 0.5  # 最小不低于原始分辨率的一半
-                                global_scale_factor = max(global_scale_factor, min_scale_factor)
-
-                                print(f"性能模式全局缩放比例: {global_scale_factor:.3f}，基于最大图像尺寸 {max_width}x{max_height}")
-
-                                # 第三步：对所有图像应用相同的缩放比例以保持相对尺寸
-                                for input_key, input_data in valid_inputs.items():
-                                    # 计算新尺寸(应用全局缩放比例)
-                                    new_width = max(int(input_data.shape[1] * global_scale_factor), 1)
-                                    new_height = max(int(input_data.shape[0] * global_scale_factor), 1)
-
-                                    # 根据图像类型选择合适的插值方法
-                                    interp = cv2.INTER_LINEAR
-
-                                    # 缩放图像
-                                    if len(input_data.shape) == 2:  # 灰度图
-                                        resized = cv2.resize(input_data, (new_width, new_height), interpolation=interp)
-                                    elif len(input_data.shape) == 3 or len(input_data.shape) == 4:  # 彩色图或带通道
-                                        resized = cv2.resize(input_data, (new_width, new_height), interpolation=interp)
-                                    else:
-                                        # 对于其他维度的数据，跳过处理
-                                        continue
-
-                                    # 确保缩放后的图像与原图像具有相同的数据类型
-                                    resized = resized.astype(input_data.dtype)
-
-                                    # 替换原输入
-                                    inputs[input_key] = resized
-                                    print(f"  - 输入'{input_key}'从{input_data.shape[:2]}缩放至{resized.shape[:2]}")
-            # 调用节点的处理函数
-            if node.get('module') and hasattr(node['module'], 'process'):
-                script_type = node.get('script_type', 'legacy')
-                node_title = node.get('title', '未知')
-                process_func = node['module'].process
-
-                # 根据脚本类型调用处理函数
-                if script_type == 'neo':
-                    # NeoScript: 可接收context参数
-                    try:
-                        import inspect
-                        sig = inspect.signature(process_func)
-                        if len(sig.parameters) == 3:
-                            outputs = process_func(inputs, params, context)
-                        elif len(sig.parameters) == 2:
-                            print(f"警告: NeoScript '{node_title}'的process函数只有两个参数，未传递context")
-                            outputs = process_func(inputs, params)
-                        else:
-                            print(f"错误: NeoScript '{node_title}'的process函数签名不正确")
-                            outputs = {}
-                    except Exception as call_e:
-                        print(f"调用NeoScript '{node_title}'.process时出错: {call_e}")
-                        import traceback
-                        traceback.print_exc()
-                        outputs = {}
-                else:
-                    # Legacy script: 只接收inputs和params
-                    try:
-                        outputs = process_func(inputs, params)
-                    except Exception as call_e:
-                        print(f"调用Legacy Script '{node_title}'.process时出错: {call_e}")
-                        import traceback
-                        traceback.print_exc()
-                        outputs = {}
-
-                # --- 处理伪类型输出 ---
-                # 如果输出中包含伪类型对应的真实类型数据，添加伪类型标签副本
-                for pseudo_type, real_type in self.pseudo_types.items():
-                    if real_type in outputs and pseudo_type not in outputs:
-                        # 创建对原始数据的引用，不复制数据
-                        outputs[pseudo_type] = outputs[real_type]
-                        print(f"为节点 '{node_title}' 添加伪类型输出: {pseudo_type} -> {real_type}")
-
-                # --- 性能模式后处理：缩放输出图像回原始尺寸 ---
-                if is_perf_sensitive and original_sizes and outputs:
-                    import cv2
-                    import numpy as np
-
-                    # 处理所有图像类型的输出
-                    for output_key, output_data in list(outputs.items()):  # 使用list复制字典项，避免在迭代中修改
-                        # 对应的输入键名(通常输入输出的键名相同，如'f32bmp')
-                        input_key = output_key
-
-                        # 如果找不到对应的原始尺寸信息，尝试查找任意一个原始尺寸信息
-                        if input_key not in original_sizes and original_sizes:
-                            input_key = next(iter(original_sizes.keys()))
-
-                        # 如果有原始尺寸信息且输出是numpy数组
-                        if input_key in original_sizes and isinstance(output_data, np.ndarray) and len(output_data.shape) >= 2:
-                            orig_info = original_sizes[input_key]
-                            orig_shape = orig_info['shape']
-
-                            # 检查是否需要恢复尺寸(高度或宽度不同)
-                            if len(output_data.shape) >= 2 and len(orig_shape) >= 2:
-                                if output_data.shape[0] != orig_shape[0] or output_data.shape[1] != orig_shape[1]:
-                                    # 计算新尺寸(保持原始宽高比)
-                                    new_size = (orig_shape[1], orig_shape[0])  # 注意cv2.resize需要(宽,高)
-
-                                    # 选择合适的插值方法
-                                    interp = cv2.INTER_LINEAR
-
-                                    # 缩放图像
-                                    if len(output_data.shape) == 2:  # 灰度图
-                                        resized = cv2.resize(output_data, new_size, interpolation=interp)
-                                    elif len(output_data.shape) == 3:  # 彩色图或带通道
-                                        if len(orig_shape) == 3 and output_data.shape[2] != orig_shape[2]:
-                                            # 通道数不匹配，需要特殊处理
-                                            if output_data.shape[2] < orig_shape[2]:
-                                                # 输出通道少于原始通道，需要添加额外通道
-                                                resized = cv2.resize(output_data, new_size, interpolation=interp)
-                                                if output_data.shape[2] == 1 and orig_shape[2] == 3:
-                                                    # 灰度转RGB
-                                                    resized = cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB)
-                                                # 其他情况可能需要特殊处理...
-                                            else:
-                                                # 输出通道多于原始通道，截取需要的通道
-                                                resized = cv2.resize(output_data[:,:,:orig_shape[2]], new_size, interpolation=interp)
-                                        else:
-                                            # 通道数匹配或原始图像不是多通道的
-                                            resized = cv2.resize(output_data, new_size, interpolation=interp)
-                                    else:
-                                        # 对于不支持的维度，跳过处理
-                                        continue
-
-                                    # 确保数据类型匹配
-                                    if 'dtype' in orig_info:
-                                        resized = resized.astype(orig_info['dtype'])
-
-                                    # 替换输出
-                                    outputs[output_key] = resized
-                                    print(f"  - 输出'{output_key}'已恢复至原始尺寸{new_size[1]}x{new_size[0]}")
-
-                                    # 如果有对应的伪类型，也更新伪类型输出
-                                    for pseudo_type, real_type in self.pseudo_types.items():
-                                        if real_type == output_key and pseudo_type in outputs:
-                                            outputs[pseudo_type] = resized
-                                            print(f"  - 伪类型输出'{pseudo_type}'也已更新")
-            else:
-                # 模块或process函数不存在
-                print(f"节点{node.get('title', '未知')}没有有效的process处理函数或模块")
-                outputs = {}
-
-        except Exception as e:
-            # 处理其他错误
-            print(f"处理节点{node.get('title', '未知')}时发生意外错误: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            outputs = {}
-
-        # 确保outputs是一个字典
-        if not isinstance(outputs, dict):
-            outputs = {}
-
-        # 更新节点元数据
-        if 'metadata' not in node:
-            node['metadata'] = self.metadata_manager.create_metadata(
-                node_id=node.get('id'),
-                node_title=node.get('title', '未知'),
-                script_path=node.get('script_path', '')
-            )
-
-        # 合并输入元数据到当前节点元数据
-        if input_metadata:
-            node['metadata'] = self.metadata_manager.merge_metadata(node['metadata'], input_metadata)
-
-        # 添加当前节点到处理路径
-        node['metadata'] = self.metadata_manager.add_node_to_path(
-            node['metadata'],
-            node.get('id'),
-            node.get('title', '未知')
-        )
-
-        # 记录处理操作
-        node['metadata'] = self.metadata_manager.add_processing_record(
-            node['metadata'],
-            'process_node',
-            {
-                'script_type': node.get('script_type', 'legacy'),
-                'script_path': node.get('script_path', ''),
-                'output_types': list(outputs.keys()) if outputs else []
-            }
-        )
-
-        # 为每个输出添加元数据（如果脚本没有返回_metadata）
-        enhanced_outputs = {}
-        for output_key, output_value in outputs.items():
-            if output_key == '_metadata':
-                # 如果脚本返回了_metadata，跳过处理
-                continue
-            enhanced_outputs[output_key] = output_value
-
-        # 如果脚本没有返回_metadata，为所有输出添加当前节点的元数据
-        if '_metadata' not in outputs and enhanced_outputs:
-            enhanced_outputs['_metadata'] = self.metadata_manager.copy_metadata(node['metadata'])
-        elif '_metadata' in outputs:
-            # 如果脚本返回了_metadata，合并到节点元数据中
-            script_metadata = outputs['_metadata']
-            if isinstance(script_metadata, dict):
-                node['metadata'] = self.metadata_manager.merge_metadata(node['metadata'], script_metadata)
-            enhanced_outputs['_metadata'] = self.metadata_manager.copy_metadata(node['metadata'])
-
-        # 保存处理结果到节点
-        node['processed_outputs'] = enhanced_outputs
-
-        # 将处理结果存储到LRU缓存中（只有当输出有效时才存储）
-        try:
-            # 检查输出是否有效（不为空且包含实际数据）
-            has_valid_output = False
-            for key, value in enhanced_outputs.items():
-                if key != '_metadata' and value is not None:
-                    has_valid_output = True
-                    break
-
-            if has_valid_output:
-                # 深拷贝输出数据以避免缓存数据被后续处理修改
-                import copy
-                enhanced_outputs_copy = copy.deepcopy(enhanced_outputs)
-                self.node_cache.put(cache_key, enhanced_outputs_copy)
-                # 可选：打印缓存统计信息（仅在调试时）
-                if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-                    stats = self.node_cache.get_stats()
-                    print(f"缓存存储：节点 '{node_title}' ({node_id}) - 输出类型: {list(enhanced_outputs.keys())} - 缓存大小: {stats['current_size']}/{stats['max_size']}")
-            else:
-                if hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-                    print(f"跳过缓存存储：节点 '{node_title}' ({node_id}) - 输出为空或无效")
-        except Exception as e:
-            print(f"存储节点缓存时出错: {e}")
-
-        # 如果有支持自定义预览更新的函数，则触发它
-        # 例如让节点自己处理预览窗口的更新，而不是由主程序统一更新
-        node_id = node.get('id')
-        if node_id is not None:
-            # --- 检查是否有自定义预览更新函数 ---
-            supported_features = node.get('script_info', {}).get('supported_features', {})
-            custom_update_func_name = supported_features.get('PreviewUpdateFunction')
-
-            if custom_update_func_name and node.get('module') and hasattr(node['module'], custom_update_func_name):
-                # 调用节点的自定义预览更新函数
-                try:
-                    custom_update_func = getattr(node['module'], custom_update_func_name)
-                    # 注意：传递 node 本身，脚本函数可以从中获取 outputs
-                    # 使用 QTimer 以安全地从处理逻辑调用可能更新UI的脚本代码
-                    from PySide6.QtCore import QTimer
-                    QTimer.singleShot(0, lambda n=node, ctx=context: custom_update_func(n, ctx))
-                except Exception as e:
-                    print(
-                        f"Error calling custom preview update function '{custom_update_func_name}' for node {node_id}: {e}")
-            elif node_id in self.node_preview_windows:
-                # --- 更新标准预览窗口 ---
-                dialog = self.node_preview_windows[node_id]
-                if dialog and dialog.isVisible():
-                    updated_img = None
-                    if 'processed_outputs' in node and node['processed_outputs']:
-                        updated_img = next(iter(node['processed_outputs'].values()), None)
-
-                    # 使用 QTimer.singleShot 确保安全更新
-                    from PySide6.QtCore import QTimer
-                    # 需要捕获 dialog 和 updated_img 的当前值
-                    QTimer.singleShot(0, lambda d=dialog, img=updated_img: d.update_image(img))
-
-        return outputs
-
-    def get_node_inputs(self, node):
-        """获取节点的输入数据，支持灵活端口"""
-        inputs = {}
-        input_type_counts = {}  # 记录每种类型输入的数量
-
-        # 初始化输入类型计数
-        # 注意：这里要考虑灵活端口可能会有多个同类型端口
-        # 使用port_widgets而不是script_info['inputs']，因为灵活端口可能增加了端口数量
-        if 'port_widgets' in node and 'inputs' in node['port_widgets']:
-            for port_idx, port_info in node['port_widgets']['inputs'].items():
-                input_type = port_info['type']
-                if input_type not in input_type_counts:
-                    input_type_counts[input_type] = 0
-        else:
-            # 回退到原来的逻辑
-            for input_type in node['script_info']['inputs']:
-                input_type_counts[input_type] = 0
-
-        # 首先按照输入端口索引排序连接，确保输入顺序一致
-        input_connections = [conn for conn in self.connections if conn['input_node'] == node]
-        input_connections.sort(key=lambda conn: conn['input_port'])
-
-                        # 处理每个连接
-        for conn in input_connections:
-            # 获取输出节点数据
-            output_node = conn['output_node']
-            output_port = conn['output_port']
-            input_port = conn['input_port']
-
-            # 获取输入类型 - 使用端口部件信息
-            try:
-                if 'port_widgets' in node and 'inputs' in node['port_widgets'] and input_port in node['port_widgets']['inputs']:
-                    input_type = node['port_widgets']['inputs'][input_port]['type']
-                else:
-                    # 如果找不到端口信息，回退到script_info
-                    # 对于灵活端口节点，可能会有额外的端口
-                    if 'flexible_ports' in node and 'inputs' in node['flexible_ports'] and node['flexible_ports']['inputs']:
-                        # 如果是灵活端口节点，且输入端口超出了基本输入数量
-                        if isinstance(input_port, int) and input_port >= len(node['script_info']['inputs']):
-                            # 使用灵活端口类型
-                            input_type = node['flexible_ports']['inputs'][0]  # 使用第一个灵活类型
-                        elif isinstance(input_port, int) and input_port < len(node['script_info']['inputs']):
-                            input_type = node['script_info']['inputs'][input_port]
-                        else:
-                            # 无法确定端口类型，跳过此连接
-                            continue
-                    elif isinstance(input_port, int) and input_port < len(node['script_info']['inputs']):
-                        input_type = node['script_info']['inputs'][input_port]
-                    else:
-                        # 安静地跳过，不打印警告以避免刷屏
-                        continue
-            except Exception as e:
-                print(f"获取节点 {node['title']} 的输入端口 {input_port} 类型时出错: {str(e)}")
-                continue
-
-            # 处理输出节点
-            output_data = self.process_node(output_node)
-
-            # 获取相应端口的输出数据
-            if output_data:
-                # 获取输出类型 - 同样使用端口部件信息
-                try:
-                    if 'port_widgets' in output_node and 'outputs' in output_node['port_widgets'] and output_port in output_node['port_widgets']['outputs']:
-                        output_type = output_node['port_widgets']['outputs'][output_port]['type']
-                    else:
-                        # 回退到script_info
-                        # 对于灵活端口节点，可能会有额外的端口
-                        if 'flexible_ports' in output_node and 'outputs' in output_node['flexible_ports'] and output_node['flexible_ports']['outputs']:
-                            # 如果是灵活端口节点，且输出端口超出了基本输出数量
-                            if isinstance(output_port, int) and output_port >= len(output_node['script_info']['outputs']):
-                                # 使用灵活端口类型
-                                output_type = output_node['flexible_ports']['outputs'][0]  # 使用第一个灵活类型
-                            elif isinstance(output_port, int) and output_port < len(output_node['script_info']['outputs']):
-                                output_type = output_node['script_info']['outputs'][output_port]
-                            else:
-                                # 无法确定端口类型，跳过此连接
-                                continue
-                        elif isinstance(output_port, int) and output_port < len(output_node['script_info']['outputs']):
-                            output_type = output_node['script_info']['outputs'][output_port]
-                        else:
-                            # 安静地跳过，不打印警告以避免刷屏
-                            continue
-                except Exception as e:
-                    print(f"获取节点 {output_node['title']} 的输出端口 {output_port} 类型时出错: {str(e)}")
-                    continue
-
-                # 检查输出是否是伪类型
-                real_output_type = output_type
-                if output_type in self.pseudo_types:
-                    real_output_type = self.pseudo_types[output_type]
-                    print(f"伪类型转换: {output_type} -> {real_output_type}")
-
-                # 如果是伪类型但数据中仍使用原始类型，则获取原始类型的数据
-                if output_type in self.pseudo_types and real_output_type in output_data:
-                    # 增加此类型输入的计数
-                    input_type_counts[input_type] += 1
-                    count = input_type_counts[input_type]
-
-                    # 对于第一个该类型的输入，使用原始类型名
-                    if count == 1:
-                        # 确保节点得到正确类型的数据，但保持输入标签为伪类型
-                        inputs[input_type] = output_data[real_output_type]
-                    else:
-                        # 对于额外的同类型输入，添加序号
-                        inputs[f"{input_type}_{count - 1}"] = output_data[real_output_type]
-                elif output_type in output_data:
-                    # 正常类型处理
-                    input_type_counts[input_type] += 1
-                    count = input_type_counts[input_type]
-
-                    # 对于第一个该类型的输入，使用原始类型名
-                    if count == 1:
-                        inputs[input_type] = output_data[output_type]
-                    else:
-                        # 对于额外的同类型输入，添加序号
-                        inputs[f"{input_type}_{count - 1}"] = output_data[output_type]
-
-        # 收集所有上游节点的元数据
-        accumulated_metadata = {}
-        for conn in input_connections:
-            output_node = conn['output_node']
-            if 'metadata' in output_node:
-                upstream_metadata = self.metadata_manager.copy_metadata(output_node['metadata'])
-                accumulated_metadata = self.metadata_manager.merge_metadata(
-                    accumulated_metadata, upstream_metadata
-                )
-
-        # 将累积的元数据添加到输入中
-        if accumulated_metadata:
-            inputs['_metadata'] = accumulated_metadata
-
-        return inputs
-
-    def invalidate_node_cache(self, node_id, reason="未知"):
+        if not getattr(self, 'performance_mode_enabled', False) or not hasattr(self, 'preview_display_widget'):
+            return 0
+        zoom = self.preview_display_widget.zoom_level
+        if zoom >= 1.0 or zoom <= 0:
+            return 0
+        level = int(math.floor(math.log2(1.0 / zoom)))
+        return max(0, min(self.proxy_max_level, level))
+
+    def _set_proxy_level(self, level):
         """
-        使指定节点的所有缓存失效
+        在GUI线程中同步切换求值使用的代理层级（会等待正在进行的渲染），只用于导出等同步操作；
+        交互中的切换通过 request_graph_render 的 proxy_level 参数在渲染线程中完成
 
-        参数:
-            node_id: 节点ID
-            reason: 失效原因（用于调试）
+        所有节点的现有输出都属于旧层级，全部清除后由下一次求值重新计算（各层级的缓存项互不影响，切换回来时直接命中）。
         """
-        if not hasattr(self, 'node_cache'):
+        # 排队中的渲染请求了其他层级时同样需要取消，否则它会在同步操作之后切走层级
+        pending_other_level = level != self._requested_proxy_level
+        self._requested_proxy_level = level
+        if level == self.engine.proxy_level and not pending_other_level:
             return
+        self._next_render_generation()
+        if self.engine.set_proxy_level(level):
+            print(f"代理分辨率: 层级 {level} (1/{2 ** level})")
 
-        # 查找并移除所有包含该节点ID的缓存项
-        keys_to_remove = []
-        for cache_key in self.node_cache.cache.keys():
-            if f"id:{node_id}" in cache_key:
-                keys_to_remove.append(cache_key)
-
-        removed_count = 0
-        for key in keys_to_remove:
-            if key in self.node_cache.cache:
-                del self.node_cache.cache[key]
-                removed_count += 1
-
-        if removed_count > 0 and hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-            print(f"缓存失效：节点 {node_id} - 原因: {reason} - 移除了 {removed_count} 个缓存项")
+    def _update_proxy_level(self):
+        """预览缩放变化后重新选择代理层级，层级变化时在后台重新渲染"""
+        level = self._select_proxy_level()
+        if level != self._requested_proxy_level:
+            self.request_graph_render(allow_roi=False, progressive=False, proxy_level=level)
 
-    def invalidate_downstream_cache(self, node_id, reason="上游节点变化"):
+    def _enter_full_resolution(self):
         """
-        使指定节点及其所有下游节点的缓存失效
+        导出等操作开始前切换到完整分辨率
 
-        参数:
-            node_id: 起始节点ID
-            reason: 失效原因
+        返回:
+            int: 之前的代理层级，传给 _leave_full_resolution 恢复
         """
-        if not hasattr(self, 'node_cache'):
+        previous_level = self._requested_proxy_level
+        self._set_proxy_level(0)
+        return previous_level
+
+    def _leave_full_resolution(self, previous_level):
+        """恢复导出前的代理层级并重新渲染预览"""
+        if previous_level and self.engine.proxy_level == 0:
+            self.request_graph_render(allow_roi=False, proxy_level=previous_level)
+
+    def purge_node_caches(self):
+        """清除内存缓存、磁盘二级缓存和持久化缓存（视图标签页中的"清除缓存"按钮）"""
+        reply = QMessageBox.question(
+            self,
+            "清除缓存",
+            "确定要清除所有节点缓存（包括磁盘上的持久化缓存）吗？\n下次处理节点图时将重新计算所有节点。",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
             return
 
-        # 找到所有下游节点
-        downstream_nodes = set()
-        self._find_downstream_nodes(node_id, downstream_nodes)
-
-        # 使当前节点和所有下游节点的缓存失效
-        all_affected_nodes = {node_id} | downstream_nodes
-        total_removed = 0
-
-        for affected_node_id in all_affected_nodes:
-            keys_to_remove = []
-            for cache_key in self.node_cache.cache.keys():
-                if f"id:{affected_node_id}" in cache_key:
-                    keys_to_remove.append(cache_key)
+        freed_bytes = self.engine.purge_caches()
 
-            for key in keys_to_remove:
-                if key in self.node_cache.cache:
-                    del self.node_cache.cache[key]
-                    total_removed += 1
-
-        if total_removed > 0 and hasattr(self, '_debug_cache_stats') and self._debug_cache_stats:
-            print(f"下游缓存失效：起始节点 {node_id} - 原因: {reason} - 影响节点: {len(all_affected_nodes)} - 移除缓存项: {total_removed}")
-
-    def _find_downstream_nodes(self, node_id, downstream_nodes):
-        """递归查找下游节点"""
-        for conn in self.connections:
-            if conn['output_node'].get('id') == node_id:
-                downstream_id = conn['input_node'].get('id')
-                if downstream_id not in downstream_nodes:
-                    downstream_nodes.add(downstream_id)
-                    # 递归查找更下游的节点
-                    self._find_downstream_nodes(downstream_id, downstream_nodes)
-
-    def print_cache_stats(self):
-        """打印LRU缓存统计信息到命令行"""
-        if hasattr(self, 'node_cache'):
-            stats = self.node_cache.get_stats()
-            print("\n=== LRU缓存统计信息 ===")
-            print(f"缓存命中次数: {stats['hits']}")
-            print(f"缓存未命中次数: {stats['misses']}")
-            print(f"总请求次数: {stats['total_requests']}")
-            print(f"缓存命中率: {stats['hit_rate']:.2%}")
-            print(f"当前缓存大小: {stats['current_size']}")
-            print(f"最大缓存大小: {stats['max_size']}")
-            print(f"缓存使用率: {stats['current_size']/stats['max_size']:.1%}")
-            print("========================\n")
-        else:
-            print("LRU缓存未初始化")
+        message = f"已清除节点缓存，释放 {freed_bytes / (1024 * 1024):.1f} MB"
+        print(message)
+        self.task_label.setText(message)
 
     def execute_sub_operation(self, node, operation):
         """执行节点子操作"""
@@ -6503,22 +6415,32 @@ class TunnelNX(QMainWindow):
             # 获取节点参数
             params = {name: param_info['value'] for name, param_info in node['params'].items()}
 
-            # 获取节点的输入数据
-            input_data = self.get_node_inputs(node)
-
-            # 创建上下文信息
-            context = {
-                'app': self,  # 传递应用实例
-                'work_folder': self.work_folder,
-                'current_image_path': self.current_image_path if hasattr(self, 'current_image_path') else None,
-                'temp_folder': self.temp_folder,
-                'scripts_folder': self.scripts_folder,
-                'node_id': node['id'],
-                'node_title': node['title']
-            }
+            # 声明了FullResolution的节点（导出、打印等）在完整分辨率上执行子操作，不使用性能模式的代理分辨率
+            supported_features = node.get('script_info', {}).get('supported_features', {})
+            full_resolution = supported_features.get('FullResolution', False)
+            previous_proxy_level = self._enter_full_resolution() if full_resolution else self.engine.proxy_level
+            try:
+                # 按需求值：先（并行）计算该节点的上游闭包，再获取节点的输入数据
+                self.engine.evaluate_sinks([node])
+                input_data = self.get_node_inputs(node)
+
+                # 创建上下文信息
+                context = {
+                    'app': self,  # 传递应用实例
+                    'work_folder': self.work_folder,
+                    'current_image_path': self.current_image_path if hasattr(self, 'current_image_path') else None,
+                    'temp_folder': self.temp_folder,
+                    'scripts_folder': self.scripts_folder,
+                    'node_id': node['id'],
+                    'node_title': node['title'],
+                    'proxy_scale': 1.0 / (2 ** self.engine.proxy_level),
+                }
 
-            # 执行操作，传递参数、输入数据和上下文
-            result = op_func(params, input_data, context)
+                # 执行操作，传递参数、输入数据和上下文
+                result = op_func(params, input_data, context)
+            finally:
+                if full_resolution:
+                    self._leave_full_resolution(previous_proxy_level)
 
             # 处理结果
             if result and isinstance(result, dict) and 'success' in result:
@@ -6530,11 +6452,11 @@ class TunnelNX(QMainWindow):
                     # 判断是否需要全部重新处理
                     if 'affects_all_nodes' in result and result['affects_all_nodes']:
                         print("子操作影响所有节点，执行完整重新计算")
-                        self.process_node_graph()
+                        self.request_graph_render(allow_roi=False, progressive=False)
                     else:
                         # 默认只处理当前节点及其下游节点
                         print(f"子操作只影响节点 '{node['title']}' 及其下游节点")
-                        self.process_node_graph(changed_nodes=[node])
+                        self.request_graph_render(changed_nodes=[node], allow_roi=False, progressive=False)
                 else:
                     # 显示错误消息
                     if 'error' in result:
@@ -6554,36 +6476,9 @@ class TunnelNX(QMainWindow):
         """
         # 如果需要强制刷新
         if force_refresh:
-            try:
-                # 设置标志
-                self._force_reprocess_all = True
-
-                # 重新处理整个节点图
-                self.process_node_graph(suppress_auto_save=True)  # 抑制自动保存，避免频繁IO操作
-
-                # 查找预览节点
-                preview_node = None
-                for node in self.nodes:
-                    if node['title'] == '预览节点':
-                        preview_node = node
-                        break
-
-                # 如果找到预览节点，确保更新显示
-                if preview_node:
-                    # 先清空处理缓存
-                    if 'processed_outputs' in preview_node:
-                        del preview_node['processed_outputs']
-                    # 处理节点
-                    self.process_node(preview_node)
-                    # 更新预览显示
-                    self.update_preview_from_node(preview_node)
-                    # 强制UI更新
-                    QApplication.processEvents()
-
-                return  # 已完成所有处理，直接返回
-            finally:
-                # 清除标志，无论处理成功还是失败
-                self._force_reprocess_all = False
+            # 重新处理整个节点图（后台渲染），完成后会自动更新预览显示
+            self.request_graph_render()
+            return
 
         # 正常更新流程（非强制刷新）
         # 查找预览节点
@@ -6597,10 +6492,8 @@ class TunnelNX(QMainWindow):
         if preview_node:
             # 检查是否有未处理的上游节点
             self._ensure_preview_dependencies_processed(preview_node)
-            # 更新预览显示
+            # 更新预览显示（界面会在事件循环中自然重绘，无需手动处理事件）
             self.update_preview_from_node(preview_node)
-            # 强制更新UI
-            QApplication.processEvents()
 
     def _ensure_preview_dependencies_processed(self, preview_node):
         """确保预览节点的所有上游依赖都被处理"""
@@ -6616,14 +6509,14 @@ class TunnelNX(QMainWindow):
 
             visited.add(current['id'])
 
-            # 如果节点未处理，添加到需要处理的列表
-            if 'processed_outputs' not in current:
-                nodes_to_process.append(current)
+            # 已处理的节点不再需要上游，不再向上查找
+            if 'processed_outputs' in current:
+                continue
+            nodes_to_process.append(current)
 
             # 查找所有输入连接
-            for conn in self.connections:
-                if conn['input_node'] == current:
-                    stack.append(conn['output_node'])
+            for conn in self.graph_index.get_input_connections(current['id']):
+                stack.append(conn['output_node'])
 
         # 如果有需要处理的节点，先处理这些节点
         if nodes_to_process:
@@ -6689,6 +6582,9 @@ class TunnelNX(QMainWindow):
                 elif img_display.shape[2] == 4:
                     img_display = cv2.cvtColor(img_display, cv2.COLOR_RGBA2BGRA)
 
+            # QImage直接引用数组内存，只读（缓存共享）或非连续的数组需要先复制
+            img_display = self._qimage_source_array(img_display)
+
             # 获取原始尺寸
             orig_height, orig_width = img_display.shape[:2]
 
@@ -6717,7 +6613,8 @@ class TunnelNX(QMainWindow):
                     # 注意：这里传递的是未缩放的原始 QImage
                     pixmap = QPixmap.fromImage(qimage)
                     if not pixmap.isNull():
-                        self.preview_display_widget.set_image(pixmap)
+                        # 代理分辨率的图像按缩小倍数放大显示，保持缩放比例相对完整分辨率
+                        self.preview_display_widget.set_image(pixmap, source_scale=2 ** self.engine.proxy_level)
                         # 强制更新界面
                         self.preview_display_widget.update()
                         # 确保预览区滚动到可见位置
@@ -6764,14 +6661,11 @@ class TunnelNX(QMainWindow):
                     print("检测到预览图像为空，强制刷新")
                     self.update_preview_from_node(preview_node)
 
-                # 强制刷新界面
+                # 请求重绘，界面在事件循环中刷新
                 self.preview_display_widget.update()
                 if hasattr(self, 'preview_scroll'):
                     self.preview_scroll.update()
 
-                # 处理事件队列
-                QApplication.processEvents()
-
     def update_preview_with_zoom(self):
         """根据缩放级别更新预览图像"""
         # 查找预览节点
@@ -6819,6 +6713,9 @@ class TunnelNX(QMainWindow):
                         # 从RGBA转为BGRA
                         img_display = cv2.cvtColor(img_display, cv2.COLOR_RGBA2BGRA)
 
+                # QImage直接引用数组内存，只读（缓存共享）或非连续的数组需要先复制
+                img_display = self._qimage_source_array(img_display)
+
                 # 获取原始尺寸
                 orig_height, orig_width = img_display.shape[:2]
 
@@ -6920,6 +6817,9 @@ class TunnelNX(QMainWindow):
                             # 从RGBA转为BGRA
                             img_display = cv2.cvtColor(img_display, cv2.COLOR_RGBA2BGRA)
 
+                    # QImage直接引用数组内存，只读（缓存共享）或非连续的数组需要先复制
+                    img_display = self._qimage_source_array(img_display)
+
                     # 获取原始尺寸
                     orig_height, orig_width = img_display.shape[:2]
 
@@ -7237,8 +7137,7 @@ class TunnelNX(QMainWindow):
                 processed_count += 1
 
         # 更新界面
-        self.film_preview_list.repaint()
-        QApplication.processEvents()
+        self.film_preview_list.update()
     def on_film_item_double_clicked(self, item: QListWidgetItem): # 指定item类型，方便代码提示
         """当胶片预览中的项目被双击时调用"""
         if item:
@@ -7279,12 +7178,9 @@ class TunnelNX(QMainWindow):
                     if self.load_node_graph_from_file(nodegraph_path):
                         # 注意：不需要再次设置状态，load_node_graph_from_file 已经正确设置
 
-                        # 处理节点图
-                        self.process_node_graph(suppress_auto_save=True)  # 不要在这里触发自动保存
-
-                        # 更新界面
-                        self.update_preview_with_zoom()
-                        self.zoom_fit()
+                        # 在后台处理节点图，渲染完成后更新预览并适应窗口
+                        self._fit_after_next_render()
+                        self.request_graph_render(allow_roi=False, progressive=False)
 
                         # 更新状态栏
                         self.task_label.setText(f"已打开节点图: {os.path.basename(nodegraph_path)}")
@@ -7439,7 +7335,9 @@ class TunnelNX(QMainWindow):
                     # 保存端口计数
                     'port_counts': node.get('port_counts', {'inputs': 0, 'outputs': 0}),
                     # 保存元数据
-                    'metadata': node.get('metadata', {})
+                    'metadata': node.get('metadata', {}),
+                    # 保存"保留输出"标记
+                    'keep_outputs': node.get('keep_outputs', False)
                 }
                 data['nodes'].append(node_data)
 
@@ -7489,6 +7387,9 @@ class TunnelNX(QMainWindow):
 
                 print(f"已成功保存节点图，当前节点图路径: {self.current_nodegraph_path}")
 
+                # 把当前节点输出写入持久化缓存，下次打开节点图时无需重新计算
+                self.engine.persist_node_outputs()
+
             return success
         except Exception as e:
             print(f"保存节点图到文件出错: {str(e)}")
@@ -7567,7 +7468,6 @@ class TunnelNX(QMainWindow):
         try:
             # 显示加载指示器
             self.task_label.setText("正在加载节点图...")
-            QApplication.processEvents()  # 强制更新UI
 
             # 设置节点图状态 - 这是从文件加载的节点图
             self.set_nodegraph_state(
@@ -7660,12 +7560,16 @@ class TunnelNX(QMainWindow):
                         node['metadata'] = node_data['metadata']
                     else:
                         # 如果没有元数据，创建默认元数据
-                        node['metadata'] = self.metadata_manager.create_metadata(
+                        node['metadata'] = self.engine.metadata_manager.create_metadata(
                             node_id=node['id'],
                             node_title=node['title'],
                             script_path=node['script_path']
                         )
 
+                    # 恢复"保留输出"标记
+                    if node_data.get('keep_outputs', False):
+                        node['keep_outputs'] = True
+
                     # 重建灵活端口视觉组件 - 确保与端口计数一致
                     if 'port_counts' in node and 'flexible_ports' in node:
                         # 对于输入端口
@@ -7794,11 +7698,7 @@ class TunnelNX(QMainWindow):
                     # 记录节点映射
                     nodes_map[node_data['id']] = node
 
-                # 每处理一批节点后更新UI
-                QApplication.processEvents()
-
             self.task_label.setText("正在创建连接...")
-            QApplication.processEvents()
 
             # 创建连接
             for conn_data in data['connections']:
@@ -7823,7 +7723,6 @@ class TunnelNX(QMainWindow):
                         self._handle_flexible_port(input_node, input_port, 'inputs')
 
             self.task_label.setText("正在更新节点图...")
-            QApplication.processEvents()
 
             # 加载完成后，只处理必要的节点 - 查找没有输入的根节点
             root_nodes = []
@@ -7854,10 +7753,10 @@ class TunnelNX(QMainWindow):
             else:
                 # 如果没有预览节点，则正常处理
                 if root_nodes:
-                    self.process_node_graph(suppress_auto_save=suppress_auto_save, changed_nodes=root_nodes)
+                    self.request_graph_render(changed_nodes=root_nodes, allow_roi=False, progressive=False)
                 else:
                     print("没有找到根节点，将处理所有节点")
-                    self.process_node_graph(suppress_auto_save=suppress_auto_save)
+                    self.request_graph_render(allow_roi=False, progressive=False)
 
             # 更新画布
             self.node_canvas_widget.update()
@@ -7885,16 +7784,19 @@ class TunnelNX(QMainWindow):
 
     def clear_node_graph(self, suppress_auto_save=False):
         """清除当前节点图"""
-        # 清除LRU缓存 - 清空节点图时需要清除缓存
-        if hasattr(self, 'node_cache'):
-            self.node_cache.clear()
+        removed_nodes = self.nodes
+        with self._graph_mutation():
+            # 清除LRU缓存 - 清空节点图时需要清除缓存
+            self.engine.reset_node_state()
             print("已清除节点处理缓存。")
 
-        # 清除连接
-        self.connections = []
+            # 清除连接和节点
+            self.connections = []
+            self.graph_index.clear()
+            self.nodes = []
 
         # 清除节点及其端口
-        for node in self.nodes:
+        for node in removed_nodes:
             # --- 新增：先删除关联的端口部件 ---
             if 'port_widgets' in node:
                  for port_type in ['inputs', 'outputs']:
@@ -7907,7 +7809,6 @@ class TunnelNX(QMainWindow):
             if 'widget' in node and node['widget']:
                 node['widget'].setParent(None)
 
-        self.nodes = []
         self.next_node_id = 0
         self.selected_node = None
 
@@ -8147,7 +8048,7 @@ class TunnelNX(QMainWindow):
                 self.update_preview(force_refresh=True)
             else:
                 # 如果找不到预览节点，进行常规处理
-                self.process_node_graph()
+                self.request_graph_render(allow_roi=False, progressive=False)
 
             # 自动适应视图大小
             QTimer.singleShot(100, self.zoom_fit)
@@ -8244,25 +8145,10 @@ class TunnelNX(QMainWindow):
             # 更新连接线
             self.update_connections()
 
-            # 处理节点图
-            self.process_node_graph()
-
-            # 确保预览节点显示
+            # 在后台处理节点图，渲染完成后更新预览显示并适应视图大小
             if preview_node:
-                print("确保预览节点及其依赖已处理")
-                self._ensure_preview_dependencies_processed(preview_node)
-                self.update_preview_from_node(preview_node)
-
-                # 强制预览界面刷新
-                if hasattr(self, 'preview_display_widget'):
-                    self.preview_display_widget.update()
-                    QApplication.processEvents()  # 强制处理事件队列
-
-                # 确保预览图像被显示
-                QTimer.singleShot(100, lambda: self.refresh_preview_display())
-
-                # 自动适应视图大小
-                QTimer.singleShot(150, self.zoom_fit)
+                self._fit_after_next_render()
+            self.request_graph_render(allow_roi=False, progressive=False)
 
         except Exception as e:
             print(f"创建简单默认节点图出错: {str(e)}")
@@ -8279,83 +8165,70 @@ class TunnelNX(QMainWindow):
         port_idx = self.selected_port['port_idx']
         port_type = self.selected_port['port_type']
 
-        # 查找与选中端口相关的连接
-        conn_to_remove = []
-        for conn in self.connections:
-            if (port_type == 'input' and conn['input_node'] == node and conn['input_port'] == port_idx) or \
-               (port_type == 'output' and conn['output_node'] == node and conn['output_port'] == port_idx):
-                conn_to_remove.append(conn)
+        with self._graph_mutation():
+            # 查找与选中端口相关的连接
+            if port_type == 'input':
+                conn_to_remove = [conn for conn in self.graph_index.get_input_connections(node['id'])
+                                  if conn['input_port'] == port_idx]
+            else:
+                conn_to_remove = [conn for conn in self.graph_index.get_output_connections(node['id'])
+                                  if conn['output_port'] == port_idx]
 
-        # 从连接列表中移除
-        for conn in conn_to_remove:
-            self.connections.remove(conn)
+            # 从连接列表和邻接索引中移除
+            for conn in conn_to_remove:
+                self.connections.remove(conn)
+                self.graph_index.remove_connection(conn)
+
+            # 处理灵活端口 - 检查这是否是最后一个添加的灵活端口
+            port_count_key = port_type + 's'  # 'input' -> 'inputs', 'output' -> 'outputs'
+
+            # 只有当断开的是最大索引的端口，并且是灵活端口类型，我们才移除它
+            if hasattr(node, 'port_counts') and port_count_key in node['port_counts']:
+                flexible_ports = node.get('flexible_ports', {}).get(port_count_key, [])
+
+                if flexible_ports and port_idx > 0:  # 索引 0 的端口永远不移除
+                    # 获取端口类型
+                    port_widget_info = node['port_widgets'][port_count_key].get(port_idx)
+                    if port_widget_info and port_widget_info['type'] in flexible_ports:
+                        # 检查是否是当前最大索引的端口
+                        max_port_idx = max(node['port_widgets'][port_count_key].keys())
+                        if port_idx == max_port_idx and port_idx == node['port_counts'][port_count_key] - 1:
+                            # 移除端口部件
+                            port_widget = port_widget_info['widget']
+                            if port_widget:
+                                port_widget.setParent(None)
+                                port_widget.deleteLater()
+
+                            # 从 port_widgets 中移除
+                            del node['port_widgets'][port_count_key][port_idx]
+
+                            # 更新端口计数
+                            node['port_counts'][port_count_key] -= 1
+
+                            # 调整节点高度
+                            max_ports = max(node['port_counts']['inputs'], node['port_counts']['outputs'])
+                            new_height = max(80, 40 + max_ports * 20)
+                            if new_height < node['height']:
+                                node['height'] = new_height
+                                node['widget'].setFixedHeight(new_height)
+
+                            print(f"已移除节点 {node['title']} 的灵活{port_type}端口 {port_idx}")
 
         # 设置节点图为已修改状态
         self.set_nodegraph_state(modified=True)
 
-        # 使受影响节点的缓存失效
-        node_id = node.get('id')
-        if node_id is not None:
-            if port_type == 'input':
-                # 断开输入端口，使当前节点及其下游节点的缓存失效
-                self.invalidate_downstream_cache(node_id, "断开输入连接")
-            else:  # port_type == 'output'
-                # 断开输出端口，使当前节点的缓存失效
-                self.invalidate_node_cache(node_id, "断开输出连接")
-                # 同时使所有曾经连接到这个输出的节点及其下游节点的缓存失效
-                for conn in conn_to_remove:
-                    if conn['output_node'] == node and conn['output_port'] == port_idx:
-                        affected_input_node_id = conn['input_node'].get('id')
-                        if affected_input_node_id is not None:
-                            self.invalidate_downstream_cache(affected_input_node_id, "上游连接断开")
-
-        # 处理灵活端口 - 检查这是否是最后一个添加的灵活端口
-        port_count_key = port_type + 's'  # 'input' -> 'inputs', 'output' -> 'outputs'
-
-        # 只有当断开的是最大索引的端口，并且是灵活端口类型，我们才移除它
-        if hasattr(node, 'port_counts') and port_count_key in node['port_counts']:
-            flexible_ports = node.get('flexible_ports', {}).get(port_count_key, [])
-
-            if flexible_ports and port_idx > 0:  # 索引 0 的端口永远不移除
-                # 获取端口类型
-                port_widget_info = node['port_widgets'][port_count_key].get(port_idx)
-                if port_widget_info and port_widget_info['type'] in flexible_ports:
-                    # 检查是否是当前最大索引的端口
-                    max_port_idx = max(node['port_widgets'][port_count_key].keys())
-                    if port_idx == max_port_idx and port_idx == node['port_counts'][port_count_key] - 1:
-                        # 移除端口部件
-                        port_widget = port_widget_info['widget']
-                        if port_widget:
-                            port_widget.setParent(None)
-                            port_widget.deleteLater()
-
-                        # 从 port_widgets 中移除
-                        del node['port_widgets'][port_count_key][port_idx]
-
-                        # 更新端口计数
-                        node['port_counts'][port_count_key] -= 1
-
-                        # 调整节点高度
-                        max_ports = max(node['port_counts']['inputs'], node['port_counts']['outputs'])
-                        new_height = max(80, 40 + max_ports * 20)
-                        if new_height < node['height']:
-                            node['height'] = new_height
-                            node['widget'].setFixedHeight(new_height)
-
-                        print(f"已移除节点 {node['title']} 的灵活{port_type}端口 {port_idx}")
-
         # 处理节点图并更新预览 - 只处理受影响的节点
         affected_node = node
         if port_type == 'input':
             # 断开输入端口，只影响当前节点和其下游节点
-            self.process_node_graph(changed_nodes=[affected_node])
+            self.request_graph_render(changed_nodes=[affected_node], allow_roi=False, progressive=False)
         else:  # port_type == 'output'
             # 断开输出端口，找出所有连接到这个输出的节点
             affected_nodes = [affected_node]
             for conn in self.connections:
                 if conn['output_node'] == node and conn['output_port'] == port_idx:
                     affected_nodes.append(conn['input_node'])
-            self.process_node_graph(changed_nodes=affected_nodes)
+            self.request_graph_render(changed_nodes=affected_nodes, allow_roi=False, progressive=False)
 
         # 通知用户
         print(f"已断开节点 {node['title']} 的 {port_type} 端口 {port_idx} 的连接")
@@ -8437,168 +8310,9 @@ class TunnelNX(QMainWindow):
             import traceback
             traceback.print_exc()
     def parse_script_header(self, file_path):
-        """
-        解析脚本头部信息，包括：
-        1. 前四行注释：inputs、outputs、description、color
-        2. 可选第五行：Type:NeoScript 标记（识别 NeoScript）
-        3. 可选的SupportedFeatures特性标记，格式为：
-           #SupportedFeatures:Feature1=True,Feature2=42,Feature3="字符串值"
-        返回值字典包含：
-           - inputs: 输入参数列表（字符串列表）
-           - outputs: 输出参数列表
-           - description: 脚本描述（字符串）
-           - color: 颜色字符串（支持自动在 6 位十六进制前添加 “#”）
-           - script_type: 'legacy' 或 'neo'
-           - supported_features: 支持特性字典，键为特性名，值为 bool/int/float/str
-           - flexible_inputs/outputs: 灵活端口列表
-        """
-        try:
-            import os, re
-
-            # 读取并剔除首尾空白
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = [line.strip() for line in file.readlines()]
-
-            # --- 基本注释行检查 ---
-            if len(lines) < 4:
-                print(f"脚本 {file_path} 行数不足，至少需要4行注释头")
-                return None
-            if not all(line.startswith('#') for line in lines[:4]):
-                print(f"脚本 {file_path} 前4行应当是注释")
-                return None
+        """解析脚本头部信息（与无界面引擎共用同一个解析函数，见 TNXEngine.parse_script_header）"""
+        return parse_script_header(file_path)
 
-            # --- 提取前四行信息 ---
-            # 第一行：inputs 列表，逗号分隔
-            inputs = lines[0][1:].strip()
-            # 第二行：outputs 列表
-            outputs = lines[1][1:].strip()
-            # 第三行：description 描述
-            description = lines[2][1:].strip()
-            # 第四行：color 字符串（可能需要加 #）
-            raw_color_str = lines[3][1:].strip()
-
-            # --- 颜色格式修正 ---
-            processed_color = raw_color_str
-            if re.match(r'^[0-9a-fA-F]{6}$', raw_color_str):
-                processed_color = '#' + raw_color_str
-                print(f"  Info: Detected 6-char hex '{raw_color_str}', adding #: '{processed_color}'")
-
-            # --- NeoScript 类型检测（可选第五行） ---
-            script_type = 'legacy'  # 默认为旧版脚本
-            if len(lines) >= 5 and lines[4].startswith('#') and 'Type:NeoScript' in lines[4]:
-                script_type = 'neo'
-                print(f"检测到 NeoScript: {os.path.basename(file_path)}")
-
-            # --- 新的SupportedFeatures解析系统 ---
-            supported_features = {}
-
-            # 检查所有行，找到SupportedFeatures标记
-            script_name = os.path.basename(file_path)
-            print(f"解析脚本特性: {script_name}")
-
-            for line in lines[4:]:  # 从第五行开始检查
-                if line.startswith('#SupportedFeatures:'):
-                    print(f"  发现SupportedFeatures标记: {line}")
-                    # 去掉注释符号和标记，保留冒号后的内容
-                    features_str = line[len('#SupportedFeatures:'):].strip()
-
-                    # 如果特性字符串为空，跳过解析
-                    if not features_str:
-                        print(f"  空特性字符串，跳过解析")
-                        continue
-
-                    # 按逗号分隔特性列表
-                    feature_items = features_str.split(',')
-                    print(f"  特性列表: {feature_items}")
-
-                    for item in feature_items:
-                        item = item.strip()
-                        # 跳过空项
-                        if not item:
-                            continue
-
-                        # 使用等号分隔键值对
-                        if '=' in item:
-                            key, val_str = item.split('=', 1)
-                            key = key.strip()
-                            val_str = val_str.strip()
-                            print(f"  解析特性: {key} = {val_str}")
-
-                            # 处理引号包围的字符串
-                            if (val_str.startswith('"') and val_str.endswith('"')) or \
-                               (val_str.startswith("'") and val_str.endswith("'")):
-                                val = val_str[1:-1]  # 去除引号
-                            # 尝试类型转换
-                            else:
-                                try:
-                                    if val_str.lower() == 'true':
-                                        val = True
-                                    elif val_str.lower() == 'false':
-                                        val = False
-                                    elif '.' in val_str:
-                                        val = float(val_str)
-                                    else:
-                                        val = int(val_str)
-                                except ValueError:
-                                    val = val_str
-
-                            supported_features[key] = val
-                                            # 特性已经在解析时输出，这里不需要单独处理
-
-            # --- 处理输入输出类型，识别灵活端口 ---
-            input_list = []
-            flexible_inputs = []
-            if inputs:
-                for i in inputs.split(','):
-                    i = i.strip()
-                    if i.endswith(':'):  # 检测灵活端口
-                        flexible_inputs.append(i[:-1])  # 去掉冒号保存
-                        input_list.append(i[:-1])  # 同时加入普通输入列表（去掉冒号）
-                    else:
-                        input_list.append(i)
-
-            output_list = []
-            flexible_outputs = []
-            if outputs:
-                for o in outputs.split(','):
-                    o = o.strip()
-                    if o.endswith(':'):  # 检测灵活端口
-                        flexible_outputs.append(o[:-1])  # 去掉冒号保存
-                        output_list.append(o[:-1])  # 同时加入普通输出列表（去掉冒号）
-                    else:
-                        output_list.append(o)
-
-            # --- 输出灵活端口信息 ---
-            if flexible_inputs:
-                print(f"检测到灵活输入端口: {', '.join(flexible_inputs)}")
-            if flexible_outputs:
-                print(f"检测到灵活输出端口: {', '.join(flexible_outputs)}")
-
-            # --- 构造并返回结果字典 ---
-            # 输出解析结果总结
-            if supported_features:
-                print(f"脚本 {os.path.basename(file_path)} 解析到的特性:")
-                for feature_key, feature_value in supported_features.items():
-                    print(f"  - {feature_key}: {feature_value} (类型: {type(feature_value).__name__})")
-            else:
-                print(f"脚本 {os.path.basename(file_path)} 没有特性定义")
-
-            return {
-                'inputs': input_list,
-                'outputs': output_list,
-                'description': description,
-                'color': processed_color,
-                'script_type': script_type,
-                'supported_features': supported_features,
-                'flexible_inputs': flexible_inputs,
-                'flexible_outputs': flexible_outputs
-            }
-
-        except Exception as e:
-            print(f"解析脚本头部出错 {file_path}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return None
     def paste_node(self):
         """粘贴之前复制的节点"""
         if not hasattr(self, 'copied_node') or not self.copied_node:
@@ -8624,8 +8338,8 @@ class TunnelNX(QMainWindow):
             new_node['y'] = self.selected_node['y'] + offset_y
             new_node['widget'].move(new_node['x'], new_node['y'])
 
-        # 处理节点图并更新预览
-        self.process_node_graph()
+        # 在后台处理节点图并更新预览
+        self.request_graph_render(allow_roi=False, progressive=False)
 
         # 选择新节点
         self.select_node(new_node)
@@ -8742,37 +8456,9 @@ class TunnelNX(QMainWindow):
         print("撤销状态保存功能已禁用")
 
     def is_upstream_of_preview(self, target_node):
-        """检查 target_node 是否是活动预览节点的上游（直接或间接）"""
-        preview_node = None
-        for node in self.nodes:
-            if node.get('title') == '预览节点':
-                preview_node = node
-                break
-
-        if not preview_node:
-            return False # 没有预览节点，无法判断
-
-        if target_node == preview_node: # 目标本身就是预览节点
-            return True
-
-        # 使用 DFS (深度优先搜索) 或 BFS (广度优先搜索) 从预览节点向上游遍历
-        queue = [preview_node]
-        visited = {preview_node['id']}
-
-        while queue:
-            current_node = queue.pop(0)
-
-            # 查找连接到 current_node 输入端口的连接
-            for conn in self.connections:
-                if conn['input_node'] == current_node:
-                    upstream_node = conn['output_node']
-                    if upstream_node == target_node:
-                        return True # 找到了目标节点
-                    if upstream_node['id'] not in visited:
-                        visited.add(upstream_node['id'])
-                        queue.append(upstream_node)
-
-        return False # 遍历完成未找到目标节点
+        """检查 target_node 是否是活动预览节点的上游（直接或间接），或者就是预览节点本身"""
+        # 预览节点的上游集合缓存在邻接索引中，只在节点图结构变化后重新计算
+        return target_node.get('id') in self.graph_index.preview_upstream_ids()
 
     def undo_node_graph(self, event=None):
         """撤销功能（已禁用）"""
@@ -8780,6 +8466,17 @@ class TunnelNX(QMainWindow):
         QMessageBox.information(self, "撤销不可用", "撤销功能已禁用，因为自动保存系统已被移除。")
         self.task_label.setText("撤销功能已禁用")
         print("撤销功能已禁用，因为自动保存系统已被移除。")
+    def _qimage_source_array(self, img_display):
+        """
+        返回可安全交给QImage引用的数组
+
+        8位灰度等图像在显示时不会经过任何转换，此时img_display就是缓存中的只读数组，
+        QImage可能写入其缓冲区，因此只读或非C连续的数组会被复制，其余情况原样返回。
+        """
+        if not img_display.flags.writeable or not img_display.flags['C_CONTIGUOUS']:
+            return np.ascontiguousarray(img_display).copy()
+        return img_display
+
     def pil_to_qimage(self, pil_image):
         """将PIL图像转换为QImage，使用OpenCV处理颜色通道"""
         try:
@@ -8859,6 +8556,13 @@ class TunnelNX(QMainWindow):
                     event.ignore() # 阻止窗口关闭
                     return
 
+        # 使正在进行的后台渲染过期，并关闭渲染线程和引擎的线程池（等待持久化缓存写完）
+        self._next_render_generation()
+        if getattr(self, '_render_executor', None) is not None:
+            self._render_executor.shutdown(wait=False)
+            self._render_executor = None
+        self.engine.shutdown()
+
         # 接受关闭事件 (仅在未取消或保存成功时执行)
         event.accept()
 
@@ -9159,6 +8863,11 @@ class NodeCanvasWidget(QWidget):
             for y in range(0, height, grid_size):
                 painter.drawLine(0, y, width, y)
 
+            # 性能热图：按最近一次求值的耗时给节点着色，并标出关键路径
+            critical_edges = set()
+            if getattr(self.parent_app, 'profile_heatmap_enabled', False):
+                critical_edges = self._draw_profile_heatmap(painter)
+
             # 获取Ctrl键状态用于绘制彩虹线
             modifiers = QApplication.keyboardModifiers()
             ctrl_pressed = bool(modifiers & Qt.ControlModifier)
@@ -9252,6 +8961,9 @@ class NodeCanvasWidget(QWidget):
                 base_line_color = QColor(self.parent_app.get_port_color(port_type))
                 line_color = base_line_color.darker(130).name() # 加深颜色
                 pen = QPen(QColor(line_color), 2.5)
+                if (output_node['id'], input_node['id']) in critical_edges:
+                    # 关键路径上的连接
+                    pen = QPen(QColor(220, 40, 40), 4.5)
                 pen.setStyle(Qt.SolidLine)
                 painter.setPen(pen) # 加粗线条
 
@@ -9322,6 +9034,60 @@ class NodeCanvasWidget(QWidget):
         finally:
             # 确保painter被正确关闭
             painter.end()
+    def _draw_profile_heatmap(self, painter):
+        """
+        在节点下方绘制性能热图：颜色从绿到红表示节点在最近一次求值中的耗时占比，
+        缓存命中的节点为灰蓝色，关键路径上的节点加红色边框
+
+        返回:
+            set: 关键路径上的连接 {(上游节点ID, 下游节点ID)}
+        """
+        app = self.parent_app
+        run = app.engine.profiler.last_run()
+        if run is None:
+            return set()
+        edges = [(conn['output_node']['id'], conn['input_node']['id']) for conn in app.connections]
+        path, _ = app.engine.profiler.critical_path(run, edges)
+        path_ids = set(path)
+        critical_edges = set(zip(path, path[1:]))
+        max_wall = max((record['wall'] for record in run['records'].values()), default=0.0)
+
+        painter.save()
+        font = painter.font()
+        font.setPointSize(8)
+        painter.setFont(font)
+        for node in app.nodes:
+            record = run['records'].get(node['id'])
+            widget = node.get('widget')
+            if record is None or not widget:
+                continue
+            top_left = widget.mapTo(self, QPoint(0, 0))
+            rect = QRect(top_left, widget.size()).adjusted(-6, -6, 6, 6)
+
+            if record['cache'] == 'miss':
+                ratio = record['wall'] / max_wall if max_wall > 0 else 0.0
+                color = QColor.fromHsvF((1.0 - ratio) / 3.0, 0.85, 0.95, 0.75)
+            else:
+                color = QColor(140, 160, 190, 150)
+            painter.setPen(QPen(QColor(220, 40, 40), 3) if node['id'] in path_ids else Qt.NoPen)
+            painter.setBrush(color)
+            painter.drawRoundedRect(rect, 8, 8)
+
+            label = f"{record['wall'] * 1000:.1f} ms"
+            if record['cache'] != 'miss':
+                label += f" ({record['cache']})"
+            if record['proxy_level']:
+                label += f" 1/{2 ** record['proxy_level']}"
+            # 标签画在半透明底色上，浅色和深色主题下都能看清
+            label_rect = QRect(rect.left(), rect.top() - 17, painter.fontMetrics().horizontalAdvance(label) + 8, 16)
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor(0, 0, 0, 160))
+            painter.drawRoundedRect(label_rect, 4, 4)
+            painter.setPen(QColor(255, 255, 255))
+            painter.drawText(label_rect, Qt.AlignCenter, label)
+        painter.restore()
+        return critical_edges
+
     # 保留原始的show_node_settings作为兼容方法
     def show_node_settings(self, node):
         """显示节点设置UI - 直接调用update_node_settings方法"""
@@ -9337,6 +9103,7 @@ class PreviewDisplayWidget(QWidget):
         self._original_pixmap = QPixmap()  # 原始未缩放图像
         self._display_pixmap = QPixmap()   # 当前展示的缩放后图像
         self._image_rect = QRectF()        # 图像实际显示区域
+        self.source_scale = 1.0            # 原始图像相对完整分辨率缩小的倍数（代理分辨率预览时为 2**level）
 
         # 缩放相关属性
         self.zoom_level = 1.0              # 当前缩放级别
@@ -9357,11 +9124,18 @@ class PreviewDisplayWidget(QWidget):
         self._neo_context_cache = {}
         self.processed_in_last_run = set()
 
-    def set_image(self, pixmap):
-        """设置要显示的图像，保存原始图像并按当前缩放比例显示"""
+    def set_image(self, pixmap, source_scale=1.0):
+        """
+        设置要显示的图像，保存原始图像并按当前缩放比例显示
+
+        参数:
+            pixmap: 要显示的图像
+            source_scale: 图像相对完整分辨率缩小的倍数，显示时放大该倍数，使缩放比例始终相对完整分辨率
+        """
         if isinstance(pixmap, QPixmap) and not pixmap.isNull():
             # 保存原始图像
             self._original_pixmap = pixmap
+            self.source_scale = source_scale
             # 按当前缩放比例更新显示图像
             self._update_display_pixmap()
             # 调整部件大小以匹配图像
@@ -9375,6 +9149,17 @@ class PreviewDisplayWidget(QWidget):
             self.setFixedSize(0, 0)
             self.repaint()
 
+    def update_region(self, pixmap, x, y):
+        """把局部重新计算的图像绘制到原始图像的(x, y)位置，并按当前缩放比例刷新显示"""
+        if self._original_pixmap.isNull() or pixmap is None or pixmap.isNull():
+            return
+        painter = QPainter(self._original_pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawPixmap(x, y, pixmap)
+        painter.end()
+        self._update_display_pixmap()
+        self.update()
+
     def _update_display_pixmap(self):
         """根据当前缩放级别更新显示图像"""
         if self._original_pixmap.isNull():
@@ -9383,8 +9168,8 @@ class PreviewDisplayWidget(QWidget):
 
         # 计算缩放后尺寸
         orig_size = self._original_pixmap.size()
-        new_width = max(1, int(orig_size.width() * self.zoom_level))
-        new_height = max(1, int(orig_size.height() * self.zoom_level))
+        new_width = max(1, int(orig_size.width() * self.zoom_level * self.source_scale))
+        new_height = max(1, int(orig_size.height() * self.zoom_level * self.source_scale))
         # 根据性能模式选择不同的转换方式
         transformation_mode = Qt.FastTransformation if (self.parent_app and hasattr(self.parent_app, 'performance_mode_enabled') and self.parent_app.performance_mode_enabled) else Qt.SmoothTransformation
 
@@ -9418,8 +9203,8 @@ class PreviewDisplayWidget(QWidget):
 
         # 更新尺寸信息
         if self.parent_app and hasattr(self.parent_app, 'image_size_label') and not self._original_pixmap.isNull():
-            orig_width = self._original_pixmap.width()
-            orig_height = self._original_pixmap.height()
+            orig_width = int(round(self._original_pixmap.width() * self.source_scale))
+            orig_height = int(round(self._original_pixmap.height() * self.source_scale))
             self.parent_app.image_size_label.setText(f"尺寸: {orig_width} x {orig_height}")
 
         # 更新主应用的缩放级别
@@ -9497,6 +9282,10 @@ class PreviewDisplayWidget(QWidget):
             h_bar.setValue(int(new_scroll_x))
             v_bar.setValue(int(new_scroll_y))
 
+        # 性能模式下缩放比例跨过金字塔层级时切换代理分辨率
+        if self.parent_app and hasattr(self.parent_app, '_update_proxy_level'):
+            self.parent_app._update_proxy_level()
+
         return True
 
     def zoom_in(self, center_point=None):
@@ -9521,8 +9310,8 @@ class PreviewDisplayWidget(QWidget):
 
         # 计算适应窗口的缩放级别
         orig_size = self._original_pixmap.size()
-        scale_x = viewport_size.width() / float(orig_size.width())
-        scale_y = viewport_size.height() / float(orig_size.height())
+        scale_x = viewport_size.width() / (orig_size.width() * self.source_scale)
+        scale_y = viewport_size.height() / (orig_size.height() * self.source_scale)
 
         # 取最小值确保完整显示
         fit_zoom = min(scale_x, scale_y) * 1
@@ -9806,89 +9595,6 @@ class PreviewDisplayWidget(QWidget):
             event.accept()
         else:
             super().contextMenuEvent(event)
-import functools
-from collections import OrderedDict
-
-class LRUCache:
-    """实现LRU(最近最少使用)缓存机制"""
-    def __init__(self, max_size=100):
-        """
-        初始化LRU缓存
-
-        参数:
-            max_size: 缓存的最大容量，超出后将移除最久未使用的项目
-        """
-        self.cache = OrderedDict()
-        self.max_size = max_size
-        self.hits = 0
-        self.misses = 0
-
-    def get(self, key):
-        """
-        从缓存中获取值，如果存在则移动到最近使用位置
-
-        参数:
-            key: 缓存键
-
-        返回:
-            缓存的值，如果不存在则返回None
-        """
-        if key in self.cache:
-            # 移到最近使用的位置
-            value = self.cache.pop(key)
-            self.cache[key] = value
-            self.hits += 1
-            return value
-        self.misses += 1
-        return None
-
-    def put(self, key, value):
-        """
-        将键值对放入缓存，如果键已存在则更新值并移动到最近使用位置，
-        如果缓存已满则移除最久未使用的项
-
-        参数:
-            key: 缓存键
-            value: 要缓存的值
-        """
-        if key in self.cache:
-            self.cache.pop(key)
-        elif len(self.cache) >= self.max_size:
-            # 移除最久未使用的项目(OrderedDict的第一项)
-            self.cache.popitem(last=False)
-        self.cache[key] = value
-
-    def clear(self):
-        """清空缓存"""
-        self.cache.clear()
-
-    def get_hit_rate(self):
-        """
-        返回缓存命中率
-
-        返回:
-            缓存命中率，范围为0.0到1.0
-        """
-        total = self.hits + self.misses
-        return self.hits / total if total > 0 else 0.0
-
-    def get_stats(self):
-        """
-        返回缓存统计信息
-
-        返回:
-            包含缓存统计信息的字典
-        """
-        total = self.hits + self.misses
-        hit_rate = self.hits / total if total > 0 else 0.0
-        return {
-            'hits': self.hits,
-            'misses': self.misses,
-            'total_requests': total,
-            'hit_rate': hit_rate,
-            'current_size': len(self.cache),
-            'max_size': self.max_size
-        }
 def eventFilter(self, watched, event):
     """事件过滤器，主要用于节点连接拖拽"""
     # 预览区域的滚轮缩放直接由 PreviewDisplayWidget.wheelEvent 处理，不再在这里处理
@@ -0,0 +1,250 @@
+"""
+TunnelNX 批处理
+
+用一个模板节点图处理大量图像：每个输入文件替换源节点（图像节点）的 image_path 参数，
+在进程池中并行计算，结果按导出节点的设置（格式、质量、透明度）写入输出文件夹。
+
+- 不依赖输入图像的上游分支（卷积核、画布等）的输出按内容指纹保存在每个工作进程的节点缓存中，之后的文件直接命中
+- 每个文件的结果追加到输出文件夹中的 batch_log.jsonl，再次运行时跳过已成功且输出文件仍存在的输入
+"""
+import os
+import io
+import glob
+import json
+import time
+import datetime
+import traceback
+import contextlib
+import concurrent.futures
+
+from TunnelNX_scripts.TNXEngine import TNXEngine, TNXEngineError
+
+# 批处理日志文件名（位于输出文件夹中）
+LOG_FILE_NAME = "batch_log.jsonl"
+
+# 导出节点的格式参数对应的扩展名
+EXPORT_FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'TIFF': '.tif', 'BMP': '.bmp'}
+
+# 工作进程中的引擎和批处理设置，由 _init_worker 创建
+_worker_state = None
+
+
+def expand_inputs(patterns, list_file=None):
+    """
+    展开输入文件列表
+
+    参数:
+        patterns: 文件路径或通配符（支持 ** 递归匹配）
+        list_file: 可选，每行一个路径的列表文件
+
+    返回:
+        list: 去重后按路径排序的文件列表
+    """
+    paths = []
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        paths.extend(matches if matches else [pattern])
+    if list_file:
+        with open(list_file, 'r', encoding='utf-8') as f:
+            paths.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return sorted({os.path.abspath(path) for path in paths if os.path.isfile(path)})
+
+
+def find_source_node(engine, node_ref=None):
+    """批处理替换 image_path 的源节点；未指定时要求节点图中只有一个带 image_path 参数的节点"""
+    if node_ref is not None:
+        node = engine.find_node(node_ref)
+        if 'image_path' not in node['params']:
+            raise TNXEngineError(f"节点 '{node['title']}' 没有 image_path 参数")
+        return node
+    candidates = [node for node in engine.nodes if 'image_path' in node['params']]
+    if not candidates:
+        raise TNXEngineError("节点图中没有带 image_path 参数的源节点")
+    if len(candidates) > 1:
+        ids = ', '.join(str(node['id']) for node in candidates)
+        raise TNXEngineError(f"节点图中有多个源节点（ID: {ids}），请用 --source 指定")
+    return candidates[0]
+
+
+def find_export_node(engine, node_ref=None):
+    """写出结果的导出节点（带 sub_export 子操作的节点）；节点图中没有时返回None"""
+    if node_ref is not None:
+        node = engine.find_node(node_ref)
+        if not hasattr(node['module'], 'sub_export'):
+            raise TNXEngineError(f"节点 '{node['title']}' 不是导出节点")
+        return node
+    candidates = [node for node in engine.nodes if hasattr(node['module'], 'sub_export')]
+    if len(candidates) > 1:
+        ids = ', '.join(str(node['id']) for node in candidates)
+        raise TNXEngineError(f"节点图中有多个导出节点（ID: {ids}），请用 --export 指定")
+    return candidates[0] if candidates else None
+
+
+def plan_outputs(input_paths, output_dir, extension):
+    """
+    为每个输入计算输出路径：保留输入相对于公共目录的子目录结构，避免不同目录中的同名文件互相覆盖
+
+    返回:
+        list: [(输入路径, 输出路径), ...]
+    """
+    if not input_paths:
+        return []
+    common = os.path.commonpath([os.path.dirname(path) for path in input_paths])
+    plan = []
+    for path in input_paths:
+        rel_stem = os.path.splitext(os.path.relpath(path, common))[0]
+        plan.append((path, os.path.join(output_dir, rel_stem + extension)))
+    return plan
+
+
+def read_completed(log_path):
+    """读取批处理日志，返回已成功处理的输入路径集合"""
+    completed = set()
+    if not os.path.exists(log_path):
+        return completed
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 上次运行中断时最后一行可能不完整
+                continue
+            if record.get('status') == 'ok' and os.path.exists(record.get('output', '')):
+                completed.add(record['input'])
+            elif record.get('input') in completed:
+                completed.discard(record['input'])
+    return completed
+
+
+def _init_worker(graph_path, scripts_folder, config_path, overrides, source_ref, export_ref, target_ref, verbose, jobs):
+    """工作进程初始化：加载一次模板节点图，之后处理的每个文件都复用该引擎"""
+    global _worker_state
+    import cv2
+    # 并行来自进程池，每个进程内的OpenCV只用一个线程，避免线程数超过CPU核心数
+    cv2.setNumThreads(1)
+
+    engine = TNXEngine(scripts_folder=scripts_folder, config_path=config_path)
+    # 同理，进程内不再使用节点线程池和图块线程池；各进程的节点缓存平分内存预算
+    engine.parallel_execution_enabled = False
+    engine.tiled_execution_enabled = False
+    engine.node_cache.max_bytes = max(1, engine.node_cache.max_bytes // jobs)
+    engine.load_graph(graph_path)
+    for spec, value in overrides:
+        engine.set_param(spec, value)
+    source = find_source_node(engine, source_ref)
+    _worker_state = {
+        'engine': engine,
+        'source': source,
+        'export': find_export_node(engine, export_ref),
+        'target': target_ref,
+        'verbose': verbose,
+    }
+
+
+def _process_file(input_path, output_path):
+    """
+    在工作进程中处理单个文件
+
+    返回:
+        dict: 日志记录（input、output、status、error、seconds）
+    """
+    state = _worker_state
+    engine = state['engine']
+    start = time.perf_counter()
+    record = {'input': input_path, 'output': output_path, 'status': 'ok'}
+    stdout = contextlib.nullcontext() if state['verbose'] else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with stdout:
+            state['source']['params']['image_path']['value'] = input_path
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+            if state['export'] is not None:
+                state['export']['params']['export_path']['value'] = output_path
+                result = engine.run_sub_operation(state['export'], 'export')
+                if not isinstance(result, dict) or not result.get('success'):
+                    error = result.get('error') if isinstance(result, dict) else None
+                    raise TNXEngineError(error or "导出节点没有返回成功结果")
+            else:
+                outputs = engine.evaluate(state['target'])
+                engine.save_image(engine.pick_image(outputs), output_path)
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = str(e) or type(e).__name__
+        if state['verbose']:
+            traceback.print_exc()
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(graph_path, input_paths, output_dir, overrides=(), jobs=None, source_ref=None,
+              export_ref=None, target_ref=None, extension='.png', force=False, verbose=False,
+              scripts_folder=None, config_path=None):
+    """
+    批量处理图像
+
+    参数:
+        graph_path: 模板节点图
+        input_paths: 输入文件列表
+        output_dir: 输出文件夹（同时保存批处理日志）
+        overrides: [(节点.参数, 值), ...] 对所有文件生效的参数覆盖
+        jobs: 工作进程数，默认为CPU核心数
+        source_ref: 源节点ID或标题，默认自动查找带 image_path 参数的节点
+        export_ref: 导出节点ID或标题，默认自动查找；节点图中没有导出节点时保存 target_ref 节点的输出
+        target_ref: 没有导出节点时保存其输出的节点，默认为预览节点
+        extension: 没有导出节点时的输出格式
+        force: 为True时忽略日志，重新处理全部输入
+
+    返回:
+        dict: 统计（total、skipped、ok、failed、seconds）
+    """
+    # 在主进程中先加载一次，节点图或参数有错时立即报错，并确定输出扩展名
+    engine = TNXEngine(scripts_folder=scripts_folder, config_path=config_path)
+    engine.load_graph(graph_path)
+    for spec, value in overrides:
+        engine.set_param(spec, value)
+    find_source_node(engine, source_ref)
+    export_node = find_export_node(engine, export_ref)
+    if export_node is not None:
+        export_format = export_node['params'].get('format', {}).get('value', 'PNG')
+        extension = EXPORT_FORMAT_EXTENSIONS.get(export_format, '.png')
+    else:
+        engine.find_node(target_ref if target_ref is not None else '预览节点')
+
+    os.makedirs(output_dir, exist_ok=True)
+    log_path = os.path.join(output_dir, LOG_FILE_NAME)
+    completed = set() if force else read_completed(log_path)
+    plan = [(src, dst) for src, dst in plan_outputs(input_paths, os.path.abspath(output_dir), extension)
+            if src not in completed]
+    stats = {'total': len(input_paths), 'skipped': len(input_paths) - len(plan), 'ok': 0, 'failed': 0}
+    if stats['skipped']:
+        print(f"跳过 {stats['skipped']} 个已处理的文件")
+
+    start = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    init_args = (graph_path, scripts_folder, config_path, list(overrides), source_ref, export_ref, target_ref, verbose, jobs)
+    with open(log_path, 'a', encoding='utf-8') as log_file, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=init_args) as pool:
+        futures = {pool.submit(_process_file, src, dst): (src, dst) for src, dst in plan}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            try:
+                record = future.result()
+            except Exception as e:
+                # 工作进程异常退出（例如内存不足被终止），对应文件记为失败
+                src, dst = futures[future]
+                record = {'input': src, 'output': dst, 'status': 'error', 'error': str(e) or type(e).__name__}
+            record['time'] = datetime.datetime.now().isoformat(timespec='seconds')
+            # 每条记录立即写入，中断后再次运行可以从日志继续
+            log_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            log_file.flush()
+
+            if record['status'] == 'ok':
+                stats['ok'] += 1
+            else:
+                stats['failed'] += 1
+                print(f"失败: {record['input']} - {record['error']}")
+            elapsed = time.perf_counter() - start
+            print(f"[{done}/{len(plan)}] {os.path.basename(record['input'])} "
+                  f"({record.get('seconds', 0):.2f} 秒，平均 {done / elapsed:.2f} 张/秒)")
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    return stats
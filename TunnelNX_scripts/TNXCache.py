@@ -0,0 +1,909 @@
+"""
+TunnelNX 节点缓存
+
+节点输出的内存缓存（按字节预算、成本感知淘汰）、磁盘二级缓存和持久化缓存、
+节点与缓存键的双向索引，以及节点输出缓冲区池。不依赖Qt，主程序和无界面引擎共用。
+"""
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import shutil
+import hashlib
+import itertools
+import platform
+import threading
+import weakref
+import concurrent.futures
+from collections import OrderedDict
+
+import numpy as np
+
+
+class CacheKeyIndex:
+    """
+    节点ID与缓存键之间的双向索引
+
+    缓存键是内容指纹，不包含节点ID，因此需要单独记录每个节点产生过哪些缓存项，
+    使节点失效时只需处理该节点自己的缓存项，而不必扫描整个缓存。
+    完全相同的两个节点会共享同一个缓存键，反向索引记录引用某个键的所有节点，
+    只有不再被任何节点引用的键才真正从缓存中移除。
+    """
+    # 每个节点最多记录的历史缓存键数量，更早的键仍可通过内容指纹命中，只是不再随节点失效
+    MAX_KEYS_PER_NODE = 256
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._keys_by_node = {}  # node_id -> OrderedDict(key -> None)，最近使用的在末尾
+            self._nodes_by_key = {}  # key -> {node_id, ...}
+
+    def record(self, node_id, key):
+        """记录节点使用了某个缓存键（并标记为该节点最近使用的键）"""
+        with self._lock:
+            keys = self._keys_by_node.setdefault(node_id, OrderedDict())
+            keys.pop(key, None)
+            keys[key] = None
+            self._nodes_by_key.setdefault(key, set()).add(node_id)
+            while len(keys) > self.MAX_KEYS_PER_NODE:
+                old_key, _ = keys.popitem(last=False)
+                self._unlink(node_id, old_key)
+
+    def latest(self, node_id):
+        """返回节点最近使用的缓存键，没有时返回None"""
+        with self._lock:
+            keys = self._keys_by_node.get(node_id)
+            if not keys:
+                return None
+            return next(reversed(keys))
+
+    def keys_for(self, node_id):
+        """返回节点记录过的全部缓存键（从旧到新）"""
+        with self._lock:
+            return list(self._keys_by_node.get(node_id, ()))
+
+    def release(self, node_id, keys=None):
+        """
+        解除节点与缓存键的关联
+
+        参数:
+            node_id: 节点ID
+            keys: 要解除的缓存键，None表示该节点的全部缓存键
+
+        返回:
+            不再被任何节点引用、可以从缓存中移除的键列表
+        """
+        with self._lock:
+            node_keys = self._keys_by_node.get(node_id)
+            if not node_keys:
+                return []
+            if keys is None:
+                keys = list(node_keys)
+            orphaned = []
+            for key in keys:
+                if key not in node_keys:
+                    continue
+                del node_keys[key]
+                if self._unlink(node_id, key):
+                    orphaned.append(key)
+            if not node_keys:
+                del self._keys_by_node[node_id]
+            return orphaned
+
+    def _unlink(self, node_id, key):
+        """从反向索引中移除一条关联，返回该键是否已无节点引用（调用方持有锁）"""
+        nodes = self._nodes_by_key.get(key)
+        if nodes is None:
+            return True
+        nodes.discard(node_id)
+        if not nodes:
+            del self._nodes_by_key[key]
+            return True
+        return False
+
+
+def estimate_nbytes(value, _seen=None):
+    """
+    估算对象实际占用的内存字节数（numpy数组、bytes、嵌套的dict/list等）
+
+    同一对象被多次引用时只计算一次（例如伪类型输出与真实类型输出共享同一个数组）。
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_nbytes(k, _seen) + estimate_nbytes(v, _seen)
+                                          for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_nbytes(item, _seen) for item in value)
+    return sys.getsizeof(value)
+
+
+class BufferPool:
+    """
+    单个节点的输出缓冲区池
+
+    记录通过alloc分配给节点的数组。再次分配相同形状和类型的数组时，如果之前的某个数组
+    已经没有池以外的引用（已被缓存淘汰、下游和预览都不再使用），直接复用它，
+    避免拖动滑块时同一个节点反复申请和释放同样大小的内存块。
+
+    池同时记录包含这些缓冲区的输出存入节点缓存时的缓存键：同一组形状只保留最新的一项，
+    被取代的旧缓存项由引擎移出缓存，缓冲区随即回到池中（见 swap_cache_key）。
+    """
+    # 每个节点最多记录的缓冲区数量，更早的缓冲区不再跟踪，由Python正常释放
+    MAX_BUFFERS = 4
+
+    def __init__(self, max_buffers=None):
+        self.max_buffers = max_buffers or self.MAX_BUFFERS
+        self._buffers = []
+        # 缓冲区形状签名 -> 最近存入节点缓存的、包含本池缓冲区的输出的缓存键
+        self._cache_keys = {}
+        self._lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def alloc(self, shape, dtype=np.float32):
+        """
+        分配可写数组，内容未初始化（与np.empty相同），调用方需要写满整个数组
+
+        参数:
+            shape: 数组形状
+            dtype: 数据类型，默认float32
+        """
+        shape = tuple(int(n) for n in shape) if isinstance(shape, (tuple, list)) else (int(shape),)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for index in range(len(self._buffers)):
+                buffer = self._buffers[index]
+                if buffer.shape != shape or buffer.dtype != dtype:
+                    continue
+                # 引用只剩池中的列表、局部变量和getrefcount的参数时，数组已不再被使用
+                if sys.getrefcount(buffer) > 3:
+                    continue
+                buffer.flags.writeable = True
+                # 移到末尾，列表按最近分配的顺序排列
+                self._buffers.append(self._buffers.pop(index))
+                self.reuses += 1
+                return buffer
+
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers.append(buffer)
+            if len(self._buffers) > self.max_buffers:
+                self._buffers.pop(0)
+            self.allocations += 1
+            return buffer
+
+    def tracks(self, array):
+        """数组是否由本池分配并仍在跟踪"""
+        with self._lock:
+            return any(buffer is array for buffer in self._buffers)
+
+    def swap_cache_key(self, arrays, cache_key):
+        """
+        记录包含本池缓冲区的输出存入节点缓存时使用的缓存键
+
+        参数:
+            arrays: 输出中由本池分配的数组
+            cache_key: 缓存键
+
+        返回:
+            被取代的同形状输出的缓存键（调用方把它移出缓存，使其缓冲区可以复用），没有时返回None
+        """
+        signature = tuple(sorted((array.shape, array.dtype.str) for array in arrays))
+        with self._lock:
+            previous_key = self._cache_keys.get(signature)
+            self._cache_keys[signature] = cache_key
+        return previous_key if previous_key != cache_key else None
+
+    def clear(self):
+        """不再跟踪任何缓冲区"""
+        with self._lock:
+            self._buffers = []
+            self._cache_keys = {}
+
+    def get_stats(self):
+        """获取分配统计信息"""
+        with self._lock:
+            idle_bytes = sum(buffer.nbytes for buffer in self._buffers if sys.getrefcount(buffer) <= 3)
+            return {
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+                'tracked': len(self._buffers),
+                'idle_bytes': idle_bytes
+            }
+
+
+class WeakOutputs:
+    """
+    节点输出的弱引用记录
+
+    数组只保留弱引用，不会阻止已释放的中间结果被回收（缓存仍持有时可以继续取回），
+    元数据等其他值直接保留。
+    """
+
+    def __init__(self, outputs):
+        self._refs = {}
+        self._values = {}
+        for key, value in outputs.items():
+            if isinstance(value, np.ndarray):
+                self._refs[key] = weakref.ref(value)
+            else:
+                self._values[key] = value
+
+    def resolve(self):
+        """返回输出字典，任意数组已被回收时返回None"""
+        outputs = dict(self._values)
+        for key, ref in self._refs.items():
+            value = ref()
+            if value is None:
+                return None
+            outputs[key] = value
+        return outputs
+
+
+def get_physical_memory_bytes():
+    """获取物理内存总量（字节），无法获取时返回None"""
+    try:
+        if platform.system() == 'Windows':
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullTotalPhys)
+            return None
+        return int(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class LRUCache:
+    """
+    按字节预算管理的节点输出缓存（线程安全，可被并行处理的节点同时访问）
+
+    每个缓存项按实际内存占用计量。超出条目数或字节预算时，采用成本感知的淘汰策略
+    (GreedyDual-Size)：优先级 = 全局老化值 + 重算耗时 / 字节数，淘汰优先级最低的项，
+    因此又大又便宜的结果先被淘汰，小而昂贵的结果保留更久；成本相同时退化为LRU。
+    优先级保存在最小堆中，每次淘汰的开销为O(log n)；刷新或移除缓存项时不从堆中删除旧项，
+    旧项在弹出时按序号识别为过期并丢弃，堆中过期项过多时整体重建。
+    """
+    def __init__(self, max_size=100, max_bytes=None):
+        """
+        初始化缓存
+
+        参数:
+            max_size: 缓存的最大条目数
+            max_bytes: 缓存的最大字节数，None表示不限制
+        """
+        self.cache = OrderedDict()
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entry_bytes = {}     # key -> 字节数
+        self._entry_costs = {}     # key -> 重算耗时（秒）
+        self._priorities = {}      # key -> GreedyDual 优先级
+        self._heap = []            # (优先级, 序号, key) 最小堆，序号越小表示越久未使用
+        self._heap_seq = {}        # key -> 该项在堆中有效记录的序号
+        self._sequence = itertools.count()
+        self._inflation = 0.0      # 全局老化值，等于最近一次被淘汰项的优先级
+        self._lock = threading.RLock()
+        # 淘汰回调 on_evict(key, value, cost)，用于把淘汰项转移到下一级缓存
+        self.on_evict = None
+
+    def _priority_for(self, key):
+        # 成本按"每MB重算秒数"计，避免数值过小
+        size_mb = max(self._entry_bytes.get(key, 0), 1) / (1024 * 1024)
+        return self._inflation + self._entry_costs.get(key, 0.0) / size_mb
+
+    def _refresh_priority(self, key):
+        """重新计算缓存项的优先级并放入堆中，该项之前的堆记录随之过期"""
+        priority = self._priority_for(key)
+        seq = next(self._sequence)
+        self._priorities[key] = priority
+        self._heap_seq[key] = seq
+        heapq.heappush(self._heap, (priority, seq, key))
+        if len(self._heap) > 2 * len(self.cache) + 64:
+            # 频繁命中的缓存项会在堆中留下大量过期记录，只保留有效记录重建
+            self._heap = [(self._priorities[k], self._heap_seq[k], k) for k in self.cache]
+            heapq.heapify(self._heap)
+
+    def get(self, key):
+        """
+        从缓存中获取值，如果存在则移动到最近使用位置并刷新优先级
+
+        参数:
+            key: 缓存键
+
+        返回:
+            缓存的值，如果不存在则返回None
+        """
+        with self._lock:
+            if key in self.cache:
+                # 移到最近使用的位置
+                value = self.cache.pop(key)
+                self.cache[key] = value
+                self._refresh_priority(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+            return None
+
+    def put(self, key, value, cost=None):
+        """
+        将键值对放入缓存，超出条目数或字节预算时按成本感知策略淘汰
+
+        参数:
+            key: 缓存键
+            value: 要缓存的值
+            cost: 重新计算该值所需的时间（秒），None表示未知
+
+        返回:
+            是否成功放入缓存（单项超过整个字节预算时不缓存，直接交给淘汰回调）
+        """
+        nbytes = estimate_nbytes(value)
+        evicted = []
+        with self._lock:
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                evicted.append((key, value, cost))
+                stored = False
+            else:
+                if key in self.cache:
+                    self._remove_entry(key)
+
+                self.cache[key] = value
+                self._entry_bytes[key] = nbytes
+                self._entry_costs[key] = float(cost) if cost else 0.0
+                self._refresh_priority(key)
+                self.current_bytes += nbytes
+
+                while len(self.cache) > 1 and (
+                        len(self.cache) > self.max_size or
+                        (self.max_bytes is not None and self.current_bytes > self.max_bytes)):
+                    victim = self._evict_one(exclude_key=key)
+                    if victim is None:
+                        break
+                    evicted.append(victim)
+                stored = True
+
+        # 淘汰回调可能涉及磁盘写入，在锁外执行，避免阻塞其他线程的缓存访问
+        if self.on_evict is not None:
+            for evicted_key, evicted_value, evicted_cost in evicted:
+                try:
+                    self.on_evict(evicted_key, evicted_value, evicted_cost)
+                except Exception as e:
+                    print(f"处理缓存淘汰项时出错: {e}")
+        return stored
+
+    def _evict_one(self, exclude_key=None):
+        """
+        淘汰优先级最低的一项（从堆顶弹出，优先级相同时淘汰最久未使用的）
+
+        返回:
+            (key, value, cost) 元组，没有可淘汰项时返回None
+        """
+        victim = None
+        victim_priority = None
+        excluded = None
+        while self._heap:
+            priority, seq, candidate = heapq.heappop(self._heap)
+            if self._heap_seq.get(candidate) != seq:
+                # 过期的堆记录（该项已被移除或优先级已刷新）
+                continue
+            if candidate == exclude_key:
+                excluded = (priority, seq, candidate)
+                continue
+            victim, victim_priority = candidate, priority
+            break
+        if excluded is not None:
+            heapq.heappush(self._heap, excluded)
+        if victim is None:
+            return None
+        self._inflation = max(self._inflation, victim_priority)
+        value = self.cache[victim]
+        cost = self._entry_costs.get(victim, 0.0)
+        self._remove_entry(victim)
+        self.evictions += 1
+        return victim, value, cost
+
+    def _remove_entry(self, key):
+        del self.cache[key]
+        self.current_bytes -= self._entry_bytes.pop(key, 0)
+        self._entry_costs.pop(key, None)
+        self._priorities.pop(key, None)
+        self._heap_seq.pop(key, None)
+
+    def remove(self, key):
+        """
+        移除指定缓存项
+
+        返回:
+            是否确实移除了缓存项
+        """
+        with self._lock:
+            if key in self.cache:
+                self._remove_entry(key)
+                return True
+            return False
+
+    def keys(self):
+        """返回当前所有缓存键的快照列表"""
+        with self._lock:
+            return list(self.cache.keys())
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self.cache.clear()
+            self._entry_bytes.clear()
+            self._entry_costs.clear()
+            self._priorities.clear()
+            self._heap = []
+            self._heap_seq.clear()
+            self.current_bytes = 0
+            self._inflation = 0.0
+
+    def get_hit_rate(self):
+        """
+        返回缓存命中率
+
+        返回:
+            缓存命中率，范围为0.0到1.0
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def get_stats(self):
+        """
+        返回缓存统计信息
+
+        返回:
+            包含缓存统计信息的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            hit_rate = self.hits / total if total > 0 else 0.0
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'total_requests': total,
+                'hit_rate': hit_rate,
+                'current_size': len(self.cache),
+                'max_size': self.max_size,
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions
+            }
+
+
+class DiskSpillCache:
+    """
+    节点缓存的磁盘二级缓存
+
+    内存缓存淘汰的输出以原始.npy文件写入缓存文件夹，命中时用np.load(mmap_mode='r')只读映射，
+    只有实际访问到的页面才会被读入内存。每个缓存项是一个以缓存键命名的子目录，包含manifest.json
+    和若干.npy文件；超过容量上限时按manifest的访问时间(atime)淘汰最久未使用的项。
+
+    同一个类也用作跨会话的持久化缓存（clear_on_start=False, verify_checksums=True），
+    此时每个数组额外记录内容校验和，每个缓存项在每次会话中第一次读取时完整校验一次。
+
+    作为内存缓存的淘汰回调时使用 put_async：写盘在后台线程中进行，淘汰发生在求值线程中，
+    不应等待磁盘；写完之前的缓存项直接从待写队列中返回。
+    """
+    MANIFEST_NAME = 'manifest.json'
+    FORMAT_VERSION = 1
+
+    def __init__(self, folder, max_bytes, clear_on_start=True, verify_checksums=False, max_pending_bytes=None):
+        """
+        初始化磁盘缓存
+
+        参数:
+            folder: 缓存文件夹
+            max_bytes: 磁盘占用上限（字节）
+            clear_on_start: 是否在启动时清空文件夹（临时缓存不跨会话保留）
+            verify_checksums: 是否记录并校验数组内容的校验和（跨会话保留的缓存应启用）
+            max_pending_bytes: put_async 待写队列占用内存的上限（字节），超过时在调用线程中直接写入；None表示不限制
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.verify_checksums = verify_checksums
+        self._verified = set()  # 本次会话中已通过校验的缓存项
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._entries = {}  # key -> 磁盘占用字节数
+        self._lock = threading.RLock()
+        # 后台写入的待写队列：目录名 -> (key, value, 字节数)，写完后移除
+        self._pending = {}
+        self.pending_bytes = 0
+        self.max_pending_bytes = max_pending_bytes
+        self._writer = None
+
+        if clear_on_start:
+            shutil.rmtree(folder, ignore_errors=True)
+        os.makedirs(folder, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """扫描缓存文件夹，重建索引并清理写入中断留下的临时目录"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            for name in os.listdir(self.folder):
+                entry_dir = os.path.join(self.folder, name)
+                if not os.path.isdir(entry_dir):
+                    continue
+                if name.startswith('.tmp-') or not os.path.exists(os.path.join(entry_dir, self.MANIFEST_NAME)):
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                    continue
+                size = self._dir_size(entry_dir)
+                self._entries[name] = size
+                self.current_bytes += size
+            self._enforce_budget()
+
+    @staticmethod
+    def _dir_size(entry_dir):
+        total = 0
+        for file_name in os.listdir(entry_dir):
+            try:
+                total += os.path.getsize(os.path.join(entry_dir, file_name))
+            except OSError:
+                pass
+        return total
+
+    @staticmethod
+    def _array_checksum(array):
+        """计算数组内容的校验和（连续数组直接读取其内存，不额外复制）"""
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(memoryview(np.ascontiguousarray(array)).cast('B'))
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _entry_name(key):
+        """缓存键是十六进制指纹时直接作为目录名，否则取其哈希"""
+        key = str(key)
+        if re.fullmatch(r'[0-9a-f]{8,128}', key):
+            return key
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _encode(self, value, arrays, array_ids):
+        """把输出值编码为可写入manifest的结构，数组放入arrays列表（同一数组只保存一次）"""
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise TypeError("不支持对象数组")
+            index = array_ids.get(id(value))
+            if index is None:
+                index = len(arrays)
+                arrays.append(value)
+                array_ids[id(value)] = index
+            return {'t': 'ndarray', 'i': index}
+        if isinstance(value, np.generic):
+            return {'t': 'scalar', 'dtype': value.dtype.str, 'v': value.item()}
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {'t': 'value', 'v': value}
+        if isinstance(value, dict):
+            if not all(isinstance(k, str) for k in value):
+                raise TypeError("字典键必须是字符串")
+            return {'t': 'dict', 'v': {k: self._encode(v, arrays, array_ids) for k, v in value.items()}}
+        if isinstance(value, (list, tuple)):
+            return {'t': 'tuple' if isinstance(value, tuple) else 'list',
+                    'v': [self._encode(v, arrays, array_ids) for v in value]}
+        raise TypeError(f"不支持的类型: {type(value).__name__}")
+
+    def _decode(self, encoded, arrays):
+        kind = encoded['t']
+        if kind == 'ndarray':
+            return arrays[encoded['i']]
+        if kind == 'scalar':
+            return np.dtype(encoded['dtype']).type(encoded['v'])
+        if kind == 'value':
+            return encoded['v']
+        if kind == 'dict':
+            return {k: self._decode(v, arrays) for k, v in encoded['v'].items()}
+        if kind == 'list':
+            return [self._decode(v, arrays) for v in encoded['v']]
+        if kind == 'tuple':
+            return tuple(self._decode(v, arrays) for v in encoded['v'])
+        raise ValueError(f"未知的编码类型: {kind}")
+
+    def contains(self, key):
+        with self._lock:
+            name = self._entry_name(key)
+            return name in self._entries or name in self._pending
+
+    def put_async(self, key, value, cost=None):
+        """
+        在后台线程中把节点输出写入磁盘，参数与 put 相同
+
+        写完之前 get 直接返回 value 本身（数组只读，与调用方共享）。
+        待写队列超过 max_pending_bytes 时退化为在调用线程中同步写入，避免淘汰项在内存中堆积。
+
+        返回:
+            是否已接受写入（同步写入时为 put 的结果）
+        """
+        name = self._entry_name(key)
+        nbytes = estimate_nbytes(value)
+        with self._lock:
+            if name in self._pending:
+                return True
+            if name in self._entries:
+                self._touch(name)
+                return True
+            queue_full = (self.max_pending_bytes is not None and
+                          self.pending_bytes + nbytes > self.max_pending_bytes)
+            if not queue_full:
+                item = (key, value, nbytes)
+                self._pending[name] = item
+                self.pending_bytes += nbytes
+                if self._writer is None:
+                    self._writer = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1, thread_name_prefix="TNXDiskCacheWriter")
+                self._writer.submit(self._write_pending, name, item)
+                return True
+        return self.put(key, value, cost)
+
+    def _write_pending(self, name, item):
+        """后台写入线程：写入待写队列中的一项"""
+        with self._lock:
+            if self._pending.get(name) is not item:
+                # 写入前已被移除或清空
+                return
+        key, value, nbytes = item
+        try:
+            self.put(key, value)
+        except Exception as e:
+            print(f"后台写入磁盘缓存失败: {e}")
+        with self._lock:
+            if self._pending.get(name) is item:
+                del self._pending[name]
+                self.pending_bytes -= nbytes
+                return
+        # 写入期间被移除或清空，刚写入的缓存项同样作废
+        self.remove(key)
+
+    def put(self, key, value, cost=None):
+        """
+        把一个节点输出字典写入磁盘
+
+        参数:
+            key: 缓存键
+            value: 节点输出字典
+            cost: 重新计算耗时（秒），目前仅用于与内存缓存的回调接口保持一致
+
+        返回:
+            是否成功写入（包含不支持序列化的对象或超过容量上限时返回False）
+        """
+        name = self._entry_name(key)
+        with self._lock:
+            if name in self._entries:
+                self._touch(name)
+                return True
+
+        arrays = []
+        try:
+            outputs = self._encode(value, arrays, {})
+        except TypeError as e:
+            print(f"输出无法写入磁盘缓存，跳过: {e}")
+            return False
+
+        total_bytes = sum(int(array.nbytes) for array in arrays)
+        if total_bytes > self.max_bytes:
+            return False
+
+        entry_dir = os.path.join(self.folder, name)
+        tmp_dir = os.path.join(self.folder, f".tmp-{name}-{threading.get_ident()}")
+        try:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            array_info = []
+            for index, array in enumerate(arrays):
+                file_name = f"{index}.npy"
+                np.save(os.path.join(tmp_dir, file_name), np.ascontiguousarray(array), allow_pickle=False)
+                info = {'file': file_name, 'shape': list(array.shape), 'dtype': array.dtype.str}
+                if self.verify_checksums:
+                    info['blake2b'] = self._array_checksum(array)
+                array_info.append(info)
+            manifest = {
+                'version': self.FORMAT_VERSION,
+                'key': str(key),
+                'created': time.time(),
+                'arrays': array_info,
+                'outputs': outputs,
+            }
+            with open(os.path.join(tmp_dir, self.MANIFEST_NAME), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            # 整个目录写完后再重命名，读取方不会看到写了一半的缓存项
+            os.replace(tmp_dir, entry_dir)
+        except OSError as e:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if os.path.exists(os.path.join(entry_dir, self.MANIFEST_NAME)):
+                # 另一个线程已写入同一缓存项
+                return True
+            print(f"写入磁盘缓存失败: {e}")
+            return False
+
+        size = self._dir_size(entry_dir)
+        with self._lock:
+            self._entries[name] = size
+            self.current_bytes += size
+            self.writes += 1
+            # 刚写入的数据就是计算校验和时的数据，本次会话中无需再校验
+            self._verified.add(name)
+            self._enforce_budget(exclude_name=name)
+        return True
+
+    def get(self, key):
+        """
+        读取缓存项，数组以只读内存映射方式打开
+
+        返回:
+            节点输出字典，不存在或校验失败时返回None
+        """
+        name = self._entry_name(key)
+        with self._lock:
+            pending = self._pending.get(name)
+            if pending is not None:
+                self.hits += 1
+                return pending[1]
+            if name not in self._entries:
+                self.misses += 1
+                return None
+
+        entry_dir = os.path.join(self.folder, name)
+        try:
+            with open(os.path.join(entry_dir, self.MANIFEST_NAME), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') != self.FORMAT_VERSION or manifest.get('key') != str(key):
+                raise ValueError("manifest与缓存键不匹配")
+            arrays = []
+            for info in manifest['arrays']:
+                array = np.load(os.path.join(entry_dir, info['file']), mmap_mode='r', allow_pickle=False)
+                if list(array.shape) != info['shape'] or array.dtype.str != info['dtype']:
+                    raise ValueError(f"数组 {info['file']} 的形状或类型与manifest不符")
+                if self.verify_checksums and name not in self._verified:
+                    if info.get('blake2b') != self._array_checksum(array):
+                        raise ValueError(f"数组 {info['file']} 的校验和不匹配")
+                arrays.append(array)
+            value = self._decode(manifest['outputs'], arrays)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"磁盘缓存项 {name} 损坏，已移除: {e}")
+            self.remove(key)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._verified.add(name)
+            self._touch(name)
+            self.hits += 1
+        return value
+
+    def _touch(self, name):
+        """更新manifest的访问时间（很多文件系统以noatime挂载，不能依赖读取自动更新）"""
+        try:
+            os.utime(os.path.join(self.folder, name, self.MANIFEST_NAME), None)
+        except OSError:
+            pass
+
+    def _enforce_budget(self, exclude_name=None):
+        """超过容量上限时按访问时间淘汰最久未使用的缓存项（调用方持有锁）"""
+        if self.current_bytes <= self.max_bytes:
+            return
+        candidates = []
+        for name in self._entries:
+            if name == exclude_name:
+                continue
+            try:
+                atime = os.stat(os.path.join(self.folder, name, self.MANIFEST_NAME)).st_atime
+            except OSError:
+                atime = 0
+            candidates.append((atime, name))
+        candidates.sort()
+        for _, name in candidates:
+            if self.current_bytes <= self.max_bytes:
+                break
+            self._remove_name(name)
+            self.evictions += 1
+
+    def _remove_name(self, name):
+        self.current_bytes -= self._entries.pop(name, 0)
+        self._verified.discard(name)
+        # Windows下仍被内存映射的文件无法删除，残留文件在下次启动时清理
+        shutil.rmtree(os.path.join(self.folder, name), ignore_errors=True)
+
+    def _drop_pending(self, name):
+        item = self._pending.pop(name, None)
+        if item is not None:
+            self.pending_bytes -= item[2]
+        return item is not None
+
+    def remove(self, key):
+        """移除指定缓存项（包括尚未写入的），返回是否确实移除"""
+        name = self._entry_name(key)
+        with self._lock:
+            removed = self._drop_pending(name)
+            if name in self._entries:
+                self._remove_name(name)
+                return True
+            return removed
+
+    def clear(self):
+        """清空磁盘缓存"""
+        with self._lock:
+            self._pending.clear()
+            self.pending_bytes = 0
+            for name in list(self._entries):
+                self._remove_name(name)
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.writes = 0
+            self.evictions = 0
+
+    def get_stats(self):
+        """
+        返回磁盘缓存统计信息
+
+        返回:
+            包含磁盘缓存统计信息的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total > 0 else 0.0,
+                'writes': self.writes,
+                'evictions': self.evictions,
+                'current_size': len(self._entries),
+                'current_bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'pending': len(self._pending),
+                'pending_bytes': self.pending_bytes
+            }
+
+    def flush(self):
+        """等待待写队列中的缓存项全部写入"""
+        writer = self._writer
+        if writer is not None:
+            # 单线程写入按提交顺序执行，等待最后提交的空任务即可
+            writer.submit(lambda: None).result()
+
+    def close(self):
+        """丢弃尚未写入的缓存项并停止后台写入线程（等待正在写入的一项完成）"""
+        with self._lock:
+            self._pending.clear()
+            self.pending_bytes = 0
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.shutdown(wait=True)
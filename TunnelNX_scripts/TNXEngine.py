@@ -0,0 +1,3296 @@
+"""
+TunnelNX 节点图引擎
+
+不依赖Qt的节点图求值核心：节点图邻接索引、内容指纹、节点缓存、提前截止、中间结果释放、
+原地执行、分块处理和并行调度器。主程序（Tunnel Next.py）通过子类接入界面状态，
+命令行渲染（tunnelnx.py）和批处理（TNXBatch.py）直接使用本模块，可以在没有显示器的服务器上运行。
+脚本头部解析和输出数组的只读/写时复制规则也在这里定义，保证各处对脚本的解释一致。
+
+无界面使用时：
+- 只按需加载节点图引用到的脚本，不扫描执行整个脚本文件夹
+- 上下文中没有界面状态（缩放、视口尺寸等），'app' 指向引擎本身
+- 默认不使用磁盘二级缓存和持久化缓存（由调用方通过 init_disk_cache 开启）
+"""
+import os
+import re
+import sys
+import copy
+import json
+import time
+import hashlib
+import datetime
+import tempfile
+import threading
+import configparser
+import importlib.util
+import concurrent.futures
+
+import numpy as np
+
+from TunnelNX_scripts.TNXCache import (
+    CacheKeyIndex, BufferPool, WeakOutputs, LRUCache, DiskSpillCache, get_physical_memory_bytes
+)
+
+# 图像类型端口，保存结果时按这些类型查找输出
+IMAGE_PORT_TYPES = ('f32bmp', 'tif16', 'img')
+# 支持保存的图像格式
+SAVE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff')
+
+
+class TNXEngineError(Exception):
+    """节点图加载、参数设置或计算失败"""
+
+
+def parse_script_header(file_path, verbose=True):
+    """
+    解析脚本头部信息，包括：
+    1. 前四行注释：inputs、outputs、description、color
+    2. 可选第五行：Type:NeoScript 标记（识别 NeoScript）
+    3. 可选的SupportedFeatures特性标记，格式为：
+       #SupportedFeatures:Feature1=True,Feature2=42,Feature3="字符串值"
+    返回值字典包含：
+       - inputs: 输入参数列表（字符串列表）
+       - outputs: 输出参数列表
+       - description: 脚本描述（字符串）
+       - color: 颜色字符串（支持自动在 6 位十六进制前添加 “#”）
+       - script_type: 'legacy' 或 'neo'
+       - supported_features: 支持特性字典，键为特性名，值为 bool/int/float/str
+       - flexible_inputs/outputs: 灵活端口列表
+    verbose 为 False 时不打印解析过程
+    """
+    try:
+        # 读取并剔除首尾空白（部分脚本带有UTF-8 BOM，用utf-8-sig读取，否则第一行不以#开头）
+        with open(file_path, 'r', encoding='utf-8-sig') as file:
+            lines = [line.strip() for line in file.readlines()]
+
+        # --- 基本注释行检查 ---
+        if len(lines) < 4:
+            if verbose:
+                print(f"脚本 {file_path} 行数不足，至少需要4行注释头")
+            return None
+        if not all(line.startswith('#') for line in lines[:4]):
+            if verbose:
+                print(f"脚本 {file_path} 前4行应当是注释")
+            return None
+
+        # --- 提取前四行信息 ---
+        # 第一行：inputs 列表，逗号分隔
+        inputs = lines[0][1:].strip()
+        # 第二行：outputs 列表
+        outputs = lines[1][1:].strip()
+        # 第三行：description 描述
+        description = lines[2][1:].strip()
+        # 第四行：color 字符串（可能需要加 #）
+        raw_color_str = lines[3][1:].strip()
+
+        # --- 颜色格式修正 ---
+        processed_color = raw_color_str
+        if re.match(r'^[0-9a-fA-F]{6}$', raw_color_str):
+            processed_color = '#' + raw_color_str
+            if verbose:
+                print(f"  Info: Detected 6-char hex '{raw_color_str}', adding #: '{processed_color}'")
+
+        # --- NeoScript 类型检测（可选第五行） ---
+        script_type = 'legacy'  # 默认为旧版脚本
+        if len(lines) >= 5 and lines[4].startswith('#') and 'Type:NeoScript' in lines[4]:
+            script_type = 'neo'
+            if verbose:
+                print(f"检测到 NeoScript: {os.path.basename(file_path)}")
+
+        # --- 新的SupportedFeatures解析系统 ---
+        supported_features = {}
+
+        # 检查所有行，找到SupportedFeatures标记
+        script_name = os.path.basename(file_path)
+        if verbose:
+            print(f"解析脚本特性: {script_name}")
+
+        for line in lines[4:]:  # 从第五行开始检查
+            if line.startswith('#SupportedFeatures:'):
+                if verbose:
+                    print(f"  发现SupportedFeatures标记: {line}")
+                # 去掉注释符号和标记，保留冒号后的内容
+                features_str = line[len('#SupportedFeatures:'):].strip()
+
+                # 如果特性字符串为空，跳过解析
+                if not features_str:
+                    if verbose:
+                        print(f"  空特性字符串，跳过解析")
+                    continue
+
+                # 按逗号分隔特性列表
+                feature_items = features_str.split(',')
+                if verbose:
+                    print(f"  特性列表: {feature_items}")
+
+                for item in feature_items:
+                    item = item.strip()
+                    # 跳过空项
+                    if not item:
+                        continue
+
+                    # 使用等号分隔键值对
+                    if '=' in item:
+                        key, val_str = item.split('=', 1)
+                        key = key.strip()
+                        val_str = val_str.strip()
+                        if verbose:
+                            print(f"  解析特性: {key} = {val_str}")
+
+                        # 处理引号包围的字符串
+                        if (val_str.startswith('"') and val_str.endswith('"')) or \
+                           (val_str.startswith("'") and val_str.endswith("'")):
+                            val = val_str[1:-1]  # 去除引号
+                        # 尝试类型转换
+                        else:
+                            try:
+                                if val_str.lower() == 'true':
+                                    val = True
+                                elif val_str.lower() == 'false':
+                                    val = False
+                                elif '.' in val_str:
+                                    val = float(val_str)
+                                else:
+                                    val = int(val_str)
+                            except ValueError:
+                                val = val_str
+
+                        supported_features[key] = val
+                                        # 特性已经在解析时输出，这里不需要单独处理
+
+        # --- 处理输入输出类型，识别灵活端口 ---
+        input_list = []
+        flexible_inputs = []
+        if inputs:
+            for i in inputs.split(','):
+                i = i.strip()
+                if i.endswith(':'):  # 检测灵活端口
+                    flexible_inputs.append(i[:-1])  # 去掉冒号保存
+                    input_list.append(i[:-1])  # 同时加入普通输入列表（去掉冒号）
+                else:
+                    input_list.append(i)
+
+        output_list = []
+        flexible_outputs = []
+        if outputs:
+            for o in outputs.split(','):
+                o = o.strip()
+                if o.endswith(':'):  # 检测灵活端口
+                    flexible_outputs.append(o[:-1])  # 去掉冒号保存
+                    output_list.append(o[:-1])  # 同时加入普通输出列表（去掉冒号）
+                else:
+                    output_list.append(o)
+
+        # --- 输出灵活端口信息 ---
+        if flexible_inputs:
+            if verbose:
+                print(f"检测到灵活输入端口: {', '.join(flexible_inputs)}")
+        if flexible_outputs:
+            if verbose:
+                print(f"检测到灵活输出端口: {', '.join(flexible_outputs)}")
+
+        # --- 构造并返回结果字典 ---
+        # 输出解析结果总结
+        if supported_features:
+            if verbose:
+                print(f"脚本 {os.path.basename(file_path)} 解析到的特性:")
+            for feature_key, feature_value in supported_features.items():
+                if verbose:
+                    print(f"  - {feature_key}: {feature_value} (类型: {type(feature_value).__name__})")
+        else:
+            if verbose:
+                print(f"脚本 {os.path.basename(file_path)} 没有特性定义")
+
+        return {
+            'inputs': input_list,
+            'outputs': output_list,
+            'description': description,
+            'color': processed_color,
+            'script_type': script_type,
+            'supported_features': supported_features,
+            'flexible_inputs': flexible_inputs,
+            'flexible_outputs': flexible_outputs
+        }
+
+    except Exception as e:
+        print(f"解析脚本头部出错 {file_path}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+
+def freeze_outputs(value, _seen=None):
+    """
+    将节点输出中的numpy数组设为只读（原地修改flags，不复制数据）
+
+    缓存与下游节点共享同一份数组，只读标志保证任何节点都无法意外修改上游结果。
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return value
+    _seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for item in value.values():
+            freeze_outputs(item, _seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            freeze_outputs(item, _seen)
+    return value
+
+
+def make_writable(array):
+    """
+    写时复制：返回可写的数组。已可写时原样返回，只读（来自缓存或上游节点）时返回副本
+
+    需要原地修改输入的脚本应先调用此函数，例如:
+        img = context['make_writable'](inputs['f32bmp'])
+    """
+    if isinstance(array, np.ndarray) and not array.flags.writeable:
+        return array.copy()
+    return array
+
+
+def scan_scripts(scripts_folder):
+    """
+    扫描脚本文件夹，只解析脚本头部，不执行脚本
+
+    参数:
+        scripts_folder: 脚本文件夹路径
+
+    返回:
+        dict: 相对脚本文件夹的路径（使用'/'分隔） -> {'path': 脚本路径, 'info': 头部信息}
+    """
+    registry = {}
+    for root, dirs, files in os.walk(scripts_folder):
+        for file in files:
+            if not file.endswith(".py"):
+                continue
+            file_path = os.path.join(root, file)
+            script_info = parse_script_header(file_path, verbose=False)
+            if not script_info:
+                continue
+            rel_path = os.path.relpath(file_path, scripts_folder).replace(os.sep, '/')
+            registry[rel_path] = {'path': file_path, 'info': script_info}
+    return registry
+
+
+def load_pseudo_types(config):
+    """
+    读取配置中的伪类型定义
+
+    参数:
+        config: configparser.ConfigParser
+
+    返回:
+        dict: 伪类型 -> 真实类型
+    """
+    pseudo_types = {}
+    if 'Pseudo Type' in config:
+        for real_type, aliases in config['Pseudo Type'].items():
+            for alias in aliases.split(','):
+                pseudo_types[alias.strip()] = real_type
+    return pseudo_types
+
+
+class MetadataManager:
+    """元数据管理器 - 负责处理节点图中的元数据流"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def create_metadata(self, **kwargs):
+        """创建新的元数据字典"""
+        with self._lock:
+            metadata = {
+                'created_at': datetime.datetime.now().isoformat(),
+                'node_path': [],  # 记录经过的节点路径
+                'processing_history': [],  # 记录处理历史
+                **kwargs
+            }
+            return metadata
+
+    def merge_metadata(self, *metadata_dicts):
+        """合并多个元数据字典，后面的会覆盖前面的同名键"""
+        with self._lock:
+            merged = {}
+            for metadata in metadata_dicts:
+                if isinstance(metadata, dict):
+                    merged.update(metadata)
+            return merged
+
+    def copy_metadata(self, metadata):
+        """深拷贝元数据"""
+        if not isinstance(metadata, dict):
+            return {}
+        return copy.deepcopy(metadata)
+
+    def add_node_to_path(self, metadata, node_id, node_title):
+        """向元数据的节点路径中添加节点（优化版本）
+
+        优化点：
+        1. 只保存节点ID和标题，不保存处理时间
+        2. 避免重复添加相同的节点
+        3. 限制路径长度，防止无限增长
+        """
+        if not isinstance(metadata, dict):
+            metadata = {}
+
+        if 'node_path' not in metadata:
+            metadata['node_path'] = []
+
+        # 检查节点是否已经在路径中（避免重复）
+        for existing_node in metadata['node_path']:
+            if (isinstance(existing_node, dict) and
+                existing_node.get('node_id') == node_id):
+                # 节点已存在，不重复添加
+                return metadata
+            elif existing_node == node_id:
+                # 兼容旧格式（直接存储node_id）
+                return metadata
+
+        # 添加新节点（只保存ID和标题）
+        node_info = {
+            'node_id': node_id,
+            'node_title': node_title
+        }
+
+        metadata['node_path'].append(node_info)
+
+        # 限制路径长度，防止无限增长（保留最近的50个节点）
+        max_path_length = 50
+        if len(metadata['node_path']) > max_path_length:
+            metadata['node_path'] = metadata['node_path'][-max_path_length:]
+
+        return metadata
+
+    def add_processing_record(self, metadata, operation, details=None):
+        """向元数据中添加处理记录（优化版本）
+
+        优化点：
+        1. 不保存时间戳，减少元数据大小
+        2. 限制历史记录数量，防止无限增长
+        3. 简化记录格式
+        """
+        if not isinstance(metadata, dict):
+            metadata = {}
+
+        if 'processing_history' not in metadata:
+            metadata['processing_history'] = []
+
+        # 简化的记录格式（不包含时间戳）
+        record = {
+            'operation': operation
+        }
+
+        # 只保存重要的详情信息
+        if details and isinstance(details, dict):
+            # 只保存脚本类型和输出类型，忽略脚本路径等冗余信息
+            simplified_details = {}
+            if 'script_type' in details:
+                simplified_details['script_type'] = details['script_type']
+            if 'output_types' in details and details['output_types']:
+                simplified_details['output_types'] = details['output_types']
+
+            if simplified_details:
+                record['details'] = simplified_details
+
+        metadata['processing_history'].append(record)
+
+        # 限制历史记录数量，防止无限增长（保留最近的20条记录）
+        max_history_length = 20
+        if len(metadata['processing_history']) > max_history_length:
+            metadata['processing_history'] = metadata['processing_history'][-max_history_length:]
+
+        return metadata
+
+    def get_metadata_value(self, metadata, key, default=None):
+        """安全地获取元数据值"""
+        if not isinstance(metadata, dict):
+            return default
+        return metadata.get(key, default)
+
+    def set_metadata_value(self, metadata, key, value):
+        """设置元数据值"""
+        if not isinstance(metadata, dict):
+            metadata = {}
+        metadata[key] = value
+        return metadata
+
+    def delete_metadata_key(self, metadata, key):
+        """删除元数据键"""
+        if isinstance(metadata, dict) and key in metadata:
+            del metadata[key]
+        return metadata
+
+    def validate_metadata(self, metadata):
+        """验证元数据格式"""
+        if not isinstance(metadata, dict):
+            return False
+
+        # 检查必要的字段
+        required_fields = ['created_at', 'node_path', 'processing_history']
+        for field in required_fields:
+            if field not in metadata:
+                return False
+
+        return True
+
+    def serialize_metadata(self, metadata):
+        """序列化元数据为JSON字符串"""
+        try:
+            import json
+            return json.dumps(metadata, ensure_ascii=False, indent=2)
+        except Exception as e:
+            print(f"元数据序列化失败: {e}")
+            return "{}"
+
+    def deserialize_metadata(self, metadata_str):
+        """从JSON字符串反序列化元数据"""
+        try:
+            import json
+            return json.loads(metadata_str)
+        except Exception as e:
+            print(f"元数据反序列化失败: {e}")
+            return {}
+
+
+class NodeGraphIndex:
+    """
+    节点图邻接索引
+
+    按节点ID维护每个节点的输入/输出连接列表，并缓存拓扑顺序、上下游闭包和预览节点的上游集合，
+    避免各处为了查找相邻节点而线性扫描整个连接列表。索引在连接和节点增删时增量更新，
+    派生数据（拓扑顺序、闭包）在结构变化后按需重新计算。
+    """
+    PREVIEW_NODE_TITLE = '预览节点'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self.nodes_by_id = {}
+            self.input_connections = {}   # node_id -> [conn, ...]
+            self.output_connections = {}  # node_id -> [conn, ...]
+            self.version = 0
+            self._invalidate_derived()
+
+    def _invalidate_derived(self):
+        """结构发生变化，清除所有派生数据"""
+        self.version += 1
+        self._topological_order = None
+        self._upstream_cache = {}
+        self._downstream_cache = {}
+        self._preview_upstream = None
+
+    def rebuild(self, nodes, connections):
+        """根据完整的节点和连接列表重建索引"""
+        with self._lock:
+            self.clear()
+            for node in nodes:
+                self.add_node(node)
+            for conn in connections:
+                self.add_connection(conn)
+
+    def add_node(self, node):
+        with self._lock:
+            node_id = node['id']
+            self.nodes_by_id[node_id] = node
+            self.input_connections.setdefault(node_id, [])
+            self.output_connections.setdefault(node_id, [])
+            self._invalidate_derived()
+
+    def remove_node(self, node):
+        """移除节点以及与之相关的所有连接"""
+        with self._lock:
+            node_id = node['id']
+            for conn in self.input_connections.get(node_id, []) + self.output_connections.get(node_id, []):
+                self._remove_connection_entries(conn)
+            self.nodes_by_id.pop(node_id, None)
+            self.input_connections.pop(node_id, None)
+            self.output_connections.pop(node_id, None)
+            self._invalidate_derived()
+
+    def add_connection(self, conn):
+        with self._lock:
+            self.input_connections.setdefault(conn['input_node']['id'], []).append(conn)
+            self.output_connections.setdefault(conn['output_node']['id'], []).append(conn)
+            self._invalidate_derived()
+
+    def remove_connection(self, conn):
+        with self._lock:
+            self._remove_connection_entries(conn)
+            self._invalidate_derived()
+
+    def _remove_connection_entries(self, conn):
+        for index, node_id in ((self.input_connections, conn['input_node']['id']),
+                               (self.output_connections, conn['output_node']['id'])):
+            conns = index.get(node_id)
+            if conns:
+                index[node_id] = [c for c in conns if c is not conn]
+
+    def get_input_connections(self, node_id):
+        """返回连接到节点输入端口的连接（按输入端口排序的副本）"""
+        with self._lock:
+            return sorted(self.input_connections.get(node_id, []), key=lambda conn: conn['input_port'])
+
+    def get_output_connections(self, node_id):
+        """返回从节点输出端口发出的连接（副本）"""
+        with self._lock:
+            return list(self.output_connections.get(node_id, []))
+
+    def topological_order(self):
+        """返回按拓扑顺序排列的节点ID列表（结构变化后重新计算）"""
+        with self._lock:
+            if self._topological_order is None:
+                in_degree = {node_id: len(self.input_connections.get(node_id, [])) for node_id in self.nodes_by_id}
+                queue = [node_id for node_id, degree in in_degree.items() if degree == 0]
+                order = []
+                while queue:
+                    node_id = queue.pop()
+                    order.append(node_id)
+                    for conn in self.output_connections.get(node_id, []):
+                        downstream_id = conn['input_node']['id']
+                        in_degree[downstream_id] -= 1
+                        if in_degree[downstream_id] == 0:
+                            queue.append(downstream_id)
+                self._topological_order = order
+            return list(self._topological_order)
+
+    def upstream_ids(self, node_id):
+        """返回节点的全部上游节点ID（不包含自身）"""
+        with self._lock:
+            cached = self._upstream_cache.get(node_id)
+            if cached is None:
+                cached = frozenset(self._walk(node_id, self.input_connections, 'output_node'))
+                self._upstream_cache[node_id] = cached
+            return cached
+
+    def downstream_ids(self, node_id):
+        """返回节点的全部下游节点ID（不包含自身）"""
+        with self._lock:
+            cached = self._downstream_cache.get(node_id)
+            if cached is None:
+                cached = frozenset(self._walk(node_id, self.output_connections, 'input_node'))
+                self._downstream_cache[node_id] = cached
+            return cached
+
+    def _walk(self, start_id, adjacency, neighbour_key):
+        visited = set()
+        stack = [start_id]
+        while stack:
+            current_id = stack.pop()
+            for conn in adjacency.get(current_id, []):
+                neighbour_id = conn[neighbour_key]['id']
+                if neighbour_id not in visited:
+                    visited.add(neighbour_id)
+                    stack.append(neighbour_id)
+        visited.discard(start_id)
+        return visited
+
+    def find_preview_node(self):
+        """返回第一个预览节点，没有则返回None"""
+        with self._lock:
+            for node in self.nodes_by_id.values():
+                if node.get('title') == self.PREVIEW_NODE_TITLE:
+                    return node
+            return None
+
+    def preview_upstream_ids(self):
+        """返回预览节点及其全部上游节点的ID集合（缓存，结构变化后重新计算）"""
+        with self._lock:
+            if self._preview_upstream is None:
+                preview_node = self.find_preview_node()
+                if preview_node is None:
+                    self._preview_upstream = frozenset()
+                else:
+                    self._preview_upstream = self.upstream_ids(preview_node['id']) | {preview_node['id']}
+            return self._preview_upstream
+
+    def would_form_cycle(self, output_node_id, input_node_id):
+        """添加 output_node -> input_node 的连接是否会形成环路"""
+        if output_node_id == input_node_id:
+            return True
+        return output_node_id in self.downstream_ids(input_node_id)
+
+
+class NodeProfiler:
+    """
+    求值性能记录
+
+    每次节点图求值记为一次运行，记录其中每个节点的耗时、CPU时间、新分配的内存、输出大小、
+    缓存命中情况和代理层级。只保留最近的若干次运行，可以导出为Chrome trace_event格式，
+    在 chrome://tracing 或 Perfetto 中按线程查看各节点的执行时间线。
+    """
+    # 最多保留的运行数量
+    MAX_RUNS = 20
+
+    def __init__(self, max_runs=None):
+        self.max_runs = max_runs or self.MAX_RUNS
+        self.runs = []
+        self._active_run = None
+        self._run_counter = 0
+        self._lock = threading.Lock()
+        # 时间戳的零点，导出跟踪时所有运行共用同一时间轴
+        self._epoch = time.perf_counter()
+
+    def begin_run(self, proxy_level=0):
+        """
+        开始记录一次求值，已有正在记录的运行时（嵌套求值）返回None
+
+        参数:
+            proxy_level: 本次求值使用的代理层级
+        """
+        with self._lock:
+            if self._active_run is not None:
+                return None
+            self._run_counter += 1
+            run = {
+                'id': self._run_counter,
+                'start': time.perf_counter() - self._epoch,
+                'end': None,
+                'proxy_level': proxy_level,
+                'cancelled': False,
+                'thread': threading.get_ident(),
+                'records': {},
+                'annotations': {}
+            }
+            self._active_run = run
+            return run
+
+    def end_run(self, run, cancelled=False):
+        """结束记录并保存到运行列表"""
+        if run is None:
+            return
+        with self._lock:
+            run['end'] = time.perf_counter() - self._epoch
+            run['cancelled'] = cancelled
+            run['annotations'] = {}
+            if self._active_run is run:
+                self._active_run = None
+            self.runs.append(run)
+            if len(self.runs) > self.max_runs:
+                self.runs.pop(0)
+
+    def active_run(self):
+        """当前正在记录的运行，没有时返回None"""
+        return self._active_run
+
+    def annotate(self, node_id, **fields):
+        """为当前运行中的节点附加字段（缓存命中、分配的内存等），节点记录时合并"""
+        with self._lock:
+            if self._active_run is not None:
+                self._active_run['annotations'].setdefault(node_id, {}).update(fields)
+
+    def record_node(self, run, node, wall_start, wall_end, cpu_time, output_bytes):
+        """
+        记录一个节点的执行
+
+        参数:
+            run: begin_run返回的运行
+            node: 节点
+            wall_start, wall_end: time.perf_counter()的开始和结束时间
+            cpu_time: 执行线程消耗的CPU时间（秒）
+            output_bytes: 输出数组的总字节数
+        """
+        if run is None:
+            return
+        with self._lock:
+            record = {
+                'node_id': node.get('id'),
+                'title': node.get('title', '未知'),
+                'start': wall_start - self._epoch,
+                'wall': wall_end - wall_start,
+                'cpu': cpu_time,
+                'allocated_bytes': 0,
+                'output_bytes': output_bytes,
+                'cache': 'miss',
+                'proxy_level': run['proxy_level'],
+                'thread': threading.get_ident(),
+                'thread_name': threading.current_thread().name
+            }
+            record.update(run['annotations'].pop(node.get('id'), {}))
+            run['records'][node.get('id')] = record
+
+    def last_run(self):
+        """最近一次完成且至少处理了一个节点的运行"""
+        with self._lock:
+            for run in reversed(self.runs):
+                if run['records']:
+                    return run
+            return None
+
+    def critical_path(self, run, edges):
+        """
+        计算运行中的关键路径：沿连接累计耗时最长的节点链，决定了这次求值的最短完成时间
+
+        参数:
+            run: 运行记录
+            edges: [(上游节点ID, 下游节点ID), ...]
+
+        返回:
+            (节点ID列表（从上游到下游）, 总耗时秒数)
+        """
+        if run is None:
+            return [], 0.0
+        times = {node_id: record['wall'] for node_id, record in run['records'].items()}
+        node_ids = set(times)
+        predecessors = {}
+        successors = {}
+        for upstream_id, downstream_id in edges:
+            node_ids.update((upstream_id, downstream_id))
+            predecessors.setdefault(downstream_id, []).append(upstream_id)
+            successors.setdefault(upstream_id, []).append(downstream_id)
+
+        # 按拓扑顺序计算以每个节点结尾的最长路径
+        pending = {node_id: len(predecessors.get(node_id, ())) for node_id in node_ids}
+        ready = [node_id for node_id, count in pending.items() if count == 0]
+        best = {}
+        previous = {}
+        while ready:
+            node_id = ready.pop()
+            incoming = [(best[upstream_id], upstream_id) for upstream_id in predecessors.get(node_id, ()) if upstream_id in best]
+            base, base_id = max(incoming, key=lambda item: item[0]) if incoming else (0.0, None)
+            best[node_id] = base + times.get(node_id, 0.0)
+            previous[node_id] = base_id
+            for downstream_id in successors.get(node_id, ()):
+                pending[downstream_id] -= 1
+                if pending[downstream_id] == 0:
+                    ready.append(downstream_id)
+        if not best:
+            return [], 0.0
+
+        end_id = max(best, key=lambda node_id: best[node_id])
+        total = best[end_id]
+        path = []
+        while end_id is not None:
+            path.append(end_id)
+            end_id = previous.get(end_id)
+        path.reverse()
+        # 去掉两端没有在本次运行中执行的节点
+        while path and path[0] not in times:
+            path.pop(0)
+        while path and path[-1] not in times:
+            path.pop()
+        return path, total
+
+    def to_chrome_trace(self, runs=None):
+        """
+        把运行记录转换为Chrome trace_event格式
+
+        参数:
+            runs: 要导出的运行列表，None表示全部保留的运行
+
+        返回:
+            dict: 可以直接写入JSON文件的跟踪数据
+        """
+        with self._lock:
+            runs = list(self.runs if runs is None else runs)
+        events = []
+        thread_names = {}
+        for run in runs:
+            run_end = run['end'] if run['end'] is not None else run['start']
+            thread_names.setdefault(run['thread'], 'TNXRender')
+            events.append({
+                'name': f"求值 #{run['id']}",
+                'cat': 'run',
+                'ph': 'X',
+                'ts': run['start'] * 1e6,
+                'dur': max(0.0, run_end - run['start']) * 1e6,
+                'pid': 1,
+                'tid': run['thread'],
+                'args': {
+                    'proxy_level': run['proxy_level'],
+                    'cancelled': run['cancelled'],
+                    'node_count': len(run['records'])
+                }
+            })
+            for record in run['records'].values():
+                thread_names[record['thread']] = record['thread_name']
+                events.append({
+                    'name': record['title'],
+                    'cat': f"node,{record['cache']}",
+                    'ph': 'X',
+                    'ts': record['start'] * 1e6,
+                    'dur': record['wall'] * 1e6,
+                    'pid': 1,
+                    'tid': record['thread'],
+                    'args': {
+                        'node_id': record['node_id'],
+                        'run': run['id'],
+                        'cpu_ms': round(record['cpu'] * 1000.0, 3),
+                        'allocated_bytes': record['allocated_bytes'],
+                        'output_bytes': record['output_bytes'],
+                        'cache': record['cache'],
+                        'proxy_level': record['proxy_level']
+                    }
+                })
+        for thread_id, thread_name in thread_names.items():
+            events.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': 1,
+                'tid': thread_id,
+                'args': {'name': thread_name}
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+class TNXEngine:
+    """
+    节点图求值引擎
+
+    主程序和命令行共用同一个引擎：节点图邻接索引、Merkle式内容指纹、节点缓存（内存、磁盘二级和持久化缓存）、
+    提前截止、中间结果释放、原地执行、分块处理和并行调度器都在这里实现，不依赖Qt。
+    主程序通过子类接入界面状态（视图快照、独立预览窗口），并在此之上实现预览、可见区域求值和代理层级选择。
+
+    节点使用与主程序相同的字典结构（id、title、script_path、script_info、params、module、
+    flexible_ports、port_counts），连接为 {'output_node', 'output_port', 'input_node', 'input_port'}。
+
+    用法:
+        engine = TNXEngine()
+        engine.load_graph("graph.json")
+        engine.set_param("图像节点.image_path", "input.jpg")
+        outputs = engine.evaluate("预览节点")
+        engine.save_image(engine.pick_image(outputs), "result.tif")
+    """
+
+    def __init__(self, scripts_folder=None, config_path=None, work_folder=None, config=None, app=None, verbose=False):
+        """
+        参数:
+            scripts_folder: 脚本文件夹，默认为程序目录下的 TunnelNX_scripts
+            config_path: 配置文件，默认为程序目录下的 config.ini（伪类型、[Performance] 和 [Cache] 配置）
+            work_folder: 工作文件夹，默认为当前目录
+            config: 已读取的 configparser.ConfigParser，提供时不再读取 config_path
+            app: 脚本上下文中 'app' 指向的对象，默认为引擎本身
+            verbose: 是否打印缓存命中、分块处理等调试信息
+        """
+        app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.scripts_folder = os.path.abspath(scripts_folder or os.path.join(app_dir, "TunnelNX_scripts"))
+        self.work_folder = os.path.abspath(work_folder or os.getcwd())
+        self.temp_folder = os.path.join(tempfile.gettempdir(), "TunnelNX")
+        os.makedirs(self.temp_folder, exist_ok=True)
+        self.app = app
+        self.verbose = verbose
+
+        if config is None:
+            config = configparser.ConfigParser()
+            config_path = config_path or os.path.join(app_dir, "config.ini")
+            if os.path.exists(config_path):
+                try:
+                    config.read(config_path, encoding='utf-8')
+                except Exception as e:
+                    print(f"读取配置文件 {config_path} 失败: {e}")
+        self.config = config
+        self.pseudo_types = load_pseudo_types(self.config)
+        if self.pseudo_types and self.verbose:
+            print(f"已加载伪类型定义: {self.pseudo_types}")
+
+        # 节点图：节点列表、连接列表和按节点ID维护的邻接索引，三者同步更新
+        self.nodes = []
+        self.connections = []
+        self.graph_index = NodeGraphIndex()
+        self.current_image_path = None
+        self.graph_path = None
+        # 最近一次 evaluate 中各节点的耗时（秒），不含上游节点
+        self.node_times = {}
+        self._script_infos = {}
+        self._script_registry = None
+
+        self.node_cache = LRUCache(max_size=200)
+        # 内容寻址缓存键：求值期间按拓扑顺序预先计算的节点指纹，以及脚本文件内容哈希缓存
+        self._evaluation_fingerprints = None
+        self._script_hash_cache = {}
+        # 内容发生变化的脚本路径，由 release_changed_scripts 释放相关节点的缓存项
+        self._changed_script_paths = set()
+        # 节点ID <-> 缓存键的双向索引，用于按节点使缓存失效
+        self.cache_key_index = CacheKeyIndex()
+        # 节点输出的来源记录：node_id -> (输出, {上游节点ID: (上游指纹, 计算时实际使用的上游输出)})，供提前截止判断；
+        # 输出被释放后改为WeakOutputs弱引用记录
+        self._node_provenance = {}
+        # 每个节点的输出缓冲区池：node_id -> BufferPool，通过context['alloc']复用不再被引用的旧输出
+        self.buffer_pools = {}
+        # 求值性能记录：每次求值中各节点的耗时、内存和缓存命中情况
+        self.profiler = NodeProfiler()
+        self.metadata_manager = MetadataManager()
+        # 代理金字塔层级：在 1/2**level 分辨率上求值，0为完整分辨率
+        self.proxy_level = 0
+
+        # 求值期间持有的锁（可重入）；修改代理层级等影响整个求值的状态时同样需要持有
+        self.evaluation_lock = threading.RLock()
+        # 被取消的求值中尚未完成的节点，由下一次求值继续处理
+        self._interrupted_lock = threading.Lock()
+        self._interrupted_node_ids = set()
+        self._interrupted_full_render = False
+
+        self._load_performance_settings()
+        # 按配置的内存预算设置节点缓存
+        self._load_cache_settings()
+
+    def _load_performance_settings(self):
+        """
+        从config.ini的[Performance]节读取求值相关配置，缺省时使用默认值
+
+        支持的配置项:
+            parallel_execution: 是否使用线程池并行执行就绪节点 (默认 true)
+            max_worker_threads: 并行执行的最大线程数 (默认 CPU核心数，最多32)
+            demand_driven_evaluation: 是否只计算汇节点（预览节点、独立预览窗口、显式导出）的上游 (默认 true)
+            early_cutoff: 重新计算的节点输出与上次完全相同时，是否停止向下游传播 (默认 true)
+            inplace_execution: 声明了InPlaceSafe的节点是否接管只被它使用、且没有被缓存持有的上游输出缓冲区，直接在上面写入结果 (默认 true)
+            buffer_pool: context['alloc']是否复用节点不再被引用的旧输出缓冲区，缓存中每个节点只保留最新的池输出 (默认 true)
+            release_intermediates: 求值时是否释放所有下游都已完成的中间节点输出 (默认 true)
+            tiled_execution: 大图像上声明了Tileable的节点是否按图块并行处理 (默认 true)
+            tile_size: 分块处理的图块边长，单位像素 (默认 1024)
+            tile_min_pixels: 启用分块处理的最小像素数 (默认 2048*2048)
+            profiling: 是否记录每次求值中各节点的耗时、内存和缓存命中情况 (默认 true)
+        """
+        section = self.config['Performance'] if 'Performance' in self.config else {}
+
+        self.parallel_execution_enabled = True
+        self.max_worker_threads = max(1, min(32, os.cpu_count() or 1))
+
+        try:
+            if 'parallel_execution' in section:
+                self.parallel_execution_enabled = self.config.getboolean('Performance', 'parallel_execution')
+            if 'max_worker_threads' in section:
+                self.max_worker_threads = max(1, self.config.getint('Performance', 'max_worker_threads'))
+        except ValueError as e:
+            print(f"读取性能配置失败，使用默认值: {e}")
+
+        # 线程池在第一次并行处理时按需创建
+        self._graph_executor = None
+        # 每个节点一把锁，防止多个工作线程同时处理同一个上游节点
+        self._node_process_locks = {}
+        self._node_process_locks_guard = threading.Lock()
+        # 标记当前线程是否为节点工作线程
+        self._node_worker_local = threading.local()
+
+        self.demand_driven_evaluation = True
+        try:
+            if 'demand_driven_evaluation' in section:
+                self.demand_driven_evaluation = self.config.getboolean('Performance', 'demand_driven_evaluation')
+        except ValueError as e:
+            print(f"读取按需求值配置失败，使用默认值: {e}")
+        self.early_cutoff_enabled = True
+        try:
+            if 'early_cutoff' in section:
+                self.early_cutoff_enabled = self.config.getboolean('Performance', 'early_cutoff')
+        except ValueError as e:
+            print(f"读取提前截止配置失败，使用默认值: {e}")
+        self.inplace_execution_enabled = True
+        try:
+            if 'inplace_execution' in section:
+                self.inplace_execution_enabled = self.config.getboolean('Performance', 'inplace_execution')
+        except ValueError as e:
+            print(f"读取原地执行配置失败，使用默认值: {e}")
+        self.buffer_pool_enabled = True
+        try:
+            if 'buffer_pool' in section:
+                self.buffer_pool_enabled = self.config.getboolean('Performance', 'buffer_pool')
+        except ValueError as e:
+            print(f"读取缓冲区池配置失败，使用默认值: {e}")
+        self.release_intermediates_enabled = True
+        try:
+            if 'release_intermediates' in section:
+                self.release_intermediates_enabled = self.config.getboolean('Performance', 'release_intermediates')
+        except ValueError as e:
+            print(f"读取中间结果释放配置失败，使用默认值: {e}")
+        self.tiled_execution_enabled = True
+        self.tile_size = 1024
+        self.tile_min_pixels = 2048 * 2048
+        try:
+            if 'tiled_execution' in section:
+                self.tiled_execution_enabled = self.config.getboolean('Performance', 'tiled_execution')
+            if 'tile_size' in section:
+                self.tile_size = max(64, self.config.getint('Performance', 'tile_size'))
+            if 'tile_min_pixels' in section:
+                self.tile_min_pixels = max(0, self.config.getint('Performance', 'tile_min_pixels'))
+        except ValueError as e:
+            print(f"读取分块处理配置失败，使用默认值: {e}")
+        # 图块线程池与节点线程池分开，避免节点工作线程等待排在自己后面的图块任务
+        self._tile_executor = None
+        self.profiling_enabled = True
+        try:
+            if 'profiling' in section:
+                self.profiling_enabled = self.config.getboolean('Performance', 'profiling')
+        except ValueError as e:
+            print(f"读取性能记录配置失败，使用默认值: {e}")
+
+    def _load_cache_settings(self):
+        """
+        从config.ini的[Cache]节读取节点缓存的内存预算，缺省时使用默认值
+
+        支持的配置项:
+            max_memory_mb: 缓存的最大内存占用，单位MB（设置后优先于max_memory_fraction）
+            max_memory_fraction: 缓存最多占用物理内存的比例 (默认 0.25)
+            max_entries: 缓存的最大条目数 (默认 200)
+            disk_cache: 是否把内存缓存淘汰的输出写入磁盘二级缓存 (默认 true)
+            disk_cache_max_mb: 磁盘二级缓存的容量上限，单位MB (默认 4096)
+            persistent_cache: 保存节点图时是否把节点输出持久化，供下次打开时直接读取 (默认 true)
+            persistent_cache_max_mb: 持久化缓存的容量上限，单位MB (默认 8192)
+        """
+        section = self.config['Cache'] if 'Cache' in self.config else {}
+
+        max_entries = 200
+        max_memory_fraction = 0.25
+        max_memory_mb = None
+        self.disk_cache_enabled = True
+        self.disk_cache_max_mb = 4096
+        self.persistent_cache_enabled = True
+        self.persistent_cache_max_mb = 8192
+        try:
+            if 'persistent_cache' in section:
+                self.persistent_cache_enabled = self.config.getboolean('Cache', 'persistent_cache')
+            if 'persistent_cache_max_mb' in section:
+                self.persistent_cache_max_mb = max(1, self.config.getint('Cache', 'persistent_cache_max_mb'))
+            if 'disk_cache' in section:
+                self.disk_cache_enabled = self.config.getboolean('Cache', 'disk_cache')
+            if 'disk_cache_max_mb' in section:
+                self.disk_cache_max_mb = max(1, self.config.getint('Cache', 'disk_cache_max_mb'))
+            if 'max_entries' in section:
+                max_entries = max(1, self.config.getint('Cache', 'max_entries'))
+            if 'max_memory_fraction' in section:
+                max_memory_fraction = min(1.0, max(0.0, self.config.getfloat('Cache', 'max_memory_fraction')))
+            if 'max_memory_mb' in section:
+                max_memory_mb = max(1, self.config.getint('Cache', 'max_memory_mb'))
+        except ValueError as e:
+            print(f"读取缓存配置失败，使用默认值: {e}")
+
+        if max_memory_mb is not None:
+            max_bytes = max_memory_mb * 1024 * 1024
+        else:
+            # 无法获取物理内存时按8GB估算
+            physical_memory = get_physical_memory_bytes() or 8 * 1024 * 1024 * 1024
+            max_bytes = int(physical_memory * max_memory_fraction)
+
+        self.node_cache.max_size = max_entries
+        self.node_cache.max_bytes = max_bytes
+        if self.verbose:
+            print(f"节点缓存预算: {max_entries} 条, {max_bytes / (1024 * 1024):.0f} MB")
+
+        # 磁盘二级缓存和持久化缓存由init_disk_cache按调用方给出的文件夹创建（命令行默认不使用）
+        self.disk_cache = None
+        self.persistent_cache = None
+        self._persist_executor = None
+
+    def init_disk_cache(self, spill_folder=None, persistent_folder=None):
+        """
+        创建磁盘二级缓存并把内存缓存的淘汰项转移过去；同时打开跨会话的持久化缓存
+
+        参数:
+            spill_folder: 磁盘二级缓存文件夹（启动时清空），None表示不使用
+            persistent_folder: 持久化缓存文件夹，None表示不使用
+        """
+        if self.persistent_cache_enabled and persistent_folder:
+            try:
+                self.persistent_cache = DiskSpillCache(
+                    persistent_folder,
+                    self.persistent_cache_max_mb * 1024 * 1024,
+                    clear_on_start=False,
+                    verify_checksums=True
+                )
+                stats = self.persistent_cache.get_stats()
+                print(f"持久化缓存: {self.persistent_cache.folder} ({stats['current_size']} 项, {stats['current_bytes'] / (1024 * 1024):.1f} MB)")
+            except OSError as e:
+                self.persistent_cache = None
+                print(f"初始化持久化缓存失败: {e}")
+
+        if not self.disk_cache_enabled or not spill_folder:
+            return
+        try:
+            # 淘汰项在后台线程中写盘，写完之前从待写队列中读取；待写队列最多占用内存缓存预算的四分之一
+            max_bytes = self.node_cache.max_bytes
+            self.disk_cache = DiskSpillCache(
+                spill_folder,
+                self.disk_cache_max_mb * 1024 * 1024,
+                clear_on_start=True,
+                max_pending_bytes=max_bytes // 4 if max_bytes else None
+            )
+            self.node_cache.on_evict = self.disk_cache.put_async
+            print(f"磁盘二级缓存: {self.disk_cache.folder} (上限 {self.disk_cache_max_mb} MB)")
+        except OSError as e:
+            self.disk_cache = None
+            print(f"初始化磁盘二级缓存失败: {e}")
+
+    def shutdown(self):
+        """
+        关闭节点处理和分块处理线程池，并等待持久化缓存写完，避免留下写了一半的缓存项
+
+        磁盘二级缓存在下次启动时清空，尚未写入的淘汰项直接丢弃。
+        """
+        if self.disk_cache is not None:
+            self.disk_cache.close()
+        if self._graph_executor is not None:
+            self._graph_executor.shutdown(wait=False)
+            self._graph_executor = None
+        if self._tile_executor is not None:
+            self._tile_executor.shutdown(wait=False)
+            self._tile_executor = None
+        if self._persist_executor is not None:
+            self._persist_executor.shutdown(wait=True)
+            self._persist_executor = None
+
+    # ------------------------------------------------------------------
+    # 脚本注册表
+    # ------------------------------------------------------------------
+    def resolve_script_path(self, script_path):
+        """
+        找到节点图中记录的脚本路径对应的脚本文件
+
+        节点图可能在其他机器上保存（不同的程序目录或路径分隔符），原路径不存在时
+        按脚本文件夹内的相对路径查找，最后按文件名在脚本文件夹中查找。
+
+        返回:
+            str: 脚本路径，找不到时返回None
+        """
+        if os.path.isfile(script_path):
+            return script_path
+
+        parts = [part for part in re.split(r'[\\/]', script_path) if part]
+        folder_name = os.path.basename(self.scripts_folder)
+        if folder_name in parts:
+            rel_parts = parts[len(parts) - parts[::-1].index(folder_name):]
+            candidate = os.path.join(self.scripts_folder, *rel_parts)
+            if os.path.isfile(candidate):
+                return candidate
+
+        if self._script_registry is None:
+            self._script_registry = scan_scripts(self.scripts_folder)
+        file_name = parts[-1] if parts else script_path
+        matches = [entry['path'] for rel_path, entry in self._script_registry.items()
+                   if rel_path.split('/')[-1] == file_name]
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def get_script_info(self, script_path):
+        """解析脚本头部（按路径缓存）"""
+        if script_path not in self._script_infos:
+            self._script_infos[script_path] = parse_script_header(script_path, verbose=False)
+        return self._script_infos[script_path]
+
+    def _load_module(self, script_path):
+        """加载脚本模块；与主程序一样每个节点使用独立的模块实例"""
+        spec = importlib.util.spec_from_file_location("module.name", script_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    # ------------------------------------------------------------------
+    # 节点图
+    # ------------------------------------------------------------------
+    def create_node(self, node_data):
+        """
+        根据节点图文件中的节点数据创建节点
+
+        参数:
+            node_data: 节点图文件中 'nodes' 列表的一项
+
+        返回:
+            dict: 节点
+        """
+        script_path = self.resolve_script_path(node_data['script_path'])
+        if not script_path:
+            raise TNXEngineError(f"找不到脚本: {node_data['script_path']}")
+        script_info = self.get_script_info(script_path)
+        if not script_info:
+            raise TNXEngineError(f"不符合格式的脚本: {script_path}")
+
+        try:
+            module = self._load_module(script_path)
+        except Exception as e:
+            raise TNXEngineError(f"加载模块出错: {script_path} - {e}") from e
+
+        # 默认参数来自脚本的 get_params，节点图中只保存了参数值
+        params = module.get_params() if hasattr(module, 'get_params') else {}
+        for param_name, param_value in node_data.get('params', {}).items():
+            if param_name in params and isinstance(params[param_name], dict):
+                params[param_name]['value'] = param_value
+
+        return {
+            'id': node_data['id'],
+            'title': os.path.splitext(os.path.basename(script_path))[0],
+            'script_path': script_path,
+            'script_info': script_info,
+            'script_type': script_info.get('script_type', 'legacy'),
+            'module': module,
+            'params': params,
+            'flexible_ports': node_data.get('flexible_ports') or {
+                'inputs': script_info.get('flexible_inputs', []),
+                'outputs': script_info.get('flexible_outputs', [])
+            },
+            'port_counts': node_data.get('port_counts') or {
+                'inputs': len(script_info.get('inputs', [])),
+                'outputs': len(script_info.get('outputs', []))
+            },
+            'keep_outputs': node_data.get('keep_outputs', False),
+        }
+
+    def load_graph(self, file_path):
+        """
+        从文件加载节点图（主程序保存的.json格式）
+
+        节点缓存按内容指纹寻址，加载另一个节点图后相同的节点仍然可以直接命中。
+
+        参数:
+            file_path: 节点图文件路径
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        nodes = []
+        connections = []
+        nodes_map = {}
+        for node_data in data.get('nodes', []):
+            node = self.create_node(node_data)
+            nodes.append(node)
+            nodes_map[node['id']] = node
+
+        for conn_data in data.get('connections', []):
+            output_node = nodes_map.get(conn_data['output_node_id'])
+            input_node = nodes_map.get(conn_data['input_node_id'])
+            if output_node is None or input_node is None:
+                print(f"跳过引用了不存在节点的连接: {conn_data}")
+                continue
+            connections.append({
+                'output_node': output_node,
+                'output_port': conn_data['output_port'],
+                'input_node': input_node,
+                'input_port': conn_data['input_port']
+            })
+
+        with self.evaluation_lock:
+            self.graph_path = file_path
+            self.current_image_path = data.get('current_image_path')
+            self.nodes = nodes
+            self.connections = connections
+            self.graph_index.rebuild(nodes, connections)
+            # 节点ID只在一个节点图内有效，清除按节点记录的状态
+            self.cache_key_index.clear()
+            self._node_provenance = {}
+            self.buffer_pools = {}
+
+    def find_node(self, node_ref):
+        """
+        按节点ID或标题查找节点
+
+        参数:
+            node_ref: 节点ID（整数或数字字符串）或节点标题
+
+        返回:
+            dict: 节点；标题对应多个节点时需要改用ID
+        """
+        for node in self.nodes:
+            if str(node['id']) == str(node_ref):
+                return node
+        matches = [node for node in self.nodes if node['title'] == node_ref]
+        if not matches:
+            raise TNXEngineError(f"节点图中没有节点: {node_ref}")
+        if len(matches) > 1:
+            ids = ', '.join(str(node['id']) for node in matches)
+            raise TNXEngineError(f"有多个标题为 '{node_ref}' 的节点（ID: {ids}），请使用节点ID")
+        return matches[0]
+
+    def set_param(self, spec, raw_value):
+        """
+        设置节点参数，spec 格式为 "节点.参数"（节点为ID或标题）
+
+        raw_value 为字符串时按参数当前值的类型转换：字符串参数原样使用，
+        布尔参数接受 true/false/1/0，数字参数按数字解析，其余按JSON解析。
+        """
+        node_ref, sep, param_name = spec.rpartition('.')
+        if not sep or not node_ref or not param_name:
+            raise TNXEngineError(f"参数格式应为 节点.参数: {spec}")
+        node = self.find_node(node_ref)
+        param_info = node['params'].get(param_name)
+        if not isinstance(param_info, dict):
+            available = ', '.join(node['params'].keys()) or '无'
+            raise TNXEngineError(f"节点 '{node['title']}' 没有参数 '{param_name}'（可用参数: {available}）")
+
+        value = raw_value
+        if isinstance(raw_value, str):
+            current = param_info.get('value')
+            try:
+                if isinstance(current, str):
+                    value = raw_value
+                elif isinstance(current, bool):
+                    if raw_value.lower() not in ('true', 'false', '1', '0'):
+                        raise ValueError(raw_value)
+                    value = raw_value.lower() in ('true', '1')
+                elif isinstance(current, int):
+                    value = int(raw_value)
+                elif isinstance(current, float):
+                    value = float(raw_value)
+                else:
+                    value = json.loads(raw_value)
+            except ValueError as e:
+                raise TNXEngineError(f"参数 {spec} 的值无效: {raw_value}") from e
+        param_info['value'] = value
+
+    # ------------------------------------------------------------------
+    # 脚本上下文和界面接入点（主程序的子类覆盖）
+    # ------------------------------------------------------------------
+    def get_view_state(self):
+        """脚本上下文中的视图状态（缩放、视口尺寸等），无界面时只有缩放比例"""
+        return {'zoom_level': 1.0}
+
+    def get_application_context(self, node=None):
+        """Gathers relevant application state information for scripts."""
+        context = {
+            'app': self.app if self.app is not None else self,
+            'work_folder': self.work_folder,
+            'temp_folder': self.temp_folder,
+            'scripts_folder': self.scripts_folder,
+            'current_image_path': self.current_image_path,
+            # 输入数组是只读的共享数据，需要原地修改时通过此函数获取可写副本
+            'make_writable': make_writable,
+            # 分配输出数组（内容未初始化），节点上下文中会复用该节点不再被引用的旧输出缓冲区
+            'alloc': np.empty,
+            # 当前求值分辨率相对完整分辨率的比例（代理分辨率小于1），以像素为单位的参数需要乘以该值
+            'proxy_scale': 1.0 / (2 ** self.proxy_level),
+        }
+        context.update(self.get_view_state())
+        if node:
+            context.update({
+                'node_id': node['id'],
+                'node_title': node['title']
+            })
+            if self.buffer_pool_enabled:
+                context['alloc'] = self._get_buffer_pool(node['id']).alloc
+        return context
+
+    def get_default_sink_ids(self):
+        """按需求值时默认的汇节点ID（预览节点）"""
+        return set(node['id'] for node in self.nodes if node.get('title') == '预览节点')
+
+    def is_output_pinned(self, node):
+        """节点输出是否需要保留（预览节点、节点内预览、自定义预览更新、用户标记保留）"""
+        if node.get('title') == '预览节点' or node.get('keep_outputs', False):
+            return True
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        return bool(supported_features.get('PreviewOnNode', False) or supported_features.get('PreviewUpdateFunction'))
+
+    def on_node_processed(self, node, context):
+        """
+        节点重新计算后调用（可能在工作线程中），无界面时不做任何事
+
+        参数:
+            node: 节点，输出在 node['processed_outputs'] 中
+            context: 本次处理使用的脚本上下文
+        """
+
+    def forget_node(self, node_id):
+        """
+        节点被删除后清除与它相关的缓存项、来源记录和输出缓冲区池
+
+        参数:
+            node_id: 被删除节点的ID
+        """
+        self.invalidate_node_cache(node_id, "节点被删除")
+        self._node_provenance.pop(node_id, None)
+        self.buffer_pools.pop(node_id, None)
+
+    def reset_node_state(self):
+        """清除节点缓存和按节点记录的状态（清空节点图时调用），磁盘上的缓存保留"""
+        self.node_cache.clear()
+        self.cache_key_index.clear()
+        self._node_provenance = {}
+        self.buffer_pools = {}
+
+    def purge_caches(self):
+        """
+        清除内存缓存、磁盘二级缓存和持久化缓存
+
+        返回:
+            int: 释放的字节数
+        """
+        freed_bytes = self.node_cache.get_stats()['current_bytes']
+        self.node_cache.clear()
+        self.cache_key_index.clear()
+        for disk_cache in (self.disk_cache, self.persistent_cache):
+            if disk_cache is not None:
+                freed_bytes += disk_cache.get_stats()['current_bytes']
+                disk_cache.clear()
+        return freed_bytes
+
+    def set_proxy_level(self, level):
+        """
+        切换求值使用的代理层级
+
+        所有节点的现有输出都属于旧层级，全部清除后由下一次求值重新计算（各层级的缓存项互不影响，切换回来时直接命中）。
+
+        返回:
+            bool: 层级是否发生了变化
+        """
+        with self.evaluation_lock:
+            if level == self.proxy_level:
+                return False
+            self.proxy_level = level
+            for node in self.nodes:
+                node.pop('processed_outputs', None)
+                node.pop('outputs_released', None)
+        return True
+
+    # ------------------------------------------------------------------
+    # 求值
+    # ------------------------------------------------------------------
+    def _get_buffer_pool(self, node_id):
+        """获取节点的输出缓冲区池，不存在时创建"""
+        pool = self.buffer_pools.get(node_id)
+        if pool is None:
+            pool = self.buffer_pools.setdefault(node_id, BufferPool())
+        return pool
+
+    def _get_demand_sink_ids(self, sinks, processing_state):
+        """
+        获取按需求值的汇节点ID集合
+
+        默认汇节点由get_default_sink_ids给出（预览节点，主程序中还有打开了独立预览窗口的节点）；显式导出等操作可以通过sinks指定。
+        """
+        if sinks is not None:
+            sink_ids = set(n['id'] for n in sinks if isinstance(n, dict) and 'id' in n)
+        else:
+            sink_ids = self.get_default_sink_ids()
+        return set(node_id for node_id in sink_ids if node_id in processing_state)
+
+    def _collect_upstream_node_ids(self, sink_ids, input_connections):
+        """收集汇节点及其全部上游节点的ID（上游闭包）"""
+        required_ids = set(sink_ids)
+        stack = list(sink_ids)
+        while stack:
+            current_id = stack.pop()
+            for conn_info in input_connections.get(current_id, []):
+                upstream_id = conn_info['output_node_id']
+                if upstream_id not in required_ids:
+                    required_ids.add(upstream_id)
+                    stack.append(upstream_id)
+        return required_ids
+
+    def evaluate_sinks(self, sink_nodes):
+        """
+        显式按需求值：确保指定汇节点（例如导出）的上游闭包都已处理
+
+        只计算闭包内尚未处理的节点，可并行执行，不会更新预览界面。
+
+        参数:
+            sink_nodes (list): 需要求值的汇节点列表
+        """
+        if not sink_nodes:
+            return
+        with self.evaluation_lock:
+            # 已释放输出的中间节点结果仍然有效，不需要重新求值
+            missing_nodes = [node for node in self.nodes
+                             if not node.get('processed_outputs') and not node.get('outputs_released')]
+            if missing_nodes:
+                self.evaluate_graph(changed_nodes=missing_nodes, sinks=sink_nodes)
+            # 输出已被释放的汇节点直接从缓存取回（必要时递归处理上游）
+            for sink_node in sink_nodes:
+                if not sink_node.get('processed_outputs'):
+                    self.process_node(sink_node)
+
+    def _should_process_in_parallel(self, nodes_to_process_ids):
+        """判断本次节点图处理是否使用线程池并行执行"""
+        if not self.parallel_execution_enabled:
+            return False
+        if self.max_worker_threads <= 1 or len(nodes_to_process_ids) <= 1:
+            return False
+        # 如果已经在节点工作线程中（例如脚本在process中触发了节点图处理），不再嵌套使用线程池
+        if getattr(self._node_worker_local, 'in_worker', False):
+            return False
+        return True
+
+    def _get_graph_executor(self):
+        """按需创建用于并行处理节点的有界线程池"""
+        if self._graph_executor is None:
+            self._graph_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_worker_threads,
+                thread_name_prefix="TNXNodeWorker"
+            )
+        return self._graph_executor
+
+    def _node_requires_main_thread(self, node):
+        """节点是否声明了 MainThreadOnly 特性（此类节点不会被提交到线程池）"""
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        return bool(supported_features.get('MainThreadOnly', False))
+
+    def _node_accepts_inplace(self, node):
+        """节点是否声明了 InPlaceSafe 特性（可以直接修改引擎交接给它的可写输入）"""
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        return bool(supported_features.get('InPlaceSafe', False))
+
+    def _get_tile_executor(self):
+        """按需创建用于分块处理的有界线程池"""
+        if self._tile_executor is None:
+            self._tile_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_worker_threads,
+                thread_name_prefix="TNXTileWorker"
+            )
+        return self._tile_executor
+
+    def get_node_tile_halo(self, node, inputs, params):
+        """
+        获取节点分块处理时每个图块需要的边缘像素数
+
+        节点通过 Tileable 特性声明支持分块处理，TileHalo 特性给出固定的边缘宽度；
+        脚本也可以定义 get_tile_halo(params, inputs) 按当前参数计算边缘宽度，
+        返回 None 表示当前参数下不能分块处理。
+
+        返回:
+            int或None: 边缘像素数，None表示不分块
+        """
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        if not supported_features.get('Tileable', False):
+            return None
+        module = node.get('module')
+        if module is not None and hasattr(module, 'get_tile_halo'):
+            try:
+                halo = module.get_tile_halo(params, inputs)
+            except Exception as e:
+                print(f"获取节点 '{node.get('title', '未知')}' 的图块边缘宽度失败: {e}")
+                return None
+            return None if halo is None else max(0, int(halo))
+        try:
+            return max(0, int(supported_features.get('TileHalo', 0)))
+        except (TypeError, ValueError):
+            return None
+
+    def _plan_tiles(self, node, inputs, params):
+        """
+        为节点的本次处理制定分块方案
+
+        与最大输入图像尺寸相同的数组按图块切分，其余输入（卷积核、常量等）整体传给每个图块。
+
+        返回:
+            dict或None: 分块方案 {'size': (H, W), 'halo': 边缘宽度, 'tiled_keys': 切分的输入键, 'tiles': [(核心区域, 带边缘区域)]}，
+                        不满足分块条件时返回None
+        """
+        if not self.tiled_execution_enabled:
+            return None
+        supported_features = node.get('script_info', {}).get('supported_features', {})
+        if not supported_features.get('Tileable', False):
+            return None
+
+        size = None
+        for value in inputs.values():
+            # 多连接端口的列表输入无法按图块对齐，整个节点不分块
+            if isinstance(value, (list, tuple)):
+                return None
+            if isinstance(value, np.ndarray) and value.ndim >= 2:
+                if size is None or value.shape[0] * value.shape[1] > size[0] * size[1]:
+                    size = value.shape[:2]
+        if size is None:
+            return None
+        height, width = size
+        tile = self.tile_size
+        if height * width < self.tile_min_pixels or (height <= tile and width <= tile):
+            return None
+
+        halo = self.get_node_tile_halo(node, inputs, params)
+        if halo is None or halo * 2 >= tile:
+            return None
+
+        tiled_keys = [key for key, value in inputs.items()
+                      if isinstance(value, np.ndarray) and value.ndim >= 2 and value.shape[:2] == size]
+
+        tiles = []
+        for y0 in range(0, height, tile):
+            y1 = min(y0 + tile, height)
+            for x0 in range(0, width, tile):
+                x1 = min(x0 + tile, width)
+                padded = (max(0, y0 - halo), min(height, y1 + halo), max(0, x0 - halo), min(width, x1 + halo))
+                tiles.append(((y0, y1, x0, x1), padded))
+
+        return {'size': size, 'halo': halo, 'tiled_keys': tiled_keys, 'tiles': tiles}
+
+    def _process_tiled(self, node, process_func, inputs, params, context, plan):
+        """
+        按分块方案在线程池中逐图块调用process，并把结果拼接到预先分配的输出数组中
+
+        每个图块收到裁切后的只读输入视图（包含边缘像素），无边缘时交接给节点原地写入的输入为可写视图；context中额外提供
+        'tile_rect' (x, y, 宽, 高，图块在整幅图像中的位置，包含边缘) 和 'image_size' (宽, 高)。
+        图块内context['alloc']为np.empty，节点的缓冲区池只用于拼接后的整幅输出。
+
+        返回:
+            dict或None: 拼接后的输出，图块输出无法拼接时返回None（由调用方改为整图处理）
+        """
+        height, width = plan['size']
+        tiled_keys = plan['tiled_keys']
+
+        def run_tile(core, padded):
+            y0, y1, x0, x1 = core
+            py0, py1, px0, px1 = padded
+            tile_inputs = dict(inputs)
+            for key in tiled_keys:
+                view = inputs[key][py0:py1, px0:px1]
+                if plan['halo'] > 0 or not inputs[key].flags.writeable:
+                    # 图块视图只读：边缘像素被相邻图块共享，脚本需要修改时应自行复制
+                    view.flags.writeable = False
+                tile_inputs[key] = view
+            if context is None:
+                tile_outputs = process_func(tile_inputs, params)
+            else:
+                tile_context = dict(context)
+                tile_context['alloc'] = np.empty
+                tile_context['tile_rect'] = (px0, py0, px1 - px0, py1 - py0)
+                tile_context['image_size'] = (width, height)
+                tile_outputs = process_func(tile_inputs, params, tile_context)
+            if not isinstance(tile_outputs, dict):
+                return None, tile_inputs
+            # 裁掉边缘像素，只保留图块核心区域
+            crop = (slice(y0 - py0, y1 - py0), slice(x0 - px0, x1 - px0))
+            cropped = {}
+            for key, value in tile_outputs.items():
+                if isinstance(value, np.ndarray) and value.ndim >= 2 and value.shape[:2] == (py1 - py0, px1 - px0):
+                    cropped[key] = value[crop]
+                else:
+                    cropped[key] = value
+            core_inputs = {key: tile_inputs[key][crop] for key in tiled_keys}
+            return cropped, core_inputs
+
+        def same_view(a, b):
+            return (a.shape == b.shape and a.strides == b.strides and a.dtype == b.dtype and
+                    a.__array_interface__['data'][0] == b.__array_interface__['data'][0])
+
+        tiles = plan['tiles']
+        core0 = tiles[0][0]
+        first_outputs, first_inputs = run_tile(*tiles[0])
+        if first_outputs is None:
+            return None
+
+        # 根据第一个图块的输出确定每个输出的拼接方式
+        core_shape = (core0[1] - core0[0], core0[3] - core0[2])
+        if self.buffer_pool_enabled:
+            alloc = self._get_buffer_pool(node['id']).alloc
+        else:
+            alloc = np.empty
+        layout = {}
+        buffers_by_id = {}
+        for key, value in first_outputs.items():
+            if isinstance(value, np.ndarray) and value.ndim >= 2 and value.shape[:2] == core_shape:
+                source = next((k for k in tiled_keys if same_view(value, first_inputs[k])), None)
+                if source is not None:
+                    # 输出就是输入本身（节点未做修改），直接传递整幅输入
+                    layout[key] = ('passthrough', source)
+                    continue
+                dest = buffers_by_id.get(id(value))
+                if dest is None:
+                    dest = alloc((height, width) + value.shape[2:], value.dtype)
+                    buffers_by_id[id(value)] = dest
+                layout[key] = ('image', dest)
+            else:
+                layout[key] = ('value', value)
+
+        def stitch(core, tile_outputs, core_inputs):
+            """把图块输出写入整幅输出，输出结构与第一个图块不一致时返回False"""
+            if tile_outputs is None or tile_outputs.keys() != layout.keys():
+                return False
+            y0, y1, x0, x1 = core
+            for key, (kind, target) in layout.items():
+                value = tile_outputs[key]
+                if kind == 'image':
+                    if not isinstance(value, np.ndarray) or value.shape[:2] != (y1 - y0, x1 - x0) or \
+                            value.shape[2:] != target.shape[2:]:
+                        return False
+                    target[y0:y1, x0:x1] = value
+                elif kind == 'passthrough':
+                    if not isinstance(value, np.ndarray) or not same_view(value, core_inputs[target]):
+                        return False
+                elif value is not target:
+                    # 非图像输出（常量、元数据等）必须在所有图块间一致
+                    if isinstance(value, np.ndarray) or isinstance(target, np.ndarray):
+                        return False
+                    try:
+                        if value != target:
+                            return False
+                    except Exception:
+                        return False
+            return True
+
+        def run_and_stitch(core, padded):
+            tile_outputs, core_inputs = run_tile(core, padded)
+            return stitch(core, tile_outputs, core_inputs)
+
+        if not stitch(core0, first_outputs, first_inputs):
+            return None
+        executor = self._get_tile_executor()
+        futures = [executor.submit(run_and_stitch, core, padded) for core, padded in tiles[1:]]
+        stitched = all([future.result() for future in futures])
+        if not stitched:
+            return None
+
+        outputs = {}
+        for key, (kind, target) in layout.items():
+            if kind == 'passthrough':
+                outputs[key] = inputs[target]
+            else:
+                outputs[key] = target
+        return outputs
+
+    def run_node_process(self, node, process_func, inputs, params, context=None):
+        """
+        调用节点的process函数；大图像上声明了Tileable的节点按图块并行处理
+
+        参数:
+            context: 传给process的第三个参数，为None时只传inputs和params
+        """
+        plan = self._plan_tiles(node, inputs, params)
+        if plan is not None:
+            tile_start = time.perf_counter()
+            outputs = self._process_tiled(node, process_func, inputs, params, context, plan)
+            if outputs is not None:
+                if self.verbose:
+                    print(f"节点 '{node.get('title', '未知')}' 分块处理: {len(plan['tiles'])} 个图块，"
+                          f"边缘 {plan['halo']} 像素，耗时 {(time.perf_counter() - tile_start) * 1000:.1f} ms")
+                return outputs
+            print(f"节点 '{node.get('title', '未知')}' 的图块输出无法拼接，改为整图处理")
+        if context is None:
+            return process_func(inputs, params)
+        return process_func(inputs, params, context)
+
+    def _prepare_inplace_inputs(self, node, inputs, consumed_inputs, params):
+        """
+        为声明了InPlaceSafe的节点交接上游输出的缓冲区
+
+        上游节点只有连接到当前节点的这一条输出连接、输出不需要保留（预览节点、标记保留等），
+        并且它的图像数组除了上游的输出字典和当前节点的输入之外没有其他引用（节点缓存、预览、其他节点都不持有）时，
+        把这个数组本身设为可写交给当前节点，同时丢弃上游节点对它的引用，节点直接在原缓冲区上写入结果，
+        不分配新数组。上游的输出记为已释放，之后需要时从缓存取回或重新计算；当前节点的来源记录不再保存被交接的输出，
+        避免用改写后的内容判断提前截止。其余输入（包括仍被缓存持有的上游输出）保持只读。
+        节点将按带边缘的图块处理时不交接：相邻图块共享边缘像素，原地写入会破坏其他图块读取的数据；
+        无边缘的图块互不重叠，交接的数组按图块切成可写视图。
+
+        参数:
+            node: 当前节点
+            inputs (dict): 节点输入，交接的数组变为可写
+            consumed_inputs (dict): 实际使用的上游输出（上游节点ID -> 输出字典），交接后对应项改为None
+            params (dict): 本次处理的参数，用于判断是否分块处理
+        """
+        if not self.inplace_execution_enabled:
+            return
+        plan = self._plan_tiles(node, inputs, params)
+        if plan is not None and plan['halo'] > 0:
+            return
+        for conn in self.graph_index.get_input_connections(node['id']):
+            upstream_node = conn['output_node']
+            upstream_id = upstream_node['id']
+            upstream_outputs = upstream_node.get('processed_outputs')
+            consumed = consumed_inputs.get(upstream_id)
+            if not isinstance(upstream_outputs, dict) or not isinstance(consumed, dict):
+                continue
+            if len(self.graph_index.get_output_connections(upstream_id)) != 1 or self.is_output_pinned(upstream_node):
+                continue
+            pool = self.buffer_pools.get(upstream_id)
+            containers = [inputs, upstream_outputs] + ([consumed] if consumed is not upstream_outputs else [])
+            handed_keys = []
+            for key in list(inputs):
+                if any(inputs[key] is inputs[handed] for handed in handed_keys):
+                    # 同一个数组对应多个输入键（如伪类型），已经交接
+                    handed_keys.append(key)
+                elif self._can_hand_over(inputs[key], upstream_outputs, containers, pool):
+                    inputs[key].flags.writeable = True
+                    handed_keys.append(key)
+            if not handed_keys:
+                continue
+            # 上游不再持有被交接的输出，来源记录也不能再引用它
+            upstream_node.pop('processed_outputs', None)
+            upstream_node['outputs_released'] = True
+            provenance = self._node_provenance.get(upstream_id)
+            if provenance is not None and provenance[0] is upstream_outputs:
+                del self._node_provenance[upstream_id]
+            consumed_inputs[upstream_id] = None
+            if self.verbose:
+                print(f"原地执行: 节点 '{node.get('title', '未知')}' 接管 '{upstream_node.get('title', '未知')}' 的输出缓冲区 {handed_keys}")
+
+    @staticmethod
+    def _can_hand_over(array, upstream_outputs, containers, pool):
+        """
+        上游输出中的图像数组能否交给下游节点原地写入
+
+        数组必须拥有自己的内存（视图可能与其他数组共享数据），引用计数中除了容器中的槽位、
+        上游缓冲区池的跟踪列表、本函数的参数和getrefcount的参数之外不能有其他引用。
+        """
+        if not isinstance(array, np.ndarray) or array.ndim < 2 or not array.flags.owndata:
+            return False
+        if not any(value is array for value in upstream_outputs.values()):
+            return False
+        expected = sum(1 for container in containers for value in container.values() if value is array)
+        if pool is not None and pool.tracks(array):
+            expected += 1
+        return sys.getrefcount(array) <= expected + 2
+
+    def _process_node_timed(self, node, cutoff=None):
+        """
+        处理单个节点并返回耗时（秒），供串行和并行执行共用
+
+        在线程池中运行时会设置线程局部标记，避免嵌套创建并行处理。
+        启用提前截止且节点沿用了上次的输出时返回None（比较输出的开销也由当前工作线程承担）。
+        """
+        node_start_time = time.time()
+        profile_run = self.profiler.active_run() if self.profiling_enabled else None
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        previous_flag = getattr(self._node_worker_local, 'in_worker', False)
+        if threading.current_thread() is not threading.main_thread():
+            self._node_worker_local.in_worker = True
+        try:
+            if self._try_early_cutoff(node, cutoff):
+                self.profiler.annotate(node['id'], cache='cutoff')
+                return None
+            self.process_node(node)
+        finally:
+            self._node_worker_local.in_worker = previous_flag
+            if profile_run is not None:
+                # CPU时间只统计执行节点的线程，分块执行时图块线程的CPU时间不计入
+                self.profiler.record_node(profile_run, node, wall_start, time.perf_counter(),
+                                          time.thread_time() - cpu_start, self._outputs_nbytes(node.get('processed_outputs')))
+        return time.time() - node_start_time
+
+    def _outputs_nbytes(self, outputs, exclude=None):
+        """
+        统计输出中数组的总字节数（同一数组只计一次）
+
+        参数:
+            exclude: 输入数组列表，与其中任何数组共享内存的输出不计入（用于统计新分配的内存）
+        """
+        if not isinstance(outputs, dict):
+            return 0
+        seen = set()
+        total = 0
+        for value in outputs.values():
+            if not isinstance(value, np.ndarray) or id(value) in seen:
+                continue
+            seen.add(id(value))
+            if exclude and any(np.may_share_memory(value, source) for source in exclude):
+                continue
+            total += value.nbytes
+        return total
+
+    def _try_early_cutoff(self, node, cutoff):
+        """
+        如果节点自身未变化，且每个上游节点的当前输出与它上次计算时实际使用的输出相同，
+        直接恢复上次的输出
+
+        上游指纹未变时输出必然相同，无需比较；指纹变化时逐位比较当前输出与使用过的输出。
+
+        返回:
+            是否沿用了旧输出（此时节点无需处理）
+        """
+        if cutoff is None:
+            return False
+        node_id = node['id']
+        if node_id in cutoff['changed_ids']:
+            return False
+        provenance = self._node_provenance.get(node_id)
+        if provenance is None:
+            return False
+        previous_outputs, provenance_inputs = provenance
+        if isinstance(previous_outputs, WeakOutputs):
+            # 输出已被释放，只有缓存仍持有这些数组时才能恢复
+            previous_outputs = previous_outputs.resolve()
+            if previous_outputs is None:
+                return False
+
+        upstream_nodes = {}
+        for conn in self.graph_index.get_input_connections(node_id):
+            upstream_nodes[conn['output_node']['id']] = conn['output_node']
+        if not upstream_nodes or set(upstream_nodes) != set(provenance_inputs):
+            return False
+
+        current_inputs = {}
+        for upstream_id, upstream_node in upstream_nodes.items():
+            consumed_key, consumed = provenance_inputs[upstream_id]
+            upstream_key = self._get_node_cache_key(upstream_node)
+            current_outputs = upstream_node.get('processed_outputs')
+            if upstream_key == consumed_key:
+                # 指纹相同，上游输出与上次使用的内容相同（上游可能已被释放）
+                current_inputs[upstream_id] = (upstream_key, current_outputs if current_outputs is not None else consumed)
+                continue
+
+            memo_key = (upstream_id, id(consumed))
+            identical = cutoff['identical'].get(memo_key)
+            if identical is None:
+                if isinstance(consumed, WeakOutputs):
+                    consumed = consumed.resolve()
+                identical = (current_outputs is not None and consumed is not None
+                             and self._outputs_identical(current_outputs, consumed))
+                cutoff['identical'][memo_key] = identical
+            if not identical:
+                return False
+            current_inputs[upstream_id] = (upstream_key, current_outputs)
+
+        node['processed_outputs'] = previous_outputs
+        node.pop('outputs_released', None)
+        # 已证明与当前上游输出相同，来源记录更新为当前的指纹和输出
+        self._node_provenance[node_id] = (previous_outputs, current_inputs)
+        cutoff['reused_ids'].add(node_id)
+
+        # 上游指纹已变化，把旧输出也登记到新的缓存键下，之后回到相同状态时可以直接命中
+        cache_key = self._get_node_cache_key(node)
+        self.cache_key_index.record(node_id, cache_key)
+        self.node_cache.put(cache_key, self._share_cached_outputs(previous_outputs))
+        return True
+
+    def _build_provenance_inputs(self, node, consumed_inputs):
+        """
+        根据实际使用的上游输出生成来源记录: {上游节点ID: (上游指纹, 上游输出)}
+        """
+        upstream_nodes = {}
+        for conn in self.graph_index.get_input_connections(node.get('id')):
+            upstream_nodes[conn['output_node']['id']] = conn['output_node']
+        provenance_inputs = {}
+        for upstream_id, outputs in consumed_inputs.items():
+            upstream_node = upstream_nodes.get(upstream_id)
+            upstream_key = self._get_node_cache_key(upstream_node) if upstream_node is not None else None
+            provenance_inputs[upstream_id] = (upstream_key, outputs)
+        return provenance_inputs
+
+    def _outputs_identical(self, new_outputs, old_outputs):
+        """
+        判断两次的节点输出是否逐位相同（忽略元数据）
+
+        同一个数组对象直接视为相同（例如直通节点返回的上游输出），
+        否则先比较形状和类型，再按字节比较数组内容。
+        """
+        if new_outputs is old_outputs:
+            return True
+        if not isinstance(new_outputs, dict) or not isinstance(old_outputs, dict):
+            return False
+        new_keys = set(key for key in new_outputs if key != '_metadata')
+        old_keys = set(key for key in old_outputs if key != '_metadata')
+        if new_keys != old_keys:
+            return False
+
+        for key in new_keys:
+            new_value = new_outputs[key]
+            old_value = old_outputs[key]
+            if new_value is old_value:
+                continue
+            if isinstance(new_value, np.ndarray) or isinstance(old_value, np.ndarray):
+                if not (isinstance(new_value, np.ndarray) and isinstance(old_value, np.ndarray)):
+                    return False
+                if new_value.shape != old_value.shape or new_value.dtype != old_value.dtype:
+                    return False
+                if new_value.dtype.hasobject:
+                    return False
+                # 按字节比较，NaN和±0也能正确区分
+                new_bytes = np.ascontiguousarray(new_value).reshape(-1).view(np.uint8)
+                old_bytes = np.ascontiguousarray(old_value).reshape(-1).view(np.uint8)
+                if not np.array_equal(new_bytes, old_bytes):
+                    return False
+                continue
+            try:
+                if type(new_value) is not type(old_value) or not bool(new_value == old_value):
+                    return False
+            except Exception:
+                return False
+        return True
+
+    def _notify_downstream_ready(self, current_id, processing_state, output_connections):
+        """
+        通知下游节点某个输入已就绪，返回因此变为就绪状态的下游节点ID列表
+        """
+        newly_ready = []
+        for conn_info in output_connections.get(current_id, []):
+            downstream_id = conn_info['input_node_id']
+            input_port_idx = conn_info['input_port_idx']
+            if downstream_id in processing_state and processing_state[downstream_id]['status'] == 'pending':
+                ds_state = processing_state[downstream_id]
+                ds_state['inputs_received'].add(input_port_idx)
+                if ds_state['inputs_received'] == ds_state['inputs_needed']:
+                    ds_state['status'] = 'ready'
+                    newly_ready.append(downstream_id)
+        return newly_ready
+
+    def _release_consumed_outputs(self, current_id, processing_state, retention):
+        """
+        节点完成（或出错）后，释放其上游中所有下游都已完成的中间节点的输出
+
+        预览节点、独立预览窗口、节点内预览和标记为保留的节点不会被释放。
+        """
+        if retention is None:
+            return
+        output_connections = retention['output_connections']
+        for conn_info in retention['input_connections'].get(current_id, []):
+            upstream_id = conn_info['output_node_id']
+            if upstream_id in retention['released_ids']:
+                continue
+            upstream_state = processing_state.get(upstream_id)
+            if upstream_state is None or upstream_state['status'] != 'done':
+                continue
+            consumer_ids = set(c['input_node_id'] for c in output_connections.get(upstream_id, []))
+            if any(processing_state[consumer_id]['status'] in ('pending', 'ready', 'processing')
+                   for consumer_id in consumer_ids if consumer_id in processing_state):
+                continue
+            upstream_node = upstream_state['node']
+            if self.is_output_pinned(upstream_node):
+                continue
+            if self._release_node_outputs(upstream_node, consumer_ids):
+                retention['released_ids'].add(upstream_id)
+
+    def _release_node_outputs(self, node, consumer_ids=()):
+        """
+        释放节点的输出并标记为已释放（outputs_released），之后需要时由缓存取回或重新计算
+
+        提前截止的来源记录改为弱引用，缓存仍持有数组时依然可以比较和恢复。
+
+        返回:
+            是否释放了输出
+        """
+        node_id = node.get('id')
+        outputs = node.pop('processed_outputs', None)
+        if outputs is None:
+            return False
+        node['outputs_released'] = True
+
+        provenance = self._node_provenance.get(node_id)
+        if provenance is not None and provenance[0] is outputs:
+            self._node_provenance[node_id] = (WeakOutputs(outputs), provenance[1])
+        for consumer_id in consumer_ids:
+            provenance = self._node_provenance.get(consumer_id)
+            if provenance is None:
+                continue
+            record = provenance[1].get(node_id)
+            if record is not None and record[1] is outputs:
+                provenance[1][node_id] = (record[0], WeakOutputs(outputs))
+        return True
+
+    def _run_processing_queue_serial(self, processing_state, output_connections, processing_queue, processed_node_ids, node_times, errors, is_cancelled=None, cutoff=None, retention=None):
+        """
+        在当前线程中逐个处理就绪节点，出错的节点记录在 errors（节点ID -> 异常）中，其下游节点不再处理
+
+        返回:
+            (processed_count, error_occurred, cancelled)
+        """
+        processed_count = 0
+        error_occurred = False
+        cancelled = False
+
+        while processing_queue:
+            # 在节点之间检查是否已被更新的渲染请求取代
+            if is_cancelled is not None and is_cancelled():
+                cancelled = True
+                break
+
+            current_id = processing_queue.pop(0)
+            state = processing_state[current_id]
+
+            if state['status'] != 'ready': # 可能已被其他路径处理
+                continue
+
+            current_node = state['node']
+            state['status'] = 'processing'
+            try:
+                # 调用 process_node 来实际执行节点逻辑
+                # process_node 内部会调用 get_node_inputs，后者依赖上游节点的 processed_outputs
+                elapsed = self._process_node_timed(current_node, cutoff)
+                state['status'] = 'done'
+                if elapsed is not None:
+                    # 沿用旧输出（提前截止）的节点不计入本次处理的节点
+                    node_times[current_id] = elapsed
+                    processed_node_ids.add(current_id)
+                    processed_count += 1
+                # 通知下游节点输入已就绪
+                for downstream_id in self._notify_downstream_ready(current_id, processing_state, output_connections):
+                    if downstream_id not in processing_queue: # 避免重复添加
+                        processing_queue.append(downstream_id)
+                self._release_consumed_outputs(current_id, processing_state, retention)
+
+            except Exception as e:
+                if self.verbose:
+                    print(f"Error processing node {current_node['title']}: {e}")
+                    import traceback
+                    traceback.print_exc()
+                state['status'] = 'error'
+                errors[current_id] = e
+                error_occurred = True
+                # 下游节点不会收到就绪通知，保持未处理状态
+                self._release_consumed_outputs(current_id, processing_state, retention)
+
+        return processed_count, error_occurred, cancelled
+
+    def _run_processing_queue_parallel(self, processing_state, output_connections, processing_queue, processed_node_ids, node_times, errors, is_cancelled=None, cutoff=None, retention=None):
+        """
+        使用有界线程池并行处理就绪节点，出错的节点与串行执行一样记录在 errors 中
+
+        所有状态转换（ready/processing/done/error）和下游通知都只在调用线程中进行，
+        工作线程只负责执行 process_node，因此 processing_state 无需额外加锁；
+        下游通知的语义与串行执行相同：上游节点完成后，输入全部就绪的下游节点才会被提交。
+        取消时不再提交新节点，只等待正在执行的节点结束。
+
+        返回:
+            (processed_count, error_occurred, cancelled)
+        """
+        executor = self._get_graph_executor()
+        running = {}  # future -> node_id
+        processed_count = 0
+        error_occurred = False
+        cancelled = False
+
+        def finish_node(current_id, elapsed, error):
+            nonlocal processed_count, error_occurred
+            state = processing_state[current_id]
+            current_node = state['node']
+            if error is not None:
+                if self.verbose:
+                    print(f"Error processing node {current_node['title']}: {error}")
+                    import traceback
+                    traceback.print_exception(type(error), error, error.__traceback__)
+                state['status'] = 'error'
+                errors[current_id] = error
+                error_occurred = True
+                self._release_consumed_outputs(current_id, processing_state, retention)
+                return
+            state['status'] = 'done'
+            if elapsed is not None:
+                # 沿用旧输出（提前截止）的节点不计入本次处理的节点
+                node_times[current_id] = elapsed
+                processed_node_ids.add(current_id)
+                processed_count += 1
+            for downstream_id in self._notify_downstream_ready(current_id, processing_state, output_connections):
+                if downstream_id not in processing_queue:
+                    processing_queue.append(downstream_id)
+            self._release_consumed_outputs(current_id, processing_state, retention)
+
+        while processing_queue or running:
+            if not cancelled and is_cancelled is not None and is_cancelled():
+                cancelled = True
+            if cancelled:
+                processing_queue.clear()
+
+            # 提交所有已就绪的节点
+            while processing_queue:
+                current_id = processing_queue.pop(0)
+                state = processing_state[current_id]
+                if state['status'] != 'ready':
+                    continue
+                state['status'] = 'processing'
+                current_node = state['node']
+
+                if self._node_requires_main_thread(current_node):
+                    # 声明了MainThreadOnly的节点直接在调用线程中执行
+                    try:
+                        finish_node(current_id, self._process_node_timed(current_node, cutoff), None)
+                    except Exception as e:
+                        finish_node(current_id, 0.0, e)
+                else:
+                    running[executor.submit(self._process_node_timed, current_node, cutoff)] = current_id
+
+            if not running:
+                continue
+
+            # 等待任意一个节点完成，再据此释放其下游节点
+            done, _ = concurrent.futures.wait(list(running.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                current_id = running.pop(future)
+                try:
+                    finish_node(current_id, future.result(), None)
+                except Exception as e:
+                    finish_node(current_id, 0.0, e)
+
+        return processed_count, error_occurred, cancelled
+
+    def _get_node_process_lock(self, node):
+        """获取节点对应的处理锁（可重入），保证同一节点不会被多个线程同时处理"""
+        node_id = node.get('id')
+        with self._node_process_locks_guard:
+            lock = self._node_process_locks.get(node_id)
+            if lock is None:
+                lock = threading.RLock()
+                self._node_process_locks[node_id] = lock
+            return lock
+
+    def record_interrupted_nodes(self, node_ids):
+        """
+        记录被取消的求值中尚未完成的节点
+
+        参数:
+            node_ids: 节点ID集合，None表示需要完整重新处理
+        """
+        with self._interrupted_lock:
+            if node_ids is None:
+                self._interrupted_full_render = True
+            else:
+                self._interrupted_node_ids.update(node_ids)
+
+    def merge_interrupted_nodes(self, changed_nodes):
+        """把被取消的求值遗留的节点合并进本次需要处理的节点列表"""
+        with self._interrupted_lock:
+            full_render = self._interrupted_full_render
+            interrupted_ids = self._interrupted_node_ids
+            self._interrupted_full_render = False
+            self._interrupted_node_ids = set()
+
+        if changed_nodes is None or full_render:
+            return None
+        if not interrupted_ids:
+            return changed_nodes
+
+        merged_nodes = list(changed_nodes)
+        merged_ids = set(n['id'] for n in merged_nodes if isinstance(n, dict) and 'id' in n)
+        for node in self.nodes:
+            if node['id'] in interrupted_ids and node['id'] not in merged_ids:
+                merged_nodes.append(node)
+                merged_ids.add(node['id'])
+        return merged_nodes
+
+    def get_node_process_params(self, node, inputs=None):
+        """
+        提取传给process的扁平参数字典
+
+        参数:
+            inputs: 节点的输入，提供时按代理分辨率缩放以像素为单位的参数
+        """
+        if 'params' in node and isinstance(node['params'], dict):
+            params = {name: param_info.get('value') for name, param_info in node['params'].items() if isinstance(param_info, dict)}
+            if inputs is not None:
+                params = self._scale_pixel_params(node, params, inputs)
+            return params
+        return {}
+
+    def _scale_pixel_params(self, node, params, inputs):
+        """
+        代理分辨率下把以像素为单位的参数（参数元信息中声明 'units': 'px'）乘以 proxy_scale，整数参数四舍五入为整数
+
+        只缩放收到代理分辨率图像的节点；源节点按完整分辨率参数生成图像后再由引擎缩小，参数保持不变。
+
+        参数:
+            node: 节点
+            params: 扁平参数字典，原地修改
+            inputs: 节点的输入
+
+        返回:
+            dict: 缩放后的参数字典
+        """
+        proxy_level = self.proxy_level
+        if not proxy_level or not self._has_image_inputs(inputs):
+            return params
+        proxy_scale = 1.0 / (2 ** proxy_level)
+        for name, param_info in node.get('params', {}).items():
+            if not isinstance(param_info, dict) or param_info.get('units') != 'px' or name not in params:
+                continue
+            value = params[name]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            # 整数参数（如滑块值）取整后仍为整数，脚本可能把它们直接用作索引或尺寸
+            params[name] = int(round(value * proxy_scale)) if isinstance(value, int) else value * proxy_scale
+        return params
+
+    def _get_node_cache_key(self, node):
+        """
+        返回节点输出的内容寻址缓存键（Merkle式指纹）
+
+        指纹 = hash(脚本文件内容, 规范化的参数, 所连接上游输出的指纹及端口)，
+        因此任意上游（无论隔了几层）的变化都会改变下游的键，而两个完全相同的节点可以共享结果。
+        求值期间使用按拓扑顺序预先计算好的指纹，其他情况下按需递归计算。
+
+        参数:
+            node: 要处理的节点
+
+        返回:
+            固定长度的十六进制摘要字符串
+        """
+        fingerprints = self._evaluation_fingerprints
+        if fingerprints is not None:
+            cached_fingerprint = fingerprints.get(node.get('id'))
+            if cached_fingerprint is not None:
+                return cached_fingerprint
+        return self._compute_node_fingerprint(node, {})
+
+    def _compute_node_fingerprints(self):
+        """
+        按拓扑顺序计算所有节点的指纹，每个节点只计算一次
+
+        返回:
+            dict: node_id -> 指纹
+        """
+        fingerprints = {}
+        for node_id in self.graph_index.topological_order():
+            node = self.graph_index.nodes_by_id.get(node_id)
+            if node is not None:
+                fingerprints[node_id] = self._compute_node_fingerprint(node, fingerprints)
+        return fingerprints
+
+    def _compute_node_fingerprint(self, node, fingerprints):
+        """
+        计算单个节点的指纹，上游指纹优先从fingerprints中读取，缺失时递归计算并写回
+
+        参数:
+            node: 节点
+            fingerprints (dict): node_id -> 已计算的指纹
+        """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(b"script:")
+        hasher.update(self._get_script_content_hash(node.get('script_path', '')).encode('ascii'))
+        hasher.update(b"|params:")
+        hasher.update(self._get_canonical_params(node).encode('utf-8'))
+
+        # 代理分辨率下的输出与完整分辨率不同，每个金字塔层级使用独立的缓存项
+        proxy_level = self.proxy_level
+        if proxy_level:
+            hasher.update(f"|proxy:{proxy_level}".encode('utf-8'))
+
+        for conn in self.graph_index.get_input_connections(node.get('id')):
+            upstream_node = conn['output_node']
+            upstream_fingerprint = fingerprints.get(upstream_node['id'])
+            if upstream_fingerprint is None:
+                upstream_fingerprint = self._compute_node_fingerprint(upstream_node, fingerprints)
+                fingerprints[upstream_node['id']] = upstream_fingerprint
+            hasher.update(f"|in{conn['input_port']}<-{upstream_fingerprint}:{conn['output_port']}".encode('utf-8'))
+
+        return hasher.hexdigest()
+
+    def _get_canonical_params(self, node):
+        """
+        返回节点参数值的规范化JSON表示（按参数名排序）
+
+        路径类型参数额外包含文件的修改时间和大小，磁盘上的文件被修改后指纹随之变化。
+        """
+        canonical = {}
+        for param_name, param_info in node.get('params', {}).items():
+            if not isinstance(param_info, dict):
+                continue
+            value = param_info.get('value')
+            if param_info.get('type') == 'path' and isinstance(value, str) and value:
+                try:
+                    stat_result = os.stat(value)
+                    value = [value, stat_result.st_mtime_ns, stat_result.st_size]
+                except OSError:
+                    pass
+            canonical[param_name] = value
+        return json.dumps(canonical, sort_keys=True, ensure_ascii=False, default=repr)
+
+    def _get_script_content_hash(self, script_path):
+        """返回脚本文件内容的哈希（按路径、修改时间和大小缓存）"""
+        try:
+            stat_result = os.stat(script_path)
+        except OSError:
+            return "missing:" + hashlib.blake2b(str(script_path).encode('utf-8'), digest_size=8).hexdigest()
+
+        cache_entry = self._script_hash_cache.get(script_path)
+        stamp = (stat_result.st_mtime_ns, stat_result.st_size)
+        if cache_entry is not None and cache_entry[0] == stamp:
+            return cache_entry[1]
+
+        with open(script_path, 'rb') as f:
+            content_hash = hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+        if cache_entry is not None and cache_entry[1] != content_hash:
+            # 脚本内容已修改，旧指纹的缓存项在下一次求值开始时释放
+            self._changed_script_paths.add(script_path)
+        self._script_hash_cache[script_path] = (stamp, content_hash)
+        return content_hash
+
+    def _has_image_inputs(self, inputs):
+        """输入中是否包含图像数组（1x1常量等不算）"""
+        return any(isinstance(value, np.ndarray) and value.ndim >= 2 and min(value.shape[:2]) > 1
+                   for value in inputs.values())
+
+    def _downscale_outputs_to_proxy(self, outputs, level):
+        """
+        把源节点输出中的图像缩小到代理层级（边长为完整分辨率的 1/2**level）
+
+        只处理图像类型（img、f32bmp、tif16及其伪类型）的端口，同一个数组对应的多个键共享缩小结果。
+        """
+        import cv2
+        factor = 2 ** level
+        resized_by_id = {}
+        for key, value in list(outputs.items()):
+            # 同类型的多个输出端口带有 _1、_2 等序号后缀
+            port_type = re.sub(r'_\d+$', '', key)
+            if self.pseudo_types.get(port_type, port_type) not in ('img', 'f32bmp', 'tif16'):
+                continue
+            if not isinstance(value, np.ndarray) or value.ndim not in (2, 3) or min(value.shape[:2]) < factor * 2:
+                continue
+            resized = resized_by_id.get(id(value))
+            if resized is None:
+                height, width = value.shape[:2]
+                new_size = (max(1, int(round(width / factor))), max(1, int(round(height / factor))))
+                resized = cv2.resize(value, new_size, interpolation=cv2.INTER_AREA)
+                if value.ndim == 3 and resized.ndim == 2:
+                    # 单通道的三维数组被cv2.resize压成二维，恢复通道维度
+                    resized = resized[:, :, np.newaxis]
+                resized_by_id[id(value)] = resized
+            outputs[key] = resized
+        return outputs
+
+    def process_node(self, node):
+        """
+        处理单个节点并返回输出（线程安全）
+
+        并行执行时多个工作线程可能通过 get_node_inputs 同时拉取同一个上游节点，
+        这里按节点加锁，保证每个节点只会被处理一次。
+
+        异常:
+            TNXEngineError: 节点或其上游节点处理出错，消息中包含出错节点的标题，原始异常在 __cause__ 中
+        """
+        # 检查node是否有效
+        if not isinstance(node, dict):
+            print(f"警告: process_node接收到的'node'不是字典: {type(node)}")
+            return {}
+
+        with self._get_node_process_lock(node):
+            return self._process_node_impl(node)
+
+    def _process_node_impl(self, node):
+        """处理单个节点并返回输出，正确处理Neo和Legacy脚本，支持性能模式自动缩放"""
+
+        # 如果节点已处理，直接返回结果（但要确保结果不为空）
+        if 'processed_outputs' in node:
+            # 确保返回的是一个字典，即使之前存储的是None或其他类型
+            outputs = node['processed_outputs']
+            if isinstance(outputs, dict) and outputs:  # 确保输出不为空
+                return outputs
+            else:
+                # 如果输出为空或无效，清除processed_outputs以重新处理
+                if self.verbose:
+                    print(f"节点 '{node.get('title', '未知')}' 的processed_outputs为空，重新处理")
+                del node['processed_outputs']
+
+        # 计算缓存键，并记录参数签名以检测处理期间的参数修改
+        cache_key = self._get_node_cache_key(node)
+        params_signature = self._get_canonical_params(node)
+        self.cache_key_index.record(node.get('id'), cache_key)
+        node_title = node.get('title', '未知')
+        node_id = node.get('id', '未知ID')
+
+        # 调试：打印缓存键信息
+        if self.verbose:
+            print(f"节点 '{node_title}' ({node_id}) 缓存键: {cache_key[:100]}...")
+
+        # 尝试从缓存中获取结果，内存缓存未命中时再查磁盘二级缓存（数组以只读内存映射打开）
+        cached_result = self.node_cache.get(cache_key)
+        cache_source = 'memory'
+        if cached_result is None and self.disk_cache is not None:
+            cached_result = self.disk_cache.get(cache_key)
+            cache_source = 'disk'
+            if cached_result is not None and self.verbose:
+                print(f"磁盘缓存命中：节点 '{node_title}' ({node_id})")
+        if cached_result is None and self.persistent_cache is not None:
+            cached_result = self.persistent_cache.get(cache_key)
+            cache_source = 'persistent'
+            if cached_result is not None and self.verbose:
+                print(f"持久化缓存命中：节点 '{node_title}' ({node_id})")
+        if cached_result is not None:
+            self.profiler.annotate(node_id, cache=cache_source)
+            # 有缓存结果，记录缓存命中并直接使用
+            node_type = node.get('script_info', {}).get('node_type', '未知类型')
+
+            if self.verbose:
+                print(f"缓存命中：节点 '{node_title}' ({node_id}) - 类型: {node_type}")
+
+            # 缓存中的数组是只读的，直接共享，只复制外层字典和元数据（与图像大小无关）
+            cached_result_copy = self._share_cached_outputs(cached_result)
+
+            # 保存到节点缓存，避免再次计算；缓存结果没有实际读取上游输出，
+            # 来源记录只保存上游指纹（以及上游当前输出的弱引用），上游指纹不变时仍可提前截止
+            node['processed_outputs'] = cached_result_copy
+            node.pop('outputs_released', None)
+            upstream_outputs = {}
+            for conn in self.graph_index.get_input_connections(node.get('id')):
+                outputs = conn['output_node'].get('processed_outputs')
+                upstream_outputs[conn['output_node']['id']] = WeakOutputs(outputs) if outputs else None
+            self._node_provenance[node.get('id')] = (cached_result_copy, self._build_provenance_inputs(node, upstream_outputs))
+            return cached_result_copy
+        else:
+            # 调试：打印缓存未命中信息
+            if self.verbose:
+                print(f"缓存未命中：节点 '{node_title}' ({node_id})")
+
+        # 初始化输出
+        outputs = {}
+        inputs = {}
+        consumed_inputs = {}
+        context = None
+        try:
+            # 获取节点输入（包含元数据），同时记录实际使用的上游输出
+            inputs = self.get_node_inputs(node, consumed_inputs)
+
+            # 提取元数据
+            input_metadata = inputs.pop('_metadata', {})
+
+            # 获取节点参数（代理分辨率下缩放以像素为单位的参数）
+            params = self.get_node_process_params(node, inputs)
+
+            # 声明了InPlaceSafe的节点接管只被它使用、没有其他引用的上游输出缓冲区，其余输入保持只读
+            if self._node_accepts_inplace(node):
+                self._prepare_inplace_inputs(node, inputs, consumed_inputs, params)
+
+            # 获取应用上下文(对NeoScript有用)
+            context = self.get_application_context(node)
+
+            # 调用节点的处理函数（记录耗时，作为缓存淘汰时的重算成本）
+            compute_start = time.perf_counter()
+            if node.get('module') and hasattr(node['module'], 'process'):
+                script_type = node.get('script_type', 'legacy')
+                node_title = node.get('title', '未知')
+                process_func = node['module'].process
+
+                # 根据脚本类型调用处理函数
+                if script_type == 'neo':
+                    # NeoScript: 可接收context参数
+                    import inspect
+                    sig = inspect.signature(process_func)
+                    if len(sig.parameters) == 3:
+                        outputs = self.run_node_process(node, process_func, inputs, params, context)
+                    elif len(sig.parameters) == 2:
+                        print(f"警告: NeoScript '{node_title}'的process函数只有两个参数，未传递context")
+                        outputs = self.run_node_process(node, process_func, inputs, params)
+                    else:
+                        raise TNXEngineError(f"NeoScript '{node_title}' 的process函数签名不正确")
+                else:
+                    # Legacy script: 默认只接收inputs和params，声明了第三个参数的脚本同样可以获得context
+                    import inspect
+                    try:
+                        accepts_context = len(inspect.signature(process_func).parameters) == 3
+                    except (TypeError, ValueError):
+                        accepts_context = False
+                    if accepts_context:
+                        outputs = self.run_node_process(node, process_func, inputs, params, context)
+                    else:
+                        outputs = self.run_node_process(node, process_func, inputs, params)
+
+                # --- 处理伪类型输出 ---
+                # 如果输出中包含伪类型对应的真实类型数据，添加伪类型标签副本
+                for pseudo_type, real_type in self.pseudo_types.items():
+                    if real_type in outputs and pseudo_type not in outputs:
+                        # 创建对原始数据的引用，不复制数据
+                        outputs[pseudo_type] = outputs[real_type]
+                        if self.verbose:
+                            print(f"为节点 '{node_title}' 添加伪类型输出: {pseudo_type} -> {real_type}")
+
+                # --- 代理分辨率：源节点（没有图像输入）的图像输出缩小到当前金字塔层级，下游节点都在代理分辨率上计算 ---
+                proxy_level = self.proxy_level
+                if proxy_level and outputs and not self._has_image_inputs(inputs):
+                    outputs = self._downscale_outputs_to_proxy(outputs, proxy_level)
+            else:
+                # 模块或process函数不存在
+                print(f"节点{node.get('title', '未知')}没有有效的process处理函数或模块")
+                outputs = {}
+
+        except TNXEngineError:
+            # 上游节点的错误已注明出错的节点，原样向下游传递
+            raise
+        except Exception as e:
+            raise TNXEngineError(f"处理节点 '{node_title}' 时出错: {e}") from e
+
+        # 确保outputs是一个字典
+        if not isinstance(outputs, dict):
+            outputs = {}
+
+        # 更新节点元数据
+        if 'metadata' not in node:
+            node['metadata'] = self.metadata_manager.create_metadata(
+                node_id=node.get('id'),
+                node_title=node.get('title', '未知'),
+                script_path=node.get('script_path', '')
+            )
+
+        # 合并输入元数据到当前节点元数据
+        if input_metadata:
+            node['metadata'] = self.metadata_manager.merge_metadata(node['metadata'], input_metadata)
+
+        # 添加当前节点到处理路径
+        node['metadata'] = self.metadata_manager.add_node_to_path(
+            node['metadata'],
+            node.get('id'),
+            node.get('title', '未知')
+        )
+
+        # 记录处理操作
+        node['metadata'] = self.metadata_manager.add_processing_record(
+            node['metadata'],
+            'process_node',
+            {
+                'script_type': node.get('script_type', 'legacy'),
+                'script_path': node.get('script_path', ''),
+                'output_types': list(outputs.keys()) if outputs else []
+            }
+        )
+
+        # 为每个输出添加元数据（如果脚本没有返回_metadata）
+        enhanced_outputs = {}
+        for output_key, output_value in outputs.items():
+            if output_key == '_metadata':
+                # 如果脚本返回了_metadata，跳过处理
+                continue
+            enhanced_outputs[output_key] = output_value
+
+        # 如果脚本没有返回_metadata，为所有输出添加当前节点的元数据
+        if '_metadata' not in outputs and enhanced_outputs:
+            enhanced_outputs['_metadata'] = self.metadata_manager.copy_metadata(node['metadata'])
+        elif '_metadata' in outputs:
+            # 如果脚本返回了_metadata，合并到节点元数据中
+            script_metadata = outputs['_metadata']
+            if isinstance(script_metadata, dict):
+                node['metadata'] = self.metadata_manager.merge_metadata(node['metadata'], script_metadata)
+            enhanced_outputs['_metadata'] = self.metadata_manager.copy_metadata(node['metadata'])
+
+        # 输出数组设为只读后再交给下游和缓存，需要修改的脚本通过make_writable获取副本
+        freeze_outputs(enhanced_outputs)
+        if self.profiler.active_run() is not None:
+            # 与输入共享内存的输出（直通、原地修改、视图）不算新分配的内存
+            input_arrays = [value for value in inputs.values() if isinstance(value, np.ndarray)]
+            self.profiler.annotate(node_id, cache='miss', allocated_bytes=self._outputs_nbytes(enhanced_outputs, input_arrays))
+
+        # 保存处理结果到节点，并记录该结果所依据的上游指纹和输出（供提前截止判断）
+        node['processed_outputs'] = enhanced_outputs
+        node.pop('outputs_released', None)
+        self._node_provenance[node.get('id')] = (enhanced_outputs, self._build_provenance_inputs(node, consumed_inputs))
+
+        # 将处理结果存储到LRU缓存中（只有当输出有效时才存储）
+        try:
+            # 检查输出是否有效（不为空且包含实际数据）
+            has_valid_output = False
+            for key, value in enhanced_outputs.items():
+                if key != '_metadata' and value is not None:
+                    has_valid_output = True
+                    break
+
+            # 后台渲染期间参数可能在GUI线程中被修改，此时结果与缓存键不再对应，不能存入缓存
+            if has_valid_output and self._get_canonical_params(node) != params_signature:
+                has_valid_output = False
+                if self.verbose:
+                    print(f"节点 '{node_title}' 的参数在处理期间被修改，跳过缓存存储")
+
+            if has_valid_output:
+                # 数组已设为只读，缓存与节点共享同一份数据，无需深拷贝
+                enhanced_outputs_copy = self._share_cached_outputs(enhanced_outputs)
+                compute_cost = time.perf_counter() - compute_start
+                stored = self.node_cache.put(cache_key, enhanced_outputs_copy, cost=compute_cost)
+                if not stored and self.verbose:
+                    print(f"节点 '{node_title}' 的输出超过缓存字节预算，跳过缓存存储")
+                if stored and self.buffer_pool_enabled:
+                    self._recycle_superseded_outputs(node_id, cache_key, enhanced_outputs)
+                # 可选：打印缓存统计信息（仅在调试时）
+                if self.verbose:
+                    stats = self.node_cache.get_stats()
+                    print(f"缓存存储：节点 '{node_title}' ({node_id}) - 输出类型: {list(enhanced_outputs.keys())} - 缓存大小: {stats['current_size']}/{stats['max_size']} 条, {stats['current_bytes'] / (1024 * 1024):.1f} MB")
+            else:
+                if self.verbose:
+                    print(f"跳过缓存存储：节点 '{node_title}' ({node_id}) - 输出为空或无效")
+        except Exception as e:
+            print(f"存储节点缓存时出错: {e}")
+
+        # 通知界面（节点内预览、独立预览窗口等）节点已重新计算
+        self.on_node_processed(node, context)
+
+        return outputs
+
+    def get_node_inputs(self, node, consumed=None, upstream_outputs=None):
+        """
+        获取节点的输入数据，支持灵活端口
+
+        参数:
+            node: 节点
+            consumed (dict): 可选，记录实际使用的上游输出（上游节点ID -> 输出字典）
+            upstream_outputs (dict): 可选，上游节点ID -> 代替该节点输出使用的输出字典（如可见区域求值时裁切后的输出）
+        """
+        inputs = {}
+        input_type_counts = {}  # 记录每种类型输入的数量
+
+        # 初始化输入类型计数
+        # 注意：这里要考虑灵活端口可能会有多个同类型端口
+        # 使用port_widgets而不是script_info['inputs']，因为灵活端口可能增加了端口数量
+        if 'port_widgets' in node and 'inputs' in node['port_widgets']:
+            for port_idx, port_info in node['port_widgets']['inputs'].items():
+                input_type = port_info['type']
+                if input_type not in input_type_counts:
+                    input_type_counts[input_type] = 0
+        else:
+            # 回退到原来的逻辑
+            for input_type in node['script_info']['inputs']:
+                input_type_counts[input_type] = 0
+
+        # 首先按照输入端口索引排序连接，确保输入顺序一致（索引已按端口排序）
+        input_connections = self.graph_index.get_input_connections(node['id'])
+
+                        # 处理每个连接
+        for conn in input_connections:
+            # 获取输出节点数据
+            output_node = conn['output_node']
+            output_port = conn['output_port']
+            input_port = conn['input_port']
+
+            # 获取输入类型 - 使用端口部件信息
+            try:
+                if 'port_widgets' in node and 'inputs' in node['port_widgets'] and input_port in node['port_widgets']['inputs']:
+                    input_type = node['port_widgets']['inputs'][input_port]['type']
+                else:
+                    # 如果找不到端口信息，回退到script_info
+                    # 对于灵活端口节点，可能会有额外的端口
+                    if 'flexible_ports' in node and 'inputs' in node['flexible_ports'] and node['flexible_ports']['inputs']:
+                        # 如果是灵活端口节点，且输入端口超出了基本输入数量
+                        if isinstance(input_port, int) and input_port >= len(node['script_info']['inputs']):
+                            # 使用灵活端口类型
+                            input_type = node['flexible_ports']['inputs'][0]  # 使用第一个灵活类型
+                        elif isinstance(input_port, int) and input_port < len(node['script_info']['inputs']):
+                            input_type = node['script_info']['inputs'][input_port]
+                        else:
+                            # 无法确定端口类型，跳过此连接
+                            continue
+                    elif isinstance(input_port, int) and input_port < len(node['script_info']['inputs']):
+                        input_type = node['script_info']['inputs'][input_port]
+                    else:
+                        # 安静地跳过，不打印警告以避免刷屏
+                        continue
+            except Exception as e:
+                print(f"获取节点 {node['title']} 的输入端口 {input_port} 类型时出错: {str(e)}")
+                continue
+
+            # 处理输出节点
+            if upstream_outputs is not None and output_node['id'] in upstream_outputs:
+                output_data = upstream_outputs[output_node['id']]
+            else:
+                output_data = self.process_node(output_node)
+            if consumed is not None:
+                consumed[output_node['id']] = output_data
+
+            # 获取相应端口的输出数据
+            if output_data:
+                # 获取输出类型 - 同样使用端口部件信息
+                try:
+                    if 'port_widgets' in output_node and 'outputs' in output_node['port_widgets'] and output_port in output_node['port_widgets']['outputs']:
+                        output_type = output_node['port_widgets']['outputs'][output_port]['type']
+                    else:
+                        # 回退到script_info
+                        # 对于灵活端口节点，可能会有额外的端口
+                        if 'flexible_ports' in output_node and 'outputs' in output_node['flexible_ports'] and output_node['flexible_ports']['outputs']:
+                            # 如果是灵活端口节点，且输出端口超出了基本输出数量
+                            if isinstance(output_port, int) and output_port >= len(output_node['script_info']['outputs']):
+                                # 使用灵活端口类型
+                                output_type = output_node['flexible_ports']['outputs'][0]  # 使用第一个灵活类型
+                            elif isinstance(output_port, int) and output_port < len(output_node['script_info']['outputs']):
+                                output_type = output_node['script_info']['outputs'][output_port]
+                            else:
+                                # 无法确定端口类型，跳过此连接
+                                continue
+                        elif isinstance(output_port, int) and output_port < len(output_node['script_info']['outputs']):
+                            output_type = output_node['script_info']['outputs'][output_port]
+                        else:
+                            # 安静地跳过，不打印警告以避免刷屏
+                            continue
+                except Exception as e:
+                    print(f"获取节点 {output_node['title']} 的输出端口 {output_port} 类型时出错: {str(e)}")
+                    continue
+
+                # 检查输出是否是伪类型
+                real_output_type = output_type
+                if output_type in self.pseudo_types:
+                    real_output_type = self.pseudo_types[output_type]
+                    if self.verbose:
+                        print(f"伪类型转换: {output_type} -> {real_output_type}")
+
+                # 如果是伪类型但数据中仍使用原始类型，则获取原始类型的数据
+                if output_type in self.pseudo_types and real_output_type in output_data:
+                    # 增加此类型输入的计数
+                    input_type_counts[input_type] += 1
+                    count = input_type_counts[input_type]
+
+                    # 对于第一个该类型的输入，使用原始类型名
+                    if count == 1:
+                        # 确保节点得到正确类型的数据，但保持输入标签为伪类型
+                        inputs[input_type] = output_data[real_output_type]
+                    else:
+                        # 对于额外的同类型输入，添加序号
+                        inputs[f"{input_type}_{count - 1}"] = output_data[real_output_type]
+                elif output_type in output_data:
+                    # 正常类型处理
+                    input_type_counts[input_type] += 1
+                    count = input_type_counts[input_type]
+
+                    # 对于第一个该类型的输入，使用原始类型名
+                    if count == 1:
+                        inputs[input_type] = output_data[output_type]
+                    else:
+                        # 对于额外的同类型输入，添加序号
+                        inputs[f"{input_type}_{count - 1}"] = output_data[output_type]
+
+        # 收集所有上游节点的元数据
+        accumulated_metadata = {}
+        for conn in input_connections:
+            output_node = conn['output_node']
+            if 'metadata' in output_node:
+                upstream_metadata = self.metadata_manager.copy_metadata(output_node['metadata'])
+                accumulated_metadata = self.metadata_manager.merge_metadata(
+                    accumulated_metadata, upstream_metadata
+                )
+
+        # 将累积的元数据添加到输入中
+        if accumulated_metadata:
+            inputs['_metadata'] = accumulated_metadata
+
+        return inputs
+
+    def invalidate_node_cache(self, node_id, reason="未知"):
+        """
+        使指定节点的所有缓存失效
+
+        参数:
+            node_id: 节点ID
+            reason: 失效原因（用于调试）
+        """
+        # 通过反向索引找到该节点的全部缓存项；仍被其他相同节点引用的缓存项保留
+        removed_count = self._remove_cache_entries(self.cache_key_index.release(node_id))
+
+        if removed_count > 0 and self.verbose:
+            print(f"缓存失效：节点 {node_id} - 原因: {reason} - 移除了 {removed_count} 个缓存项")
+
+    def release_changed_scripts(self):
+        """
+        脚本文件内容变化后，移除使用该脚本的节点及其全部下游节点的缓存项
+
+        缓存键包含脚本内容哈希和上游指纹，这些缓存项不会再被命中，直接释放所占的内存和磁盘空间。
+        参数修改和连接变化不需要处理：缓存按内容指纹寻址，旧的缓存项不会被错误命中，
+        参数改回原值时还可以直接复用，由缓存按预算淘汰。
+        """
+        changed_paths, self._changed_script_paths = self._changed_script_paths, set()
+        if not changed_paths:
+            return
+        affected_ids = set()
+        for node in list(self.nodes):
+            if node.get('script_path') in changed_paths:
+                affected_ids.add(node['id'])
+                affected_ids.update(self.graph_index.downstream_ids(node['id']))
+        for node_id in affected_ids:
+            self.invalidate_node_cache(node_id, "脚本已修改")
+
+    def _remove_cache_entries(self, cache_keys):
+        """从内存缓存和磁盘二级缓存中移除指定的缓存项，返回移除的数量"""
+        removed_count = 0
+        for cache_key in cache_keys:
+            if self.node_cache.remove(cache_key):
+                removed_count += 1
+            if self.disk_cache is not None and self.disk_cache.remove(cache_key):
+                removed_count += 1
+        return removed_count
+
+    def persist_node_outputs(self):
+        """
+        把当前所有节点的输出写入持久化缓存（在后台线程中写盘）
+
+        只有输出与节点当前的内容指纹一致时才会写入，避免把过期结果存到新的键下。
+
+        返回:
+            提交写入的缓存项数量
+        """
+        if self.persistent_cache is None:
+            return 0
+
+        fingerprints = self._compute_node_fingerprints()
+        entries = []
+        for node in list(self.nodes):
+            cache_key = fingerprints.get(node.get('id'))
+            if cache_key is None or self.cache_key_index.latest(node.get('id')) != cache_key:
+                continue
+            if self.persistent_cache.contains(cache_key):
+                continue
+            outputs = node.get('processed_outputs')
+            if not outputs and node.get('outputs_released', False):
+                # 已释放的中间结果仍可能在内存缓存中
+                outputs = self.node_cache.get(cache_key)
+            if not isinstance(outputs, dict) or not outputs:
+                continue
+            entries.append((cache_key, dict(outputs)))
+
+        if not entries:
+            return 0
+
+        if self._persist_executor is None:
+            self._persist_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="TNXCachePersist")
+
+        def write_entries():
+            written = 0
+            for cache_key, outputs in entries:
+                if self.persistent_cache.put(cache_key, outputs):
+                    written += 1
+            print(f"持久化缓存：已写入 {written}/{len(entries)} 个节点输出")
+
+        self._persist_executor.submit(write_entries)
+        return len(entries)
+
+    def _recycle_superseded_outputs(self, node_id, cache_key, outputs):
+        """
+        输出使用了节点缓冲区池时，把该节点之前存入缓存的同形状输出移出内存缓存
+
+        缓冲区归池所有：缓存中每个节点每种形状只保留最新的池输出，被取代的旧输出不再持有缓冲区，
+        拖动滑块时池在少数几块缓冲区之间轮换，而不是每次都申请新的内存。
+        参数改回旧值时该节点需要重新计算；仍被其他相同节点引用的缓存项保留。
+        """
+        pool = self.buffer_pools.get(node_id)
+        if pool is None:
+            return
+        pooled = [value for value in outputs.values() if isinstance(value, np.ndarray) and pool.tracks(value)]
+        if not pooled:
+            return
+        previous_key = pool.swap_cache_key(pooled, cache_key)
+        if previous_key is None:
+            return
+        for orphaned_key in self.cache_key_index.release(node_id, [previous_key]):
+            self.node_cache.remove(orphaned_key)
+
+    def _share_cached_outputs(self, outputs):
+        """
+        浅复制节点输出字典用于缓存存取
+
+        数组本身是只读的，可以在缓存和节点之间直接共享；只有外层字典和可变的元数据会被复制，
+        因此缓存命中的开销与图像大小无关。
+        """
+        shared = dict(outputs)
+        if isinstance(shared.get('_metadata'), dict):
+            shared['_metadata'] = self.metadata_manager.copy_metadata(shared['_metadata'])
+        return shared
+
+    def print_cache_stats(self):
+        """打印LRU缓存统计信息到命令行"""
+        stats = self.node_cache.get_stats()
+        print("\n=== LRU缓存统计信息 ===")
+        print(f"缓存命中次数: {stats['hits']}")
+        print(f"缓存未命中次数: {stats['misses']}")
+        print(f"总请求次数: {stats['total_requests']}")
+        print(f"缓存命中率: {stats['hit_rate']:.2%}")
+        print(f"当前缓存大小: {stats['current_size']}")
+        print(f"最大缓存大小: {stats['max_size']}")
+        print(f"缓存使用率: {stats['current_size']/stats['max_size']:.1%}")
+        print(f"当前缓存内存: {stats['current_bytes'] / (1024 * 1024):.1f} MB")
+        if stats['max_bytes']:
+            print(f"缓存内存上限: {stats['max_bytes'] / (1024 * 1024):.1f} MB")
+            print(f"内存使用率: {stats['current_bytes']/stats['max_bytes']:.1%}")
+        print(f"淘汰次数: {stats['evictions']}")
+        if self.disk_cache is not None:
+            disk_stats = self.disk_cache.get_stats()
+            print("--- 磁盘二级缓存 ---")
+            print(f"命中/未命中: {disk_stats['hits']}/{disk_stats['misses']} ({disk_stats['hit_rate']:.2%})")
+            print(f"缓存项: {disk_stats['current_size']}, 写入次数: {disk_stats['writes']}, 淘汰次数: {disk_stats['evictions']}")
+            print(f"磁盘占用: {disk_stats['current_bytes'] / (1024 * 1024):.1f} / {disk_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+        if self.persistent_cache is not None:
+            persist_stats = self.persistent_cache.get_stats()
+            print("--- 持久化缓存 ---")
+            print(f"命中/未命中: {persist_stats['hits']}/{persist_stats['misses']} ({persist_stats['hit_rate']:.2%})")
+            print(f"缓存项: {persist_stats['current_size']}, 写入次数: {persist_stats['writes']}, 淘汰次数: {persist_stats['evictions']}")
+            print(f"磁盘占用: {persist_stats['current_bytes'] / (1024 * 1024):.1f} / {persist_stats['max_bytes'] / (1024 * 1024):.0f} MB")
+        if self.buffer_pools:
+            pool_stats = [pool.get_stats() for pool in list(self.buffer_pools.values())]
+            print("--- 输出缓冲区池 ---")
+            print(f"分配/复用: {sum(st['allocations'] for st in pool_stats)}/{sum(st['reuses'] for st in pool_stats)}")
+            print(f"空闲缓冲区: {sum(st['idle_bytes'] for st in pool_stats) / (1024 * 1024):.1f} MB")
+        print("========================\n")
+
+    def evaluate_graph(self, changed_nodes=None, is_cancelled=None, sinks=None):
+        """
+        按拓扑顺序对节点图求值，不涉及任何界面操作，可以在后台渲染线程中运行
+
+        参数:
+            changed_nodes (list): 需要重新处理的节点列表，None表示全部重新处理
+            is_cancelled (callable): 返回True时在节点之间停止处理
+            sinks (list): 按需求值模式下的汇节点，None表示使用默认汇节点
+                （预览节点和打开了独立预览窗口的节点）
+
+        返回:
+            dict: processed_node_ids, processed_count, error_occurred, errors（节点ID -> 异常）, cancelled, node_times, processing_time
+        """
+        processed_node_ids = set() # 记录在此次运行中处理的节点
+        result = {
+            'processed_node_ids': processed_node_ids,
+            'processed_count': 0,
+            'error_occurred': False,
+            'errors': {},
+            'cancelled': False,
+            'node_times': {},
+            'processing_time': 0.0
+        }
+
+        # 合并之前被取消的渲染中尚未完成的节点
+        changed_nodes = self.merge_interrupted_nodes(changed_nodes)
+
+        if not self.nodes:
+            return result
+
+        # 按拓扑顺序一次性计算本次求值中所有节点的内容指纹（缓存键）
+        self._evaluation_fingerprints = self._compute_node_fingerprints()
+        self.release_changed_scripts()
+
+        # --- 1. 初始化处理状态 ---
+        # processing_state: node_id -> {'node': node_obj, 'inputs_needed': set(indices), 'inputs_received': set(indices), 'status': 'pending/ready/processing/done/error'}
+        processing_state = {}
+        # input_connections: input_node_id -> list of {output_node_id, output_port_idx, input_port_idx}
+        input_connections = {node['id']: [] for node in self.nodes}
+        # output_connections: output_node_id -> list of {input_node_id, input_port_idx, output_port_idx}
+        output_connections = {node['id']: [] for node in self.nodes}
+
+        # 使用连接列表的快照，避免GUI线程在后台求值期间修改列表
+        for conn in list(self.connections):
+            in_node_id = conn['input_node']['id']
+            out_node_id = conn['output_node']['id']
+            input_connections[in_node_id].append({
+                'output_node_id': out_node_id,
+                'output_port_idx': conn['output_port'],
+                'input_port_idx': conn['input_port']
+            })
+            output_connections[out_node_id].append({
+                'input_node_id': in_node_id,
+                'input_port_idx': conn['input_port'],
+                'output_port_idx': conn['output_port']
+            })
+
+        for node in self.nodes:
+            node_id = node['id']
+            num_expected_inputs = len(node['script_info'].get('inputs', []))
+            inputs_needed = set(idx for idx in range(num_expected_inputs)
+                                if any(conn_info['input_port_idx'] == idx for conn_info in input_connections[node_id]))
+            processing_state[node_id] = {
+                'node': node,
+                'inputs_needed': inputs_needed,
+                'inputs_received': set(),
+                'status': 'pending'
+            }
+
+        # --- 2. 确定处理范围和起始节点 ---
+        nodes_to_process_ids = set()
+        if changed_nodes is None:
+            # 完全重新计算
+            nodes_to_process_ids = set(processing_state.keys())
+        else:
+            # 选择性重新计算
+            nodes_to_process_ids = set(n['id'] for n in changed_nodes)
+            queue = list(nodes_to_process_ids)
+            while queue:
+                current_id = queue.pop(0)
+                for conn_info in output_connections.get(current_id, []):
+                    downstream_id = conn_info['input_node_id']
+                    if downstream_id not in nodes_to_process_ids:
+                        nodes_to_process_ids.add(downstream_id)
+                        queue.append(downstream_id)
+            # 对于受影响的节点，重置其状态
+            for node_id in nodes_to_process_ids:
+                processing_state[node_id]['status'] = 'pending'
+                processing_state[node_id]['inputs_received'] = set()
+            # 对于未受影响的节点，标记为完成 (假设它们有缓存的结果)
+            for node_id in processing_state:
+                 if node_id not in nodes_to_process_ids:
+                      processing_state[node_id]['status'] = 'done' # 标记为完成
+                      # 不需要添加到 processed_node_ids，因为我们只关心本次运行处理的
+
+        # --- 按需求值：只处理汇节点上游闭包内的节点 ---
+        if self.demand_driven_evaluation:
+            sink_ids = self._get_demand_sink_ids(sinks, processing_state)
+            if sink_ids:
+                required_ids = self._collect_upstream_node_ids(sink_ids, input_connections)
+                skipped_ids = nodes_to_process_ids - required_ids
+                for node_id in skipped_ids:
+                    # 不被任何汇节点需要的节点暂不计算，清除其过期输出，等到被需要时再处理
+                    processing_state[node_id]['status'] = 'skipped'
+                    processing_state[node_id]['node'].pop('processed_outputs', None)
+                    processing_state[node_id]['node'].pop('outputs_released', None)
+                nodes_to_process_ids &= required_ids
+                if skipped_ids and self.verbose:
+                    print(f"按需求值: 跳过 {len(skipped_ids)} 个不影响汇节点的节点")
+
+        # 清除处理范围内所有节点（变化节点及其全部下游节点）的旧输出，
+        # 保证下游节点不会返回过期结果，且每个受影响的节点在本次运行中恰好处理一次
+        for node_id in nodes_to_process_ids:
+            processing_state[node_id]['node'].pop('processed_outputs', None)
+            processing_state[node_id]['node'].pop('outputs_released', None)
+
+        # 提前截止：某个节点重新计算后输出与之前完全相同时，其下游节点（自身未变化、
+        # 且所有上游输出与它上次计算时使用的完全相同）直接恢复上次的输出，不再重新计算
+        cutoff = None
+        if changed_nodes is not None and self.early_cutoff_enabled:
+            cutoff = {
+                'changed_ids': set(n['id'] for n in changed_nodes),
+                'identical': {},     # (上游节点ID, id(使用过的上游输出)) -> 是否与当前输出相同
+                'reused_ids': set()  # 沿用旧输出的节点
+            }
+
+        # 中间结果释放：某个节点的所有下游都完成后释放它的输出（固定的节点除外），
+        # 之后需要时由缓存取回，峰值内存随节点图的宽度而不是长度增长
+        retention = None
+        if self.release_intermediates_enabled:
+            retention = {
+                'input_connections': input_connections,
+                'output_connections': output_connections,
+                'released_ids': set()
+            }
+
+        # 查找处理范围内的起始节点 (没有需要的输入，或者所有需要的输入都来自已完成/范围外的节点)
+        processing_queue = []
+        for node_id in nodes_to_process_ids:
+            state = processing_state[node_id]
+            if not state['inputs_needed']: # 没有输入端口
+                state['status'] = 'ready'
+                processing_queue.append(node_id)
+            else:
+                # 检查输入是否来自已完成的节点
+                received_from_done = set()
+                all_inputs_accounted_for = True
+                for conn_info in input_connections[node_id]:
+                    upstream_id = conn_info['output_node_id']
+                    input_port_idx = conn_info['input_port_idx']
+                    if input_port_idx in state['inputs_needed']:
+                         if upstream_id not in processing_state or processing_state[upstream_id]['status'] == 'done':
+                              received_from_done.add(input_port_idx)
+                         elif upstream_id not in nodes_to_process_ids: # 输入来自范围外
+                              received_from_done.add(input_port_idx)
+                         # else: 输入来自处理范围内的未完成节点，等待
+
+                state['inputs_received'] = received_from_done
+                if state['inputs_received'] == state['inputs_needed']:
+                     state['status'] = 'ready'
+                     processing_queue.append(node_id)
+
+        # --- 3. 执行处理 ---
+        start_time = time.time()
+
+        # 记录每个节点的处理时间（按节点ID，标题相同的节点不会互相覆盖）
+        node_times = result['node_times']
+
+        profile_run = self.profiler.begin_run(self.proxy_level) if self.profiling_enabled else None
+        cancelled = False
+        try:
+            if self._should_process_in_parallel(nodes_to_process_ids):
+                # 并行模式：就绪节点被同时提交到有界线程池
+                processed_count, error_occurred, cancelled = self._run_processing_queue_parallel(
+                    processing_state, output_connections, processing_queue, processed_node_ids, node_times, result['errors'], is_cancelled, cutoff, retention)
+            else:
+                processed_count, error_occurred, cancelled = self._run_processing_queue_serial(
+                    processing_state, output_connections, processing_queue, processed_node_ids, node_times, result['errors'], is_cancelled, cutoff, retention)
+        finally:
+            self.profiler.end_run(profile_run, cancelled)
+
+        if retention is not None and retention['released_ids'] and self.verbose:
+            print(f"释放中间结果: {len(retention['released_ids'])} 个节点的输出已释放，需要时从缓存取回")
+
+        if cutoff is not None and cutoff['reused_ids'] and self.verbose:
+            print(f"提前截止: {len(cutoff['reused_ids'])} 个下游节点的输入未变化，沿用上次的输出")
+
+        if cancelled:
+            # 记录未完成的节点，由下一次渲染继续处理
+            unfinished_ids = set(node_id for node_id in nodes_to_process_ids
+                                 if processing_state[node_id]['status'] != 'done')
+            self.record_interrupted_nodes(unfinished_ids)
+
+        self._evaluation_fingerprints = None
+
+        end_time = time.time()
+        result.update({
+            'processed_count': processed_count,
+            'error_occurred': error_occurred,
+            'cancelled': cancelled,
+            'processing_time': end_time - start_time
+        })
+        return result
+
+    # ------------------------------------------------------------------
+    # 命令行和批处理使用的计算接口
+    # ------------------------------------------------------------------
+    def evaluate(self, target=None):
+        """
+        计算目标节点及其全部上游节点
+
+        每次都对目标节点的上游闭包完整求值：参数可能被直接修改（set_param、批处理更换输入），
+        没有变化的节点按内容指纹直接从节点缓存取回，不会重新计算。
+
+        参数:
+            target: 节点ID或标题，默认为预览节点
+
+        返回:
+            dict: 目标节点的输出（不含元数据）
+        """
+        node = self.find_node(target if target is not None else '预览节点')
+        with self.evaluation_lock:
+            result = self.evaluate_graph(sinks=[node])
+            self.node_times = result['node_times']
+            self._raise_evaluation_error(result)
+            outputs = self.process_node(node)
+        return {key: value for key, value in outputs.items() if key != '_metadata'}
+
+    def _raise_evaluation_error(self, result):
+        """求值中有节点出错时抛出第一个错误（调度器只记录错误，不会中断整个求值）"""
+        for error in result['errors'].values():
+            if isinstance(error, TNXEngineError):
+                raise error
+            raise TNXEngineError(str(error) or type(error).__name__) from error
+
+    def run_sub_operation(self, node, operation):
+        """
+        执行节点的子操作（脚本中的 sub_<operation> 函数，例如导出节点的 sub_export）
+
+        参数:
+            node: 节点
+            operation: 子操作名（不含 sub_ 前缀）
+
+        返回:
+            子操作的返回值
+        """
+        op_func = getattr(node['module'], f"sub_{operation}", None)
+        if op_func is None:
+            raise TNXEngineError(f"节点 '{node['title']}' 没有子操作: {operation}")
+        with self.evaluation_lock:
+            upstream_nodes = [conn['output_node'] for conn in self.graph_index.get_input_connections(node['id'])]
+            if upstream_nodes:
+                result = self.evaluate_graph(sinks=upstream_nodes)
+                self.node_times = result['node_times']
+                self._raise_evaluation_error(result)
+            inputs = self.get_node_inputs(node)
+        params = self.get_node_process_params(node)
+        return op_func(params, inputs, self.get_application_context(node))
+
+    # ------------------------------------------------------------------
+    # 保存
+    # ------------------------------------------------------------------
+    def pick_image(self, outputs, port=None):
+        """
+        从节点输出中取出要保存的图像
+
+        参数:
+            outputs: 节点输出
+            port: 输出类型名，默认按 f32bmp、tif16、img 的顺序查找
+        """
+        keys = [port] if port else list(IMAGE_PORT_TYPES)
+        for key in keys:
+            value = outputs.get(key)
+            if isinstance(value, np.ndarray):
+                return value
+        raise TNXEngineError(f"节点输出中没有可保存的图像（输出: {', '.join(outputs.keys()) or '无'}）")
+
+    def save_image(self, image, file_path):
+        """
+        保存RGB(A)图像。jpg保存为8位，png和tif保存为16位
+
+        参数:
+            image: float32（0-1）、uint16 或 uint8 数组
+            file_path: 保存路径，扩展名决定格式
+        """
+        import cv2
+
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in SAVE_EXTENSIONS:
+            raise TNXEngineError(f"不支持的输出格式: {ext or file_path}")
+        eight_bit = ext in ('.jpg', '.jpeg')
+
+        if image.dtype in (np.float32, np.float64):
+            if eight_bit:
+                img_save = (image * 255).clip(0, 255).astype(np.uint8)
+            else:
+                img_save = (image * 65535).clip(0, 65535).astype(np.uint16)
+        elif image.dtype == np.uint16 and eight_bit:
+            img_save = (image / 256).astype(np.uint8)
+        else:
+            img_save = image
+
+        if img_save.ndim == 3 and img_save.shape[2] == 4:
+            # jpg不支持透明度
+            code = cv2.COLOR_RGBA2BGR if eight_bit else cv2.COLOR_RGBA2BGRA
+            img_save = cv2.cvtColor(img_save, code)
+        elif img_save.ndim == 3 and img_save.shape[2] == 3:
+            img_save = cv2.cvtColor(img_save, cv2.COLOR_RGB2BGR)
+
+        output_dir = os.path.dirname(os.path.abspath(file_path))
+        os.makedirs(output_dir, exist_ok=True)
+        if not cv2.imwrite(file_path, img_save):
+            raise TNXEngineError(f"保存图像失败: {file_path}")
@@ -1,5 +1,5 @@
 ﻿#tif16
-#tif16,tif16
+#tif16_magnitude,tif16_phase
 #傅里叶变换 - 生成幅度谱和相位谱
 #3399FF
 import cv2
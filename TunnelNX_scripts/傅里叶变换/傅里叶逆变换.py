@@ -1,4 +1,4 @@
-﻿#tif16,tif16
+﻿#tif16_magnitude,tif16_phase
 #tif16
 #傅里叶逆变换 - 从幅度谱和相位谱重建图像
 #FF6600
@@ -2,17 +2,35 @@
 # f32bmp
 # 卷积滤波
 # FFFF00
+#SupportedFeatures:Tileable=True
 import cv2
 import numpy as np
 
 
+def get_tile_halo(params, inputs):
+    """分块处理的边缘宽度：卷积核半径"""
+    kernel = inputs.get('kernel')
+    if kernel is not None:
+        kh, kw = np.asarray(kernel).shape[:2]
+    elif params.get('kernel_type', 'custom') == 'custom':
+        try:
+            rows = params.get('custom_kernel', '0,0,0;0,1,0;0,0,0').strip().split(';')
+            kh, kw = len(rows), max(len(row.strip().split(',')) for row in rows)
+        except Exception:
+            kh, kw = 3, 3
+    else:
+        # 内置卷积核都是3x3
+        kh, kw = 3, 3
+    return max(kh, kw) // 2
+
+
 def process(inputs, params):
     # 检查图像输入是否存在
     if 'f32bmp' not in inputs or inputs['f32bmp'] is None:
         return {'f32bmp': None}
 
-    # 创建输入图像的副本以避免修改原始数据
-    img = inputs['f32bmp'].copy()
+    # 输入数组是只读共享的，卷积只读取它，无需复制
+    img = inputs['f32bmp']
 
     # 获取卷积参数
     border_type = params.get('border_type', 'reflect_101')
@@ -26,7 +44,7 @@ def process(inputs, params):
 
         if 'kernel' in inputs and inputs['kernel'] is not None:
             # 使用连接的核节点提供的卷积核
-            kernel = inputs['kernel'].copy()
+            kernel = inputs['kernel']
             # 确保kernel是float32类型并且形状正确
             if kernel.dtype != np.float32:
                 kernel = kernel.astype(np.float32)
@@ -5,7 +5,21 @@
 import numpy as np
 
 
-def process(inputs, params):
+def scale_kernel_size(size, proxy_scale):
+    """
+    把按完整分辨率像素设定的核大小换算到代理分辨率
+
+    参数:
+        size: 完整分辨率下的核大小
+        proxy_scale: 当前求值分辨率相对完整分辨率的比例
+
+    返回:
+        int: 最接近 size * proxy_scale 的奇数，至少为1
+    """
+    return max(1, 2 * int(round((size * proxy_scale - 1) / 2)) + 1)
+
+
+def process(inputs, params, context=None):
     # 生成卷积核并输出
     kernel_type = params.get('kernel_type', 'custom')
     intensity = params.get('intensity', 1.0)
@@ -20,6 +34,12 @@ def process(inputs, params):
         if size % 2 == 0:
             size += 1
 
+        # 模糊核的大小以像素为单位：性能模式的代理分辨率下按比例缩小，预览的模糊程度与完整分辨率一致
+        # （本节点没有图像输入，引擎不会缩放它的参数，需要自己读取proxy_scale）
+        proxy_scale = context.get('proxy_scale', 1.0) if context else 1.0
+        if kernel_type in ('blur', 'gaussian_blur') and proxy_scale != 1.0:
+            size = scale_kernel_size(size, proxy_scale)
+
         # 打印调试信息
         print(f"生成卷积核: 类型={kernel_type}, 大小={size}, 强度={intensity}")
             
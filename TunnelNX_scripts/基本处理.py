@@ -2,7 +2,7 @@
 # f32bmp
 # 基本图像处理
 # 90EE90
-#SupportedFeatures:PerfSensitive=True
+#SupportedFeatures:PerfSensitive=True,Tileable=True
 import numpy as np
 
 
@@ -122,18 +122,18 @@ def hsv_to_rgb(h, s, v):
     return r, g, b
 
 
-def process(inputs, params):
-    """基本处理节点，优化大图像处理性能"""
+def process(inputs, params, context=None):
+    """基本处理节点（大图像由引擎按图块并行处理，见第5行的Tileable声明）"""
     # 首先检查输入是否有效
     if 'f32bmp' not in inputs or inputs['f32bmp'] is None:
         return {'f32bmp': None}
+
+    # 输出数组通过引擎的缓冲区池分配，拖动滑块时复用上次的输出内存（内容未初始化）
+    alloc = context['alloc'] if context and 'alloc' in context else np.empty
         
     # 获取输入图像
     img_input = inputs['f32bmp']
     
-    # 大图像优化: 检查图像大小，如果很大则启用分块处理
-    use_tiling = (img_input.shape[0] * img_input.shape[1] > 2048 * 2048)
-    
     # 判断是否为 RGBA 图像
     is_rgba = False
     alpha_channel = None
@@ -165,141 +165,60 @@ def process(inputs, params):
         # 无需处理，直接返回原图
         return {'f32bmp': img_input}
     
-    # 分块处理大图像
-    if use_tiling:
-        # 定义分块处理函数
-        def process_tile(tile, params):
-            # 应用基本参数处理
-            result = tile.copy()
-            
-            # 亮度调整
-            if brightness != 0:
-                factor = 1 + brightness / 100
-                result = result * factor
-                
-            # 对比度调整
-            if contrast != 0:
-                factor = (259 * (contrast + 255)) / (255 * (259 - contrast))
-                midpoint = 0.5
-                result = factor * (result - midpoint) + midpoint
-            
-            # 剪裁处理值域
-            np.clip(result, 0, 1, out=result)
-            
-            return result
-            
-        # 对RGB通道分块处理
-        tile_size = 1024  # 块大小
-        h, w = img.shape[:2]
-        result = np.zeros_like(img)
-        
-        for y in range(0, h, tile_size):
-            y_end = min(y + tile_size, h)
-            for x in range(0, w, tile_size):
-                x_end = min(x + tile_size, w)
-                
-                # 提取块
-                tile = img[y:y_end, x:x_end].copy()
-                
-                # 处理特定块
-                if len(tile.shape) == 3:  # RGB图像
-                    # 处理RGB基本参数
-                    processed_tile = process_tile(tile, params)
-                    
-                    # 如果需要HSV处理
-                    if saturation != 0 or hue != 0:
-                        # RGB转HSV
-                        r, g, b = processed_tile[:, :, 0], processed_tile[:, :, 1], processed_tile[:, :, 2]
-                        h_val, s, v = rgb_to_hsv(r, g, b)
-                        
-                        # 应用饱和度调整
-                        if saturation != 0:
-                            s = s * (1 + saturation / 100)
-                            
-                        # 应用色调调整
-                        if hue != 0:
-                            h_val = (h_val + hue / 360) % 1.0
-                        
-                        # HSV转RGB
-                        r, g, b = hsv_to_rgb(h_val, s, v)
-                        processed_tile = np.stack([r, g, b], axis=2)
-                    
-                    # 应用白平衡 (向量化操作)
-                    if wb_r != 1.0 or wb_g != 1.0 or wb_b != 1.0:
-                        processed_tile[:, :, 0] *= wb_r
-                        processed_tile[:, :, 1] *= wb_g
-                        processed_tile[:, :, 2] *= wb_b
-                        
-                else:  # 灰度图像，较少的处理
-                    processed_tile = process_tile(tile, params)
-                
-                # 合并结果
-                result[y:y_end, x:x_end] = processed_tile
-        
-        # 重组最终输出
-        if is_rgba:
-            # 重新添加Alpha通道
-            final_img = np.zeros(img_input.shape, dtype=np.float32)
-            final_img[:, :, :3] = result
-            final_img[:, :, 3] = alpha_channel
-        else:
-            final_img = result
-            
-    else:
-        # 小图像直接处理
-        result = img.copy()
-        
-        # 应用亮度调整
-        if brightness != 0:
-            factor = 1 + brightness / 100
-            result = result * factor
-        
-        # 应用对比度调整
-        if contrast != 0:
-            factor = (259 * (contrast + 255)) / (255 * (259 - contrast))
-            midpoint = 0.5
-            result = factor * (result - midpoint) + midpoint
+    # 逐像素处理：大图像由引擎切成图块分别调用，结果与整图处理一致
+    result = img.copy()
+    
+    # 应用亮度调整
+    if brightness != 0:
+        factor = 1 + brightness / 100
+        result = result * factor
+    
+    # 应用对比度调整
+    if contrast != 0:
+        factor = (259 * (contrast + 255)) / (255 * (259 - contrast))
+        midpoint = 0.5
+        result = factor * (result - midpoint) + midpoint
+    
+    # 如果是彩色图像且需要处理HSV参数
+    if len(result.shape) == 3 and (saturation != 0 or hue != 0):
+        # 分离RGB通道
+        r, g, b = result[:, :, 0], result[:, :, 1], result[:, :, 2]
         
-        # 如果是彩色图像且需要处理HSV参数
-        if len(result.shape) == 3 and (saturation != 0 or hue != 0):
-            # 分离RGB通道
-            r, g, b = result[:, :, 0], result[:, :, 1], result[:, :, 2]
-            
-            # 转换RGB到HSV
-            h, s, v = rgb_to_hsv(r, g, b)
-            
-            # 应用饱和度调整
-            if saturation != 0:
-                s = s * (1 + saturation / 100)
-            
-            # 应用色调调整
-            if hue != 0:
-                h = (h + hue / 360) % 1.0
-            
-            # 转换HSV回RGB
-            r, g, b = hsv_to_rgb(h, s, v)
-            result = np.stack([r, g, b], axis=2)
+        # 转换RGB到HSV
+        h, s, v = rgb_to_hsv(r, g, b)
         
-        # 应用白平衡
-        if len(result.shape) == 3 and (wb_r != 1.0 or wb_g != 1.0 or wb_b != 1.0):
-            result[:, :, 0] = result[:, :, 0] * wb_r
-            result[:, :, 1] = result[:, :, 1] * wb_g
-            result[:, :, 2] = result[:, :, 2] * wb_b
+        # 应用饱和度调整
+        if saturation != 0:
+            s = s * (1 + saturation / 100)
         
-        # 统一剪裁处理后的数据
-        np.clip(result, 0, 1, out=result)
+        # 应用色调调整
+        if hue != 0:
+            h = (h + hue / 360) % 1.0
         
-        # 重组最终输出
-        if is_rgba:
-            # 重新添加Alpha通道
-            final_img = np.zeros(img_input.shape, dtype=np.float32)
-            final_img[:, :, :3] = result
-            final_img[:, :, 3] = alpha_channel
-        else:
-            final_img = result
+        # 转换HSV回RGB
+        r, g, b = hsv_to_rgb(h, s, v)
+        result = np.stack([r, g, b], axis=2)
+    
+    # 应用白平衡
+    if len(result.shape) == 3 and (wb_r != 1.0 or wb_g != 1.0 or wb_b != 1.0):
+        result[:, :, 0] = result[:, :, 0] * wb_r
+        result[:, :, 1] = result[:, :, 1] * wb_g
+        result[:, :, 2] = result[:, :, 2] * wb_b
     
-    # 确保最终输出是float32类型
-    return {'f32bmp': final_img.astype(np.float32)}
+    # 统一剪裁处理后的数据
+    np.clip(result, 0, 1, out=result)
+    
+    # 重组最终输出
+    if is_rgba:
+        # 重新添加Alpha通道
+        final_img = alloc(img_input.shape, np.float32)
+        final_img[:, :, :3] = result
+        final_img[:, :, 3] = alpha_channel
+    else:
+        final_img = result
+
+    # 确保最终输出是float32类型（已经是float32时不再复制）
+    return {'f32bmp': final_img.astype(np.float32, copy=False)}
 
 
 def get_params():
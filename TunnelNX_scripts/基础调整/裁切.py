@@ -816,11 +816,14 @@ def show_crop_dialog(node, context):
     if not all(k in params and isinstance(params[k], dict) and 'value' in params[k] for k in required_keys):
         params_valid = False
 
+    # 性能模式下输入图像是代理分辨率，裁切参数保存的是完整分辨率坐标，需要换算
+    proxy_scale = context.get('proxy_scale', 1.0) if isinstance(context, dict) else 1.0
+
     if params_valid:
         try:
             original_rect = QRect(
-                int(params['crop_x']['value']), int(params['crop_y']['value']),
-                int(params['crop_width']['value']), int(params['crop_height']['value'])
+                int(round(params['crop_x']['value'] * proxy_scale)), int(round(params['crop_y']['value'] * proxy_scale)),
+                int(round(params['crop_width']['value'] * proxy_scale)), int(round(params['crop_height']['value'] * proxy_scale))
             )
             # --- 修改开始：使用 QTimer.singleShot 延迟调用 ---
             # 将 widget 和 rect 作为参数传递给 lambda 函数，避免闭包问题
@@ -842,10 +845,13 @@ def show_crop_dialog(node, context):
             if 'params' not in node or not isinstance(node.get('params'), dict):
                 node['params'] = {}
             for key, value in new_params.items():
+                # 换算回完整分辨率坐标，并声明为像素单位，代理分辨率下由主程序按比例缩放
+                value = int(round(value / proxy_scale))
                 if key in node['params'] and isinstance(node['params'][key], dict):
                         node['params'][key]['value'] = value
+                        node['params'][key]['units'] = 'px'
                 else:
-                        node['params'][key] = {'value': value}
+                        node['params'][key] = {'value': value, 'units': 'px'}
             print(f"--- show_crop_dialog: Updated node['params'] with value structure: {node['params']} ---") # 修改日志
             # --- 结束恢复 ---
 
@@ -857,8 +863,8 @@ def show_crop_dialog(node, context):
                     node.setdefault('processed_outputs', {})['f32bmp'] = image_data
 
             # 7. 触发主程序重新处理节点图
-            print(f"--- show_crop_dialog: Triggering process_node_graph for node {node.get('id', 'N/A')} ---")
-            app.process_node_graph(changed_nodes=[node])
+            print(f"--- show_crop_dialog: Triggering request_graph_render for node {node.get('id', 'N/A')} ---")
+            app.request_graph_render(changed_nodes=[node])
 
         else:
                 print("Info: Crop dialog accepted, but no valid crop parameters obtained.")
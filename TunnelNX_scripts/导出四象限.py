@@ -2,7 +2,7 @@
 #f32bmp
 #四象限导出工具
 #4287F5
-
+#SupportedFeatures:FullResolution=True
 import numpy as np
 import os
 import cv2
@@ -2,6 +2,7 @@
 #
 # 导出图像（支持透明度）
 # EEAC00
+#SupportedFeatures:FullResolution=True
 import cv2
 import numpy as np
 import os
@@ -3,6 +3,7 @@
 # 打印图像节点（支持Windows打印）
 # 007BFF
 #Type:NeoScript
+#SupportedFeatures:FullResolution=True
 
 import numpy as np
 import cv2
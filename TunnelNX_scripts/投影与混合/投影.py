@@ -6,12 +6,12 @@ import cv2
 import numpy as np
 
 
-def process(inputs, params):
+def process(inputs, params, context=None):
     if 'f32bmp' not in inputs or inputs['f32bmp'] is None:
         return {'f32bmp': None}
 
     # 获取输入图像
-    img = inputs['f32bmp'].copy()
+    img = inputs['f32bmp']
     h, w = img.shape[:2]
 
     # 获取变换参数
@@ -22,14 +22,15 @@ def process(inputs, params):
     tx = params.get('tx', 0)  # X轴平移
     ty = params.get('ty', 0)  # Y轴平移
     distance = params.get('distance', 1000)  # Z轴距离/深度
-    default_distance = 1000  # 默认摄像机距离
+    # 默认摄像机距离（像素）；distance按像素单位随代理分辨率缩小并取整，默认值也要同样缩小，比较时允许半个像素的取整误差
+    default_distance = 1000 * (context.get('proxy_scale', 1.0) if context else 1.0)
 
     scale = params.get('scale', 100) / 100.0  # 缩放因子
 
     # 在默认参数下直接返回原图像
     if (abs(theta_x) < 1e-6 and abs(theta_y) < 1e-6 and abs(theta_z) < 1e-6 and 
         abs(tx) < 1e-6 and abs(ty) < 1e-6 and 
-        abs(distance - default_distance) < 1e-6 and 
+        abs(distance - default_distance) <= 0.5 and 
         abs(scale - 1.0) < 1e-6):
         return {'f32bmp': img}
 
@@ -185,8 +186,8 @@ def get_params():
         'theta_x': {'type': 'slider', 'label': 'X轴旋转 (俯仰)', 'min': -45, 'max': 45, 'value': 0},
         'theta_y': {'type': 'slider', 'label': 'Y轴旋转 (偏航)', 'min': -45, 'max': 45, 'value': 0},
         'theta_z': {'type': 'slider', 'label': 'Z轴旋转 (翻滚)', 'min': -180, 'max': 180, 'value': 0},
-        'tx': {'type': 'slider', 'label': 'X轴平移', 'min': -300, 'max': 300, 'value': 0},
-        'ty': {'type': 'slider', 'label': 'Y轴平移', 'min': -300, 'max': 300, 'value': 0},
-        'distance': {'type': 'slider', 'label': '摄像机距离', 'min': 500, 'max': 3000, 'value': 1000},
+        'tx': {'type': 'slider', 'label': 'X轴平移', 'min': -300, 'max': 300, 'value': 0, 'units': 'px'},
+        'ty': {'type': 'slider', 'label': 'Y轴平移', 'min': -300, 'max': 300, 'value': 0, 'units': 'px'},
+        'distance': {'type': 'slider', 'label': '摄像机距离', 'min': 500, 'max': 3000, 'value': 1000, 'units': 'px'},
         'scale': {'type': 'slider', 'label': '缩放 (%)', 'min': 50, 'max': 150, 'value': 100}
     }
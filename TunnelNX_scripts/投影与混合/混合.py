@@ -2,11 +2,19 @@
 # f32bmp
 # 混合两幅图像与多种混合模式
 # 5DA5DA
+#SupportedFeatures:Tileable=True
 import cv2
 import numpy as np
 
 
-def process(inputs, params):
+def get_tile_halo(params, inputs):
+    """分块处理的边缘宽度：两幅图像尺寸相同时逐像素混合，尺寸不同时需要整体对齐，不能分块"""
+    sizes = {value.shape[:2] for key, value in inputs.items()
+             if key.startswith('f32bmp') and isinstance(value, np.ndarray) and value.ndim >= 2}
+    return 0 if len(sizes) <= 1 else None
+
+
+def process(inputs, params, context=None):
     """处理混合节点的输入 - 改进的输入处理"""
     # 检查我们是否有第一个输入
     if 'f32bmp' not in inputs or inputs['f32bmp'] is None:
@@ -14,7 +22,7 @@ def process(inputs, params):
         return {'f32bmp': None}
 
     # 获取主输入图像
-    img1 = inputs['f32bmp'].copy()
+    img1 = inputs['f32bmp']
     
     # 安全检查 - 确保img1是有效的numpy数组
     if not isinstance(img1, np.ndarray):
@@ -35,7 +43,7 @@ def process(inputs, params):
 
         # 检查键是否符合f32bmp_N的模式或直接是第二个f32bmp
         if key.startswith('f32bmp_') or key == 'f32bmp_1' or key == 'f32bmp_2':
-            img2 = inputs[key].copy()
+            img2 = inputs[key]
             print(f"找到第二输入: {key}")
             break
 
@@ -138,9 +146,9 @@ def process(inputs, params):
         img1, img2 = img2, img1
         opacity1, opacity2 = opacity2, opacity1
 
-    # 确保图像为float32类型进行处理
-    img1 = img1.astype(np.float32)
-    img2 = img2.astype(np.float32)
+    # 确保图像为float32类型进行处理（已经是float32时不复制，后续只读取img1和img2）
+    img1 = img1.astype(np.float32, copy=False)
+    img2 = img2.astype(np.float32, copy=False)
     
     # 检查是否需要考虑Alpha通道进行混合
     if respect_alpha:
@@ -215,8 +223,9 @@ def process(inputs, params):
         # 使用blend_normal混合alpha通道
         alpha_result = blend_normal(alpha1, alpha2, opacity1_alpha, opacity2_alpha)
         
-        # 将RGB和Alpha通道合并
-        result = np.zeros((*rgb_result.shape[:2], 4), dtype=np.float32)
+        # 将RGB和Alpha通道合并，输出数组通过引擎的缓冲区池分配（四个通道都会写入，无需清零）
+        alloc = context['alloc'] if context and 'alloc' in context else np.empty
+        result = alloc((*rgb_result.shape[:2], 4), np.float32)
         result[:, :, :3] = rgb_result
         
         # 确保alpha_result是二维的
@@ -225,8 +234,8 @@ def process(inputs, params):
         
         result[:, :, 3] = alpha_result
 
-        # 确保结果在float32的有效范围内（0.0-1.0）
-        result = np.clip(result, 0.0, 1.0).astype(np.float32)
+        # 确保结果在float32的有效范围内（0.0-1.0），原地剪裁以保留池中分配的缓冲区
+        np.clip(result, 0.0, 1.0, out=result)
 
     except Exception as e:
         print(f"混合过程中出错: {str(e)}")
@@ -2,6 +2,7 @@
 #f32bmp,constant
 #将输入图像的每个通道乘以常量值或第二张图像
 #8A2BE2
+#SupportedFeatures:InPlaceSafe=True,Tileable=True
 import numpy as np
 
 def get_params():
@@ -18,7 +19,8 @@ def get_params():
             'min': -1000,
             'max': 1000,
             'value': 0,
-            'step': 1
+            'step': 1,
+            'units': 'px'
         },
         'offset_y': {
             'type': 'slider',
@@ -26,10 +28,23 @@ def get_params():
             'min': -1000,
             'max': 1000,
             'value': 0,
-            'step': 1
+            'step': 1,
+            'units': 'px'
         }
     }
 
+def get_tile_halo(params, inputs):
+    """分块处理的边缘宽度：只有无偏移的逐像素运算可以分块"""
+    if int(round(params.get('offset_x', 0))) != 0 or int(round(params.get('offset_y', 0))) != 0:
+        return None
+    img = inputs.get('f32bmp')
+    constant_input = inputs.get('constant')
+    # 常量图像与输入尺寸不同时按重叠区域整体计算
+    if img is not None and constant_input is not None and constant_input.shape[:2] != (1, 1) and \
+            constant_input.shape[:2] != img.shape[:2]:
+        return None
+    return 0
+
 def process(inputs, params):
     # 检查输入
     if 'f32bmp' not in inputs or inputs['f32bmp'] is None:
@@ -41,8 +56,8 @@ def process(inputs, params):
         return {'f32bmp': inputs['f32bmp'], 'constant': None}
     
     try:
-        # 获取图像输入
-        img = inputs['f32bmp'].copy()
+        # 获取图像输入（只读，除非引擎为本节点提供了可写副本）
+        img = inputs['f32bmp']
         
         # 获取常量输入
         constant_input = inputs['constant']
@@ -51,11 +66,11 @@ def process(inputs, params):
         is_image_input = constant_input.shape[0] > 1 or constant_input.shape[1] > 1
         
         # 获取偏移值
-        offset_x = int(params.get('offset_x', 0))
-        offset_y = int(params.get('offset_y', 0))
+        offset_x = int(round(params.get('offset_x', 0)))
+        offset_y = int(round(params.get('offset_y', 0)))
         
-        # 创建输出图像副本
-        result = img.copy()
+        # 输入可写时直接在其上修改，否则创建输出图像副本
+        result = img if img.flags.writeable else img.copy()
         
         if is_image_input:
             # 处理图像乘法（常量输入是图像）
@@ -2,6 +2,7 @@
 # f32bmp
 # 像素取反：对输入图像进行像素取反操作，保留原始Alpha通道
 # FF00FF
+#SupportedFeatures:InPlaceSafe=True,Tileable=True
 
 import numpy as np
 
@@ -19,10 +20,17 @@ def process(inputs, params):
         return {}
     # 如果是 RGBA 四通道
     if im.ndim == 3 and im.shape[2] == 4:
-        # 只对 RGB 通道取反，Alpha 通道保持不变
-        out = np.empty_like(im)
-        out[..., :3] = 1.0 - im[..., :3]
-        out[..., 3]  = im[..., 3]
+        # 只对 RGB 通道取反，Alpha 通道保持不变；输入可写时直接原地取反
+        if im.flags.writeable and im.dtype.kind == 'f':
+            out = im
+            np.subtract(1.0, im[..., :3], out=out[..., :3])
+        else:
+            out = np.empty_like(im)
+            out[..., :3] = 1.0 - im[..., :3]
+            out[..., 3]  = im[..., 3]
+    elif im.flags.writeable and im.dtype.kind == 'f':
+        # 其他通道数（如 RGB 或灰度），对所有通道原地取反
+        out = np.subtract(1.0, im, out=im)
     else:
         # 其他通道数（如 RGB 或灰度），对所有通道取反
         out = 1.0 - im
@@ -2,6 +2,7 @@
 # f32bmp
 # 像素取反：对输入图像进行像素取反操作
 # FF00FF
+#SupportedFeatures:InPlaceSafe=True,Tileable=True
 
 import numpy as np
 
@@ -17,6 +18,9 @@ def process(inputs, params):
     if not isinstance(im, np.ndarray):
         print(f"Error: 输入不是 NumPy 数组，而是 {type(im)}.")
         return {}
-    # 对像素取反
-    out = 1.0 - im
+    # 对像素取反，输入可写时直接原地取反
+    if im.flags.writeable and im.dtype.kind == 'f':
+        out = np.subtract(1.0, im, out=im)
+    else:
+        out = 1.0 - im
     return {'f32bmp': out}
\ No newline at end of file
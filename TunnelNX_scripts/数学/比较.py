@@ -19,7 +19,8 @@ def get_params():
             'min': -1000,
             'max': 1000,
             'value': 0,
-            'step': 1
+            'step': 1,
+            'units': 'px'
         },
         'offset_y': {
             'type': 'slider',
@@ -27,7 +28,8 @@ def get_params():
             'min': -1000,
             'max': 1000,
             'value': 0,
-            'step': 1
+            'step': 1,
+            'units': 'px'
         },
         'threshold': {
             'type': 'slider',
@@ -66,8 +68,8 @@ def process(inputs, params):
         
         # 获取参数
         comparison_type = params.get('comparison_type', '大于')
-        offset_x = int(params.get('offset_x', 0))
-        offset_y = int(params.get('offset_y', 0))
+        offset_x = int(round(params.get('offset_x', 0)))
+        offset_y = int(round(params.get('offset_y', 0)))
         threshold = float(params.get('threshold', 0.001))
         
         print(f"比较类型：{comparison_type}，偏移=({offset_x},{offset_y})，阈值={threshold}")
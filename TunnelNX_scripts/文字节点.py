@@ -12,13 +12,14 @@ def process(inputs, params):
     # 获取参数
     text = params.get('text', '示例文字')
     font_name = params.get('font_name', 'SimSun')
-    font_size = int(params.get('font_size', 32))
+    # 代理分辨率下字号会按比例缩小，至少保留1像素
+    font_size = max(1, int(round(params.get('font_size', 32))))
     text_color = params.get('text_color', '#FFFFFF')
     background_color = params.get('background_color', '#000000')
     image_width = int(params.get('image_width', 800))
     image_height = int(params.get('image_height', 600))
-    position_x = int(params.get('position_x', 50))
-    position_y = int(params.get('position_y', 50))
+    position_x = int(round(params.get('position_x', 50)))
+    position_y = int(round(params.get('position_y', 50)))
 
     # 解析颜色
     def hex_to_rgb(hex_color):
@@ -138,13 +139,13 @@ def get_params():
             'SimSun', 'SimHei', 'Microsoft YaHei', 'KaiTi', 'FangSong',  # 中文常用字体
             'Arial', 'Times New Roman', 'Courier New', 'Verdana', 'Georgia'  # 英文常用字体
         ], 'value': 'SimSun'},
-        'font_size': {'type': 'slider', 'label': '字号', 'min': 8, 'max': 144, 'value': 32},
+        'font_size': {'type': 'slider', 'label': '字号', 'min': 8, 'max': 144, 'value': 32, 'units': 'px'},
         'text_color': {'type': 'text', 'label': '文字颜色(十六进制)', 'value': '#FFFFFF'},
         'background_color': {'type': 'text', 'label': '背景颜色(十六进制)', 'value': '#000000'},
         'image_width': {'type': 'slider', 'label': '图像宽度', 'min': 100, 'max': 4096, 'value': 800},
         'image_height': {'type': 'slider', 'label': '图像高度', 'min': 100, 'max': 4096, 'value': 600},
-        'position_x': {'type': 'slider', 'label': '文字X坐标', 'min': 0, 'max': 4000, 'value': 50},
-        'position_y': {'type': 'slider', 'label': '文字Y坐标', 'min': 0, 'max': 4000, 'value': 50},
+        'position_x': {'type': 'slider', 'label': '文字X坐标', 'min': 0, 'max': 4000, 'value': 50, 'units': 'px'},
+        'position_y': {'type': 'slider', 'label': '文字Y坐标', 'min': 0, 'max': 4000, 'value': 50, 'units': 'px'},
     }
 
 
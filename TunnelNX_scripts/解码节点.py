@@ -62,10 +62,13 @@ def extract_image_metadata(image_path):
         return "sRGB", 2.2  # 默认值
 
 
-def process(inputs, params):
+def process(inputs, params, context=None):
     if 'img' not in inputs:
         return {'f32bmp': None}
 
+    # 输出数组通过引擎的缓冲区池分配，重新解码相同尺寸的图像时复用上次的输出内存
+    alloc = context['alloc'] if context and 'alloc' in context else np.empty
+
     img = inputs['img']
     if img is None:
         return {'f32bmp': None}
@@ -166,7 +169,7 @@ def process(inputs, params):
 
         # 创建RGBA格式的f32bmp
         height, width = img_float.shape[:2]
-        rgba_image = np.zeros((height, width, 4), dtype=np.float32)
+        rgba_image = alloc((height, width, 4), np.float32)
         rgba_image[:, :, :3] = img_float
         rgba_image[:, :, 3] = alpha_float
 
@@ -188,7 +191,7 @@ def process(inputs, params):
     else:
         # 如果没有Alpha通道，创建RGBA格式的f32bmp，Alpha通道设为1.0（完全不透明）
         height, width = img_float.shape[:2]
-        rgba_image = np.zeros((height, width, 4), dtype=np.float32)
+        rgba_image = alloc((height, width, 4), np.float32)
         rgba_image[:, :, :3] = img_float
         rgba_image[:, :, 3] = 1.0
 
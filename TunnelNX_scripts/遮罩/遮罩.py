@@ -2,10 +2,19 @@
 # f32bmp
 # 将遮罩应用到输入图像上
 # 8D2E92
+#SupportedFeatures:Tileable=True
 
 import cv2
 import numpy as np
 
+def get_tile_halo(params, inputs):
+    """分块处理的边缘宽度：遮罩逐像素作用，尺寸与输入不同时需要整体缩放，不能分块"""
+    input_image = inputs.get('f32bmp')
+    mask_image = inputs.get('f32bmp_mask')
+    if input_image is not None and mask_image is not None and mask_image.shape[:2] != input_image.shape[:2]:
+        return None
+    return 0
+
 def get_params():
     """返回节点参数"""
     return {
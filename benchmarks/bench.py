@@ -0,0 +1,349 @@
+"""
+TunnelNX 节点图基准测试
+
+用主程序同样使用的求值引擎（TunnelNX_scripts/TNXEngine.py）运行 benchmarks/graphs 中的合成节点图，
+输入为按固定种子生成的测试图像（1、12、48、200 百万像素），记录冷启动、预热重算和缓存命中时的
+各节点耗时、总耗时以及峰值内存，结果保存为JSON；compare 命令与基线结果比较并标出变慢的项目。
+
+    python benchmarks/bench.py run --sizes 1,12 --out results.json
+    python benchmarks/bench.py compare baseline.json results.json --threshold 0.1
+
+- 冷启动: 新进程中第一次计算，包含加载节点图和脚本、读取输入文件
+- 预热: 同一进程中之后的完整重算，每次计算前清空节点缓存和节点输出，取各次的中位数
+- 缓存命中: 预热之后不做任何修改再次计算，所有节点从节点缓存取回，衡量指纹计算和缓存查找的开销，
+  同时记录缓存命中和未命中次数，取各次的中位数
+- 引擎使用默认配置（不读取 config.ini），不启用磁盘二级缓存和持久化缓存，冷启动不会命中之前运行留下的缓存
+- 每个测试在独立的子进程中运行，峰值内存（peak_rss_mb）只属于该测试
+"""
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import argparse
+import statistics
+import subprocess
+import configparser
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+GRAPHS_DIR = os.path.join(BENCH_DIR, "graphs")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# 默认测试的图像尺寸（百万像素），48和200需要较多内存，按需通过 --sizes 指定
+DEFAULT_SIZES = (1, 12)
+ALL_SIZES = (1, 12, 48, 200)
+
+# 比较时低于该值（秒）的耗时变化视为噪声
+DEFAULT_MIN_DELTA = 0.005
+
+
+def image_dimensions(megapixels):
+    """4:3 图像的宽高"""
+    width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5))
+    return width, int(round(width * 3 / 4))
+
+
+def synthetic_rows(width, y0, y1, seed):
+    """生成测试图像的若干行（float32，0-1）：渐变、正弦纹理、圆环和固定种子的噪声，
+    同时包含平滑区域和细节，避免某些节点在纯色图像上走捷径"""
+    yy, xx = np.mgrid[y0:y1, 0:width].astype(np.float32)
+    u = xx / max(width - 1, 1)
+    v = yy / max(width * 3 / 4 - 1, 1)
+    rings = 0.5 + 0.5 * np.sin(40.0 * np.hypot(u - 0.5, v - 0.5))
+    texture = 0.5 + 0.5 * np.sin(u * 90.0) * np.cos(v * 70.0)
+    rng = np.random.default_rng(seed + y0)
+    noise = rng.random(u.shape, dtype=np.float32) * 0.1
+    return np.stack([u * 0.8 + noise, rings * 0.7 + noise, texture * 0.6 + v * 0.3 + noise], axis=-1).clip(0, 1)
+
+
+def generate_inputs(megapixels, image_dir):
+    """
+    生成（或复用已生成的）测试输入，相同尺寸每次生成的内容完全相同
+
+    返回:
+        dict: 模板变量 image（8位RGB TIFF）、gray16（16位灰度原始数据）、width、height
+    """
+    import cv2
+
+    width, height = image_dimensions(megapixels)
+    os.makedirs(image_dir, exist_ok=True)
+    image_path = os.path.join(image_dir, f"bench_{megapixels}mp.tif")
+    gray16_path = os.path.join(image_dir, f"bench_{megapixels}mp_gray16.bin")
+    if not (os.path.exists(image_path) and os.path.exists(gray16_path)):
+        print(f"生成 {megapixels} MP 测试图像 ({width}x{height}) ...")
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        gray16 = np.empty((height, width), dtype=np.uint16)
+        # 分块生成，200 MP 时中间的浮点数组也不会占用过多内存
+        block = 512
+        for y0 in range(0, height, block):
+            y1 = min(height, y0 + block)
+            rows = synthetic_rows(width, y0, y1, seed=megapixels)
+            rgb[y0:y1] = (rows * 255).astype(np.uint8)
+            gray16[y0:y1] = (rows.mean(axis=2) * 65535).astype(np.uint16)
+        # 不压缩，避免读取输入的时间受压缩算法影响
+        cv2.imwrite(image_path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_TIFF_COMPRESSION, 1])
+        gray16.tofile(gray16_path)
+    return {'image': image_path, 'gray16': gray16_path, 'width': width, 'height': height}
+
+
+def peak_rss_mb():
+    """当前进程的峰值内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+
+def _node_times(engine):
+    """以 "[ID] 标题" 为键的节点耗时"""
+    titles = {node['id']: node['title'] for node in engine.nodes}
+    return {f"[{node_id}] {titles[node_id]}": seconds for node_id, seconds in engine.node_times.items()}
+
+
+def _clear_node_results(engine):
+    """清空节点缓存、节点输出和来源记录，下一次计算完整重算所有节点"""
+    engine.reset_node_state()
+    for node in engine.nodes:
+        node.pop('processed_outputs', None)
+        node.pop('outputs_released', None)
+
+
+def _timed_evaluate(engine, target):
+    """计算一次目标节点，返回 (总耗时, 各节点耗时)"""
+    start = time.perf_counter()
+    engine.evaluate(target)
+    return time.perf_counter() - start, _node_times(engine)
+
+
+def _median_pass(runs):
+    """把若干次 (总耗时, 各节点耗时) 汇总为中位数"""
+    nodes = {}
+    for _, node_times in runs:
+        for key, seconds in node_times.items():
+            nodes.setdefault(key, []).append(seconds)
+    return {
+        'runs': len(runs),
+        'total_seconds': statistics.median(total for total, _ in runs),
+        'nodes': {key: statistics.median(values) for key, values in nodes.items()},
+    }
+
+
+def run_case(graph_path, megapixels, image_dir, repeat):
+    """
+    在当前进程中运行单个测试（由 run 命令在子进程中调用）
+
+    返回:
+        dict: 测试结果
+    """
+    import io
+    import contextlib
+    from TunnelNX_scripts.TNXEngine import TNXEngine
+
+    variables = generate_inputs(megapixels, image_dir)
+    with open(graph_path, 'r', encoding='utf-8') as f:
+        spec = json.load(f).get('benchmark', {})
+
+    # 脚本的调试输出不计入结果
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        engine = TNXEngine(config=configparser.ConfigParser())
+        engine.load_graph(graph_path)
+        for param_spec, template in spec.get('set', {}).items():
+            engine.set_param(param_spec, str(template).format(**variables))
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        outputs = engine.evaluate(spec.get('target'))
+        cold_total = time.perf_counter() - start
+        cold_nodes = _node_times(engine)
+
+        warm_runs = []
+        for _ in range(max(0, repeat - 1)):
+            _clear_node_results(engine)
+            warm_runs.append(_timed_evaluate(engine, spec.get('target')))
+
+        # 最后一次预热的结果仍在节点缓存中，之后的计算全部命中
+        cached_runs = []
+        cache_stats = engine.node_cache.get_stats()
+        for _ in range(max(0, repeat - 1)):
+            cached_runs.append(_timed_evaluate(engine, spec.get('target')))
+        cache_after = engine.node_cache.get_stats()
+
+    if not any(isinstance(value, np.ndarray) for value in outputs.values()):
+        raise RuntimeError(f"{os.path.basename(graph_path)} 的目标节点没有输出图像")
+
+    result = {
+        'graph': os.path.splitext(os.path.basename(graph_path))[0],
+        'megapixels': megapixels,
+        'width': variables['width'],
+        'height': variables['height'],
+        'cold': {'load_seconds': load_seconds, 'total_seconds': load_seconds + cold_total, 'nodes': cold_nodes},
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if warm_runs:
+        result['warm'] = _median_pass(warm_runs)
+    if cached_runs:
+        result['cached'] = _median_pass(cached_runs)
+        result['cached']['cache_hits'] = cache_after['hits'] - cache_stats['hits']
+        result['cached']['cache_misses'] = cache_after['misses'] - cache_stats['misses']
+    return result
+
+
+def command_run(args):
+    """run 命令：每个节点图和尺寸的组合在独立子进程中运行"""
+    graphs = [name.strip() for name in args.graphs.split(',')] if args.graphs else \
+        sorted(os.path.splitext(name)[0] for name in os.listdir(GRAPHS_DIR) if name.endswith('.json'))
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else list(DEFAULT_SIZES)
+    unknown = [size for size in sizes if size not in ALL_SIZES]
+    if unknown:
+        print(f"不支持的尺寸: {unknown}（可选 {', '.join(map(str, ALL_SIZES))}）", file=sys.stderr)
+        return 2
+
+    cases = []
+    failed = 0
+    for megapixels in sizes:
+        # 先在主进程中生成输入，图像生成时间和内存不计入测试
+        generate_inputs(megapixels, args.image_dir)
+        for graph in graphs:
+            graph_path = os.path.join(GRAPHS_DIR, graph + '.json')
+            cmd = [sys.executable, os.path.abspath(__file__), '_case', graph_path, str(megapixels),
+                   '--image-dir', args.image_dir, '--repeat', str(args.repeat)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', cwd=APP_DIR)
+            if proc.returncode != 0:
+                failed += 1
+                print(f"{graph} @ {megapixels} MP 失败:\n{proc.stderr.strip()}", file=sys.stderr)
+                continue
+            case = json.loads(proc.stdout.strip().splitlines()[-1])
+            cases.append(case)
+            warm = case.get('warm', {}).get('total_seconds')
+            cached = case.get('cached', {}).get('total_seconds')
+            print(f"{graph:<20} {megapixels:>4} MP  冷启动 {case['cold']['total_seconds']:8.3f} 秒  "
+                  f"预热 {warm if warm is not None else float('nan'):8.3f} 秒  "
+                  f"缓存命中 {cached if cached is not None else float('nan'):8.3f} 秒  "
+                  f"峰值内存 {case['peak_rss_mb'] or 0:8.0f} MB")
+
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'cases': cases,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {args.out}")
+    return 1 if failed else 0
+
+
+def compare_results(baseline, current, threshold, min_delta):
+    """
+    比较两次结果
+
+    返回:
+        list: [(测试名, 项目, 基线秒数, 当前秒数, 是否变慢), ...]，只包含变化超过阈值的项目
+    """
+    base_cases = {(case['graph'], case['megapixels']): case for case in baseline.get('cases', [])}
+    changes = []
+    for case in current.get('cases', []):
+        base = base_cases.get((case['graph'], case['megapixels']))
+        if base is None:
+            continue
+        name = f"{case['graph']} @ {case['megapixels']} MP"
+        pairs = [('冷启动总计', base['cold']['total_seconds'], case['cold']['total_seconds'])]
+        if 'warm' in base and 'warm' in case:
+            pairs.append(('预热总计', base['warm']['total_seconds'], case['warm']['total_seconds']))
+            for key, seconds in case['warm']['nodes'].items():
+                if key in base['warm']['nodes']:
+                    pairs.append((key, base['warm']['nodes'][key], seconds))
+        if 'cached' in base and 'cached' in case:
+            pairs.append(('缓存命中总计', base['cached']['total_seconds'], case['cached']['total_seconds']))
+        for item, old, new in pairs:
+            if abs(new - old) < min_delta or old <= 0:
+                continue
+            ratio = (new - old) / old
+            if abs(ratio) >= threshold:
+                changes.append((name, item, old, new, ratio > 0))
+    return changes
+
+
+def command_compare(args):
+    """compare 命令：有变慢的项目时返回1"""
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    changes = compare_results(baseline, current, args.threshold, args.min_delta)
+    if not changes:
+        print(f"没有超过 {args.threshold:.0%} 的变化")
+        return 0
+    regressions = 0
+    for name, item, old, new, slower in changes:
+        regressions += slower
+        mark = "变慢" if slower else "变快"
+        print(f"[{mark}] {name:<28} {item:<24} {old:8.3f} → {new:8.3f} 秒 ({(new - old) / old:+.0%})")
+    print(f"共 {regressions} 项变慢，{len(changes) - regressions} 项变快")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    """命令行参数定义"""
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="TunnelNX 节点图基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    default_image_dir = os.path.join(tempfile.gettempdir(), "TunnelNX_bench")
+
+    run = subparsers.add_parser("run", help="运行基准测试")
+    run.add_argument("--graphs", help="逗号分隔的节点图名（默认为 graphs 文件夹中的全部）")
+    run.add_argument("--sizes", help=f"逗号分隔的图像尺寸，单位百万像素（可选 {', '.join(map(str, ALL_SIZES))}，"
+                                     f"默认 {', '.join(map(str, DEFAULT_SIZES))}）")
+    run.add_argument("--repeat", type=int, default=3,
+                     help="每个测试的计算次数，第一次为冷启动，之后的预热重算和缓存命中各 repeat-1 次（默认3）")
+    run.add_argument("--image-dir", default=default_image_dir, help="测试图像文件夹（生成一次后复用）")
+    run.add_argument("--out", default="bench_results.json", help="结果文件")
+
+    compare = subparsers.add_parser("compare", help="与基线结果比较")
+    compare.add_argument("baseline", help="基线结果文件")
+    compare.add_argument("current", help="当前结果文件")
+    compare.add_argument("--threshold", type=float, default=0.10, help="视为变化的相对比例（默认0.10）")
+    compare.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                         help=f"低于该秒数的变化视为噪声（默认{DEFAULT_MIN_DELTA}）")
+
+    case = subparsers.add_parser("_case")
+    case.add_argument("graph")
+    case.add_argument("megapixels", type=int)
+    case.add_argument("--image-dir", default=default_image_dir)
+    case.add_argument("--repeat", type=int, default=3)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "run":
+        return command_run(args)
+    if args.command == "compare":
+        return command_compare(args)
+    if args.command == "_case":
+        print(json.dumps(run_case(args.graph, args.megapixels, args.image_dir, args.repeat), ensure_ascii=False))
+        return 0
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+TunnelNX 单脚本微基准测试
+
+从脚本注册表（scan_scripts）自动发现 TunnelNX_scripts 中的全部脚本，按脚本头部声明的输入类型
+生成合成输入，在几种图像尺寸下单独计时每个脚本的 process 函数（不经过节点图），
+并按 get_params() 中的下拉框、复选框和滑块最大值逐个改变参数，输出每个脚本的吞吐量（百万像素/秒）。
+
+    python benchmarks/script_bench.py
+    python benchmarks/script_bench.py --scripts 混合,图层合成 --sizes 1,4 --json scripts.json
+
+- 输入数组与真实计算时一样是只读的，context 来自无界面引擎
+- 没有输入端口的源节点、没有输出端口的导出类节点，以及输入类型无法合成的脚本会被跳过并注明原因
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import statistics
+import contextlib
+import unicodedata
+
+import numpy as np
+
+from bench import APP_DIR, image_dimensions, synthetic_rows
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+from TunnelNX_scripts.TNXEngine import TNXEngine, TNXEngineError, scan_scripts, freeze_outputs
+
+# 默认测试的图像尺寸（百万像素）
+DEFAULT_SIZES = (0.25, 1, 4)
+
+# 单个参数组合的计时预算（秒），第一次调用超过预算时不再重复
+DEFAULT_BUDGET = 5.0
+
+
+def synthesize_input(port_type, width, height, seed=0):
+    """
+    按端口类型生成合成输入
+
+    返回:
+        合成的输入数据；无法生成该类型时返回None
+    """
+    if port_type in ('f32bmp', 'f32bmp_mask', 'img', 'tif16') or port_type.startswith('channel'):
+        rgb = synthetic_rows(width, 0, height, seed)
+        if port_type == 'img':
+            return (rgb * 255).astype(np.uint8)
+        if port_type == 'tif16':
+            return (rgb * 65535).astype(np.uint16)
+        # f32bmp 为带透明度的RGBA
+        return np.concatenate([rgb, np.ones((height, width, 1), dtype=np.float32)], axis=-1)
+    if port_type in ('tif16_magnitude', 'tif16_phase'):
+        return (synthetic_rows(width, 0, height, seed).mean(axis=-1) * 65535).astype(np.uint16)
+    if port_type == 'kernel':
+        return np.full((5, 5), 1.0 / 25, dtype=np.float32)
+    if port_type == 'constant':
+        constant = np.full((1, 1, 4), 0.5, dtype=np.float32)
+        constant[0, 0, 3] = 1.0
+        return constant
+    if port_type == 'bin':
+        return synthetic_rows(width, 0, height, seed).tobytes()
+    return None
+
+
+def build_inputs(script_info, width, height):
+    """
+    按脚本头部的输入类型生成输入字典，键的规则与引擎相同（第一个同类型输入用类型名，之后为 类型_1 ...）；
+    有灵活输入端口时额外提供一个灵活端口的输入
+
+    返回:
+        (dict, str): 输入字典；无法生成时返回 (None, 原因)
+    """
+    port_types = list(script_info.get('inputs', []))
+    flexible = script_info.get('flexible_inputs', [])
+    if flexible:
+        port_types.append(flexible[0])
+
+    inputs = {}
+    counts = {}
+    for index, port_type in enumerate(port_types):
+        value = synthesize_input(port_type, width, height, seed=index)
+        if value is None:
+            return None, f"无法合成输入类型 {port_type}"
+        counts[port_type] = counts.get(port_type, 0) + 1
+        inputs[port_type if counts[port_type] == 1 else f"{port_type}_{counts[port_type] - 1}"] = value
+    freeze_outputs(inputs)
+    return inputs, None
+
+
+def param_variants(params, max_variants):
+    """
+    参数组合：默认值，以及每次只改变一个参数的组合（下拉框的其他选项、复选框取反、滑块最大值）
+
+    返回:
+        list: [(名称, 扁平参数字典), ...]
+    """
+    defaults = {name: info.get('value') for name, info in params.items() if isinstance(info, dict)}
+    variants = [("默认", defaults)]
+    for name, info in params.items():
+        if not isinstance(info, dict):
+            continue
+        param_type = info.get('type')
+        default = info.get('value')
+        if param_type == 'dropdown':
+            values = [option for option in info.get('options', []) if option != default]
+        elif param_type == 'checkbox':
+            values = [not default]
+        elif param_type == 'slider' and 'max' in info and info['max'] != default:
+            values = [info['max']]
+        else:
+            continue
+        for value in values:
+            variants.append((f"{name}={value}", dict(defaults, **{name: value})))
+    return variants[:max_variants]
+
+
+def time_process(process_func, inputs, params, context, repeat, budget):
+    """
+    计时 process，第一次调用作为预热
+
+    返回:
+        (float, dict): 中位耗时（秒）和最后一次的输出
+    """
+    times = []
+    first = None
+    outputs = None
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        if context is not None:
+            outputs = process_func(inputs, dict(params), context)
+        else:
+            outputs = process_func(inputs, dict(params))
+        elapsed = time.perf_counter() - start
+        if first is None:
+            first = elapsed
+        else:
+            times.append(elapsed)
+        if first + sum(times) > budget:
+            break
+    return statistics.median(times) if times else first, outputs
+
+
+def _is_passthrough(outputs, inputs):
+    """输出的图像是否都直接引用了输入数组"""
+    arrays = [value for value in outputs.values() if isinstance(value, np.ndarray) and value.ndim >= 2]
+    input_arrays = [value for value in inputs.values() if isinstance(value, np.ndarray)]
+    return bool(arrays) and all(any(np.may_share_memory(array, source) for source in input_arrays) for array in arrays)
+
+
+def _pad(text, width):
+    """按显示宽度（中文字符占两列）左对齐"""
+    text = str(text)
+    display = sum(2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1 for char in text)
+    return text + ' ' * max(1, width - display)
+
+
+def benchmark_script(engine, script_path, script_info, sizes, repeat, max_variants, budget):
+    """
+    测试单个脚本
+
+    返回:
+        dict: {'script', 'path', 'results': [...]} 或带 'skipped' 原因
+    """
+    name = os.path.relpath(script_path, engine.scripts_folder).replace(os.sep, '/')
+    entry = {'script': os.path.splitext(name)[0], 'path': name, 'results': []}
+    if not script_info.get('inputs'):
+        entry['skipped'] = "没有输入端口（源节点）"
+        return entry
+    if not script_info.get('outputs'):
+        entry['skipped'] = "没有输出端口"
+        return entry
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            node = engine.create_node({'id': 0, 'script_path': script_path})
+    except TNXEngineError as e:
+        entry['skipped'] = str(e)
+        return entry
+    process_func = getattr(node['module'], 'process', None)
+    if process_func is None:
+        entry['skipped'] = "没有 process 函数"
+        return entry
+
+    import inspect
+    try:
+        accepts_context = len(inspect.signature(process_func).parameters) == 3
+    except (TypeError, ValueError):
+        accepts_context = False
+    context = engine.get_application_context(node) if accepts_context else None
+
+    variants = param_variants(node['params'], max_variants)
+    for megapixels in sizes:
+        width, height = image_dimensions(megapixels)
+        inputs, reason = build_inputs(script_info, width, height)
+        if inputs is None:
+            entry['skipped'] = reason
+            return entry
+        for variant_name, params in variants:
+            record = {'variant': variant_name, 'megapixels': megapixels, 'width': width, 'height': height}
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    seconds, outputs = time_process(process_func, inputs, params, context, repeat, budget)
+                record['seconds'] = seconds
+                record['mp_per_second'] = width * height / 1e6 / seconds if seconds > 0 else None
+                if not isinstance(outputs, dict) or all(value is None for value in outputs.values()):
+                    record['note'] = "没有输出"
+                elif _is_passthrough(outputs, inputs):
+                    # 参数为恒等变换时脚本直接返回输入，吞吐量没有参考意义
+                    record['note'] = "直通"
+            except Exception as e:
+                record['error'] = f"{type(e).__name__}: {e}"
+            entry['results'].append(record)
+    return entry
+
+
+def print_report(entries, sizes):
+    """打印每个参数组合的结果，以及按最大尺寸下默认参数吞吐量排序的汇总"""
+    print(f"{_pad('脚本', 40)}{_pad('参数', 32)}{'MP':>6}{'耗时 ms':>11}{'MP/s':>10}")
+    for entry in entries:
+        for record in entry['results']:
+            prefix = f"{_pad(entry['script'], 40)}{_pad(str(record['variant'])[:30], 32)}{record['megapixels']:>6g}"
+            if 'error' in record:
+                print(f"{prefix}  错误: {record['error']}")
+                continue
+            note = f"  ({record['note']})" if 'note' in record else ""
+            print(f"{prefix}{record['seconds'] * 1000:>11.1f}{record['mp_per_second'] or 0:>10.1f}{note}")
+
+    largest = max(sizes)
+    summary = []
+    for entry in entries:
+        for record in entry['results']:
+            if record['variant'] == "默认" and record['megapixels'] == largest and record.get('mp_per_second') \
+                    and 'note' not in record:
+                summary.append((record['mp_per_second'], entry['script']))
+    if summary:
+        summary.sort()
+        fastest = summary[-1][0]
+        print(f"\n默认参数、{largest:g} MP 下的吞吐量（从慢到快，不含直通和没有输出的脚本）:")
+        for mp_per_second, script in summary:
+            ratio = fastest / mp_per_second
+            relation = "最快" if ratio < 1.05 else f"比最快的慢 {ratio:.1f} 倍"
+            print(f"  {_pad(script, 40)}{mp_per_second:>10.1f} MP/s  ({relation})")
+
+    skipped = [entry for entry in entries if 'skipped' in entry]
+    if skipped:
+        print("\n跳过的脚本:")
+        for entry in skipped:
+            print(f"  {entry['script']}: {entry['skipped']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TunnelNX 单脚本微基准测试")
+    parser.add_argument("--scripts", help="逗号分隔的脚本名或相对路径（如 混合,投影与混合/图层合成，默认测试全部）")
+    parser.add_argument("--sizes", help=f"逗号分隔的图像尺寸，单位百万像素（默认 {', '.join(map(str, DEFAULT_SIZES))}）")
+    parser.add_argument("--repeat", type=int, default=3, help="预热之后的计时次数（默认3）")
+    parser.add_argument("--max-variants", type=int, default=8, help="每个脚本最多测试的参数组合数（默认8）")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help=f"单个参数组合的计时预算秒数（默认{DEFAULT_BUDGET:g}）")
+    parser.add_argument("--json", dest="json_path", help="同时把结果保存为JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [float(size) for size in args.sizes.split(',')] if args.sizes else list(DEFAULT_SIZES)
+    filters = [name.strip() for name in args.scripts.split(',')] if args.scripts else None
+
+    engine = TNXEngine()
+    registry = scan_scripts(engine.scripts_folder)
+    entries = []
+    for rel_path, script in sorted(registry.items()):
+        rel_stem = os.path.splitext(rel_path)[0]
+        if filters and not any(name in (rel_stem, rel_stem.split('/')[-1]) for name in filters):
+            continue
+        print(f"测试 {rel_path} ...", file=sys.stderr)
+        entries.append(benchmark_script(engine, script['path'], script['info'], sizes,
+                                        args.repeat, args.max_variants, args.budget))
+
+    print_report(entries, sizes)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'sizes': sizes, 'scripts': entries}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
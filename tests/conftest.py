@@ -0,0 +1,89 @@
+"""
+测试共用的配置：把程序目录加入导入路径，并提供 benchmarks/graphs 中的节点图、不读取 config.ini 的引擎、
+测试用的菱形节点图和记录节点执行情况的工具
+"""
+import os
+import sys
+import json
+import time
+import functools
+import threading
+import collections
+import configparser
+
+import cv2
+import numpy as np
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GRAPHS_DIR = os.path.join(APP_DIR, "benchmarks", "graphs")
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from TunnelNX_scripts.TNXEngine import TNXEngine  # noqa: E402
+
+
+def graph_path(name):
+    """benchmarks/graphs 中的节点图路径"""
+    return os.path.join(GRAPHS_DIR, f"{name}.json")
+
+
+@pytest.fixture
+def engine():
+    """使用默认配置的引擎（不读取用户的 config.ini）"""
+    return TNXEngine(config=configparser.ConfigParser())
+
+
+def write_diamond_graph(tmp_path):
+    """图像 -> 解码 -> 两个基本处理分支 (2, 3) -> 混合 (4) -> 预览 (5) 的菱形节点图"""
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(0).random((48, 64, 3)) * 255).astype(np.uint8))
+    scripts = ["图像节点.py", "解码节点.py", "基本处理.py", "基本处理.py", "投影与混合/混合.py", "预览节点.py"]
+    params = {0: {"image_path": image_path}, 2: {"brightness": 20}, 3: {"contrast": 30}}
+    edges = [(0, 1, 0), (1, 2, 0), (1, 3, 0), (2, 4, 0), (3, 4, 1), (4, 5, 0)]
+    graph = {
+        "nodes": [{"id": node_id, "script_path": os.path.join(APP_DIR, "TunnelNX_scripts", script),
+                   "params": params.get(node_id, {})} for node_id, script in enumerate(scripts)],
+        "connections": [{"output_node_id": out_id, "output_port": 0, "input_node_id": in_id, "input_port": port}
+                        for out_id, in_id, port in edges],
+    }
+    path = tmp_path / "diamond.json"
+    path.write_text(json.dumps(graph, ensure_ascii=False), encoding="utf-8")
+    return str(path), edges
+
+
+class ProcessRecorder:
+    """
+    包装节点的process函数，记录调用次数、执行区间和线程，可以让指定节点变慢、出错或停住
+
+    gates: 节点ID -> (entered, release) 两个threading.Event，节点开始执行时设置entered，等到release被设置后才继续
+    """
+
+    def __init__(self, engine, delays=None, failures=(), gates=None):
+        self.calls = collections.Counter()
+        self.spans = {}
+        self._lock = threading.Lock()
+        for node in engine.nodes:
+            module = node['module']
+            module.process = self._wrap(node['id'], module.process, (delays or {}).get(node['id'], 0),
+                                        node['id'] in failures, (gates or {}).get(node['id']))
+
+    def _wrap(self, node_id, process, delay, fail, gate):
+        @functools.wraps(process)
+        def wrapper(*args):
+            start = time.perf_counter()
+            with self._lock:
+                self.calls[node_id] += 1
+            if gate is not None:
+                entered, release = gate
+                entered.set()
+                release.wait(5)
+            time.sleep(delay)
+            if fail:
+                raise RuntimeError("测试节点出错")
+            outputs = process(*args)
+            with self._lock:
+                self.spans[node_id] = (start, time.perf_counter(), threading.current_thread().name)
+            return outputs
+        return wrapper
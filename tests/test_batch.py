@@ -0,0 +1,107 @@
+"""
+批处理 TNXBatch 的测试：日志续跑逻辑，以及用 benchmarks/graphs 中的节点图实际运行的批处理
+"""
+import os
+import json
+
+import cv2
+import numpy as np
+
+from conftest import graph_path
+from TunnelNX_scripts.TNXBatch import LOG_FILE_NAME, read_completed, run_batch
+
+
+def write_log(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write((json.dumps(line, ensure_ascii=False) if isinstance(line, dict) else line) + '\n')
+
+
+def make_output(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"x")
+    return str(path)
+
+
+# ----------------------------------------------------------------------
+# read_completed
+# ----------------------------------------------------------------------
+def test_read_completed_missing_log(tmp_path):
+    assert read_completed(str(tmp_path / LOG_FILE_NAME)) == set()
+
+
+def test_read_completed_only_ok_with_existing_output(tmp_path):
+    log_path = str(tmp_path / LOG_FILE_NAME)
+    write_log(log_path, [
+        {'input': 'a.jpg', 'output': make_output(tmp_path, 'a.png'), 'status': 'ok'},
+        # 输出文件已被删除的成功记录需要重新处理
+        {'input': 'b.jpg', 'output': str(tmp_path / 'b.png'), 'status': 'ok'},
+        {'input': 'c.jpg', 'output': make_output(tmp_path, 'c.png'), 'status': 'error', 'error': 'boom'},
+    ])
+    assert read_completed(log_path) == {'a.jpg'}
+
+
+def test_read_completed_latest_record_wins(tmp_path):
+    log_path = str(tmp_path / LOG_FILE_NAME)
+    output = make_output(tmp_path, 'a.png')
+    write_log(log_path, [
+        {'input': 'a.jpg', 'output': output, 'status': 'ok'},
+        {'input': 'a.jpg', 'output': output, 'status': 'error', 'error': 'boom'},
+        {'input': 'b.jpg', 'output': make_output(tmp_path, 'b.png'), 'status': 'error', 'error': 'boom'},
+        {'input': 'b.jpg', 'output': str(tmp_path / 'b.png'), 'status': 'ok'},
+    ])
+    assert read_completed(log_path) == {'b.jpg'}
+
+
+def test_read_completed_ignores_truncated_line(tmp_path):
+    log_path = str(tmp_path / LOG_FILE_NAME)
+    write_log(log_path, [
+        {'input': 'a.jpg', 'output': make_output(tmp_path, 'a.png'), 'status': 'ok'},
+        '{"input": "b.jpg", "output": "b.png", "sta',
+    ])
+    assert read_completed(log_path) == {'a.jpg'}
+
+
+# ----------------------------------------------------------------------
+# run_batch
+# ----------------------------------------------------------------------
+def make_inputs(folder, count):
+    folder.mkdir()
+    rng = np.random.default_rng(0)
+    paths = []
+    for index in range(count):
+        path = folder / f"img{index}.png"
+        cv2.imwrite(str(path), (rng.random((48, 64, 3)) * 255).astype(np.uint8))
+        paths.append(str(path))
+    return paths
+
+
+def read_log(output_dir):
+    with open(os.path.join(output_dir, LOG_FILE_NAME), 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_run_batch_resumes_from_log(tmp_path):
+    input_paths = make_inputs(tmp_path / "in", 3)
+    broken = tmp_path / "in" / "broken.png"
+    broken.write_bytes(b"not an image")
+    input_paths.append(str(broken))
+    output_dir = str(tmp_path / "out")
+    kwargs = dict(jobs=1, extension='.png', config_path=str(tmp_path / "missing.ini"))
+
+    stats = run_batch(graph_path("linear_chain"), input_paths, output_dir, **kwargs)
+    assert (stats['total'], stats['ok'], stats['failed'], stats['skipped']) == (4, 3, 1, 0)
+    records = {os.path.basename(r['input']): r for r in read_log(output_dir)}
+    assert records['broken.png']['status'] == 'error' and records['broken.png']['error']
+    for index in range(3):
+        assert os.path.isfile(records[f"img{index}.png"]['output'])
+
+    # 再次运行只重试失败的文件；删除的输出文件也会重新生成
+    os.remove(records['img1.png']['output'])
+    stats = run_batch(graph_path("linear_chain"), input_paths, output_dir, **kwargs)
+    assert (stats['ok'], stats['failed'], stats['skipped']) == (1, 1, 2)
+    assert os.path.isfile(records['img1.png']['output'])
+
+    # force 忽略日志
+    stats = run_batch(graph_path("linear_chain"), input_paths, output_dir, force=True, **kwargs)
+    assert stats['skipped'] == 0 and stats['ok'] == 3
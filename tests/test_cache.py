@@ -0,0 +1,174 @@
+"""
+内存缓存 LRUCache 的成本感知淘汰和磁盘二级缓存 DiskSpillCache 的后台写入测试
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from TunnelNX_scripts.TNXCache import DiskSpillCache, LRUCache, estimate_nbytes
+
+
+def make_outputs(value):
+    image = np.full((16, 16, 3), value, dtype=np.float32)
+    image.flags.writeable = False
+    return {'f32bmp': image, 'label': 'x'}
+
+
+def blocked_writer(cache):
+    """让后台写入线程等待，返回放行用的事件"""
+    release = threading.Event()
+    cache._writer_started = threading.Event()
+    original_put = cache.put
+
+    def slow_put(key, value, cost=None):
+        cache._writer_started.set()
+        release.wait(5)
+        return original_put(key, value, cost)
+
+    cache.put = slow_put
+    return release
+
+
+def test_put_async_serves_pending_entries(tmp_path):
+    cache = DiskSpillCache(str(tmp_path / "spill"), 1 << 30)
+    release = blocked_writer(cache)
+    outputs = make_outputs(0.5)
+    assert cache.put_async("a1b2c3d4", outputs)
+    assert cache.contains("a1b2c3d4")
+    # 写完之前直接返回内存中的同一份数据
+    assert cache.get("a1b2c3d4") is outputs
+    assert cache.get_stats()['pending'] == 1
+
+    release.set()
+    cache.flush()
+    stats = cache.get_stats()
+    assert (stats['pending'], stats['pending_bytes'], stats['writes']) == (0, 0, 1)
+    loaded = cache.get("a1b2c3d4")
+    assert loaded is not outputs
+    assert np.array_equal(loaded['f32bmp'], outputs['f32bmp']) and loaded['label'] == 'x'
+    cache.close()
+
+
+def test_removed_pending_entry_is_not_written(tmp_path):
+    cache = DiskSpillCache(str(tmp_path / "spill"), 1 << 30)
+    release = blocked_writer(cache)
+    cache.put_async("a1b2c3d4", make_outputs(0.1))
+    cache.put_async("b1b2c3d4", make_outputs(0.2))
+    cache._writer_started.wait(5)
+    # 第一项正在写入，第二项仍在队列中
+    assert cache.remove("b1b2c3d4")
+    cache.clear()
+    release.set()
+    cache.flush()
+    assert not cache.contains("a1b2c3d4") and not cache.contains("b1b2c3d4")
+    assert cache.get_stats()['current_size'] == 0
+    cache.close()
+
+
+def test_full_queue_writes_synchronously(tmp_path):
+    outputs = make_outputs(0.3)
+    cache = DiskSpillCache(str(tmp_path / "spill"), 1 << 30, max_pending_bytes=1)
+    assert cache.put_async("a1b2c3d4", outputs)
+    stats = cache.get_stats()
+    assert (stats['pending'], stats['writes']) == (0, 1)
+    cache.close()
+
+
+def test_lru_eviction_spills_in_background(tmp_path):
+    cache = DiskSpillCache(str(tmp_path / "spill"), 1 << 30)
+    memory = LRUCache(max_size=1)
+    memory.on_evict = cache.put_async
+    first = make_outputs(0.7)
+    memory.put("a1b2c3d4", first)
+    memory.put("b1b2c3d4", make_outputs(0.8))
+    assert memory.get("a1b2c3d4") is None
+    assert np.array_equal(cache.get("a1b2c3d4")['f32bmp'], first['f32bmp'])
+    cache.flush()
+    assert cache.get_stats()['writes'] == 1
+    cache.close()
+
+
+# ----------------------------------------------------------------------
+# 成本感知淘汰（GreedyDual-Size）
+# ----------------------------------------------------------------------
+MB = 1024 * 1024
+
+
+def sized_outputs(nbytes):
+    return {'f32bmp': np.zeros(nbytes, dtype=np.uint8)}
+
+
+def recording_cache(max_bytes, max_size=100):
+    """记录淘汰顺序的缓存"""
+    cache = LRUCache(max_size=max_size, max_bytes=max_bytes)
+    evicted = []
+    cache.on_evict = lambda key, value, cost: evicted.append(key)
+    return cache, evicted
+
+
+def test_gds_evicts_large_cheap_entries_first():
+    cache, evicted = recording_cache(max_bytes=4 * MB)
+    cache.put("small_costly", sized_outputs(MB // 4), cost=1.0)
+    cache.put("large_cheap", sized_outputs(MB), cost=0.01)
+    cache.put("large_costly", sized_outputs(MB), cost=1.0)
+    cache.put("small_cheap", sized_outputs(MB // 4), cost=0.01)
+    # 较早放入、也没有被访问过的小而昂贵的项不受影响，先淘汰每字节重算成本最低的大项
+    cache.put("new", sized_outputs(2 * MB), cost=0.5)
+    assert evicted == ["large_cheap"]
+    assert cache.get("small_costly") is not None and cache.get("small_cheap") is not None
+
+
+def test_gds_falls_back_to_lru_for_equal_costs():
+    cache, evicted = recording_cache(max_bytes=None, max_size=3)
+    for key in ("a", "b", "c"):
+        cache.put(key, sized_outputs(1024), cost=0.1)
+    cache.get("a")
+    cache.put("d", sized_outputs(1024), cost=0.1)
+    cache.put("e", sized_outputs(1024), cost=0.1)
+    assert evicted == ["b", "c"]
+
+
+def test_inflation_lets_old_costly_entries_age_out():
+    cache, evicted = recording_cache(max_bytes=None, max_size=2)
+    cache.put("costly", sized_outputs(MB), cost=0.3)
+    # 每次淘汰抬高全局老化值，新放入的便宜项最终超过一直未被访问的昂贵项
+    for i in range(7):
+        cache.put(f"cheap{i}", sized_outputs(MB), cost=0.1)
+    assert "costly" in evicted
+    assert cache.keys() == ["cheap5", "cheap6"]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_byte_budget_is_respected(seed):
+    rng = np.random.default_rng(seed)
+    max_bytes = 8 * MB
+    cache, evicted = recording_cache(max_bytes=max_bytes)
+    for i in range(200):
+        key = f"k{rng.integers(40)}"
+        if rng.random() < 0.3:
+            cache.get(key)
+            continue
+        cache.put(key, sized_outputs(int(rng.integers(1, 3 * MB))), cost=float(rng.random()))
+        stats = cache.get_stats()
+        assert stats['current_bytes'] <= max_bytes
+        assert stats['current_bytes'] == sum(estimate_nbytes(cache.cache[k]) for k in cache.keys())
+    assert evicted
+
+    # 单项超过整个预算时不缓存，直接交给淘汰回调
+    evicted.clear()
+    assert not cache.put("huge", sized_outputs(max_bytes + 1), cost=10.0)
+    assert evicted == ["huge"] and cache.get("huge") is None
+
+
+def test_eviction_heap_stays_bounded_under_hits():
+    cache = LRUCache(max_size=10)
+    for i in range(10):
+        cache.put(f"k{i}", sized_outputs(1024), cost=0.1)
+    for _ in range(1000):
+        for i in range(10):
+            cache.get(f"k{i}")
+    assert len(cache._heap) <= 2 * len(cache.cache) + 64
+    # 命中刷新了顺序：k0最久未使用，最先被淘汰
+    cache.put("new", sized_outputs(1024), cost=0.1)
+    assert "k0" not in cache.keys() and "k1" in cache.keys()
@@ -0,0 +1,450 @@
+"""
+无界面引擎 TNXEngine 的节点图接口测试：参数设置、节点查找、脚本路径解析、原地执行、缓冲区池、分块执行、代理分辨率、并行执行、提前截止和中间结果释放
+"""
+import os
+import shutil
+import threading
+import configparser
+import concurrent.futures
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import APP_DIR, ProcessRecorder, graph_path, write_diamond_graph
+from TunnelNX_scripts.TNXEngine import TNXEngine, TNXEngineError
+from TunnelNX_scripts.TNXCache import WeakOutputs
+
+
+# ----------------------------------------------------------------------
+# set_param
+# ----------------------------------------------------------------------
+def test_set_param_converts_by_current_type(engine):
+    engine.load_graph(graph_path("linear_chain"))
+
+    engine.set_param("2.brightness", "-25")
+    engine.set_param("2.wb_r", "1.5")
+    engine.set_param("卷积.normalize", "true")
+    engine.set_param("卷积核节点.size", "7")
+
+    basic = engine.find_node(2)
+    assert basic['params']['brightness']['value'] == -25
+    assert isinstance(basic['params']['brightness']['value'], int)
+    assert basic['params']['wb_r']['value'] == 1.5
+    assert engine.find_node("卷积")['params']['normalize']['value'] is True
+    # 字符串参数原样保存，即使看起来像数字
+    assert engine.find_node("卷积核节点")['params']['size']['value'] == "7"
+
+
+@pytest.mark.parametrize("raw, expected", [("1", True), ("0", False), ("FALSE", False), ("True", True)])
+def test_set_param_bool_spellings(engine, raw, expected):
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("解码节点.is_raw", raw)
+    assert engine.find_node("解码节点")['params']['is_raw']['value'] is expected
+
+
+def test_set_param_parses_json_for_other_types(engine):
+    engine.load_graph(graph_path("linear_chain"))
+    engine.find_node(6)['params']['points'] = {'value': [0, 0]}
+    engine.set_param("6.points", "[1, 2, 3]")
+    assert engine.find_node(6)['params']['points']['value'] == [1, 2, 3]
+
+
+def test_set_param_keeps_non_string_values(engine):
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("2.brightness", 42)
+    assert engine.find_node(2)['params']['brightness']['value'] == 42
+
+
+@pytest.mark.parametrize("spec, raw", [
+    ("2.brightness", "bright"),
+    ("2.wb_r", "1.5x"),
+    ("解码节点.is_raw", "yes"),
+])
+def test_set_param_rejects_invalid_values(engine, spec, raw):
+    engine.load_graph(graph_path("linear_chain"))
+    with pytest.raises(TNXEngineError) as excinfo:
+        engine.set_param(spec, raw)
+    assert isinstance(excinfo.value.__cause__, ValueError)
+
+
+@pytest.mark.parametrize("spec", ["brightness", ".brightness", "2.", "2.no_such_param", "99.brightness"])
+def test_set_param_rejects_bad_specs(engine, spec):
+    engine.load_graph(graph_path("linear_chain"))
+    with pytest.raises(TNXEngineError):
+        engine.set_param(spec, "1")
+
+
+# ----------------------------------------------------------------------
+# find_node
+# ----------------------------------------------------------------------
+def test_find_node_by_id_or_title(engine):
+    engine.load_graph(graph_path("fan_in_composite"))
+    assert engine.find_node(7)['title'] == "图层合成"
+    assert engine.find_node("7")['title'] == "图层合成"
+    assert engine.find_node("图层合成")['id'] == 7
+
+
+def test_find_node_rejects_ambiguous_title(engine):
+    engine.load_graph(graph_path("fan_in_composite"))
+    with pytest.raises(TNXEngineError) as excinfo:
+        engine.find_node("基本处理")
+    # 错误信息列出所有同名节点的ID，方便改用ID
+    assert "2" in str(excinfo.value) and "3" in str(excinfo.value)
+    assert engine.find_node(3)['params']['saturation']['value'] == -50
+
+
+def test_find_node_missing(engine):
+    engine.load_graph(graph_path("fan_in_composite"))
+    with pytest.raises(TNXEngineError):
+        engine.find_node("不存在的节点")
+
+
+# ----------------------------------------------------------------------
+# resolve_script_path
+# ----------------------------------------------------------------------
+def test_resolve_existing_path(engine):
+    path = os.path.join(engine.scripts_folder, "数学", "取反.py")
+    assert engine.resolve_script_path(path) == path
+
+
+@pytest.mark.parametrize("saved_path", [
+    "C:\\Users\\someone\\Tunnel-Next\\TunnelNX_scripts\\卷积\\卷积.py",
+    "/home/someone/Tunnel-Next/TunnelNX_scripts/卷积/卷积.py",
+])
+def test_resolve_path_saved_on_another_machine(engine, saved_path):
+    expected = os.path.join(engine.scripts_folder, "卷积", "卷积.py")
+    assert os.path.normpath(engine.resolve_script_path(saved_path)) == os.path.normpath(expected)
+
+
+def test_resolve_by_file_name(engine):
+    # 脚本文件夹改名或脚本移动到其他子文件夹时按文件名查找
+    resolved = engine.resolve_script_path("D:\\old_scripts\\取反.py")
+    assert os.path.normpath(resolved) == os.path.normpath(os.path.join(engine.scripts_folder, "数学", "取反.py"))
+
+
+def test_resolve_unknown_script(engine):
+    assert engine.resolve_script_path("/nowhere/TunnelNX_scripts/没有这个脚本.py") is None
+
+
+def test_resolve_ambiguous_file_name(tmp_path):
+    scripts_folder = tmp_path / "scripts"
+    for sub in ("a", "b"):
+        (scripts_folder / sub).mkdir(parents=True)
+        shutil.copy(os.path.join(APP_DIR, "TunnelNX_scripts", "数学", "取反.py"), scripts_folder / sub / "取反.py")
+    engine = TNXEngine(scripts_folder=str(scripts_folder), config_path=str(tmp_path / "missing.ini"))
+    # 同名脚本有多个时无法确定，返回None
+    assert engine.resolve_script_path("/elsewhere/取反.py") is None
+    assert engine.resolve_script_path("/elsewhere/scripts/b/取反.py") == str(scripts_folder / "b" / "取反.py")
+
+
+# ----------------------------------------------------------------------
+# 原地执行
+# ----------------------------------------------------------------------
+def test_inplace_consumer_leaves_upstream_cached(engine, tmp_path):
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(0).random((48, 64, 3)) * 255).astype(np.uint8))
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("图像节点.image_path", image_path)
+    engine.set_param("3.brightness", "10")
+
+    # 取反声明了InPlaceSafe，且是卷积唯一的下游，但卷积的输出被缓存持有，不能交接：取反自己分配结果，缓存中的输出不受影响
+    inverted = engine.evaluate()['f32bmp']
+    misses = engine.node_cache.get_stats()['misses']
+    convolved = engine.evaluate("卷积")['f32bmp']
+    assert engine.node_cache.get_stats()['misses'] == misses
+    assert not convolved.flags.writeable
+    assert not np.shares_memory(inverted, convolved)
+    assert np.allclose(inverted[..., :3], 1.0 - convolved[..., :3], atol=1e-6)
+
+
+class BufferAddressEngine(TNXEngine):
+    """记录每个节点输出图像的内存地址（不持有数组本身，不影响引用计数）"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.buffer_addresses = {}
+
+    def on_node_processed(self, node, context):
+        image = node['processed_outputs'].get('f32bmp')
+        if isinstance(image, np.ndarray):
+            self.buffer_addresses[node['title']] = image.__array_interface__['data'][0]
+
+
+@pytest.mark.parametrize("tiled", [False, True])
+def test_inplace_consumer_takes_over_uncached_buffer(tmp_path, tiled):
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(0).random((300, 400, 3)) * 255).astype(np.uint8))
+    # 缓存预算小于单个输出，卷积的输出只由节点自己持有，可以交给取反
+    config = configparser.ConfigParser()
+    config['Cache'] = {'max_memory_mb': '1'}
+    # 分块处理时取反（无边缘）在交接的缓冲区的可写图块视图上原地写入
+    config['Performance'] = {'tiled_execution': str(tiled).lower(), 'tile_size': '64', 'tile_min_pixels': '10000'}
+    engine = BufferAddressEngine(config=config)
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("图像节点.image_path", image_path)
+
+    inverted = engine.evaluate()['f32bmp']
+    # 取反直接写在卷积的输出缓冲区中，没有分配新数组
+    assert engine.buffer_addresses['取反'] == engine.buffer_addresses['卷积']
+    record = engine.profiler.last_run()['records'][engine.find_node("取反")['id']]
+    assert record['allocated_bytes'] == 0
+    assert 'processed_outputs' not in engine.find_node("卷积")
+    assert not inverted.flags.writeable
+
+    # 卷积需要时重新计算，结果与交接前被改写的缓冲区无关
+    convolved = engine.evaluate("卷积")['f32bmp']
+    assert not np.shares_memory(inverted, convolved)
+    assert np.allclose(inverted[..., :3], 1.0 - convolved[..., :3], atol=1e-6)
+
+
+# ----------------------------------------------------------------------
+# 缓冲区池
+# ----------------------------------------------------------------------
+def test_buffer_pool_reuses_buffers_across_edits(engine, tmp_path):
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(0).random((48, 64, 3)) * 255).astype(np.uint8))
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("图像节点.image_path", image_path)
+    engine.evaluate()
+    for brightness in range(5, 35, 5):
+        engine.set_param("2.brightness", str(brightness))
+        result = engine.evaluate()['f32bmp']
+
+    # 基本处理通过context['alloc']分配输出，被取代的缓存项移出缓存后缓冲区回到池中
+    stats = engine.buffer_pools[2].get_stats()
+    assert stats['reuses'] > 0
+    assert stats['allocations'] <= 3
+
+    # 复用的缓冲区没有改写仍在使用的结果
+    fresh = TNXEngine(config=configparser.ConfigParser())
+    fresh.load_graph(graph_path("linear_chain"))
+    fresh.set_param("图像节点.image_path", image_path)
+    fresh.set_param("2.brightness", "30")
+    assert np.array_equal(result, fresh.evaluate()['f32bmp'])
+
+
+# ----------------------------------------------------------------------
+# 分块执行
+# ----------------------------------------------------------------------
+def evaluate_basic_processing(image_path, tiled):
+    config = configparser.ConfigParser()
+    config['Performance'] = {'tiled_execution': str(tiled).lower(), 'tile_size': '64', 'tile_min_pixels': '10000'}
+    engine = TNXEngine(config=config)
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("图像节点.image_path", image_path)
+    # 亮度和白平衡把部分像素推到1以上，剪裁必须在全部调整之后
+    engine.set_param("2.brightness", "60")
+    engine.set_param("2.wb_r", "1.8")
+    engine.set_param("2.wb_b", "0.6")
+    return engine.evaluate(2)['f32bmp']
+
+
+def test_tiled_basic_processing_matches_whole_image(tmp_path):
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(1).random((150, 200, 3)) * 255).astype(np.uint8))
+    whole = evaluate_basic_processing(image_path, tiled=False)
+    tiled = evaluate_basic_processing(image_path, tiled=True)
+    assert whole.min() >= 0.0 and whole.max() <= 1.0
+    assert np.allclose(tiled, whole, atol=1e-6)
+
+
+# ----------------------------------------------------------------------
+# 代理分辨率
+# ----------------------------------------------------------------------
+@pytest.mark.parametrize("kernel_type, level, expected", [
+    ("gaussian_blur", 0, (9, 9)),
+    ("gaussian_blur", 1, (5, 5)),
+    ("gaussian_blur", 3, (1, 1)),
+    ("blur", 2, (3, 3)),
+    # 锐化等核的大小不是空间范围，保持不变
+    ("sharpen", 2, (9, 9)),
+])
+def test_blur_kernel_size_follows_proxy_level(engine, kernel_type, level, expected):
+    engine.load_graph(graph_path("linear_chain"))
+    engine.set_param("卷积核节点.kernel_type", kernel_type)
+    engine.set_param("卷积核节点.size", "9")
+    engine.set_proxy_level(level)
+    assert engine.evaluate("卷积核节点")['kernel'].shape == expected
+
+
+@pytest.mark.parametrize("level", [0, 1, 2, 4])
+def test_projection_defaults_are_identity_at_every_proxy_level(engine, tmp_path, level):
+    image_path = str(tmp_path / "in.png")
+    cv2.imwrite(image_path, (np.random.default_rng(2).random((96, 128, 3)) * 255).astype(np.uint8))
+    engine.load_graph(graph_path("projection_blend"))
+    engine.set_param("图像节点.image_path", image_path)
+    for name, value in (("theta_y", "0"), ("theta_z", "0"), ("tx", "0"), ("scale", "100")):
+        engine.set_param(f"投影.{name}", value)
+    engine.set_proxy_level(level)
+
+    # distance按像素单位随代理分辨率缩小，默认参数在任何层级下都应原样输出
+    source = engine.evaluate("解码节点")['f32bmp']
+    projected = engine.evaluate("投影")['f32bmp']
+    assert source.shape[:2] == (96 >> level, 128 >> level)
+    assert np.array_equal(projected, source)
+
+
+def test_pixel_params_keep_int_type_at_proxy_level(engine):
+    engine.load_graph(graph_path("projection_blend"))
+    engine.set_param("投影.tx", "41")
+    engine.set_proxy_level(2)
+    params = engine.get_node_process_params(engine.find_node("投影"), {'f32bmp': np.zeros((4, 4, 4), np.float32)})
+    assert params['tx'] == 10 and type(params['tx']) is int
+    assert params['distance'] == 250 and type(params['distance']) is int
+    # 角度不是像素单位，保持不变
+    assert params['theta_y'] == 15
+
+
+# ----------------------------------------------------------------------
+# 并行执行
+# ----------------------------------------------------------------------
+def parallel_engine(workers=4, **performance):
+    config = configparser.ConfigParser()
+    config['Performance'] = {'parallel_execution': 'true', 'max_worker_threads': str(workers), **performance}
+    return TNXEngine(config=config)
+
+
+def test_parallel_executor_orders_nodes_and_overlaps_branches(tmp_path):
+    path, edges = write_diamond_graph(tmp_path)
+    engine = parallel_engine()
+    engine.load_graph(path)
+    recorder = ProcessRecorder(engine, delays={2: 0.3})
+
+    result = engine.evaluate_graph()
+    assert not result['error_occurred']
+    assert result['processed_node_ids'] == set(range(6))
+    assert all(recorder.calls[node_id] == 1 for node_id in range(6))
+    # 每个节点都在它的所有上游完成之后才开始
+    for out_id, in_id, _ in edges:
+        assert recorder.spans[out_id][1] <= recorder.spans[in_id][0]
+    # 快的分支不等待慢的分支：在慢分支结束前已经在另一个工作线程中完成
+    slow_start, slow_end, slow_thread = recorder.spans[2]
+    fast_start, fast_end, fast_thread = recorder.spans[3]
+    assert fast_end < slow_end and fast_start < slow_end
+    assert slow_thread != fast_thread
+    assert slow_thread.startswith("TNXNodeWorker") and fast_thread.startswith("TNXNodeWorker")
+
+
+def test_parallel_executor_records_failure_without_running_downstream(tmp_path):
+    path, _ = write_diamond_graph(tmp_path)
+    engine = parallel_engine()
+    engine.load_graph(path)
+    recorder = ProcessRecorder(engine, delays={2: 0.1}, failures={3})
+
+    result = engine.evaluate_graph()
+    assert result['error_occurred']
+    assert set(result['errors']) == {3}
+    assert isinstance(result['errors'][3], TNXEngineError)
+    assert isinstance(result['errors'][3].__cause__, RuntimeError)
+    # 另一个分支照常完成，出错节点的下游不会被执行
+    assert 2 in result['processed_node_ids'] and 'processed_outputs' in engine.find_node(2)
+    assert recorder.calls[4] == 0 and recorder.calls[5] == 0
+    with pytest.raises(TNXEngineError, match="基本处理"):
+        engine.evaluate()
+
+
+def test_process_node_runs_each_node_once_across_threads(tmp_path):
+    path, _ = write_diamond_graph(tmp_path)
+    engine = parallel_engine()
+    engine.load_graph(path)
+    recorder = ProcessRecorder(engine, delays={1: 0.2})
+
+    # 两个分支同时拉取尚未计算的解码节点，节点锁保证解码只执行一次
+    barrier = threading.Barrier(4)
+
+    def pull(node_id):
+        barrier.wait()
+        return engine.process_node(engine.find_node(node_id))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(pull, [2, 3, 2, 3]))
+    assert recorder.calls[1] == 1
+    assert recorder.calls[2] == 1 and recorder.calls[3] == 1
+    assert results[0]['f32bmp'] is results[2]['f32bmp']
+
+
+# ----------------------------------------------------------------------
+# 提前截止
+# ----------------------------------------------------------------------
+def test_early_cutoff_stops_at_unchanged_output(engine, tmp_path):
+    path, _ = write_diamond_graph(tmp_path)
+    engine.load_graph(path)
+    recorder = ProcessRecorder(engine)
+    engine.evaluate_graph()
+    before = engine.find_node(5)['processed_outputs']['f32bmp']
+
+    # 换成内容相同的另一个文件：图像节点的指纹变化、需要重新计算，但输出逐位相同
+    copy_path = str(tmp_path / "copy.png")
+    shutil.copyfile(str(tmp_path / "in.png"), copy_path)
+    engine.set_param("0.image_path", copy_path)
+    result = engine.evaluate_graph(changed_nodes=[engine.find_node(0)])
+
+    assert recorder.calls[0] == 2
+    assert all(recorder.calls[node_id] == 1 for node_id in range(1, 6))
+    assert result['processed_node_ids'] == {0}
+    after = engine.find_node(5)['processed_outputs']['f32bmp']
+    assert after is before
+
+    # 沿用的输出与从头计算的结果相同
+    fresh = TNXEngine(config=configparser.ConfigParser())
+    fresh.load_graph(path)
+    fresh.set_param("0.image_path", copy_path)
+    assert np.array_equal(after, fresh.evaluate()['f32bmp'])
+
+
+def test_early_cutoff_still_propagates_changed_outputs(engine, tmp_path):
+    path, _ = write_diamond_graph(tmp_path)
+    engine.load_graph(path)
+    recorder = ProcessRecorder(engine)
+    engine.evaluate_graph()
+    before = engine.find_node(5)['processed_outputs']['f32bmp']
+
+    engine.set_param("2.brightness", "40")
+    result = engine.evaluate_graph(changed_nodes=[engine.find_node(2)])
+    # 输出真的变化时下游照常重新计算，另一个分支不受影响
+    assert result['processed_node_ids'] == {2, 4, 5}
+    assert recorder.calls[3] == 1
+    assert not np.array_equal(engine.find_node(5)['processed_outputs']['f32bmp'], before)
+
+
+# ----------------------------------------------------------------------
+# 中间结果释放
+# ----------------------------------------------------------------------
+def test_release_keeps_retained_and_preview_outputs(engine, tmp_path):
+    path, _ = write_diamond_graph(tmp_path)
+    engine.load_graph(path)
+    engine.find_node(2)['keep_outputs'] = True
+    recorder = ProcessRecorder(engine)
+    engine.evaluate_graph()
+
+    # 所有下游都已完成的中间节点释放输出，来源记录只剩弱引用
+    for node_id in (0, 3, 4):
+        node = engine.find_node(node_id)
+        assert 'processed_outputs' not in node
+        assert node.get('outputs_released') is True
+        assert isinstance(engine._node_provenance[node_id][0], WeakOutputs)
+    # 标记为保留的节点、节点内预览（解码节点）和预览节点在下游完成后仍然持有输出
+    for node_id in (1, 2, 5):
+        node = engine.find_node(node_id)
+        assert 'f32bmp' in node['processed_outputs']
+        assert not node.get('outputs_released')
+
+    # 缓存仍持有数组时弱引用可以解析，再次取用直接从缓存恢复而不重新计算
+    released = engine._node_provenance[3][0].resolve()
+    assert released is not None
+    outputs = engine.process_node(engine.find_node(3))
+    assert outputs['f32bmp'] is released['f32bmp']
+    assert recorder.calls[3] == 1
+
+
+def test_release_disabled_keeps_all_outputs(tmp_path):
+    config = configparser.ConfigParser()
+    config['Performance'] = {'release_intermediates': 'false'}
+    engine = TNXEngine(config=config)
+    engine.load_graph(write_diamond_graph(tmp_path)[0])
+    engine.evaluate_graph()
+    for node_id in range(1, 6):
+        node = engine.find_node(node_id)
+        assert 'processed_outputs' in node
+        assert not node.get('outputs_released')
@@ -0,0 +1,105 @@
+"""
+主程序后台渲染的代数（generation）测试：被更新的请求取代的渲染在节点之间取消，结果不会发布到预览
+"""
+import os
+import threading
+import importlib.util
+import configparser
+
+import pytest
+
+from conftest import APP_DIR, ProcessRecorder, write_diamond_graph
+from TunnelNX_scripts.TNXEngine import TNXEngine
+
+pytest.importorskip("PySide6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+_spec = importlib.util.spec_from_file_location("tunnel_next", os.path.join(APP_DIR, "Tunnel Next.py"))
+tunnel_next = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(tunnel_next)
+TunnelNX = tunnel_next.TunnelNX
+
+
+class RenderHarness:
+    """
+    只带后台渲染状态的主窗口替身：渲染任务和发布逻辑使用 TunnelNX 的实现，
+    交给GUI线程的回调先记录下来，由测试代替事件循环执行
+    """
+    _next_render_generation = TunnelNX._next_render_generation
+    _is_render_stale = TunnelNX._is_render_stale
+    _background_render_job = TunnelNX._background_render_job
+    _publish_render_result = TunnelNX._publish_render_result
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._render_generation = 0
+        self._render_state_lock = threading.Lock()
+        self._render_lock = engine.evaluation_lock
+        self._render_level_times = {}
+        self.ui_callbacks = []
+        self.published = []
+
+    def _run_on_ui_thread(self, callback):
+        self.ui_callbacks.append(callback)
+
+    def run_ui_callbacks(self):
+        callbacks, self.ui_callbacks = self.ui_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _finish_node_graph_processing(self, result):
+        self.published.append(result)
+
+    def _select_proxy_level(self):
+        return self.engine.proxy_level
+
+    def _on_background_render_done(self):
+        pass
+
+
+@pytest.fixture
+def diamond_engine(tmp_path):
+    config = configparser.ConfigParser()
+    config['Performance'] = {'parallel_execution': 'false'}
+    engine = TNXEngine(config=config)
+    engine.load_graph(write_diamond_graph(tmp_path)[0])
+    return engine
+
+
+def test_newer_generation_cancels_stale_render(diamond_engine):
+    engine = diamond_engine
+    entered, release = threading.Event(), threading.Event()
+    recorder = ProcessRecorder(engine, gates={2: (entered, release)})
+    harness = RenderHarness(engine)
+
+    stale = harness._next_render_generation()
+    worker = threading.Thread(target=harness._background_render_job, args=(stale, None))
+    worker.start()
+    assert entered.wait(5)
+    # 渲染停在分支节点时有新的编辑
+    newer = harness._next_render_generation()
+    release.set()
+    worker.join(5)
+    assert not worker.is_alive()
+
+    # 过期的渲染在节点之间停止，没有计算下游，也没有发布任何结果
+    harness.run_ui_callbacks()
+    assert harness.published == []
+    assert recorder.calls[4] == 0 and recorder.calls[5] == 0
+    assert 'processed_outputs' not in engine.find_node(5)
+
+    # 新一代的渲染接着处理被取消的节点并发布
+    harness._background_render_job(newer, [])
+    harness.run_ui_callbacks()
+    assert len(harness.published) == 1
+    assert {4, 5} <= harness.published[0]['processed_node_ids']
+    assert recorder.calls[2] == 1 and recorder.calls[5] == 1
+
+
+def test_superseded_render_result_is_not_published(diamond_engine):
+    harness = RenderHarness(diamond_engine)
+    generation = harness._next_render_generation()
+    harness._background_render_job(generation, None)
+    # 渲染已经完成，但在结果交给GUI线程之前有了新的请求
+    harness._next_render_generation()
+    harness.run_ui_callbacks()
+    assert harness.published == []
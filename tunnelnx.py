@@ -0,0 +1,128 @@
+"""
+TunnelNX 命令行渲染
+
+不启动界面，直接加载保存的节点图并把结果保存为图像，例如:
+    python tunnelnx.py render graph.json --set 图像节点.image_path=input.jpg --out result.tif
+    python tunnelnx.py info graph.json
+    python tunnelnx.py batch graph.json "photos/**/*.jpg" --out-dir results --jobs 8
+"""
+import os
+import sys
+import time
+import argparse
+
+from TunnelNX_scripts.TNXEngine import TNXEngine, TNXEngineError, SAVE_EXTENSIONS
+from TunnelNX_scripts.TNXBatch import expand_inputs, run_batch
+
+
+def build_parser():
+    """命令行参数定义"""
+    parser = argparse.ArgumentParser(prog="tunnelnx", description="TunnelNX 无界面节点图渲染")
+    parser.add_argument("--scripts", help="脚本文件夹（默认为程序目录下的 TunnelNX_scripts）")
+    parser.add_argument("--config", help="配置文件（默认为程序目录下的 config.ini）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render = subparsers.add_parser("render", help="计算节点图并保存结果图像")
+    render.add_argument("graph", help="节点图文件（.json）")
+    render.add_argument("--set", dest="overrides", action="append", default=[], metavar="节点.参数=值",
+                        help="覆盖节点参数，节点可以是ID或标题，可重复使用")
+    render.add_argument("--out", required=True, help="输出图像路径（.jpg 8位，.png/.tif 16位）")
+    render.add_argument("--node", help="输出节点的ID或标题（默认为预览节点）")
+    render.add_argument("--port", help="输出类型（默认按 f32bmp、tif16、img 查找）")
+
+    info = subparsers.add_parser("info", help="列出节点图中的节点和参数")
+    info.add_argument("graph", help="节点图文件（.json）")
+
+    batch = subparsers.add_parser("batch", help="用同一个节点图并行处理多个图像")
+    batch.add_argument("graph", help="模板节点图文件（.json）")
+    batch.add_argument("inputs", nargs="*", help="输入图像路径或通配符（支持 ** 递归匹配）")
+    batch.add_argument("--list", dest="list_file", help="输入列表文件，每行一个路径")
+    batch.add_argument("--out-dir", required=True, help="输出文件夹，批处理日志 batch_log.jsonl 也保存在这里")
+    batch.add_argument("--set", dest="overrides", action="append", default=[], metavar="节点.参数=值",
+                       help="对所有文件生效的参数覆盖，可重复使用")
+    batch.add_argument("--jobs", type=int, default=None, help="工作进程数（默认为CPU核心数）")
+    batch.add_argument("--source", help="替换 image_path 的源节点ID或标题（默认自动查找）")
+    batch.add_argument("--export", help="导出节点ID或标题（默认自动查找）")
+    batch.add_argument("--node", help="没有导出节点时保存其输出的节点（默认为预览节点）")
+    batch.add_argument("--ext", default=".png", help="没有导出节点时的输出格式（默认 .png）")
+    batch.add_argument("--force", action="store_true", help="忽略日志，重新处理已成功的文件")
+    batch.add_argument("--verbose", action="store_true", help="显示脚本的输出")
+    return parser
+
+
+def parse_overrides(overrides):
+    """把 --set 参数拆分为 [(节点.参数, 值), ...]"""
+    parsed = []
+    for override in overrides:
+        spec, sep, value = override.partition('=')
+        if not sep:
+            raise TNXEngineError(f"参数覆盖格式应为 节点.参数=值: {override}")
+        parsed.append((spec.strip(), value))
+    return parsed
+
+
+def apply_overrides(engine, overrides):
+    """应用 --set 参数覆盖"""
+    for spec, value in parse_overrides(overrides):
+        engine.set_param(spec, value)
+
+
+def command_render(engine, args):
+    """render 子命令"""
+    # 先检查输出格式，避免计算完才发现无法保存
+    if os.path.splitext(args.out)[1].lower() not in SAVE_EXTENSIONS:
+        raise TNXEngineError(f"不支持的输出格式: {args.out}（支持 {', '.join(SAVE_EXTENSIONS)}）")
+    engine.load_graph(args.graph)
+    apply_overrides(engine, args.overrides)
+
+    start = time.perf_counter()
+    outputs = engine.evaluate(args.node)
+    image = engine.pick_image(outputs, args.port)
+    engine.save_image(image, args.out)
+    print(f"已保存 {args.out} ({image.shape[1]}x{image.shape[0]})，耗时 {time.perf_counter() - start:.2f} 秒")
+
+
+def command_info(engine, args):
+    """info 子命令"""
+    engine.load_graph(args.graph)
+    for node in engine.nodes:
+        print(f"[{node['id']}] {node['title']}")
+        for name, info in node['params'].items():
+            if isinstance(info, dict):
+                print(f"    {name} = {info.get('value')!r}")
+
+
+def command_batch(engine, args):
+    """batch 子命令"""
+    input_paths = expand_inputs(args.inputs, args.list_file)
+    if not input_paths:
+        raise TNXEngineError("没有找到输入文件")
+    if args.ext.lower() not in SAVE_EXTENSIONS:
+        raise TNXEngineError(f"不支持的输出格式: {args.ext}（支持 {', '.join(SAVE_EXTENSIONS)}）")
+    stats = run_batch(args.graph, input_paths, args.out_dir, overrides=parse_overrides(args.overrides),
+                      jobs=args.jobs, source_ref=args.source, export_ref=args.export, target_ref=args.node,
+                      extension=args.ext.lower(), force=args.force, verbose=args.verbose,
+                      scripts_folder=args.scripts, config_path=args.config)
+    print(f"批处理完成: 共 {stats['total']} 个文件，成功 {stats['ok']}，失败 {stats['failed']}，"
+          f"跳过 {stats['skipped']}，耗时 {stats['seconds']:.1f} 秒")
+    return 1 if stats['failed'] else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine = TNXEngine(scripts_folder=args.scripts, config_path=args.config)
+    try:
+        if args.command == "render":
+            command_render(engine, args)
+        elif args.command == "info":
+            command_info(engine, args)
+        elif args.command == "batch":
+            return command_batch(engine, args)
+    except (TNXEngineError, OSError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())